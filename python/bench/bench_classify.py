@@ -0,0 +1,62 @@
+# standard imports
+import sys
+import timeit
+import logging
+
+# external imports
+from chainlib.eth.error import RequestMismatchException
+from chainlib.eth.contract import ABIContractType
+
+# local imports
+from eth_erc20 import ERC20
+from eth_erc20.plan import CallPlan
+from eth_erc20.classify import CallClassifier
+
+logging.basicConfig(level=logging.WARNING)
+
+holder_address = '0x2B5AD5c4795c026514f8317c7a215E218DcCD6cF'
+spender_address = '0x4CCeBa2d7D2B4fdcE4304d3e09a1fea9fbEb1528'
+inputs = [
+    CallPlan.get('transfer', ABIContractType.ADDRESS, ABIContractType.UINT256).encode(spender_address, 42),
+    CallPlan.get('transferFrom', ABIContractType.ADDRESS, ABIContractType.ADDRESS, ABIContractType.UINT256).encode(holder_address, spender_address, 42),
+    CallPlan.get('approve', ABIContractType.ADDRESS, ABIContractType.UINT256).encode(spender_address, 42),
+    CallPlan.get('totalSupply').encode(),
+        ]
+parsers = [
+    ERC20.parse_transfer_request,
+    ERC20.parse_transfer_from_request,
+    ERC20.parse_approve_request,
+        ]
+classifier = CallClassifier(ERC20.call_plans())
+
+
+def classify_parsers():
+    for v in inputs:
+        for parser in parsers:
+            try:
+                parser(v)
+                break
+            except RequestMismatchException:
+                pass
+
+
+def classify_selector():
+    for v in classifier.classify_all(inputs):
+        pass
+
+
+def main():
+    count = 20000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    t_parsers = timeit.timeit(classify_parsers, number=count)
+    t_selector = timeit.timeit(classify_selector, number=count)
+    n = count * len(inputs)
+    print('classify x {}'.format(n))
+    print('parsers  {:.3f}s {:.2f}us/input'.format(t_parsers, t_parsers * 1000000 / n))
+    print('selector {:.3f}s {:.2f}us/input'.format(t_selector, t_selector * 1000000 / n))
+    print('speedup  {:.2f}x'.format(t_parsers / t_selector))
+
+
+if __name__ == '__main__':
+    main()
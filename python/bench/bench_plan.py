@@ -0,0 +1,59 @@
+# standard imports
+import sys
+import timeit
+import logging
+
+# external imports
+from chainlib.chain import ChainSpec
+from chainlib.eth.contract import (
+        ABIContractEncoder,
+        ABIContractType,
+        )
+from chainlib.jsonrpc import JSONRPCRequest
+from hexathon import add_0x
+
+# local imports
+from eth_erc20 import ERC20
+
+logging.basicConfig(level=logging.WARNING)
+
+chain_spec = ChainSpec('evm', 'foochain', 42)
+contract_address = '0x4CCeBa2d7D2B4fdcE4304d3e09a1fea9fbEb1528'
+holder_address = '0x2B5AD5c4795c026514f8317c7a215E218DcCD6cF'
+c = ERC20(chain_spec)
+
+
+def balance_of_encoder():
+    j = JSONRPCRequest()
+    o = j.template()
+    o['method'] = 'eth_call'
+    enc = ABIContractEncoder()
+    enc.method('balanceOf')
+    enc.typ(ABIContractType.ADDRESS)
+    enc.address(holder_address)
+    data = add_0x(enc.get())
+    tx = c.template(holder_address, contract_address)
+    tx = c.set_code(tx, data)
+    o['params'].append(c.normalize(tx))
+    o['params'].append('latest')
+    return j.finalize(o)
+
+
+def balance_of_plan():
+    return c.balance_of(contract_address, holder_address, sender_address=holder_address)
+
+
+def main():
+    count = 20000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    t_encoder = timeit.timeit(balance_of_encoder, number=count)
+    t_plan = timeit.timeit(balance_of_plan, number=count)
+    print('balance_of x {}'.format(count))
+    print('encoder {:.3f}s {:.2f}us/call'.format(t_encoder, t_encoder * 1000000 / count))
+    print('plan    {:.3f}s {:.2f}us/call'.format(t_plan, t_plan * 1000000 / count))
+    print('speedup {:.2f}x'.format(t_encoder / t_plan))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# standard imports
+import os
+import sys
+import time
+import logging
+
+# external imports
+from chainlib.chain import ChainSpec
+from chainlib.eth.nonce import OverrideNonceOracle
+from chainlib.eth.gas import OverrideGasOracle
+from chainlib.eth.tx import TxFormat
+from funga.eth.keystore.dict import DictKeystore
+from funga.eth.signer import EIP155Signer
+
+# local imports
+from eth_erc20 import ERC20
+
+logging.basicConfig(level=logging.WARNING)
+
+chain_spec = ChainSpec('evm', 'foochain', 42)
+contract_address = '0x4CCeBa2d7D2B4fdcE4304d3e09a1fea9fbEb1528'
+recipient_address = '0x2B5AD5c4795c026514f8317c7a215E218DcCD6cF'
+
+keystore = DictKeystore()
+sender_address = keystore.new()
+signer = EIP155Signer(keystore)
+
+
+def templates(count):
+    nonce_oracle = OverrideNonceOracle(sender_address, 0)
+    gas_oracle = OverrideGasOracle(price=1000000000, limit=100000)
+    c = ERC20(chain_spec, signer=signer, nonce_oracle=nonce_oracle, gas_oracle=gas_oracle)
+    return [c.transfer(contract_address, sender_address, recipient_address, i, tx_format=TxFormat.DICT) for i in range(count)]
+
+
+def main():
+    count = 5000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    cpus = os.cpu_count() or 1
+    c = ERC20(chain_spec, signer=signer)
+
+    txs = templates(count)
+    t = time.time()
+    for tx in txs:
+        c.finalize(tx, tx_format=TxFormat.RLP_SIGNED)
+    t_serial = time.time() - t
+    print('sign transfer x {}, {} cpus'.format(count, cpus))
+    print('serial      {:.3f}s {:.2f}us/tx'.format(t_serial, t_serial * 1000000 / count))
+
+    processes = 1
+    while processes <= cpus:
+        txs = templates(count)
+        t = time.time()
+        c.finalize_batch(txs, tx_format=TxFormat.RLP_SIGNED, processes=processes)
+        t_batch = time.time() - t
+        print('processes {:<2} {:.3f}s {:.2f}us/tx speedup {:.2f}x'.format(processes, t_batch, t_batch * 1000000 / count, t_serial / t_batch))
+        if processes < cpus and processes * 2 > cpus:
+            processes = cpus
+        else:
+            processes *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# standard imports
+import os
+import sys
+import subprocess
+import configparser
+
+# number of top level imports to list for each script
+TOP_COUNT = 5
+LOCAL_PACKAGES = ('eth_erc20', 'giftable_erc20_token', 'static_token')
+
+root_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def console_scripts():
+    cfg = configparser.ConfigParser()
+    cfg.read(os.path.join(root_dir, 'setup.cfg'))
+    r = []
+    for l in cfg.get('options.entry_points', 'console_scripts').strip().split('\n'):
+        (name, target) = l.split('=')
+        r.append((name.strip(), target.strip().split(':')[0],))
+    return r
+
+
+def importtime(module):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = root_dir
+    p = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module], env=env, capture_output=True, text=True)
+    if p.returncode != 0:
+        raise RuntimeError('import {} failed: {}'.format(module, p.stderr[-1024:]))
+    r = []
+    for l in p.stderr.split('\n'):
+        if l[:12] != 'import time:' or 'imported package' in l:
+            continue
+        (self_us, cumulative_us, name) = l[12:].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        r.append((name.strip(), int(self_us), int(cumulative_us), depth,))
+    return r
+
+
+def main():
+    count = 5
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    print('console script import time, best of {}'.format(count))
+    for (name, module) in console_scripts():
+        best = None
+        for i in range(count):
+            r = importtime(module)
+            total = sum([v[1] for v in r])
+            if best == None or total < best[0]:
+                best = (total, r,)
+        (total, r) = best
+        local = sum([v[1] for v in r if v[0].split('.')[0] in LOCAL_PACKAGES])
+        print('{:<24} {:8.1f}ms total {:6.1f}ms local'.format(name, total / 1000, local / 1000))
+        top = sorted([v for v in r if v[3] <= 1 and v[0] != module], key=lambda v: v[2], reverse=True)[:TOP_COUNT]
+        for v in top:
+            print('    {:<40} {:8.1f}ms'.format(v[0], v[2] / 1000))
+
+
+if __name__ == '__main__':
+    main()
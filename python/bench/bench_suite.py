@@ -0,0 +1,284 @@
+# standard imports
+import os
+import sys
+import json
+import time
+import timeit
+import logging
+import argparse
+import platform
+import subprocess
+from importlib.metadata import (
+        version,
+        PackageNotFoundError,
+        )
+
+# external imports
+from chainlib.chain import ChainSpec
+from chainlib.eth.nonce import (
+        OverrideNonceOracle,
+        RPCNonceOracle,
+        )
+from chainlib.eth.gas import OverrideGasOracle
+from chainlib.eth.tx import (
+        TxFormat,
+        receipt,
+        )
+from chainlib.eth.contract import ABIContractType
+from funga.eth.keystore.dict import DictKeystore
+from funga.eth.signer import EIP155Signer
+
+# local imports
+from eth_erc20 import ERC20
+from eth_erc20.plan import CallPlan
+from eth_erc20.amount import AmountCodec
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.simulate import GiftableTokenSimulator
+
+logging.basicConfig(level=logging.WARNING)
+
+FORMAT_VERSION = 1
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.1
+PACKAGES = ('chainlib', 'chainlib-eth', 'funga-eth', 'hexathon', 'eth-tester', 'eth-erc20')
+
+root_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+chain_spec = ChainSpec('evm', 'foochain', 42)
+contract_address = '0x4CCeBa2d7D2B4fdcE4304d3e09a1fea9fbEb1528'
+holder_address = '0x2B5AD5c4795c026514f8317c7a215E218DcCD6cF'
+recipient_address = '0x6813Eb9362372EEF6200f3b1dbC3f819671cBA69'
+
+
+def word(v):
+    return '0x' + v.to_bytes(32, 'big').hex()
+
+
+def string_result(s):
+    b = s.encode('utf-8')
+    return '0x' + (32).to_bytes(32, 'big').hex() + len(b).to_bytes(32, 'big').hex() + b.ljust(32, b'\x00').hex()
+
+
+def encode_benchmarks():
+    nonce_oracle = OverrideNonceOracle(holder_address, 42)
+    gas_oracle = OverrideGasOracle(price=1000000000, limit=100000)
+    c = ERC20(chain_spec, nonce_oracle=nonce_oracle, gas_oracle=gas_oracle)
+    g = GiftableToken(chain_spec, nonce_oracle=nonce_oracle, gas_oracle=gas_oracle)
+    return [
+        ('encode.balance_of', lambda: c.balance_of(contract_address, holder_address, sender_address=holder_address)),
+        ('encode.allowance', lambda: c.allowance(contract_address, holder_address, recipient_address, sender_address=holder_address)),
+        ('encode.transfer', lambda: c.transfer(contract_address, holder_address, recipient_address, 1024, tx_format=TxFormat.DICT)),
+        ('encode.approve', lambda: c.approve(contract_address, holder_address, recipient_address, 1024, tx_format=TxFormat.DICT)),
+        ('encode.mint_to', lambda: g.mint_to(contract_address, holder_address, recipient_address, 1024, tx_format=TxFormat.DICT)),
+        ]
+
+
+def decode_benchmarks():
+    balance = word(1 << 200)
+    name = string_result('Foo Token')
+    transfer = CallPlan.get('transfer', ABIContractType.ADDRESS, ABIContractType.UINT256).encode(recipient_address, 1024)
+    transfer_from = CallPlan.get('transferFrom', ABIContractType.ADDRESS, ABIContractType.ADDRESS, ABIContractType.UINT256).encode(holder_address, recipient_address, 1024)
+    approve = CallPlan.get('approve', ABIContractType.ADDRESS, ABIContractType.UINT256).encode(recipient_address, 1024)
+    addresses = [holder_address] * 100
+    balances = [balance] * 100
+    amount_codec = AmountCodec(18)
+    values = [(i + 1) * 10 ** 21 + i for i in range(100)]
+    amounts = amount_codec.format_many(values)
+    return [
+        ('decode.parse_balance', lambda: ERC20.parse_balance(balance)),
+        ('decode.parse_name', lambda: ERC20.parse_name(name)),
+        ('decode.parse_decimals', lambda: ERC20.parse_decimals(word(18))),
+        ('decode.parse_balance_batch_100', lambda: ERC20.parse_balance_batch(addresses, balances)),
+        ('decode.parse_transfer_request', lambda: ERC20.parse_transfer_request(transfer)),
+        ('decode.parse_transfer_from_request', lambda: ERC20.parse_transfer_from_request(transfer_from)),
+        ('decode.parse_approve_request', lambda: ERC20.parse_approve_request(approve)),
+        ('amount.format_many_100', lambda: amount_codec.format_many(values)),
+        ('amount.parse_many_100', lambda: amount_codec.parse_many(amounts)),
+        ]
+
+
+def sign_benchmarks():
+    keystore = DictKeystore()
+    sender_address = keystore.new()
+    signer = EIP155Signer(keystore)
+    nonce_oracle = OverrideNonceOracle(sender_address, 42)
+    gas_oracle = OverrideGasOracle(price=1000000000, limit=100000)
+    c = ERC20(chain_spec, signer=signer, nonce_oracle=nonce_oracle, gas_oracle=gas_oracle)
+    g = GiftableToken(chain_spec, signer=signer, nonce_oracle=nonce_oracle, gas_oracle=gas_oracle)
+    return [
+        ('sign.transfer', lambda: c.transfer(contract_address, sender_address, recipient_address, 1024, tx_format=TxFormat.RLP_SIGNED)),
+        ('sign.transfer_jsonrpc', lambda: c.transfer(contract_address, sender_address, recipient_address, 1024)),
+        ('sign.mint_to', lambda: g.mint_to(contract_address, sender_address, recipient_address, 1024, tx_format=TxFormat.RLP_SIGNED)),
+        ]
+
+
+def simulate_benchmarks():
+    nonce_oracle = OverrideNonceOracle(holder_address, 42)
+    gas_oracle = OverrideGasOracle(price=1000000000, limit=100000)
+    c = ERC20(chain_spec, nonce_oracle=nonce_oracle, gas_oracle=gas_oracle)
+    txs = [c.transfer(contract_address, holder_address, recipient_address, i, tx_format=TxFormat.DICT) for i in range(1000)]
+
+    def transfer():
+        sim = GiftableTokenSimulator(contract_address, holder_address)
+        sim.balances[sim.owner] = 1 << 40
+        sim.run(txs)
+
+    return [
+        ('simulate.transfer_1000', transfer),
+        ]
+
+
+def roundtrip_benchmarks(case):
+    nonce_oracle = RPCNonceOracle(case.accounts[0], conn=case.rpc)
+    c = GiftableToken(case.chain_spec, signer=case.signer, nonce_oracle=nonce_oracle)
+
+    def balance_of():
+        return c.parse_balance(case.rpc.do(c.balance_of(case.address, case.accounts[0], sender_address=case.accounts[0])))
+
+    def transfer():
+        (tx_hash, o) = c.transfer(case.address, case.accounts[0], case.accounts[1], 1)
+        case.rpc.do(o)
+        r = case.rpc.do(receipt(tx_hash))
+        if r['status'] != 1:
+            raise RuntimeError('transfer {} reverted'.format(tx_hash))
+
+    return [
+        ('roundtrip.balance_of', balance_of),
+        ('roundtrip.transfer', transfer),
+        ]
+
+
+def measure(fn, repeat):
+    """Time a benchmark function, with the number of calls per run chosen by timeit.Timer.autorange.
+
+    :rtype: dict
+    :returns: Best and median nanoseconds per call, with the number of calls per run and number of runs
+    """
+    timer = timeit.Timer(fn)
+    (number, t) = timer.autorange()
+    times = sorted(timer.repeat(repeat=repeat, number=number))
+    return {
+        'ns_per_op': times[0] * 1000000000 / number,
+        'median_ns_per_op': times[len(times) // 2] * 1000000000 / number,
+        'number': number,
+        'repeat': repeat,
+        }
+
+
+def environment():
+    commit = None
+    try:
+        p = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root_dir, capture_output=True, text=True)
+        if p.returncode == 0:
+            commit = p.stdout.strip()
+    except OSError:
+        pass
+    packages = {}
+    for name in PACKAGES:
+        try:
+            packages[name] = version(name)
+        except PackageNotFoundError:
+            packages[name] = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'packages': packages,
+        }
+
+
+def run(groups, name_filter, repeat):
+    benchmarks = []
+    case = None
+    if 'encode' in groups:
+        benchmarks += encode_benchmarks()
+    if 'decode' in groups:
+        benchmarks += decode_benchmarks()
+    if 'sign' in groups:
+        benchmarks += sign_benchmarks()
+    if 'simulate' in groups:
+        benchmarks += simulate_benchmarks()
+    if 'roundtrip' in groups:
+        from giftable_erc20_token.unittest import TestGiftableToken
+        case = TestGiftableToken('run')
+        case.setUp()
+        benchmarks += roundtrip_benchmarks(case)
+
+    results = {}
+    try:
+        for (name, fn) in benchmarks:
+            if name_filter != None and name_filter not in name:
+                continue
+            results[name] = measure(fn, repeat)
+            sys.stderr.write('{:<40} {:>14.1f} ns/op\n'.format(name, results[name]['ns_per_op']))
+    finally:
+        if case != None:
+            case.tearDown()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print the change of each result against a baseline run.
+
+    :rtype: list
+    :returns: Names of the benchmarks that are slower than the baseline by more than threshold
+    """
+    regressions = []
+    for (name, v) in results.items():
+        try:
+            base = baseline['results'][name]['ns_per_op']
+        except KeyError:
+            print('{:<40} {:>14.1f} ns/op (new)'.format(name, v['ns_per_op']))
+            continue
+        ratio = v['ns_per_op'] / base
+        s = ''
+        if ratio > 1 + threshold:
+            s = ' REGRESSION'
+            regressions.append(name)
+        print('{:<40} {:>14.1f} ns/op {:>14.1f} ns/op {:>+7.1f}%{}'.format(name, base, v['ns_per_op'], (ratio - 1) * 100, s))
+    return regressions
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Micro-benchmarks for calldata encoding, result decoding, signing and eth-tester round trips')
+    argparser.add_argument('-o', '--output', type=str, help='Write results as JSON to file')
+    argparser.add_argument('--compare', type=str, help='Compare results with JSON results of an earlier run, exit with status 1 on regressions')
+    argparser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='Slowdown ratio that counts as regression when comparing')
+    argparser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Number of timed runs of each benchmark; the best is reported')
+    argparser.add_argument('--group', type=str, action='append', choices=['encode', 'decode', 'sign', 'simulate', 'roundtrip'], help='Benchmark group to run, may be repeated (default: all)')
+    argparser.add_argument('--filter', type=str, help='Only run benchmarks with names containing this string')
+    args = argparser.parse_args()
+
+    groups = args.group or ['encode', 'decode', 'sign', 'simulate', 'roundtrip']
+    o = {
+        'version': FORMAT_VERSION,
+        'time': int(time.time()),
+        'environment': environment(),
+        'results': run(groups, args.filter, args.repeat),
+        }
+
+    if args.output != None:
+        f = open(args.output, 'w')
+        json.dump(o, f, indent=2, sort_keys=True)
+        f.write('\n')
+        f.close()
+    elif args.compare == None:
+        json.dump(o, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+    if args.compare != None:
+        f = open(args.compare, 'r')
+        baseline = json.load(f)
+        f.close()
+        if baseline.get('version') != FORMAT_VERSION:
+            raise ValueError('baseline format version {} does not match {}'.format(baseline.get('version'), FORMAT_VERSION))
+        regressions = compare(o['results'], baseline, args.threshold)
+        if len(regressions) > 0:
+            sys.stderr.write('{} regressions over {:.0f}%: {}\n'.format(len(regressions), args.threshold * 100, ', '.join(regressions)))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+# standard imports
+import ssl
+import json
+import base64
+import asyncio
+import logging
+import urllib.parse
+
+# external imports
+from chainlib.connection import error_parser as default_error_parser
+from chainlib.jsonrpc import jsonrpc_result
+from chainlib.error import RPCException
+from chainlib.eth.constant import ZERO_ADDRESS
+from chainlib.block import BlockSpec
+
+# local imports
+from .erc20 import ERC20
+from .cache import (
+    METADATA_KEYS,
+    metadata_query,
+    parse_metadata,
+)
+from .batch import DEFAULT_BATCH_SIZE
+
+logg = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_TIMEOUT = 30.0
+
+
+class AsyncJSONRPCConnection:
+    """JSON-RPC client over a pool of keep-alive HTTP/1.1 connections, for use with asyncio.
+
+    Requests are dict objects or batch arrays as built by chainlib.jsonrpc.JSONRPCRequest, like for chainlib.connection.JSONRPCHTTPConnection. At most concurrency requests are in flight at any time, each on its own connection; idle connections are kept open and reused by later requests.
+
+    Connections belong to the event loop they were opened in. If the connection object is used from another event loop, e.g. in a later asyncio.run, the pool is started over.
+
+    :param url: Endpoint url. Credentials in the url are sent as basic auth
+    :type url: str
+    :param concurrency: Maximum number of requests in flight, and of open connections
+    :type concurrency: int
+    :param timeout: Seconds to wait for connecting and for each response
+    :type timeout: float
+    :param verify_identity: Verify TLS certificate of endpoint
+    :type verify_identity: bool
+    :param error_parser: Error parser for JSON-RPC error responses
+    :type error_parser: chainlib.jsonrpc.ErrorParser
+    :raises ValueError: Unsupported url scheme, or invalid concurrency
+    """
+
+    def __init__(self, url, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT, verify_identity=True, error_parser=default_error_parser):
+        u = urllib.parse.urlsplit(url)
+        if u.scheme not in ['http', 'https']:
+            raise ValueError('unsupported url scheme {}'.format(u.scheme))
+        if concurrency < 1:
+            raise ValueError('concurrency must be positive, got {}'.format(concurrency))
+        self.host = u.hostname
+        self.port = u.port
+        self.ssl = None
+        if u.scheme == 'https':
+            self.ssl = ssl.create_default_context()
+            if not verify_identity:
+                self.ssl.check_hostname = False
+                self.ssl.verify_mode = ssl.CERT_NONE
+            if self.port == None:
+                self.port = 443
+        elif self.port == None:
+            self.port = 80
+        self.path = u.path or '/'
+        if u.query:
+            self.path += '?' + u.query
+        self.auth = None
+        if u.username != None:
+            credentials = '{}:{}'.format(urllib.parse.unquote(u.username), urllib.parse.unquote(u.password or ''))
+            self.auth = 'Basic ' + base64.b64encode(credentials.encode('utf-8')).decode('ascii')
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.error_parser = error_parser
+        self.idle = []
+        self.semaphore = None
+        self.loop = None
+
+
+    async def __open(self):
+        try:
+            (reader, writer) = await asyncio.wait_for(asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.timeout)
+        except asyncio.TimeoutError:
+            raise RPCException('timeout connecting to {}:{}'.format(self.host, self.port))
+        except OSError as e:
+            raise RPCException(e)
+        logg.debug('opened connection to {}:{}'.format(self.host, self.port))
+        return (reader, writer,)
+
+
+    async def __exchange(self, stream, data):
+        (reader, writer) = stream
+        h = 'POST {} HTTP/1.1\r\nHost: {}:{}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: keep-alive\r\n'.format(self.path, self.host, self.port, len(data))
+        if self.auth != None:
+            h += 'Authorization: {}\r\n'.format(self.auth)
+        writer.write(h.encode('ascii') + b'\r\n' + data)
+        await writer.drain()
+
+        status = await reader.readline()
+        if len(status) == 0:
+            raise ConnectionResetError('connection closed by endpoint')
+        status = status.decode('ascii').split(' ', 2)
+        headers = {}
+        while True:
+            l = await reader.readline()
+            if l in [b'\r\n', b'\n', b'']:
+                break
+            (k, v) = l.decode('latin-1').split(':', 1)
+            headers[k.strip().lower()] = v.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = b''
+            while True:
+                l = int((await reader.readline()).split(b';')[0], 16)
+                chunk = await reader.readexactly(l + 2)
+                if l == 0:
+                    break
+                body += chunk[:-2]
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            # without length the body ends when the endpoint closes the connection
+            body = await reader.read()
+            headers['connection'] = 'close'
+
+        keep_alive = headers.get('connection', '').lower() != 'close'
+        if int(status[1]) != 200:
+            raise RPCException('HTTP {} from {}:{}: {}'.format(status[1], self.host, self.port, body[:256]))
+        return (body, keep_alive,)
+
+
+    def __reset(self, loop):
+        # streams of a previous loop cannot be used, or closed properly, in this one
+        for (reader, writer) in self.idle:
+            try:
+                writer.close()
+            except RuntimeError:
+                pass
+        self.idle = []
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.loop = loop
+
+
+    async def __request(self, data):
+        loop = asyncio.get_running_loop()
+        if loop != self.loop:
+            self.__reset(loop)
+        async with self.semaphore:
+            reused = len(self.idle) > 0
+            if reused:
+                stream = self.idle.pop()
+            else:
+                stream = await self.__open()
+            while True:
+                try:
+                    (body, keep_alive) = await asyncio.wait_for(self.__exchange(stream, data), self.timeout)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    stream[1].close()
+                    if not reused:
+                        raise RPCException(e)
+                    # idle connection was closed by the endpoint, retry once on a fresh one
+                    logg.debug('reused connection failed, reconnecting: {}'.format(e))
+                    reused = False
+                    stream = await self.__open()
+                except asyncio.TimeoutError:
+                    stream[1].close()
+                    raise RPCException('timeout waiting for response from {}:{}'.format(self.host, self.port))
+                except Exception as e:
+                    stream[1].close()
+                    raise e
+            if keep_alive:
+                self.idle.append(stream)
+            else:
+                stream[1].close()
+        return body
+
+
+    async def do(self, o):
+        """Execute a JSON-RPC request object or batch array.
+
+        :param o: JSON-RPC request object, or batch array
+        :type o: dict or list
+        :raises chainlib.error.JSONRPCException: Error response from endpoint
+        :raises chainlib.error.RPCException: Endpoint could not be reached
+        :raises ValueError: Response does not match request
+        :rtype: any
+        :returns: Result value of request, or list of result values in request order for a batch array
+        """
+        data = json.dumps(o).encode('utf-8')
+        r = json.loads(await self.__request(data))
+        if not isinstance(o, list):
+            if o['id'] != r['id']:
+                raise ValueError('RPC id mismatch; sent {} received {}'.format(o['id'], r['id']))
+            return jsonrpc_result(r, self.error_parser)
+
+        responses = {}
+        for v in r:
+            responses[v['id']] = v
+        results = []
+        for v in o:
+            try:
+                results.append(jsonrpc_result(responses[v['id']], self.error_parser))
+            except KeyError:
+                raise ValueError('RPC id {} missing in batch response'.format(v['id']))
+        return results
+
+
+    async def close(self):
+        while len(self.idle) > 0:
+            (reader, writer) = self.idle.pop()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+class AsyncERC20:
+    """Asynchronous token queries, using the request builders of a token contract interface.
+
+    All methods are coroutines, and may be run concurrently with asyncio.gather; the number of requests actually in flight is bounded by the connection.
+
+    :param conn: Connection
+    :type conn: eth_erc20.aio.AsyncJSONRPCConnection
+    :param chain_spec: Chain spec of the token contracts
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param sender_address: Sender address for the eth_call queries
+    :type sender_address: str
+    :param factory: Contract interface to build the requests with. Defaults to eth_erc20.ERC20
+    :type factory: eth_erc20.ERC20
+    :param cache: Metadata cache to use for the metadata method
+    :type cache: eth_erc20.cache.TokenMetadataCache
+    """
+
+    def __init__(self, conn, chain_spec, sender_address=ZERO_ADDRESS, factory=None, cache=None):
+        self.conn = conn
+        self.chain_spec = chain_spec
+        self.sender_address = sender_address
+        if factory == None:
+            factory = ERC20(chain_spec)
+        self.factory = factory
+        self.cache = cache
+
+
+    async def balance_of(self, contract_address, holder_address, height=BlockSpec.LATEST):
+        o = self.factory.balance_of(contract_address, holder_address, sender_address=self.sender_address, height=height)
+        r = await self.conn.do(o)
+        return self.factory.parse_balance(r)
+
+
+    async def balances(self, contract_address, holder_addresses, height=BlockSpec.LATEST, batch_size=DEFAULT_BATCH_SIZE):
+        """Query balances of many holders, in concurrent JSON-RPC batches.
+
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :param holder_addresses: Holder addresses
+        :type holder_addresses: iterable
+        :param height: Block height to query at
+        :type height: int or chainlib.block.BlockSpec
+        :param batch_size: Maximum number of queries per batch
+        :type batch_size: int
+        :rtype: dict
+        :returns: Balance for each holder, keyed by address as given
+        """
+        batches = list(self.factory.balance_of_batch(contract_address, holder_addresses, sender_address=self.sender_address, height=height, batch_size=batch_size))
+        results = await asyncio.gather(*[self.conn.do(o) for (chunk, o) in batches])
+        r = {}
+        for ((chunk, o), v) in zip(batches, results):
+            r.update(self.factory.parse_balance_batch(chunk, v))
+        return r
+
+
+    async def allowance(self, contract_address, holder_address, spender_address, height=BlockSpec.LATEST):
+        o = self.factory.allowance(contract_address, holder_address, spender_address, sender_address=self.sender_address, height=height)
+        r = await self.conn.do(o)
+        return self.factory.parse_allowance(r)
+
+
+    async def total_supply(self, contract_address, height=BlockSpec.LATEST):
+        o = self.factory.total_supply(contract_address, sender_address=self.sender_address, height=height)
+        r = await self.conn.do(o)
+        return self.factory.parse_total_supply(r)
+
+
+    async def metadata(self, contract_address, keys=METADATA_KEYS, refresh=False):
+        """Query token metadata in a single JSON-RPC batch, skipping values found in the metadata cache.
+
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :param keys: Metadata values to retrieve
+        :type keys: tuple
+        :param refresh: Ignore cached values, and replace them with the queried ones
+        :type refresh: bool
+        :rtype: dict
+        :returns: Metadata values, keyed by name
+        """
+        r = {}
+        if self.cache != None:
+            r = dict(self.cache.get(self.chain_spec, contract_address) or {})
+        if refresh:
+            missing = list(keys)
+        else:
+            missing = [k for k in keys if k not in r]
+        if len(missing) == 0:
+            return r
+        o = metadata_query(self.chain_spec, contract_address, keys=missing, sender_address=self.sender_address)
+        r.update(parse_metadata(missing, await self.conn.do(o)))
+        if self.cache != None:
+            self.cache.put(self.chain_spec, contract_address, r)
+        return r
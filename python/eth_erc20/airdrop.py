@@ -0,0 +1,384 @@
+# standard imports
+import os
+import csv
+import json
+import time
+import logging
+
+# external imports
+from chainlib.eth.nonce import (
+    RPCNonceOracle,
+    OverrideNonceOracle,
+)
+from chainlib.eth.tx import (
+    TxFormat,
+    raw,
+    receipt,
+)
+from chainlib.eth.address import to_checksum_address
+from hexathon import (
+    add_0x,
+    strip_0x,
+)
+
+# local imports
+from .erc20 import ERC20
+from .batch import (
+    chunks,
+    do_batch,
+)
+
+logg = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 100
+DEFAULT_MAX_PENDING = 1000
+DEFAULT_POLL_INTERVAL = 1.0
+
+# submission errors of geth, erigon, nethermind and openethereum for transactions already in the pool or chain
+KNOWN_TX_ERRORS = [
+    'already known',
+    'known transaction',
+    'alreadyknown',
+    'already imported',
+]
+
+
+def read_transfers(f, amount_codec=None):
+    """Read transfers from CSV with recipient address and token value columns.
+
+    A first line that does not start with an address is treated as a header and skipped.
+
+    :param f: CSV input
+    :type f: file
+    :param amount_codec: If set, values are in token units and parsed with this codec. Otherwise they are integers in base units
+    :type amount_codec: eth_erc20.amount.AmountCodec
+    :raises ValueError: Invalid address or value
+    :rtype: generator
+    :returns: Recipient and value, as (address, int) tuples
+    """
+    first = True
+    for row in csv.reader(f):
+        if len(row) == 0 or row[0].strip() == '' or row[0].strip()[0] == '#':
+            continue
+        recipient = row[0].strip()
+        if first:
+            first = False
+            try:
+                bytes.fromhex(strip_0x(recipient))
+            except ValueError:
+                logg.debug('skipping csv header {}'.format(row))
+                continue
+        if len(row) < 2:
+            raise ValueError('missing value for recipient {}'.format(recipient))
+        value = row[1].strip()
+        if amount_codec == None:
+            value = int(value)
+        else:
+            value = amount_codec.parse(value)
+        yield (add_0x(to_checksum_address(strip_0x(recipient))), value,)
+
+
+def is_known_error(e):
+    """Check whether a submission error means the node already has the transaction.
+
+    :param e: Error returned for the submission
+    :type e: Exception
+    :rtype: bool
+    :returns: True if the transaction is already known to the node
+    """
+    v = str(e).lower()
+    for m in KNOWN_TX_ERRORS:
+        if m in v:
+            return True
+    return False
+
+
+class Airdrop:
+    """Sends token transfers to many recipients, keeping a journal that allows resuming after interruption.
+
+    Nonces are allocated locally in sequence, and all transactions are signed and journaled before any are sent. Signed transactions are then submitted in windows of JSON-RPC batches without waiting for receipts, as long as fewer than max_pending are unconfirmed. Receipts are polled in batches.
+
+    On resume, transfers already in the journal are never signed again; journaled transactions without a receipt are submitted again with their original signature, and the remaining transfers get nonces following the last journaled one.
+
+    The journal is a JSON lines file. The first line records chain, token and sender; each following line records the signing, submission or receipt of one transfer.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param chain_spec: Chain spec
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param token_address: Token contract address
+    :type token_address: str
+    :param sender_address: Sender address
+    :type sender_address: str
+    :param journal_path: Path to journal file
+    :type journal_path: str
+    :param signer: Transaction signer
+    :type signer: funga.signer.Signer
+    :param gas_oracle: Gas oracle. Should not query the network, since it is called once for every transfer
+    :type gas_oracle: chainlib.eth.gas.GasOracle
+    :param window: Number of transactions submitted in each JSON-RPC batch
+    :type window: int
+    :param max_pending: Maximum number of submitted transactions without receipt
+    :type max_pending: int
+    :param factory_class: Token interface class to build the transactions with
+    :type factory_class: eth_erc20.ERC20
+    :raises ValueError: Journal is for a different chain, token or sender
+    """
+
+    def __init__(self, conn, chain_spec, token_address, sender_address, journal_path, signer=None, gas_oracle=None, window=DEFAULT_WINDOW, max_pending=DEFAULT_MAX_PENDING, factory_class=ERC20, id_generator=None):
+        self.conn = conn
+        self.chain_spec = chain_spec
+        self.token_address = token_address
+        self.sender_address = sender_address
+        self.signer = signer
+        self.gas_oracle = gas_oracle
+        self.window = window
+        self.max_pending = max(max_pending, window)
+        self.factory_class = factory_class
+        self.id_generator = id_generator
+        self.transfers = []
+        self.entries = {}
+        self.pending_entries = {}
+        self.journal_path = journal_path
+        self.__load_journal()
+        for i in sorted(self.entries.keys()):
+            self.__track(self.entries[i])
+        self.journal = open(journal_path, 'a')
+
+
+    def __header(self):
+        return {
+            'chain': str(self.chain_spec),
+            'token': strip_0x(self.token_address).lower(),
+            'sender': strip_0x(self.sender_address).lower(),
+                }
+
+
+    def __load_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        f = open(self.journal_path, 'rb')
+        header = None
+        end = 0
+        for l in f:
+            try:
+                o = json.loads(l)
+            except ValueError:
+                # interrupted write, can only be the last line
+                logg.warning('truncating incomplete journal line {}'.format(l))
+                break
+            end += len(l)
+            if header == None:
+                header = o
+                if header != self.__header():
+                    f.close()
+                    raise ValueError('journal {} is for {}, not {}'.format(self.journal_path, header, self.__header()))
+                continue
+            entry = self.entries.get(o['i'])
+            if entry == None:
+                self.entries[o['i']] = o
+            else:
+                entry.update(o)
+        f.close()
+        if end < os.path.getsize(self.journal_path):
+            os.truncate(self.journal_path, end)
+        logg.info('loaded {} journal entries from {}'.format(len(self.entries), self.journal_path))
+
+
+    def __write(self, items):
+        if self.journal.tell() == 0:
+            self.journal.write(json.dumps(self.__header()) + '\n')
+        for o in items:
+            self.journal.write(json.dumps(o) + '\n')
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+
+    def __track(self, entry):
+        if entry.get('sent') and entry.get('status') == None:
+            self.pending_entries[entry['i']] = entry
+        else:
+            self.pending_entries.pop(entry['i'], None)
+
+
+    def __record(self, items):
+        for o in items:
+            entry = self.entries[o['i']]
+            entry.update(o)
+            self.__track(entry)
+        self.__write(items)
+
+
+    def add(self, transfers):
+        """Add transfers to send, in order. Transfers already journaled must be added in the same order as before.
+
+        :param transfers: Recipient and value, as (address, int) tuples
+        :type transfers: iterable
+        :raises ValueError: Transfer does not match journal entry at the same position
+        """
+        for (recipient, value) in transfers:
+            i = len(self.transfers)
+            entry = self.entries.get(i)
+            if entry != None and (strip_0x(entry['recipient']).lower() != strip_0x(recipient).lower() or entry['value'] != value):
+                raise ValueError('transfer {} ({}, {}) does not match journal ({}, {})'.format(i, recipient, value, entry['recipient'], entry['value']))
+            self.transfers.append((recipient, value,))
+
+
+    def sign(self, nonce=None):
+        """Sign and journal all transfers not yet journaled.
+
+        :param nonce: Nonce of the first new transaction. If not set, the nonce following the last journaled transaction is used, or the nonce from the network if the journal is empty
+        :type nonce: int
+        :rtype: int
+        :returns: Number of transactions signed
+        """
+        if nonce == None:
+            nonces = [entry['nonce'] for entry in self.entries.values()]
+            if len(nonces) > 0:
+                nonce = max(nonces) + 1
+            else:
+                nonce = RPCNonceOracle(self.sender_address, conn=self.conn, id_generator=self.id_generator).get_nonce()
+        nonce_oracle = OverrideNonceOracle(self.sender_address, nonce)
+        c = self.factory_class(self.chain_spec, signer=self.signer, gas_oracle=self.gas_oracle, nonce_oracle=nonce_oracle)
+        count = 0
+        items = []
+        for i in range(len(self.transfers)):
+            if self.entries.get(i) != None:
+                continue
+            (recipient, value) = self.transfers[i]
+            tx_nonce = nonce_oracle.nonce
+            (tx_hash, tx_raw) = c.transfer(self.token_address, self.sender_address, recipient, value, tx_format=TxFormat.RLP_SIGNED)
+            o = {
+                'i': i,
+                'recipient': recipient,
+                'value': value,
+                'nonce': tx_nonce,
+                'hash': tx_hash,
+                'raw': add_0x(tx_raw),
+                    }
+            self.entries[i] = o
+            items.append(o)
+            count += 1
+            if len(items) == self.window:
+                self.__write(items)
+                items = []
+        self.__write(items)
+        logg.info('signed {} transfers from nonce {}'.format(count, nonce))
+        return count
+
+
+    def pending(self):
+        """Journal entries submitted without receipt, in transfer order.
+
+        :rtype: list
+        :returns: Journal entries
+        """
+        return list(self.pending_entries.values())
+
+
+    def unsent(self):
+        """Journal entries signed but not submitted in this or a previous run, in transfer order.
+
+        :rtype: list
+        :returns: Journal entries
+        """
+        return [self.entries[i] for i in sorted(self.entries.keys()) if not self.entries[i].get('sent')]
+
+
+    def send(self, interval=DEFAULT_POLL_INTERVAL):
+        """Submit all signed transactions without receipt, in windows.
+
+        Transactions journaled as submitted but without receipt are submitted again first. If the node returns an error for a transaction, its receipt is looked up, since a resubmitted transaction may already be mined. If there is none, a transaction the node reports as already known, see eth_erc20.airdrop.KNOWN_TX_ERRORS, is left for receipt tracking to settle. Any other error is journaled with the transfer, which is then left unsent, and a later run submits it again with the same signature. Transactions with higher nonces from the same sender cannot be mined until it is.
+
+        :param interval: Seconds to wait between receipt polls while too many transactions are pending
+        :type interval: float
+        :rtype: generator
+        :returns: Journal entries of transactions confirmed while sending, see eth_erc20.airdrop.Airdrop.confirm, and of transactions rejected by the node, with the error message in the error field
+        """
+        entries = self.pending() + self.unsent()
+        self.pending_entries = {}
+        for window in chunks(entries, batch_size=self.window):
+            while len(self.pending_entries) + len(window) > self.max_pending:
+                confirmed = list(self.confirm())
+                for entry in confirmed:
+                    yield entry
+                if len(confirmed) == 0:
+                    time.sleep(interval)
+            o = [raw(entry['raw'], id_generator=self.id_generator) for entry in window]
+            r = do_batch(self.conn, o, tolerate_errors=True)
+            items = []
+            failed = []
+            for (entry, v) in zip(window, r):
+                if isinstance(v, Exception):
+                    logg.warning('submit transfer {} nonce {} tx {} failed: {}'.format(entry['i'], entry['nonce'], entry['hash'], v))
+                    failed.append((entry, v,))
+                else:
+                    items.append({'i': entry['i'], 'sent': True, 'error': None})
+            rejected = []
+            if len(failed) > 0:
+                o = [receipt(entry['hash'], id_generator=self.id_generator) for (entry, v) in failed]
+                r = do_batch(self.conn, o, tolerate_errors=True)
+                for ((entry, e), v) in zip(failed, r):
+                    if v != None and not isinstance(v, Exception):
+                        items.append({'i': entry['i'], 'sent': True, 'error': None})
+                    elif is_known_error(e):
+                        items.append({'i': entry['i'], 'sent': True, 'error': None})
+                    else:
+                        items.append({'i': entry['i'], 'sent': False, 'error': str(e)})
+                        rejected.append(entry['i'])
+            self.__record(items)
+            logg.debug('submitted window of {} transactions, {} rejected'.format(len(window), len(rejected)))
+            for i in rejected:
+                yield self.entries[i]
+
+
+    def confirm(self):
+        """Poll receipts of pending transactions once, in batches, and journal the ones found.
+
+        :rtype: generator
+        :returns: Journal entries of the confirmed transactions, with receipt status and block number
+        """
+        for chunk in chunks(self.pending(), batch_size=self.window):
+            o = [receipt(entry['hash'], id_generator=self.id_generator) for entry in chunk]
+            r = do_batch(self.conn, o, tolerate_errors=True)
+            items = []
+            for (entry, v) in zip(chunk, r):
+                if v == None or isinstance(v, Exception):
+                    continue
+                block_number = v.get('blockNumber', v.get('block_number'))
+                if isinstance(block_number, str):
+                    block_number = int(block_number, 16)
+                status = v['status']
+                if isinstance(status, str):
+                    status = int(status, 16)
+                items.append({'i': entry['i'], 'status': status, 'block': block_number})
+            self.__record(items)
+            for item in items:
+                yield self.entries[item['i']]
+
+
+    def wait(self, timeout=0, interval=DEFAULT_POLL_INTERVAL):
+        """Poll receipts until all submitted transactions have one.
+
+        :param timeout: Seconds to wait at most, or 0 to wait indefinitely
+        :type timeout: float
+        :param interval: Seconds to wait between polls
+        :type interval: float
+        :raises TimeoutError: Transactions are still pending after timeout
+        :rtype: generator
+        :returns: Journal entries of the confirmed transactions, see eth_erc20.airdrop.Airdrop.confirm
+        """
+        start = time.time()
+        while len(self.pending_entries) > 0:
+            confirmed = list(self.confirm())
+            for entry in confirmed:
+                yield entry
+            if len(self.pending_entries) == 0:
+                break
+            if timeout > 0 and time.time() - start > timeout:
+                raise TimeoutError('{} transfers still pending after {} seconds'.format(len(self.pending_entries), timeout))
+            time.sleep(interval)
+
+
+    def close(self):
+        self.journal.close()
@@ -0,0 +1,300 @@
+# standard imports
+import logging
+import sqlite3
+
+# external imports
+from chainlib.eth.constant import ZERO_ADDRESS
+from chainlib.eth.contract import ABIContractType
+from chainlib.eth.error import RequestMismatchException
+from chainlib.eth.tx import transaction
+
+# local imports
+from .erc20 import ERC20
+from .plan import CallPlan
+from .scan import LogScanner
+from .ledger import (
+    event_plans,
+    to_holder,
+    DEFAULT_FLUSH_SIZE,
+)
+from .batch import (
+    chunks,
+    do_batch,
+    DEFAULT_BATCH_SIZE,
+)
+
+logg = logging.getLogger(__name__)
+
+# allowance value that common token implementations never decrease on transferFrom
+MAX_ALLOWANCE = (1 << 256) - 1
+
+
+class AllowanceIndex:
+    """Local allowance table for token contracts, materialized from Approval, TransferFrom and Transfer events.
+
+    Approval events set the allowance of an owner and spender pair. TransferFrom events, as emitted by GiftableToken, carry the spender and decrease its allowance by the transferred value.
+
+    Plain ERC20 contracts emit only Transfer for a transferFrom call, without the spender. If resolve_transfers is set in sync, the emitting transaction is looked up for Transfer events whose sender has allowances in the index, and if it is a direct transferFrom call to the contract, its sender is taken as spender. Transfers through intermediate contracts cannot be attributed this way; use verify to find the pairs affected. A decrease is skipped if the same transaction also emitted an Approval for the pair, as contracts that emit Approval on transferFrom do, and for allowances of eth_erc20.allowance.MAX_ALLOWANCE.
+
+    Like eth_erc20.ledger.BalanceLedger, each contract has a checkpoint holding the last block whose events have been applied, committed in the same transaction as the allowance changes.
+
+    :param path: Path to sqlite database file, or ":memory:"
+    :type path: str
+    :param chain_spec: Chain spec of the token contracts
+    :type chain_spec: chainlib.chain.ChainSpec
+    :raises ValueError: Database already holds indices for a different chain
+    """
+
+    def __init__(self, path, chain_spec):
+        self.chain_spec = chain_spec
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS chain (spec TEXT NOT NULL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS allowance_checkpoint (contract TEXT PRIMARY KEY, block_number INTEGER NOT NULL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS allowance (contract TEXT NOT NULL, owner TEXT NOT NULL, spender TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (contract, owner, spender))')
+        self.db.execute('CREATE INDEX IF NOT EXISTS allowance_spender ON allowance (contract, spender)')
+        r = self.db.execute('SELECT spec FROM chain').fetchone()
+        if r == None:
+            self.db.execute('INSERT INTO chain (spec) VALUES (?)', (str(chain_spec),))
+        elif r[0] != str(chain_spec):
+            raise ValueError('index is for chain {}, not {}'.format(r[0], chain_spec))
+        self.db.commit()
+
+
+    def checkpoint(self, contract_address):
+        """Last block whose events have been applied for the contract.
+
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :rtype: int
+        :returns: Block number, or -1 if nothing has been applied yet
+        """
+        r = self.db.execute('SELECT block_number FROM allowance_checkpoint WHERE contract = ?', (to_holder(contract_address),)).fetchone()
+        if r == None:
+            return -1
+        return r[0]
+
+
+    def allowance(self, contract_address, owner_address, spender_address):
+        """Indexed allowance of a spender over an owner's tokens at the contract checkpoint.
+
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :param owner_address: Token owner address
+        :type owner_address: str
+        :param spender_address: Spender address
+        :type spender_address: str
+        :rtype: int
+        :returns: Allowance
+        """
+        return self.__get(to_holder(contract_address), to_holder(owner_address), to_holder(spender_address))
+
+
+    def by_owner(self, contract_address, owner_address):
+        """All non-zero allowances granted by an owner.
+
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :param owner_address: Token owner address
+        :type owner_address: str
+        :rtype: dict
+        :returns: Allowance for each spender, keyed by checksummed spender address without 0x prefix
+        """
+        r = {}
+        for (spender, value) in self.db.execute('SELECT spender, value FROM allowance WHERE contract = ? AND owner = ?', (to_holder(contract_address), to_holder(owner_address),)):
+            r[spender] = int(value)
+        return r
+
+
+    def by_spender(self, contract_address, spender_address):
+        """All non-zero allowances granted to a spender.
+
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :param spender_address: Spender address
+        :type spender_address: str
+        :rtype: dict
+        :returns: Allowance of each owner, keyed by checksummed owner address without 0x prefix
+        """
+        r = {}
+        for (owner, value) in self.db.execute('SELECT owner, value FROM allowance WHERE contract = ? AND spender = ?', (to_holder(contract_address), to_holder(spender_address),)):
+            r[owner] = int(value)
+        return r
+
+
+    def allowances(self, contract_address):
+        """All non-zero allowances of a contract, in owner order.
+
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :rtype: generator
+        :returns: Allowances, as (owner address, spender address, value) tuples
+        """
+        for (owner, spender, value) in self.db.execute('SELECT owner, spender, value FROM allowance WHERE contract = ? ORDER BY owner, spender', (to_holder(contract_address),)):
+            yield (owner, spender, int(value),)
+
+
+    def __get(self, contract_address, owner, spender, pending=None):
+        if pending != None:
+            v = pending.get((owner, spender,))
+            if v != None:
+                return v
+        r = self.db.execute('SELECT value FROM allowance WHERE contract = ? AND owner = ? AND spender = ?', (contract_address, owner, spender,)).fetchone()
+        if r == None:
+            return 0
+        return int(r[0])
+
+
+    def __has_allowances(self, contract_address, owner, pending_owners):
+        if owner in pending_owners:
+            return True
+        r = self.db.execute('SELECT 1 FROM allowance WHERE contract = ? AND owner = ? LIMIT 1', (contract_address, owner,)).fetchone()
+        return r != None
+
+
+    def __flush(self, contract_address, pending, block_number):
+        for ((owner, spender), value) in pending.items():
+            if value == 0:
+                self.db.execute('DELETE FROM allowance WHERE contract = ? AND owner = ? AND spender = ?', (contract_address, owner, spender,))
+            else:
+                self.db.execute('INSERT OR REPLACE INTO allowance (contract, owner, spender, value) VALUES (?, ?, ?, ?)', (contract_address, owner, spender, str(value),))
+        self.db.execute('INSERT OR REPLACE INTO allowance_checkpoint (contract, block_number) VALUES (?, ?)', (contract_address, block_number,))
+        self.db.commit()
+        logg.debug('allowance index {} flushed {} pairs at block {}'.format(contract_address, len(pending), block_number))
+
+
+    def __spender(self, conn, contract_address, event, plan):
+        tx = conn.do(transaction(event.tx_hash))
+        if tx == None or tx.get('to') == None or to_holder(tx['to']) != contract_address:
+            return None
+        try:
+            (holder, recipient, value) = plan.decode(tx.get('input') or tx.get('data') or '')
+        except (RequestMismatchException, ValueError):
+            return None
+        if holder != event.sender:
+            return None
+        return to_holder(tx['from'])
+
+
+    def sync(self, conn, contract_address, start=0, end=None, plans=None, scanner=None, resolve_transfers=False, flush_size=DEFAULT_FLUSH_SIZE):
+        """Apply events from the block after the contract checkpoint up to and including the end block.
+
+        :param conn: RPC connection
+        :type conn: chainlib.connection.RPCConnection
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :param start: First block to process if the contract has no checkpoint, e.g. the block the contract was published in
+        :type start: int
+        :param end: Last block to process. If not set, the latest block at the time of the call is used
+        :type end: int
+        :param plans: Event plans to scan for. Defaults to eth_erc20.ledger.event_plans()
+        :type plans: list of eth_erc20.event.EventPlan
+        :param scanner: Log scanner to use instead of one created with default settings
+        :type scanner: eth_erc20.scan.LogScanner
+        :param resolve_transfers: Look up transactions of Transfer events to attribute them to a spender, for contracts that do not emit TransferFrom
+        :type resolve_transfers: bool
+        :param flush_size: Number of pairs with pending changes that triggers a commit
+        :type flush_size: int
+        :rtype: int
+        :returns: New checkpoint block number
+        """
+        contract_address = to_holder(contract_address)
+        if scanner == None:
+            if plans == None:
+                plans = event_plans()
+            scanner = LogScanner(conn, plans)
+        if end == None:
+            end = scanner.latest()
+        cursor = self.checkpoint(contract_address) + 1
+        if cursor < start:
+            cursor = start
+        if cursor > end:
+            return end
+
+        transfer_from_plan = CallPlan.get('transferFrom', ABIContractType.ADDRESS, ABIContractType.ADDRESS, ABIContractType.UINT256)
+        pending = {}
+        pending_owners = set()
+        last_block = cursor - 1
+        last_tx = None
+        approved = set()
+        for event in scanner.scan(contract_address, cursor, end=end):
+            if event.block_number != last_block:
+                if len(pending) >= flush_size:
+                    self.__flush(contract_address, pending, event.block_number - 1)
+                    pending = {}
+                    pending_owners = set()
+                last_block = event.block_number
+            if event.tx_hash != last_tx:
+                approved = set()
+                last_tx = event.tx_hash
+            name = event.__class__.__name__
+            if name == 'Approval':
+                k = (event.owner, event.spender,)
+                pending[k] = event.value
+                pending_owners.add(event.owner)
+                approved.add(k)
+                continue
+            elif name == 'TransferFrom':
+                k = (event.sender, event.spender,)
+            elif name == 'Transfer' and resolve_transfers:
+                if not self.__has_allowances(contract_address, event.sender, pending_owners):
+                    continue
+                spender = self.__spender(conn, contract_address, event, transfer_from_plan)
+                if spender == None:
+                    continue
+                k = (event.sender, spender,)
+            else:
+                continue
+            if k in approved:
+                continue
+            value = self.__get(contract_address, k[0], k[1], pending=pending)
+            if value == MAX_ALLOWANCE and name == 'Transfer':
+                continue
+            if value < event.value:
+                logg.warning('transfer of {} exceeds indexed allowance {} for {} by {} in {}'.format(event.value, value, k[0], k[1], contract_address))
+                value = event.value
+            pending[k] = value - event.value
+            pending_owners.add(k[0])
+
+        self.__flush(contract_address, pending, end)
+        return end
+
+
+    def verify(self, conn, contract_address, pairs=None, sender_address=ZERO_ADDRESS, batch_size=DEFAULT_BATCH_SIZE):
+        """Compare indexed allowances with allowance results at the contract checkpoint height.
+
+        :param conn: RPC connection
+        :type conn: chainlib.connection.RPCConnection
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :param pairs: Pairs to check, as (owner address, spender address) tuples. If not set, all pairs in the index are checked
+        :type pairs: iterable
+        :param sender_address: Sender address for the eth_call queries
+        :type sender_address: str
+        :param batch_size: Maximum number of requests per JSON-RPC batch
+        :type batch_size: int
+        :raises ValueError: Contract has no checkpoint
+        :rtype: list
+        :returns: Mismatching entries, as (owner address, spender address, indexed allowance, node allowance) tuples
+        """
+        height = self.checkpoint(contract_address)
+        if height < 0:
+            raise ValueError('no checkpoint for {}'.format(contract_address))
+        if pairs == None:
+            entries = self.allowances(contract_address)
+        else:
+            entries = ((to_holder(owner), to_holder(spender), self.allowance(contract_address, owner, spender),) for (owner, spender) in pairs)
+        c = ERC20(self.chain_spec)
+        r = []
+        for chunk in chunks(entries, batch_size=batch_size):
+            o = []
+            for (owner, spender, value) in chunk:
+                o.append(c.allowance(contract_address, owner, spender, sender_address=sender_address, height=height))
+            for ((owner, spender, value), result) in zip(chunk, do_batch(conn, o)):
+                node_value = c.parse_allowance(result)
+                if node_value != value:
+                    r.append((owner, spender, value, node_value,))
+        return r
+
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,178 @@
+# standard imports
+import functools
+
+# external imports
+from chainlib.eth.constant import ZERO_ADDRESS
+
+# local imports
+from .cache import token_metadata
+
+MAX_VALUE = (1 << 256) - 1
+
+
+class AmountCodec:
+    """Converts token values between integer base units and decimal strings in token units, e.g. 1500000 and "1.500000" for a token with 6 decimals.
+
+    Conversion is done on the decimal string representation of the values, so values of any size are converted exactly. The *_many methods convert whole sequences at once, and are the ones to use for bulk formatting and parsing.
+
+    Formatted values always have exactly as many fractional digits as the token has decimals.
+
+    :param decimals: Token decimals
+    :type decimals: int
+    :raises ValueError: Negative decimals
+    """
+
+    def __init__(self, decimals):
+        decimals = int(decimals)
+        if decimals < 0:
+            raise ValueError('decimals cannot be negative, got {}'.format(decimals))
+        self.decimals = decimals
+
+
+    def format(self, value):
+        """Format a single value, see eth_erc20.amount.AmountCodec.format_many.
+
+        :param value: Value in base units
+        :type value: int
+        :raises ValueError: Negative value
+        :rtype: str
+        :returns: Value in token units
+        """
+        return self.format_many((value,))[0]
+
+
+    def format_many(self, values):
+        """Format values in base units as decimal strings in token units.
+
+        :param values: Values in base units
+        :type values: iterable of int
+        :raises ValueError: Negative value
+        :rtype: list
+        :returns: Values in token units, in input order
+        """
+        d = self.decimals
+        if d == 0:
+            r = [str(v) for v in values]
+            for s in r:
+                if s[0] == '-':
+                    raise ValueError('negative value {}'.format(s))
+            return r
+        r = []
+        append = r.append
+        for s in map(str, values):
+            if s[0] == '-':
+                raise ValueError('negative value {}'.format(s))
+            l = len(s)
+            if l <= d:
+                append('0.' + s.zfill(d))
+            else:
+                append(s[:l-d] + '.' + s[l-d:])
+        return r
+
+
+    def parse(self, s):
+        """Parse a single value, see eth_erc20.amount.AmountCodec.parse_many.
+
+        :param s: Value in token units
+        :type s: str
+        :raises ValueError: Invalid value
+        :rtype: int
+        :returns: Value in base units
+        """
+        return self.parse_many((s,))[0]
+
+
+    def parse_many(self, values):
+        """Parse decimal strings in token units to values in base units.
+
+        Fractional digits beyond the token decimals are accepted only if they are all zero, so that no value is ever rounded.
+
+        :param values: Values in token units, e.g. "1.5"
+        :type values: iterable of str
+        :raises ValueError: Invalid value, value with more significant fractional digits than the token decimals, or value larger than 256 bits
+        :rtype: list
+        :returns: Values in base units, in input order
+        """
+        d = self.decimals
+        r = []
+        append = r.append
+        for v in values:
+            (whole, sep, fraction) = v.strip().partition('.')
+            digits = whole + fraction
+            if len(digits) == 0 or not digits.isdigit() or not digits.isascii():
+                raise ValueError('invalid token value "{}"'.format(v))
+            l = len(fraction)
+            if l > d:
+                if fraction[d:].strip('0') != '':
+                    raise ValueError('token value "{}" has more than {} decimals'.format(v, d))
+                fraction = fraction[:d]
+            elif l < d:
+                fraction += '0' * (d - l)
+            n = int(whole + fraction)
+            if n > MAX_VALUE:
+                raise ValueError('token value "{}" does not fit in 256 bits'.format(v))
+            append(n)
+        return r
+
+
+@functools.lru_cache(maxsize=None)
+def codec(decimals):
+    """Shared codec instance for the given decimals.
+
+    :param decimals: Token decimals
+    :type decimals: int
+    :rtype: eth_erc20.amount.AmountCodec
+    :returns: Codec
+    """
+    return AmountCodec(decimals)
+
+
+def format_amount(value, decimals):
+    """Format a value in base units as a decimal string in token units.
+
+    :param value: Value in base units
+    :type value: int
+    :param decimals: Token decimals
+    :type decimals: int
+    :rtype: str
+    :returns: Value in token units
+    """
+    return codec(decimals).format(value)
+
+
+def parse_amount(s, decimals):
+    """Parse a decimal string in token units to a value in base units.
+
+    :param s: Value in token units
+    :type s: str
+    :param decimals: Token decimals
+    :type decimals: int
+    :raises ValueError: Invalid value
+    :rtype: int
+    :returns: Value in base units
+    """
+    return codec(decimals).parse(s)
+
+
+def token_codec(conn, chain_spec, address, cache=None, refresh=False, sender_address=ZERO_ADDRESS):
+    """Codec for the decimals of a token contract.
+
+    The decimals are retrieved with eth_erc20.cache.token_metadata, so they are only queried from the node the first time a token is seen when a cache is given.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param chain_spec: Chain spec
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param address: Token contract address
+    :type address: str
+    :param cache: Token metadata cache
+    :type cache: eth_erc20.cache.TokenMetadataCache
+    :param refresh: If set, query the decimals from the node and update the cache entry
+    :type refresh: bool
+    :param sender_address: Sender address for the eth_call query
+    :type sender_address: str
+    :rtype: eth_erc20.amount.AmountCodec
+    :returns: Codec
+    """
+    metadata = token_metadata(conn, chain_spec, address, keys=('decimals',), cache=cache, refresh=refresh, sender_address=sender_address)
+    return codec(metadata['decimals'])
@@ -0,0 +1,132 @@
+# standard imports
+import logging
+
+# external imports
+from chainlib.connection import JSONRPCHTTPConnection
+from chainlib.error import JSONRPCException
+
+logg = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_CONCURRENCY = 4
+
+
+def chunks(v, batch_size=DEFAULT_BATCH_SIZE):
+    """Split an iterable into lists of at most batch_size items.
+
+    :param v: Items to split
+    :type v: iterable
+    :param batch_size: Maximum number of items in each list
+    :type batch_size: int
+    :raises ValueError: Invalid batch size
+    :rtype: generator
+    :returns: Item lists, in input order
+    """
+    if batch_size < 1:
+        raise ValueError('batch size must be positive, got {}'.format(batch_size))
+    r = []
+    for item in v:
+        r.append(item)
+        if len(r) == batch_size:
+            yield r
+            r = []
+    if len(r) > 0:
+        yield r
+
+
+def supports_batch(conn):
+    """Whether a connection sends JSON-RPC batch arrays natively.
+
+    Connection wrappers can declare support with a supports_batch attribute.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :rtype: bool
+    :returns: True if batch arrays can be sent in a single request
+    """
+    if isinstance(conn, JSONRPCHTTPConnection):
+        return True
+    return getattr(conn, 'supports_batch', False) == True
+
+
+def do_batch(conn, o, tolerate_errors=False):
+    """Execute a JSON-RPC batch array and return the results in request order.
+
+    Connections that cannot send batch arrays natively execute the requests one by one.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param o: JSON-RPC batch array
+    :type o: list
+    :param tolerate_errors: If set, a batch with error responses is retried request by request, and the exception for each failed request is returned in place of its result
+    :type tolerate_errors: bool
+    :raises chainlib.error.JSONRPCException: Error response, if tolerate_errors is not set
+    :rtype: list
+    :returns: Result value of each request, in request order
+    """
+    if len(o) == 0:
+        return []
+    try:
+        if supports_batch(conn):
+            logg.debug('sending batch of {} requests'.format(len(o)))
+            return conn.do(o)
+        r = []
+        for v in o:
+            r.append(conn.do(v))
+        return r
+    except JSONRPCException as e:
+        if not tolerate_errors:
+            raise e
+        logg.debug('batch of {} requests has errors, retrying one by one: {}'.format(len(o), e))
+    r = []
+    for v in o:
+        try:
+            r.append(conn.do(v))
+        except JSONRPCException as e:
+            r.append(e)
+    return r
+
+
+def do_batches(conn, batches, concurrency=DEFAULT_CONCURRENCY, tolerate_errors=False):
+    """Execute JSON-RPC batch arrays concurrently, yielding the results of each batch as it completes.
+
+    Batches are taken from the input only when fewer than concurrency batches are in flight, so the input may be an unbounded generator.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param batches: Batches, as (tag, JSON-RPC batch array) tuples, e.g. from eth_erc20.ERC20.balance_of_batch
+    :type batches: iterable
+    :param concurrency: Maximum number of batches in flight
+    :type concurrency: int
+    :param tolerate_errors: Return exceptions for failed requests in place of their results, see eth_erc20.batch.do_batch
+    :type tolerate_errors: bool
+    :raises ValueError: Invalid concurrency
+    :rtype: generator
+    :returns: Batch tag and results, as (tag, list) tuples, in order of completion
+    """
+    if concurrency < 1:
+        raise ValueError('concurrency must be positive, got {}'.format(concurrency))
+    from concurrent.futures import (
+        ThreadPoolExecutor,
+        wait,
+        FIRST_COMPLETED,
+    )
+    batches = iter(batches)
+    pending = {}
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        while True:
+            for (tag, o) in batches:
+                pending[executor.submit(do_batch, conn, o, tolerate_errors)] = tag
+                if len(pending) == concurrency:
+                    break
+            if len(pending) == 0:
+                break
+            (done, not_done) = wait(pending.keys(), return_when=FIRST_COMPLETED)
+            for future in done:
+                tag = pending.pop(future)
+                yield (tag, future.result(),)
+    finally:
+        for future in pending.keys():
+            future.cancel()
+        executor.shutdown(wait=True)
@@ -0,0 +1,222 @@
+# standard imports
+import os
+import json
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+# external imports
+from chainlib.eth.address import to_checksum_address
+from chainlib.eth.constant import ZERO_ADDRESS
+from chainlib.block import BlockSpec
+from hexathon import strip_0x
+
+# local imports
+from .erc20 import ERC20
+from .batch import do_batch
+
+logg = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 1024
+METADATA_KEYS = (
+    'name',
+    'symbol',
+    'decimals',
+)
+
+
+def default_cache_dir():
+    """Default on-disk location of the token metadata cache.
+
+    :rtype: str
+    :returns: $XDG_CACHE_HOME/eth_erc20, or ~/.cache/eth_erc20 if XDG_CACHE_HOME is not set
+    """
+    d = os.environ.get('XDG_CACHE_HOME')
+    if not d:
+        d = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(d, 'eth_erc20')
+
+
+class TokenMetadataCache:
+    """On-disk cache of token name, symbol and decimals, with an in-memory LRU in front of it.
+
+    Entries are stored as one JSON file per token, in a directory per chain spec. Failing to write the disk cache is logged and otherwise ignored. The cache may be shared between threads.
+
+    :param path: Cache directory. If not set, eth_erc20.cache.default_cache_dir() is used
+    :type path: str
+    :param size: Maximum number of entries in the in-memory LRU
+    :type size: int
+    :param metrics: Metrics registry to count hits and misses in
+    :type metrics: eth_erc20.metrics.Metrics
+    """
+
+    def __init__(self, path=None, size=DEFAULT_CACHE_SIZE, metrics=None):
+        if path == None:
+            path = default_cache_dir()
+        self.path = path
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.metrics = metrics
+
+
+    def __key(self, chain_spec, contract_address):
+        return (str(chain_spec), to_checksum_address(strip_0x(contract_address)),)
+
+
+    def __file(self, k):
+        return os.path.join(self.path, k[0], k[1] + '.json')
+
+
+    def get(self, chain_spec, contract_address):
+        """Retrieve cached metadata for a token.
+
+        :param chain_spec: Chain spec of the token contract
+        :type chain_spec: chainlib.chain.ChainSpec
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :rtype: dict
+        :returns: Cached metadata, or None if not cached
+        """
+        k = self.__key(chain_spec, contract_address)
+        with self.lock:
+            v = self.entries.get(k)
+            if v != None:
+                self.entries.move_to_end(k)
+        if v != None:
+            self.__count('erc20_cache_hits_total', (('cache', 'metadata'), ('tier', 'memory'),))
+            return v
+        try:
+            f = open(self.__file(k), 'r')
+        except FileNotFoundError:
+            self.__count('erc20_cache_misses_total', (('cache', 'metadata'),))
+            return None
+        try:
+            v = json.load(f)
+        except ValueError as e:
+            logg.warning('ignoring corrupt metadata cache entry {}: {}'.format(self.__file(k), e))
+            self.__count('erc20_cache_misses_total', (('cache', 'metadata'),))
+            return None
+        finally:
+            f.close()
+        self.__remember(k, v)
+        self.__count('erc20_cache_hits_total', (('cache', 'metadata'), ('tier', 'disk'),))
+        return v
+
+
+    def put(self, chain_spec, contract_address, metadata):
+        """Store metadata for a token.
+
+        :param chain_spec: Chain spec of the token contract
+        :type chain_spec: chainlib.chain.ChainSpec
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :param metadata: Metadata values, keyed by eth_erc20.cache.METADATA_KEYS
+        :type metadata: dict
+        """
+        k = self.__key(chain_spec, contract_address)
+        self.__remember(k, metadata)
+        fp = self.__file(k)
+        try:
+            os.makedirs(os.path.dirname(fp), exist_ok=True)
+            (fd, tmp) = tempfile.mkstemp(dir=os.path.dirname(fp))
+            f = os.fdopen(fd, 'w')
+            json.dump(metadata, f)
+            f.close()
+            os.replace(tmp, fp)
+        except OSError as e:
+            logg.warning('could not write metadata cache entry {}: {}'.format(fp, e))
+
+
+    def __count(self, name, labels):
+        if self.metrics != None:
+            self.metrics.inc(name, labels)
+
+
+    def __remember(self, k, v):
+        with self.lock:
+            self.entries[k] = v
+            self.entries.move_to_end(k)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+def metadata_query(chain_spec, contract_address, keys=METADATA_KEYS, sender_address=ZERO_ADDRESS, height=BlockSpec.LATEST):
+    """Build the eth_call queries for token metadata values.
+
+    :param chain_spec: Chain spec of the token contract
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param contract_address: Token contract address
+    :type contract_address: str
+    :param keys: Metadata values to query
+    :type keys: tuple
+    :param sender_address: Sender address for the eth_call queries
+    :type sender_address: str
+    :param height: Block height to query at
+    :type height: int or chainlib.block.BlockSpec
+    :rtype: list
+    :returns: JSON-RPC request objects, in key order
+    """
+    c = ERC20(chain_spec)
+    o = []
+    for k in keys:
+        o.append(getattr(c, k)(contract_address, sender_address=sender_address, height=height))
+    return o
+
+
+def parse_metadata(keys, v):
+    """Decode results of the queries built by eth_erc20.cache.metadata_query.
+
+    :param keys: Metadata values queried
+    :type keys: tuple
+    :param v: Query results, in key order
+    :type v: list
+    :rtype: dict
+    :returns: Metadata values, keyed by name
+    """
+    r = {}
+    for (k, result) in zip(keys, v):
+        r[k] = getattr(ERC20, 'parse_' + k)(result)
+    return r
+
+
+def token_metadata(conn, chain_spec, contract_address, keys=METADATA_KEYS, cache=None, refresh=False, sender_address=ZERO_ADDRESS):
+    """Retrieve token metadata, querying the node only for values not in the cache.
+
+    All queried values are fetched in the same batch, and the result is written back to the cache.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param chain_spec: Chain spec of the token contract
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param contract_address: Token contract address
+    :type contract_address: str
+    :param keys: Metadata values to retrieve
+    :type keys: tuple
+    :param cache: Metadata cache. If not set, the node is always queried
+    :type cache: eth_erc20.cache.TokenMetadataCache
+    :param refresh: Ignore cached values, and replace them with the queried ones
+    :type refresh: bool
+    :param sender_address: Sender address for the eth_call queries
+    :type sender_address: str
+    :rtype: dict
+    :returns: Metadata values, keyed by name
+    """
+    r = {}
+    if cache != None:
+        r = dict(cache.get(chain_spec, contract_address) or {})
+    if refresh:
+        missing = list(keys)
+    else:
+        missing = [k for k in keys if k not in r]
+    if len(missing) == 0:
+        return r
+
+    o = metadata_query(chain_spec, contract_address, keys=missing, sender_address=sender_address)
+    r.update(parse_metadata(missing, do_batch(conn, o)))
+    logg.debug('fetched token metadata {} for {}'.format(missing, contract_address))
+
+    if cache != None:
+        cache.put(chain_spec, contract_address, r)
+    return r
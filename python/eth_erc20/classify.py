@@ -0,0 +1,66 @@
+# standard imports
+import logging
+
+logg = logging.getLogger(__name__)
+
+
+class CallClassifier:
+    """Identifies and decodes contract input data by looking up its 4-byte selector.
+
+    :param plans: Call plans to recognize, e.g. eth_erc20.ERC20.call_plans()
+    :type plans: list of eth_erc20.plan.CallPlan
+    :raises ValueError: Two plans share the same selector
+    """
+
+    def __init__(self, plans=[]):
+        self.plans = {}
+        for plan in plans:
+            self.add(plan)
+
+
+    def add(self, plan):
+        """Add a call plan to the selector table.
+
+        :param plan: Call plan
+        :type plan: eth_erc20.plan.CallPlan
+        :raises ValueError: Selector already added for a different method signature
+        """
+        existing = self.plans.get(plan.selector)
+        if existing != None and existing.signature != plan.signature:
+            raise ValueError('selector {} collision between {} and {}'.format(plan.selector, existing.signature, plan.signature))
+        self.plans[plan.selector] = plan
+
+
+    def classify(self, v):
+        """Identify and decode contract input data.
+
+        :param v: Contract input data, in hex, or transaction object with the input data in the "input" or "data" field
+        :type v: str or dict
+        :rtype: tuple, or None
+        :returns: Call plan and decoded arguments, or None if the selector is unknown or the input data is invalid for the method
+        """
+        if isinstance(v, dict):
+            v = v.get('input') or v.get('data') or ''
+        if v[:2] == '0x':
+            v = v[2:]
+        plan = self.plans.get(v[:8].lower())
+        if plan == None:
+            return None
+        try:
+            r = plan.decode(v)
+        except ValueError as e:
+            logg.debug('invalid input for {}: {}'.format(plan.signature, e))
+            return None
+        return (plan, r,)
+
+
+    def classify_all(self, inputs):
+        """Identify and decode a sequence of contract inputs in one pass.
+
+        :param inputs: Contract input data, in hex, or transaction objects
+        :type inputs: iterable
+        :rtype: generator
+        :returns: Result of eth_erc20.classify.CallClassifier.classify for each input, in input order
+        """
+        for v in inputs:
+            yield self.classify(v)
@@ -0,0 +1,383 @@
+# standard imports
+import os
+import json
+import stat
+import errno
+import queue
+import socket
+import logging
+import threading
+import socketserver
+from concurrent.futures import Future
+
+# external imports
+from chainlib.eth.constant import ZERO_ADDRESS
+from chainlib.block import BlockSpec
+from chainlib.error import JSONRPCException
+
+# local imports
+from .erc20 import ERC20
+from .cache import (
+    METADATA_KEYS,
+    metadata_query,
+    parse_metadata,
+)
+from .batch import (
+    do_batch,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CONCURRENCY,
+)
+
+logg = logging.getLogger(__name__)
+
+# seconds to wait for more queries before sending a batch that is not full
+DEFAULT_MAX_DELAY = 0.002
+
+METHODS = ['balance', 'allowance', 'supply', 'info', 'burned', 'minted']
+
+
+class Query:
+    """Token query submitted to the daemon, with the JSON-RPC requests that answer it.
+
+    :param requests: JSON-RPC request objects
+    :type requests: list
+    :param parse: Function taking the results of the requests, in order, and returning the query result
+    :type parse: function
+    """
+
+    def __init__(self, requests, parse):
+        self.requests = requests
+        self.parse = parse
+        self.future = Future()
+
+
+class QueryDaemon:
+    """Answers token queries by coalescing the JSON-RPC requests of concurrently submitted queries into batches.
+
+    Each of the concurrency dispatcher threads takes all queries waiting in the queue, up to batch_size requests, and sends them in a single JSON-RPC batch. New queries accumulate while batches are in flight, so batches grow with load.
+
+    Supported methods, with their parameters, are:
+
+    - balance: contract, address
+    - allowance: contract, owner, spender
+    - supply: contract
+    - info: contract; returns name, symbol, decimals and supply. Name, symbol and decimals are served from the metadata cache when available
+    - burned: contract; total burned tokens, if the factory is giftable_erc20_token.GiftableToken
+    - minted: contract; total minted tokens, if the factory is giftable_erc20_token.GiftableToken
+
+    All methods also take an optional height parameter.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param chain_spec: Chain spec
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param sender_address: Sender address for the eth_call queries
+    :type sender_address: str
+    :param factory: Contract interface to build the requests with. Defaults to eth_erc20.ERC20
+    :type factory: eth_erc20.ERC20
+    :param cache: Token metadata cache
+    :type cache: eth_erc20.cache.TokenMetadataCache
+    :param batch_size: Maximum number of requests per batch
+    :type batch_size: int
+    :param concurrency: Number of batches in flight
+    :type concurrency: int
+    :param max_delay: Seconds to wait for more queries before sending a batch that is not full
+    :type max_delay: float
+    """
+
+    def __init__(self, conn, chain_spec, sender_address=ZERO_ADDRESS, factory=None, cache=None, batch_size=DEFAULT_BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY, max_delay=DEFAULT_MAX_DELAY, id_generator=None):
+        self.conn = conn
+        self.chain_spec = chain_spec
+        self.sender_address = sender_address
+        if factory == None:
+            factory = ERC20(chain_spec)
+        self.factory = factory
+        self.cache = cache
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_delay = max_delay
+        self.id_generator = id_generator
+        self.queue = queue.Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+        self.query_count = 0
+        self.batch_count = 0
+
+
+    def query_balance(self, contract, address, height=BlockSpec.LATEST):
+        o = self.factory.balance_of(contract, address, sender_address=self.sender_address, height=height, id_generator=self.id_generator)
+        return Query([o], lambda r: self.factory.parse_balance(r[0]))
+
+
+    def query_allowance(self, contract, owner, spender, height=BlockSpec.LATEST):
+        o = self.factory.allowance(contract, owner, spender, sender_address=self.sender_address, height=height, id_generator=self.id_generator)
+        return Query([o], lambda r: self.factory.parse_allowance(r[0]))
+
+
+    def query_supply(self, contract, height=BlockSpec.LATEST):
+        o = self.factory.total_supply(contract, sender_address=self.sender_address, height=height, id_generator=self.id_generator)
+        return Query([o], lambda r: self.factory.parse_total_supply(r[0]))
+
+
+    def query_burned(self, contract, height=BlockSpec.LATEST):
+        if not hasattr(self.factory, 'burned'):
+            raise ValueError('burned not supported by {}'.format(self.factory.__class__.__name__))
+        o = self.factory.burned(contract, sender_address=self.sender_address, height=height, id_generator=self.id_generator)
+        return Query([o], lambda r: self.factory.parse_burned(r[0]))
+
+
+    def query_minted(self, contract, height=BlockSpec.LATEST):
+        if not hasattr(self.factory, 'total_minted'):
+            raise ValueError('minted not supported by {}'.format(self.factory.__class__.__name__))
+        o = self.factory.total_minted(contract, sender_address=self.sender_address, height=height, id_generator=self.id_generator)
+        return Query([o], lambda r: self.factory.parse_total_minted(r[0]))
+
+
+    def query_info(self, contract, height=BlockSpec.LATEST):
+        metadata = {}
+        if self.cache != None:
+            metadata = dict(self.cache.get(self.chain_spec, contract) or {})
+        missing = [k for k in METADATA_KEYS if k not in metadata]
+        o = metadata_query(self.chain_spec, contract, keys=missing, sender_address=self.sender_address, height=height)
+        o.append(self.factory.total_supply(contract, sender_address=self.sender_address, height=height, id_generator=self.id_generator))
+
+        def parse(r):
+            if len(missing) > 0:
+                metadata.update(parse_metadata(missing, r[:-1]))
+                if self.cache != None:
+                    self.cache.put(self.chain_spec, contract, dict(metadata))
+            v = dict(metadata)
+            v['supply'] = self.factory.parse_total_supply(r[-1])
+            return v
+
+        return Query(o, parse)
+
+
+    def submit(self, method, params={}):
+        """Queue a query.
+
+        :param method: Query method, see eth_erc20.daemon.QueryDaemon
+        :type method: str
+        :param params: Query parameters, keyed by name
+        :type params: dict
+        :raises ValueError: Unknown or unsupported method, or invalid parameters
+        :rtype: concurrent.futures.Future
+        :returns: Future for the query result
+        """
+        if method not in METHODS:
+            raise ValueError('unknown method {}'.format(method))
+        try:
+            # request ids may come from a generator that is not thread safe
+            with self.lock:
+                q = getattr(self, 'query_' + method)(**params)
+        except TypeError as e:
+            raise ValueError('invalid params for {}: {}'.format(method, e))
+        self.queue.put(q)
+        return q.future
+
+
+    def query(self, method, params={}, timeout=None):
+        """Run a query and wait for its result.
+
+        :param method: Query method, see eth_erc20.daemon.QueryDaemon
+        :type method: str
+        :param params: Query parameters, keyed by name
+        :type params: dict
+        :param timeout: Seconds to wait for the result
+        :type timeout: float
+        :raises ValueError: Unknown method, or invalid parameters
+        :raises chainlib.error.JSONRPCException: Error response for the query
+        :rtype: any
+        :returns: Query result
+        """
+        return self.submit(method, params).result(timeout=timeout)
+
+
+    def __collect(self, first):
+        queries = [first]
+        count = len(first.requests)
+        delay = self.max_delay
+        while count < self.batch_size:
+            try:
+                if delay > 0:
+                    q = self.queue.get(timeout=delay)
+                    delay = 0
+                else:
+                    q = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if q == None:
+                # stop marker, leave it for the other dispatchers
+                self.queue.put(None)
+                break
+            queries.append(q)
+            count += len(q.requests)
+        return queries
+
+
+    def __dispatch(self):
+        while True:
+            q = self.queue.get()
+            if q == None:
+                self.queue.put(None)
+                return
+            queries = self.__collect(q)
+            o = []
+            for q in queries:
+                o += q.requests
+            try:
+                r = do_batch(self.conn, o, tolerate_errors=True)
+            except Exception as e:
+                for q in queries:
+                    q.future.set_exception(e)
+                continue
+            with self.lock:
+                self.query_count += len(queries)
+                self.batch_count += 1
+            logg.debug('answered {} queries with batch of {} requests'.format(len(queries), len(o)))
+            cursor = 0
+            for q in queries:
+                v = r[cursor:cursor+len(q.requests)]
+                cursor += len(q.requests)
+                errors = [e for e in v if isinstance(e, Exception)]
+                try:
+                    if len(errors) > 0:
+                        raise errors[0]
+                    q.future.set_result(q.parse(v))
+                except Exception as e:
+                    q.future.set_exception(e)
+
+
+    def start(self):
+        for i in range(self.concurrency):
+            t = threading.Thread(target=self.__dispatch, daemon=True)
+            t.start()
+            self.threads.append(t)
+
+
+    def stop(self):
+        self.queue.put(None)
+        for t in self.threads:
+            t.join()
+        self.threads = []
+
+
+def remove_stale_socket(path):
+    """Remove a unix socket that no process is listening on.
+
+    :param path: Path to unix socket
+    :type path: str
+    :raises ValueError: Path is not a socket
+    :raises OSError: Another process is listening on the socket
+    """
+    if not stat.S_ISSOCK(os.stat(path).st_mode):
+        raise ValueError('{} exists and is not a socket'.format(path))
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(path)
+    except ConnectionRefusedError:
+        logg.info('removing stale socket {}'.format(path))
+        os.unlink(path)
+        return
+    finally:
+        s.close()
+    raise OSError(errno.EADDRINUSE, 'another process is listening on {}'.format(path))
+
+
+class ThreadingUnixServer(socketserver.ThreadingUnixStreamServer):
+
+    daemon_threads = True
+
+
+class DaemonServer:
+    """JSON-lines front end for a query daemon, on a unix socket.
+
+    Each line sent by a client is a JSON object {"id": <any>, "method": <str>, "params": <object>}, and is answered with a line {"id": <id>, "result": <any>} or {"id": <id>, "error": <str>}. A client may send any number of queries without waiting for answers; answers are written as queries complete, which may be out of order.
+
+    :param daemon: Query daemon
+    :type daemon: eth_erc20.daemon.QueryDaemon
+    :param path: Path to unix socket. A socket left at the path by a stopped process is replaced
+    :type path: str
+    :raises ValueError: Path exists and is not a socket
+    :raises OSError: Another process is listening on the socket
+    """
+
+    def __init__(self, daemon, path):
+        self.daemon = daemon
+        self.path = path
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+
+            def handle(self):
+                lock = threading.Lock()
+                # answers not yet written; a future is done before its callbacks have run
+                outstanding = threading.Condition()
+                count = [0]
+
+                def respond(o):
+                    b = (json.dumps(o) + '\n').encode('utf-8')
+                    with lock:
+                        try:
+                            self.wfile.write(b)
+                            self.wfile.flush()
+                        except (OSError, ValueError) as e:
+                            logg.debug('client went away: {}'.format(e))
+
+                def done(query_id, f):
+                    respond(server.result(query_id, f))
+                    with outstanding:
+                        count[0] -= 1
+                        outstanding.notify()
+
+                for l in self.rfile:
+                    if len(l.strip()) == 0:
+                        continue
+                    query_id = None
+                    try:
+                        o = json.loads(l)
+                        query_id = o.get('id')
+                        future = server.daemon.submit(o['method'], o.get('params', {}))
+                    except (ValueError, KeyError, TypeError, AttributeError) as e:
+                        respond({'id': query_id, 'error': 'invalid query: {}'.format(e)})
+                        continue
+                    with outstanding:
+                        count[0] += 1
+                    future.add_done_callback(lambda f, query_id=query_id: done(query_id, f))
+
+                # answer everything before closing the connection
+                with outstanding:
+                    outstanding.wait_for(lambda: count[0] == 0)
+
+        if os.path.exists(path):
+            remove_stale_socket(path)
+        self.server = ThreadingUnixServer(path, Handler)
+        self.thread = None
+
+
+    def result(self, query_id, future):
+        try:
+            return {'id': query_id, 'result': future.result()}
+        except JSONRPCException as e:
+            return {'id': query_id, 'error': 'rpc error: {}'.format(e)}
+        except Exception as e:
+            return {'id': query_id, 'error': str(e)}
+
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        logg.info('daemon listening on {}'.format(self.path))
+
+
+    def serve_forever(self):
+        logg.info('daemon listening on {}'.format(self.path))
+        self.server.serve_forever()
+
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread != None:
+            self.thread.join()
+        os.unlink(self.path)
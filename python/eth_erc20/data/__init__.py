@@ -0,0 +1,3 @@
+import os
+
+data_dir = os.path.realpath(os.path.dirname(__file__))
@@ -2,175 +2,194 @@
 import logging
 
 # external imports
-from chainlib.eth.constant import ZERO_ADDRESS
+from chainlib.eth.constant import (
+    ZERO_ADDRESS,
+    MINIMUM_FEE_PRICE,
+)
 from chainlib.eth.contract import (
-    ABIContractEncoder,
-    ABIContractDecoder,
     ABIContractType,
     abi_decode_single,
 )
 from chainlib.eth.jsonrpc import to_blockheight_param
-from chainlib.eth.error import RequestMismatchException
 from chainlib.eth.tx import (
     TxFactory,
     TxFormat,
+    raw,
 )
 from chainlib.jsonrpc import JSONRPCRequest
 from chainlib.block import BlockSpec
 from hexathon import (
     add_0x,
-    strip_0x,
 )
 
+# local imports
+from .plan import CallPlan
+from .event import EventPlan
+from .batch import (
+    chunks,
+    DEFAULT_BATCH_SIZE,
+)
+from .sign import sign_batch
+
 logg = logging.getLogger()
 
 
+def to_block_param(height):
+    """Translate a block spec to the block parameter of eth_call.
+
+    A 0x-prefixed block hash becomes an EIP-1898 block object, so that the node rejects the call instead of answering from another block when the hash is not canonical. Block objects are passed as is, and everything else goes through chainlib.eth.jsonrpc.to_blockheight_param.
+
+    :param height: Block number, chainlib.block.BlockSpec, block hash or EIP-1898 block object
+    :type height: int, chainlib.block.BlockSpec, str or dict
+    :rtype: str or dict
+    :returns: Block parameter
+    """
+    if isinstance(height, dict):
+        return height
+    if isinstance(height, str) and len(height) == 66 and height[:2] == '0x':
+        return {'blockHash': height.lower(), 'requireCanonical': True}
+    return to_blockheight_param(height)
+
+
+def to_hex_lower(v):
+    if v[:2] == '0x':
+        v = v[2:]
+    return '0x' + bytes.fromhex(v).hex()
+
+
 class ERC20(TxFactory):
     
 
-    def balance_of(self, contract_address, address, sender_address=ZERO_ADDRESS, id_generator=None, height=BlockSpec.LATEST):
+    def call_plan(self, plan, contract_address, args=(), sender_address=ZERO_ADDRESS, height=BlockSpec.LATEST, id_generator=None):
         j = JSONRPCRequest(id_generator)
         o = j.template()
         o['method'] = 'eth_call'
-        enc = ABIContractEncoder()
-        enc.method('balanceOf')
-        enc.typ(ABIContractType.ADDRESS)
-        enc.address(address)
-        data = add_0x(enc.get())
-        tx = self.template(sender_address, contract_address)
-        tx = self.set_code(tx, data)
-        o['params'].append(self.normalize(tx))
-        height = to_blockheight_param(height)
-        o['params'].append(height)
+        data = '0x' + plan.encode(*args)
+        o['params'].append(self.normalize_call(sender_address, contract_address, data))
+        o['params'].append(to_block_param(height))
         o = j.finalize(o)
         return o
 
 
-    def balance(self, contract_address, address, sender_address=ZERO_ADDRESS, id_generator=None):
-        return self.balance_of(contract_address, address, sender_address=sender_address, id_generator=id_generator)
+    def normalize_call(self, sender_address, contract_address, data):
+        # same output as TxFactory.normalize, without the tx serialization round trip for integer fee values
+        gas_price = MINIMUM_FEE_PRICE
+        gas = TxFactory.fee
+        if self.gas_oracle != None:
+            (gas_price, gas) = self.gas_oracle.get_gas()
+            (price, gas) = self.gas_oracle.get_gas(code=data)
+        if type(gas_price) != int or type(gas) != int or gas_price <= 0 or gas <= 0:
+            tx = {
+                'from': sender_address,
+                'to': contract_address,
+                'value': 0,
+                'data': data,
+                'gasPrice': gas_price,
+                'gas': gas,
+                'chainId': self.chain_spec.chain_id(),
+                'nonce': 0,
+                    }
+            return self.normalize(tx)
+        return {
+            'from': sender_address,
+            'to': to_hex_lower(contract_address),
+            'gasPrice': hex(gas_price),
+            'gas': hex(gas),
+            'data': to_hex_lower(data),
+                }
+
+
+    def transact_data(self, contract_address, sender_address, data, tx_format=TxFormat.JSONRPC, id_generator=None):
+        tx = self.template(sender_address, contract_address, use_nonce=True)
+        tx = self.set_code(tx, data)
+        tx = self.finalize(tx, tx_format, id_generator=id_generator)
+        return tx
 
 
-    def symbol(self, contract_address, sender_address=ZERO_ADDRESS, id_generator=None):
-        j = JSONRPCRequest(id_generator)
-        o = j.template()
-        o['method'] = 'eth_call'
-        enc = ABIContractEncoder()
-        enc.method('symbol')
-        data = add_0x(enc.get())
-        tx = self.template(sender_address, contract_address)
-        tx = self.set_code(tx, data)
-        o['params'].append(self.normalize(tx))
-        o['params'].append('latest')
-        o = j.finalize(o)
-        return o
+    def finalize_batch(self, txs, tx_format=TxFormat.JSONRPC, id_generator=None, processes=None, executor=None):
+        """Sign many transactions in parallel, with the same output as calling finalize for each of them in turn.
+
+        Transaction templates are built by the transaction methods with tx_format TxFormat.DICT, which assigns the nonce from the nonce oracle without signing. Signing is then spread across a process pool, see eth_erc20.sign.sign_batch.
+
+        :param txs: Transaction templates
+        :type txs: list
+        :param tx_format: Transaction output format
+        :type tx_format: chainlib.eth.tx.TxFormat
+        :param id_generator: JSONRPC id generator, used in input order
+        :type id_generator: chainlib.jsonrpc.JSONRPCIdGenerator
+        :param processes: Number of worker processes
+        :type processes: int
+        :param executor: Process pool to use instead of starting a new one for the call
+        :type executor: concurrent.futures.ProcessPoolExecutor
+        :rtype: list
+        :returns: Transaction output in specified format, in input order
+        """
+        if tx_format not in [TxFormat.JSONRPC, TxFormat.RLP_SIGNED]:
+            return [self.finalize(tx, tx_format, id_generator=id_generator) for tx in txs]
+        r = sign_batch(self.signer, txs, processes=processes, executor=executor)
+        if tx_format == TxFormat.JSONRPC:
+            r = [(tx_hash, raw(tx_raw, id_generator=id_generator),) for (tx_hash, tx_raw) in r]
+        return r
 
 
-    def name(self, contract_address, sender_address=ZERO_ADDRESS, id_generator=None):
-        j = JSONRPCRequest(id_generator)
-        o = j.template()
-        o['method'] = 'eth_call'
-        enc = ABIContractEncoder()
-        enc.method('name')
-        data = add_0x(enc.get())
-        tx = self.template(sender_address, contract_address)
-        tx = self.set_code(tx, data)
-        o['params'].append(self.normalize(tx))
-        o['params'].append('latest')
-        o = j.finalize(o)
-        return o
+    def balance_of(self, contract_address, address, sender_address=ZERO_ADDRESS, id_generator=None, height=BlockSpec.LATEST):
+        plan = CallPlan.get('balanceOf', ABIContractType.ADDRESS)
+        return self.call_plan(plan, contract_address, (address,), sender_address=sender_address, height=height, id_generator=id_generator)
+
+
+    def balance(self, contract_address, address, sender_address=ZERO_ADDRESS, id_generator=None, height=BlockSpec.LATEST):
+        return self.balance_of(contract_address, address, sender_address=sender_address, id_generator=id_generator, height=height)
+
+
+    def balance_of_batch(self, contract_address, addresses, sender_address=ZERO_ADDRESS, id_generator=None, height=BlockSpec.LATEST, batch_size=DEFAULT_BATCH_SIZE):
+        for chunk in chunks(addresses, batch_size=batch_size):
+            o = []
+            for address in chunk:
+                o.append(self.balance_of(contract_address, address, sender_address=sender_address, id_generator=id_generator, height=height))
+            yield (chunk, o,)
+
+
+    def symbol(self, contract_address, sender_address=ZERO_ADDRESS, id_generator=None, height=BlockSpec.LATEST):
+        plan = CallPlan.get('symbol')
+        return self.call_plan(plan, contract_address, sender_address=sender_address, height=height, id_generator=id_generator)
+
+
+    def name(self, contract_address, sender_address=ZERO_ADDRESS, id_generator=None, height=BlockSpec.LATEST):
+        plan = CallPlan.get('name')
+        return self.call_plan(plan, contract_address, sender_address=sender_address, height=height, id_generator=id_generator)
 
     
-    def decimals(self, contract_address, sender_address=ZERO_ADDRESS, id_generator=None):
-        j = JSONRPCRequest(id_generator)
-        o = j.template()
-        o['method'] = 'eth_call'
-        enc = ABIContractEncoder()
-        enc.method('decimals')
-        data = add_0x(enc.get())
-        tx = self.template(sender_address, contract_address)
-        tx = self.set_code(tx, data)
-        o['params'].append(self.normalize(tx))
-        o['params'].append('latest')
-        o = j.finalize(o)
-        return o
+    def decimals(self, contract_address, sender_address=ZERO_ADDRESS, id_generator=None, height=BlockSpec.LATEST):
+        plan = CallPlan.get('decimals')
+        return self.call_plan(plan, contract_address, sender_address=sender_address, height=height, id_generator=id_generator)
 
 
-    def total_supply(self, contract_address, sender_address=ZERO_ADDRESS, id_generator=None):
-        j = JSONRPCRequest(id_generator)
-        o = j.template()
-        o['method'] = 'eth_call'
-        enc = ABIContractEncoder()
-        enc.method('totalSupply')
-        data = add_0x(enc.get())
-        tx = self.template(sender_address, contract_address)
-        tx = self.set_code(tx, data)
-        o['params'].append(self.normalize(tx))
-        o['params'].append('latest')
-        o = j.finalize(o)
-        return o
+    def total_supply(self, contract_address, sender_address=ZERO_ADDRESS, id_generator=None, height=BlockSpec.LATEST):
+        plan = CallPlan.get('totalSupply')
+        return self.call_plan(plan, contract_address, sender_address=sender_address, height=height, id_generator=id_generator)
 
 
-    def allowance(self, contract_address, holder_address, spender_address, sender_address=ZERO_ADDRESS, id_generator=None):
-        j = JSONRPCRequest(id_generator)
-        o = j.template()
-        o['method'] = 'eth_call'
-        enc = ABIContractEncoder()
-        enc.method('allowance')
-        enc.typ(ABIContractType.ADDRESS)
-        enc.typ(ABIContractType.ADDRESS)
-        enc.address(holder_address)
-        enc.address(spender_address)
-        data = add_0x(enc.get())
-        tx = self.template(sender_address, contract_address)
-        tx = self.set_code(tx, data)
-        o['params'].append(self.normalize(tx))
-        o['params'].append('latest')
-        o = j.finalize(o)
-        return o
+    def allowance(self, contract_address, holder_address, spender_address, sender_address=ZERO_ADDRESS, id_generator=None, height=BlockSpec.LATEST):
+        plan = CallPlan.get('allowance', ABIContractType.ADDRESS, ABIContractType.ADDRESS)
+        return self.call_plan(plan, contract_address, (holder_address, spender_address,), sender_address=sender_address, height=height, id_generator=id_generator)
 
 
     def transfer(self, contract_address, sender_address, recipient_address, value, tx_format=TxFormat.JSONRPC, id_generator=None):
-        enc = ABIContractEncoder()
-        enc.method('transfer')
-        enc.typ(ABIContractType.ADDRESS)
-        enc.typ(ABIContractType.UINT256)
-        enc.address(recipient_address)
-        enc.uint256(value)
-        data = add_0x(enc.get())
-        tx = self.template(sender_address, contract_address, use_nonce=True)
-        tx = self.set_code(tx, data)
-        tx = self.finalize(tx, tx_format, id_generator=id_generator)
-        return tx
+        plan = CallPlan.get('transfer', ABIContractType.ADDRESS, ABIContractType.UINT256)
+        data = add_0x(plan.encode(recipient_address, value))
+        return self.transact_data(contract_address, sender_address, data, tx_format=tx_format, id_generator=id_generator)
 
 
     def transfer_from(self, contract_address, sender_address, holder_address, recipient_address, value, tx_format=TxFormat.JSONRPC, id_generator=None):
-        enc = ABIContractEncoder()
-        enc.method('transferFrom')
-        enc.typ(ABIContractType.ADDRESS)
-        enc.typ(ABIContractType.ADDRESS)
-        enc.typ(ABIContractType.UINT256)
-        enc.address(holder_address)
-        enc.address(recipient_address)
-        enc.uint256(value)
-        data = add_0x(enc.get())
-        tx = self.template(sender_address, contract_address, use_nonce=True)
-        tx = self.set_code(tx, data)
-        tx = self.finalize(tx, tx_format)
-        return tx
+        plan = CallPlan.get('transferFrom', ABIContractType.ADDRESS, ABIContractType.ADDRESS, ABIContractType.UINT256)
+        data = add_0x(plan.encode(holder_address, recipient_address, value))
+        return self.transact_data(contract_address, sender_address, data, tx_format=tx_format)
 
 
     def approve(self, contract_address, sender_address, spender_address, value, tx_format=TxFormat.JSONRPC, id_generator=None):
-        enc = ABIContractEncoder()
-        enc.method('approve')
-        enc.typ(ABIContractType.ADDRESS)
-        enc.typ(ABIContractType.UINT256)
-        enc.address(spender_address)
-        enc.uint256(value)
-        data = add_0x(enc.get())
-        tx = self.template(sender_address, contract_address, use_nonce=True)
-        tx = self.set_code(tx, data)
-        tx = self.finalize(tx, tx_format)
-        return tx
+        plan = CallPlan.get('approve', ABIContractType.ADDRESS, ABIContractType.UINT256)
+        data = add_0x(plan.encode(spender_address, value))
+        return self.transact_data(contract_address, sender_address, data, tx_format=tx_format)
 
 
     @classmethod
@@ -198,6 +217,16 @@ class ERC20(TxFactory):
         return self.parse_balance(v)
 
 
+    @classmethod
+    def parse_balance_batch(self, addresses, v):
+        if len(addresses) != len(v):
+            raise ValueError('batch result count mismatch; expected {}, got {}'.format(len(addresses), len(v)))
+        r = {}
+        for i in range(len(addresses)):
+            r[addresses[i]] = self.parse_balance(v[i])
+        return r
+
+
     @classmethod
     def parse_total_supply(self, v):
         return abi_decode_single(ABIContractType.UINT256, v)
@@ -210,78 +239,40 @@ class ERC20(TxFactory):
 
     @classmethod
     def parse_transfer_request(self, v):
-        v = strip_0x(v)
-        cursor = 0
-        enc = ABIContractEncoder()
-        enc.method('transfer')
-        enc.typ(ABIContractType.ADDRESS)
-        enc.typ(ABIContractType.UINT256)
-        r = enc.get()
-        l = len(r)
-        m = v[:l]
-        if m != r:
-            raise RequestMismatchException(v)
-        cursor += l
-
-        dec = ABIContractDecoder()
-        dec.typ(ABIContractType.ADDRESS)
-        dec.typ(ABIContractType.UINT256)
-        dec.val(v[cursor:cursor+64])
-        cursor += 64
-        dec.val(v[cursor:cursor+64])
-        r = dec.decode()
-        return r 
+        plan = CallPlan.get('transfer', ABIContractType.ADDRESS, ABIContractType.UINT256)
+        return plan.decode(v)
 
 
     @classmethod
     def parse_transfer_from_request(self, v):
-        v = strip_0x(v)
-        cursor = 0
-        enc = ABIContractEncoder()
-        enc.method('transferFrom')
-        enc.typ(ABIContractType.ADDRESS)
-        enc.typ(ABIContractType.ADDRESS)
-        enc.typ(ABIContractType.UINT256)
-        r = enc.get()
-        l = len(r)
-        m = v[:l]
-        if m != r:
-            raise RequestMismatchException(v)
-        cursor += l
-
-        dec = ABIContractDecoder()
-        dec.typ(ABIContractType.ADDRESS)
-        dec.typ(ABIContractType.ADDRESS)
-        dec.typ(ABIContractType.UINT256)
-        dec.val(v[cursor:cursor+64])
-        cursor += 64
-        dec.val(v[cursor:cursor+64])
-        cursor += 64
-        dec.val(v[cursor:cursor+64])
-        r = dec.decode()
-        return r 
+        plan = CallPlan.get('transferFrom', ABIContractType.ADDRESS, ABIContractType.ADDRESS, ABIContractType.UINT256)
+        return plan.decode(v)
 
 
     @classmethod
     def parse_approve_request(self, v):
-        v = strip_0x(v)
-        cursor = 0
-        enc = ABIContractEncoder()
-        enc.method('approve')
-        enc.typ(ABIContractType.ADDRESS)
-        enc.typ(ABIContractType.UINT256)
-        r = enc.get()
-        l = len(r)
-        m = v[:l]
-        if m != r:
-            raise RequestMismatchException(v)
-        cursor += l
-
-        dec = ABIContractDecoder()
-        dec.typ(ABIContractType.ADDRESS)
-        dec.typ(ABIContractType.UINT256)
-        dec.val(v[cursor:cursor+64])
-        cursor += 64
-        dec.val(v[cursor:cursor+64])
-        r = dec.decode()
-        return r 
+        plan = CallPlan.get('approve', ABIContractType.ADDRESS, ABIContractType.UINT256)
+        return plan.decode(v)
+
+
+    @classmethod
+    def call_plans(self):
+        return [
+            CallPlan.get('transfer', ABIContractType.ADDRESS, ABIContractType.UINT256),
+            CallPlan.get('transferFrom', ABIContractType.ADDRESS, ABIContractType.ADDRESS, ABIContractType.UINT256),
+            CallPlan.get('approve', ABIContractType.ADDRESS, ABIContractType.UINT256),
+            CallPlan.get('balanceOf', ABIContractType.ADDRESS),
+            CallPlan.get('allowance', ABIContractType.ADDRESS, ABIContractType.ADDRESS),
+            CallPlan.get('totalSupply'),
+            CallPlan.get('name'),
+            CallPlan.get('symbol'),
+            CallPlan.get('decimals'),
+                ]
+
+
+    @classmethod
+    def event_plans(self):
+        return [
+            EventPlan.get('Transfer', ('sender', ABIContractType.ADDRESS, True), ('recipient', ABIContractType.ADDRESS, True), ('value', ABIContractType.UINT256, False)),
+            EventPlan.get('Approval', ('owner', ABIContractType.ADDRESS, True), ('spender', ABIContractType.ADDRESS, True), ('value', ABIContractType.UINT256, False)),
+                ]
@@ -0,0 +1,133 @@
+# standard imports
+import logging
+from collections import namedtuple
+
+# external imports
+from chainlib.eth.contract import ABIContractEncoder
+from hexathon import strip_0x
+
+# local imports
+from .plan import decoders
+
+logg = logging.getLogger(__name__)
+
+# log entry location fields added to every event record
+LOCATION_FIELDS = (
+    'contract_address',
+    'block_number',
+    'tx_hash',
+    'tx_index',
+    'log_index',
+)
+
+
+def to_int(v):
+    if isinstance(v, int):
+        return v
+    return int(v, 16)
+
+
+class EventPlan:
+    """Precompiled decoding plan for a contract event.
+
+    The event signature is hashed once, and decoded log entries are returned as records of a namedtuple type named after the event. The record fields are the event arguments followed by eth_erc20.event.LOCATION_FIELDS.
+
+    :param name: Event name
+    :type name: str
+    :param fields: Event arguments, in order, as (field name, chainlib.eth.contract.ABIContractType, indexed) tuples
+    :type fields: tuple
+    :raises NotImplementedError: Argument type is not supported
+    """
+
+    __plans = {}
+
+    def __init__(self, name, *fields):
+        enc = ABIContractEncoder()
+        enc.method(name)
+        self.decoders = []
+        for (field_name, typ, indexed) in fields:
+            enc.typ(typ)
+            try:
+                self.decoders.append((decoders[typ], indexed,))
+            except KeyError:
+                raise NotImplementedError('no event plan decoder for type {}'.format(typ))
+        self.name = name
+        self.fields = fields
+        self.signature = enc.get_method()
+        self.topic = '0x' + enc.get_signature()
+        self.record = namedtuple(name, [field[0] for field in fields] + list(LOCATION_FIELDS))
+
+
+    def match(self, log):
+        """Check whether log entry is an emission of the plan event.
+
+        :param log: Log entry, as returned by eth_getLogs or in a transaction receipt
+        :type log: dict
+        :rtype: bool
+        :returns: True if topic matches
+        """
+        if len(log['topics']) == 0:
+            return False
+        return log['topics'][0].lower() == self.topic
+
+
+    def decode(self, log):
+        """Decode log entry to an event record.
+
+        :param log: Log entry, as returned by eth_getLogs or in a transaction receipt
+        :type log: dict
+        :raises ValueError: Log entry is not an emission of the plan event, or data too short
+        :rtype: namedtuple
+        :returns: Event record
+        """
+        topics = log['topics']
+        if len(topics) == 0 or topics[0].lower() != self.topic:
+            raise ValueError('topic mismatch for {}'.format(self.signature))
+        data = strip_0x(log['data'], allow_empty=True)
+        r = []
+        topic_cursor = 1
+        data_cursor = 0
+        for (decoder, indexed) in self.decoders:
+            if indexed:
+                if topic_cursor >= len(topics):
+                    raise ValueError('missing indexed topic for {}'.format(self.signature))
+                word = strip_0x(topics[topic_cursor])
+                topic_cursor += 1
+            else:
+                word = data[data_cursor:data_cursor+64]
+                if len(word) < 64:
+                    raise ValueError('log data too short for {}'.format(self.signature))
+                data_cursor += 64
+            r.append(decoder(word))
+        r += [
+            log['address'],
+            to_int(log['blockNumber']),
+            log['transactionHash'],
+            to_int(log['transactionIndex']),
+            to_int(log['logIndex']),
+                ]
+        return self.record(*r)
+
+
+    @staticmethod
+    def get(name, *fields):
+        """Return the cached plan for the given event and arguments, creating it if it does not exist.
+
+        :param name: Event name
+        :type name: str
+        :param fields: Event arguments, in order, as (field name, chainlib.eth.contract.ABIContractType, indexed) tuples
+        :type fields: tuple
+        :rtype: eth_erc20.event.EventPlan
+        :returns: Event plan
+        """
+        k = (name, fields,)
+        plan = EventPlan.__plans.get(k)
+        if plan == None:
+            plan = EventPlan(name, *fields)
+            EventPlan.__plans[k] = plan
+            logg.debug('added event plan {} -> {}'.format(plan.signature, plan.topic))
+        return plan
+
+
+    def __str__(self):
+        return '{} {}'.format(self.topic, self.signature)
@@ -0,0 +1,411 @@
+# standard imports
+import os
+import sys
+import mmap
+import struct
+import hashlib
+import logging
+import tempfile
+from array import array
+
+# external imports
+from chainlib.eth.address import to_checksum_address
+from hexathon import strip_0x
+
+logg = logging.getLogger(__name__)
+
+# version 2 changed the index slot hash, see eth_erc20.holders.slot_of
+MAGIC = b'ERC20HT2'
+# magic, holder count, index slot count, reserved
+HEADER = struct.Struct('<8sQQ8x')
+ADDRESS_SIZE = 20
+BALANCE_SIZE = 32
+ID_SIZE = 4
+NO_ID = 0xffffffff
+MAX_HOLDERS = NO_ID - 1
+MAX_BALANCE = (1 << 256) - 1
+MIN_CAPACITY = 1024
+
+ZERO_HOLDER = bytes(ADDRESS_SIZE)
+
+
+def to_address_bytes(v):
+    """Normalize address to its 20 bytes.
+
+    :param v: Address, as hex with or without 0x prefix, or bytes
+    :type v: str or bytes
+    :raises ValueError: Not a 20 byte address
+    :rtype: bytes
+    :returns: Address bytes
+    """
+    if not isinstance(v, bytes):
+        v = bytes.fromhex(strip_0x(v))
+    if len(v) != ADDRESS_SIZE:
+        raise ValueError('invalid address length {}'.format(len(v)))
+    return v
+
+
+def slot_of(address, capacity):
+    # contract and vanity addresses may share long prefixes, so all bytes are hashed
+    h = hashlib.blake2b(address, digest_size=8).digest()
+    return int.from_bytes(h, 'little') & (capacity - 1)
+
+
+class HolderTableBuilder:
+    """In-memory holder balance table, to be written to file for eth_erc20.holders.HolderTable.
+
+    Addresses are interned to sequential integer ids on first use. Addresses and balances are kept in flat byte arrays, 20 bytes and 32 bytes per holder, with an open addressing index of 32-bit ids kept at most half full. A holder costs about 60 bytes, against some 200 bytes for a dict of hex address string to int.
+
+    Balances are stored as 32 byte big-endian words, the same encoding as balanceOf results, so that raw results can be copied without conversion.
+
+    :param capacity: Initial number of index slots, rounded up to a power of two
+    :type capacity: int
+    """
+
+    def __init__(self, capacity=MIN_CAPACITY):
+        c = MIN_CAPACITY
+        while c < capacity:
+            c <<= 1
+        self.addresses = bytearray()
+        self.balances = bytearray()
+        self.index = array('I', [NO_ID]) * c
+        self.count = 0
+
+
+    @classmethod
+    def load(cls, path):
+        """Create a builder holding the contents of a holder table file.
+
+        :param path: Holder table file
+        :type path: str
+        :rtype: eth_erc20.holders.HolderTableBuilder
+        :returns: Builder
+        """
+        table = HolderTable(path)
+        try:
+            o = cls(capacity=table.capacity)
+            o.count = len(table)
+            o.addresses = bytearray(table.address_bytes())
+            o.balances = bytearray(table.balance_bytes())
+            o.index = array('I')
+            o.index.frombytes(table.index_bytes())
+            if sys.byteorder != 'little':
+                o.index.byteswap()
+        finally:
+            table.close()
+        return o
+
+
+    def __len__(self):
+        return self.count
+
+
+    def __grow(self):
+        capacity = len(self.index) << 1
+        index = array('I', [NO_ID]) * capacity
+        mask = capacity - 1
+        for i in range(self.count):
+            address = self.addresses[i*ADDRESS_SIZE:(i+1)*ADDRESS_SIZE]
+            slot = slot_of(address, capacity)
+            while index[slot] != NO_ID:
+                slot = (slot + 1) & mask
+            index[slot] = i
+        self.index = index
+        logg.debug('holder table index grown to {} slots for {} holders'.format(capacity, self.count))
+
+
+    def __find(self, address):
+        mask = len(self.index) - 1
+        slot = slot_of(address, len(self.index))
+        while True:
+            i = self.index[slot]
+            if i == NO_ID:
+                return (None, slot,)
+            if self.addresses[i*ADDRESS_SIZE:(i+1)*ADDRESS_SIZE] == address:
+                return (i, slot,)
+            slot = (slot + 1) & mask
+
+
+    def id_of(self, address):
+        """Id of an interned address.
+
+        :param address: Holder address
+        :type address: str or bytes
+        :rtype: int
+        :returns: Id, or None if address is not in the table
+        """
+        return self.__find(to_address_bytes(address))[0]
+
+
+    def intern(self, address):
+        """Id of an address, adding it with zero balance if it is not in the table.
+
+        :param address: Holder address
+        :type address: str or bytes
+        :raises OverflowError: Table is full
+        :rtype: int
+        :returns: Id
+        """
+        address = to_address_bytes(address)
+        (i, slot) = self.__find(address)
+        if i != None:
+            return i
+        if self.count == MAX_HOLDERS:
+            raise OverflowError('holder table is full')
+        i = self.count
+        self.addresses += address
+        self.balances += bytes(BALANCE_SIZE)
+        self.index[slot] = i
+        self.count += 1
+        if self.count * 2 > len(self.index):
+            self.__grow()
+        return i
+
+
+    def balance_of(self, address):
+        i = self.id_of(address)
+        if i == None:
+            return 0
+        return int.from_bytes(self.balances[i*BALANCE_SIZE:(i+1)*BALANCE_SIZE], 'big')
+
+
+    def set(self, address, value):
+        if value < 0 or value > MAX_BALANCE:
+            raise ValueError('balance out of range: {}'.format(value))
+        i = self.intern(address)
+        self.balances[i*BALANCE_SIZE:(i+1)*BALANCE_SIZE] = value.to_bytes(BALANCE_SIZE, 'big')
+
+
+    def add(self, address, delta):
+        """Add a signed amount to a holder balance.
+
+        :param address: Holder address
+        :type address: str or bytes
+        :param delta: Amount to add, negative to subtract
+        :type delta: int
+        :raises ValueError: Resulting balance is negative or does not fit 256 bits
+        """
+        i = self.intern(address)
+        v = int.from_bytes(self.balances[i*BALANCE_SIZE:(i+1)*BALANCE_SIZE], 'big') + delta
+        if v < 0 or v > MAX_BALANCE:
+            raise ValueError('balance of {} out of range: {}'.format(to_address_bytes(address).hex(), v))
+        self.balances[i*BALANCE_SIZE:(i+1)*BALANCE_SIZE] = v.to_bytes(BALANCE_SIZE, 'big')
+
+
+    def set_results(self, addresses, results):
+        """Store raw balanceOf results, e.g. the output of eth_erc20.batch.do_batch for eth_erc20.ERC20.balance_of_batch requests.
+
+        :param addresses: Holder addresses, in request order
+        :type addresses: list
+        :param results: Raw eth_call results, as 0x-prefixed hex
+        :type results: list
+        :raises ValueError: Result is not a 32 byte word
+        """
+        for (address, v) in zip(addresses, results):
+            b = bytes.fromhex(strip_0x(v))
+            if len(b) != BALANCE_SIZE:
+                raise ValueError('invalid balance result length {} for {}'.format(len(b), address))
+            i = self.intern(address)
+            self.balances[i*BALANCE_SIZE:(i+1)*BALANCE_SIZE] = b
+
+
+    def apply(self, events):
+        """Replay Transfer, TransferFrom and Mint event records, e.g. from eth_erc20.scan.LogScanner.scan.
+
+        Burn events do not carry the burner address and are skipped; use eth_erc20.ledger.BalanceLedger to resolve them.
+
+        :param events: Event records
+        :type events: iterable
+        :rtype: int
+        :returns: Number of events applied
+        """
+        c = 0
+        for event in events:
+            name = event.__class__.__name__
+            if name == 'Transfer' or name == 'TransferFrom':
+                sender = to_address_bytes(event.sender)
+                if sender != ZERO_HOLDER:
+                    self.add(sender, -event.value)
+                recipient = event.recipient
+            elif name == 'Mint':
+                recipient = event.beneficiary
+            else:
+                continue
+            recipient = to_address_bytes(recipient)
+            if recipient != ZERO_HOLDER:
+                self.add(recipient, event.value)
+            c += 1
+        return c
+
+
+    def write(self, path):
+        """Write the table to file, replacing any existing file atomically.
+
+        :param path: Holder table file
+        :type path: str
+        """
+        index = self.index
+        if sys.byteorder != 'little':
+            index = array('I', index)
+            index.byteswap()
+        d = os.path.dirname(os.path.abspath(path))
+        (fd, tmp) = tempfile.mkstemp(dir=d)
+        try:
+            f = os.fdopen(fd, 'wb')
+            f.write(HEADER.pack(MAGIC, self.count, len(index)))
+            f.write(index.tobytes())
+            f.write(self.addresses)
+            f.write(self.balances)
+            f.close()
+            os.replace(tmp, path)
+        except Exception as e:
+            os.unlink(tmp)
+            raise e
+
+
+class HolderTable:
+    """Read-only memory-mapped holder balance table, as written by eth_erc20.holders.HolderTableBuilder.
+
+    The file holds a header, the open addressing index of little-endian 32-bit holder ids, the 20 byte holder addresses in id order, and the 32 byte big-endian balances in id order. Lookups by address probe the index in place, so opening the table costs no parsing, and the pages are shared by all processes mapping the same file.
+
+    :param path: Holder table file
+    :type path: str
+    :raises ValueError: Not a holder table file, or file truncated
+    """
+
+    def __init__(self, path):
+        f = open(path, 'rb')
+        try:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        if len(self.mm) < HEADER.size:
+            self.mm.close()
+            raise ValueError('not a holder table: {}'.format(path))
+        (magic, self.count, self.capacity) = HEADER.unpack_from(self.mm, 0)
+        self.address_offset = HEADER.size + self.capacity * ID_SIZE
+        self.balance_offset = self.address_offset + self.count * ADDRESS_SIZE
+        if magic != MAGIC or len(self.mm) != self.balance_offset + self.count * BALANCE_SIZE:
+            self.mm.close()
+            raise ValueError('not a holder table, or truncated: {}'.format(path))
+        self.view = memoryview(self.mm)
+        if sys.byteorder == 'little':
+            self.index = self.view[HEADER.size:self.address_offset].cast('I')
+        else:
+            self.index = array('I')
+            self.index.frombytes(self.view[HEADER.size:self.address_offset])
+            self.index.byteswap()
+
+
+    def __len__(self):
+        return self.count
+
+
+    def index_bytes(self):
+        return self.view[HEADER.size:self.address_offset]
+
+
+    def address_bytes(self):
+        return self.view[self.address_offset:self.balance_offset]
+
+
+    def balance_bytes(self):
+        return self.view[self.balance_offset:]
+
+
+    def id_of(self, address):
+        """Id of a holder address.
+
+        :param address: Holder address
+        :type address: str or bytes
+        :rtype: int
+        :returns: Id, or None if address is not in the table
+        """
+        address = to_address_bytes(address)
+        mask = self.capacity - 1
+        slot = slot_of(address, self.capacity)
+        while True:
+            i = self.index[slot]
+            if i == NO_ID:
+                return None
+            offset = self.address_offset + i * ADDRESS_SIZE
+            if self.mm[offset:offset+ADDRESS_SIZE] == address:
+                return i
+            slot = (slot + 1) & mask
+
+
+    def address_of(self, i):
+        """Address of a holder id.
+
+        :param i: Holder id
+        :type i: int
+        :raises IndexError: No such id
+        :rtype: str
+        :returns: Checksummed address without 0x prefix
+        """
+        if i < 0 or i >= self.count:
+            raise IndexError('no holder id {}'.format(i))
+        offset = self.address_offset + i * ADDRESS_SIZE
+        return to_checksum_address(self.mm[offset:offset+ADDRESS_SIZE].hex())
+
+
+    def balance_by_id(self, i):
+        if i < 0 or i >= self.count:
+            raise IndexError('no holder id {}'.format(i))
+        offset = self.balance_offset + i * BALANCE_SIZE
+        return int.from_bytes(self.mm[offset:offset+BALANCE_SIZE], 'big')
+
+
+    def balance_of(self, address):
+        """Balance of a holder.
+
+        :param address: Holder address
+        :type address: str or bytes
+        :rtype: int
+        :returns: Balance, or 0 if address is not in the table
+        """
+        i = self.id_of(address)
+        if i == None:
+            return 0
+        return self.balance_by_id(i)
+
+
+    def items(self, skip_zero=False):
+        """Iterate holders in id order.
+
+        :param skip_zero: Leave out holders with zero balance
+        :type skip_zero: bool
+        :rtype: generator
+        :returns: Holders, as (address bytes, balance) tuples
+        """
+        addresses = self.address_bytes()
+        balances = self.balance_bytes()
+        for i in range(self.count):
+            v = int.from_bytes(balances[i*BALANCE_SIZE:(i+1)*BALANCE_SIZE], 'big')
+            if skip_zero and v == 0:
+                continue
+            yield (bytes(addresses[i*ADDRESS_SIZE:(i+1)*ADDRESS_SIZE]), v,)
+
+
+    def export(self, f, skip_zero=False):
+        """Write holders as CSV lines of checksummed address and balance, in id order.
+
+        :param f: Output file
+        :type f: file-like object
+        :param skip_zero: Leave out holders with zero balance
+        :type skip_zero: bool
+        :rtype: int
+        :returns: Number of lines written
+        """
+        c = 0
+        for (address, v) in self.items(skip_zero=skip_zero):
+            f.write('{},{}\n'.format(to_checksum_address(address.hex()), v))
+            c += 1
+        return c
+
+
+    def close(self):
+        if isinstance(self.index, memoryview):
+            self.index.release()
+        self.view.release()
+        self.mm.close()
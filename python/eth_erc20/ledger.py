@@ -0,0 +1,242 @@
+# standard imports
+import logging
+import sqlite3
+
+# external imports
+from chainlib.eth.address import to_checksum_address
+from chainlib.eth.constant import ZERO_ADDRESS
+from chainlib.eth.contract import ABIContractType
+from chainlib.eth.tx import transaction
+from hexathon import strip_0x
+
+# local imports
+from .erc20 import ERC20
+from .event import EventPlan
+from .scan import LogScanner
+from .batch import (
+    chunks,
+    do_batch,
+)
+
+logg = logging.getLogger(__name__)
+
+# number of distinct holders with pending changes before they are written to the store
+DEFAULT_FLUSH_SIZE = 10000
+# sqlite bound parameter limit is 999 in older versions
+QUERY_BATCH_SIZE = 500
+
+ZERO_HOLDER = strip_0x(ZERO_ADDRESS)
+
+
+def to_holder(v):
+    return to_checksum_address(strip_0x(v))
+
+
+def event_plans():
+    """Event plans for all events that change balances or allowances; the ERC20 events, and the TransferFrom, Mint and Burn events of giftable_erc20_token.GiftableToken.
+
+    :rtype: list of eth_erc20.event.EventPlan
+    :returns: Event plans
+    """
+    return ERC20.event_plans() + [
+        EventPlan.get('TransferFrom', ('sender', ABIContractType.ADDRESS, True), ('recipient', ABIContractType.ADDRESS, True), ('spender', ABIContractType.ADDRESS, True), ('value', ABIContractType.UINT256, False)),
+        EventPlan.get('Mint', ('minter', ABIContractType.ADDRESS, True), ('beneficiary', ABIContractType.ADDRESS, True), ('value', ABIContractType.UINT256, False)),
+        EventPlan.get('Burn', ('value', ABIContractType.UINT256, False)),
+            ]
+
+
+class BalanceLedger:
+    """Local balance table for token contracts, materialized from Transfer, TransferFrom, Mint and Burn events.
+
+    Each contract has a checkpoint holding the last block whose events have been applied, and each sync resumes from the block after it. Balance changes and checkpoint are committed in the same transaction.
+
+    Burn events do not carry the burner address, so the sender of the emitting transaction is looked up for each one.
+
+    :param path: Path to sqlite database file, or ":memory:"
+    :type path: str
+    :param chain_spec: Chain spec of the token contracts
+    :type chain_spec: chainlib.chain.ChainSpec
+    :raises ValueError: Database already holds ledgers for a different chain
+    """
+
+    def __init__(self, path, chain_spec):
+        self.chain_spec = chain_spec
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS chain (spec TEXT NOT NULL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS checkpoint (contract TEXT PRIMARY KEY, block_number INTEGER NOT NULL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS balance (contract TEXT NOT NULL, holder TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (contract, holder))')
+        r = self.db.execute('SELECT spec FROM chain').fetchone()
+        if r == None:
+            self.db.execute('INSERT INTO chain (spec) VALUES (?)', (str(chain_spec),))
+        elif r[0] != str(chain_spec):
+            raise ValueError('ledger is for chain {}, not {}'.format(r[0], chain_spec))
+        self.db.commit()
+
+
+    def checkpoint(self, contract_address):
+        """Last block whose events have been applied for the contract.
+
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :rtype: int
+        :returns: Block number, or -1 if nothing has been applied yet
+        """
+        r = self.db.execute('SELECT block_number FROM checkpoint WHERE contract = ?', (to_holder(contract_address),)).fetchone()
+        if r == None:
+            return -1
+        return r[0]
+
+
+    def balance_of(self, contract_address, holder_address):
+        """Ledger balance of a holder at the contract checkpoint.
+
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :param holder_address: Holder address
+        :type holder_address: str
+        :rtype: int
+        :returns: Balance
+        """
+        r = self.db.execute('SELECT value FROM balance WHERE contract = ? AND holder = ?', (to_holder(contract_address), to_holder(holder_address),)).fetchone()
+        if r == None:
+            return 0
+        return int(r[0])
+
+
+    def balances(self, contract_address, holder_addresses=None):
+        """Ledger balances of many holders at the contract checkpoint.
+
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :param holder_addresses: Holder addresses. If not set, all holders in the ledger are returned
+        :type holder_addresses: iterable
+        :rtype: dict
+        :returns: Balance for each holder, keyed by checksummed holder address without 0x prefix
+        """
+        contract_address = to_holder(contract_address)
+        r = {}
+        if holder_addresses == None:
+            for (holder, value) in self.db.execute('SELECT holder, value FROM balance WHERE contract = ?', (contract_address,)):
+                r[holder] = int(value)
+            return r
+        for chunk in chunks(holder_addresses, batch_size=QUERY_BATCH_SIZE):
+            chunk = [to_holder(v) for v in chunk]
+            for holder in chunk:
+                r[holder] = 0
+            q = 'SELECT holder, value FROM balance WHERE contract = ? AND holder IN ({})'.format(','.join(['?'] * len(chunk)))
+            for (holder, value) in self.db.execute(q, [contract_address] + chunk):
+                r[holder] = int(value)
+        return r
+
+
+    def __flush(self, contract_address, deltas, block_number):
+        for (holder, delta) in deltas.items():
+            if delta == 0:
+                continue
+            r = self.db.execute('SELECT value FROM balance WHERE contract = ? AND holder = ?', (contract_address, holder,)).fetchone()
+            value = delta
+            if r != None:
+                value += int(r[0])
+            if value < 0:
+                logg.warning('negative ledger balance {} for {} in {}'.format(value, holder, contract_address))
+            if value == 0:
+                self.db.execute('DELETE FROM balance WHERE contract = ? AND holder = ?', (contract_address, holder,))
+            else:
+                self.db.execute('INSERT OR REPLACE INTO balance (contract, holder, value) VALUES (?, ?, ?)', (contract_address, holder, str(value),))
+        self.db.execute('INSERT OR REPLACE INTO checkpoint (contract, block_number) VALUES (?, ?)', (contract_address, block_number,))
+        self.db.commit()
+        logg.debug('ledger {} flushed {} holders at block {}'.format(contract_address, len(deltas), block_number))
+
+
+    def sync(self, conn, contract_address, start=0, end=None, plans=None, scanner=None, flush_size=DEFAULT_FLUSH_SIZE):
+        """Apply events from the block after the contract checkpoint up to and including the end block.
+
+        :param conn: RPC connection
+        :type conn: chainlib.connection.RPCConnection
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :param start: First block to process if the contract has no checkpoint, e.g. the block the contract was published in
+        :type start: int
+        :param end: Last block to process. If not set, the latest block at the time of the call is used
+        :type end: int
+        :param plans: Event plans to scan for. Defaults to eth_erc20.ledger.event_plans()
+        :type plans: list of eth_erc20.event.EventPlan
+        :param scanner: Log scanner to use instead of one created with default settings
+        :type scanner: eth_erc20.scan.LogScanner
+        :param flush_size: Number of holders with pending changes that triggers a commit
+        :type flush_size: int
+        :rtype: int
+        :returns: New checkpoint block number
+        """
+        contract_address = to_holder(contract_address)
+        if scanner == None:
+            if plans == None:
+                plans = event_plans()
+            scanner = LogScanner(conn, plans)
+        if end == None:
+            end = scanner.latest()
+        cursor = self.checkpoint(contract_address) + 1
+        if cursor < start:
+            cursor = start
+        if cursor > end:
+            return end
+
+        deltas = {}
+        last_block = cursor - 1
+        for event in scanner.scan(contract_address, cursor, end=end):
+            if event.block_number != last_block:
+                if len(deltas) >= flush_size:
+                    self.__flush(contract_address, deltas, event.block_number - 1)
+                    deltas = {}
+                last_block = event.block_number
+            name = event.__class__.__name__
+            if name == 'Transfer' or name == 'TransferFrom':
+                changes = ((event.sender, -event.value,), (event.recipient, event.value,),)
+            elif name == 'Mint':
+                changes = ((event.beneficiary, event.value,),)
+            elif name == 'Burn':
+                o = transaction(event.tx_hash)
+                tx = conn.do(o)
+                changes = ((to_holder(tx['from']), -event.value,),)
+            else:
+                continue
+            for (holder, value) in changes:
+                if holder == ZERO_HOLDER:
+                    continue
+                deltas[holder] = deltas.get(holder, 0) + value
+
+        self.__flush(contract_address, deltas, end)
+        return end
+
+
+    def verify(self, conn, contract_address, holder_addresses=None, sender_address=ZERO_ADDRESS):
+        """Compare ledger balances with balanceOf results at the contract checkpoint height.
+
+        :param conn: RPC connection
+        :type conn: chainlib.connection.RPCConnection
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :param holder_addresses: Holder addresses to check. If not set, all holders in the ledger are checked
+        :type holder_addresses: iterable
+        :param sender_address: Sender address for the eth_call queries
+        :type sender_address: str
+        :raises ValueError: Contract has no checkpoint
+        :rtype: list
+        :returns: Mismatching entries, as (holder address, ledger balance, node balance) tuples
+        """
+        height = self.checkpoint(contract_address)
+        if height < 0:
+            raise ValueError('no checkpoint for {}'.format(contract_address))
+        ledger_balances = self.balances(contract_address, holder_addresses=holder_addresses)
+        c = ERC20(self.chain_spec)
+        r = []
+        for (chunk, o) in c.balance_of_batch(contract_address, list(ledger_balances.keys()), sender_address=sender_address, height=height):
+            node_balances = c.parse_balance_batch(chunk, do_batch(conn, o))
+            for holder in chunk:
+                if node_balances[holder] != ledger_balances[holder]:
+                    r.append((holder, ledger_balances[holder], node_balances[holder],))
+        return r
+
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,400 @@
+# standard imports
+import os
+import json
+import time
+import bisect
+import logging
+import tempfile
+import threading
+
+# external imports
+from hexathon import strip_0x
+
+# local imports
+from .erc20 import ERC20
+
+logg = logging.getLogger(__name__)
+
+# seconds
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# bytes
+DEFAULT_SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152)
+
+# methods whose first parameter is a call object with the contract address in "to"
+CALL_METHODS = ('eth_call', 'eth_estimateGas')
+
+HELP = {
+    'erc20_rpc_requests_total': 'JSON-RPC requests, by RPC method, contract and contract method',
+    'erc20_rpc_errors_total': 'JSON-RPC requests that failed, by RPC method, contract and contract method',
+    'erc20_rpc_batches_total': 'JSON-RPC batch arrays sent',
+    'erc20_rpc_latency_seconds': 'JSON-RPC round trip time, by RPC method, or "batch" for batch arrays',
+    'erc20_rpc_request_bytes': 'Size of serialized JSON-RPC requests, by RPC method, or "batch" for batch arrays',
+    'erc20_rpc_response_bytes': 'Size of serialized JSON-RPC results, by RPC method, or "batch" for batch arrays',
+    'erc20_reverts_total': 'Transaction receipts retrieved with failed status, by contract',
+    'erc20_cache_hits_total': 'Cache lookups answered from the cache, by cache and tier',
+    'erc20_cache_misses_total': 'Cache lookups not found in the cache, by cache',
+}
+
+
+class Histogram:
+    """Counts of observed values in cumulative buckets, with sum and count, as in Prometheus histograms.
+
+    :param buckets: Upper bounds of the buckets, in ascending order
+    :type buckets: tuple
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+
+    def observe(self, v):
+        self.counts[bisect.bisect_left(self.buckets, v)] += 1
+        self.sum += v
+        self.count += 1
+
+
+    def cumulative(self):
+        r = []
+        n = 0
+        for v in self.counts:
+            n += v
+            r.append(n)
+        return r
+
+
+def escape_label(v):
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if len(labels) == 0:
+        return ''
+    return '{' + ','.join(['{}="{}"'.format(k, escape_label(v)) for (k, v) in labels]) + '}'
+
+
+def hex_label(v):
+    if not isinstance(v, str):
+        return ''
+    if v[:2] == '0x':
+        v = v[2:]
+    return v.lower()
+
+
+def format_number(v):
+    if isinstance(v, float):
+        return repr(v)
+    return str(v)
+
+
+class Metrics:
+    """Thread-safe registry of counters and histograms, exported in Prometheus text format or as a JSON snapshot.
+
+    Metrics are identified by name and a tuple of (label, value) pairs.
+
+    :param latency_buckets: Histogram buckets for latencies, in seconds
+    :type latency_buckets: tuple
+    :param size_buckets: Histogram buckets for payload sizes, in bytes
+    :type size_buckets: tuple
+    """
+
+    def __init__(self, latency_buckets=DEFAULT_LATENCY_BUCKETS, size_buckets=DEFAULT_SIZE_BUCKETS):
+        self.latency_buckets = latency_buckets
+        self.size_buckets = size_buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.start = time.time()
+
+
+    def inc(self, name, labels=(), v=1):
+        """Increment a counter.
+
+        :param name: Metric name
+        :type name: str
+        :param labels: Label names and values
+        :type labels: tuple of (str, str) tuples
+        :param v: Increment
+        :type v: int
+        """
+        k = (name, labels,)
+        with self.lock:
+            self.counters[k] = self.counters.get(k, 0) + v
+
+
+    def observe(self, name, v, labels=(), buckets=None):
+        """Add an observation to a histogram.
+
+        :param name: Metric name
+        :type name: str
+        :param v: Observed value
+        :type v: float
+        :param labels: Label names and values
+        :type labels: tuple of (str, str) tuples
+        :param buckets: Histogram buckets, used when the histogram is created. Defaults to the latency buckets
+        :type buckets: tuple
+        """
+        k = (name, labels,)
+        with self.lock:
+            h = self.histograms.get(k)
+            if h == None:
+                h = Histogram(buckets or self.latency_buckets)
+                self.histograms[k] = h
+            h.observe(v)
+
+
+    def counter(self, name, labels=()):
+        """Current value of a counter.
+
+        :rtype: int
+        :returns: Counter value, 0 if never incremented
+        """
+        return self.counters.get((name, labels,), 0)
+
+
+    def snapshot(self):
+        """Current values of all metrics.
+
+        :rtype: dict
+        :returns: Counters and histograms, as lists of objects with name, labels and values
+        """
+        with self.lock:
+            counters = []
+            for ((name, labels), v) in sorted(self.counters.items()):
+                counters.append({'name': name, 'labels': dict(labels), 'value': v})
+            histograms = []
+            for ((name, labels), h) in sorted(self.histograms.items(), key=lambda v: v[0]):
+                histograms.append({
+                    'name': name,
+                    'labels': dict(labels),
+                    'buckets': list(h.buckets),
+                    'counts': list(h.counts),
+                    'sum': h.sum,
+                    'count': h.count,
+                    })
+        return {
+            'time': time.time(),
+            'uptime': time.time() - self.start,
+            'counters': counters,
+            'histograms': histograms,
+            }
+
+
+    def prometheus(self):
+        """Current values of all metrics in the Prometheus text exposition format.
+
+        :rtype: str
+        :returns: Metrics text
+        """
+        lines = []
+        with self.lock:
+            seen = set()
+            for ((name, labels), v) in sorted(self.counters.items()):
+                if name not in seen:
+                    seen.add(name)
+                    lines.append('# HELP {} {}'.format(name, HELP.get(name, name)))
+                    lines.append('# TYPE {} counter'.format(name))
+                lines.append('{}{} {}'.format(name, format_labels(labels), v))
+            for ((name, labels), h) in sorted(self.histograms.items(), key=lambda v: v[0]):
+                if name not in seen:
+                    seen.add(name)
+                    lines.append('# HELP {} {}'.format(name, HELP.get(name, name)))
+                    lines.append('# TYPE {} histogram'.format(name))
+                for (le, n) in zip(list(h.buckets) + ['+Inf'], h.cumulative()):
+                    lines.append('{}_bucket{} {}'.format(name, format_labels(labels, (('le', format_number(le)),)), n))
+                lines.append('{}_sum{} {}'.format(name, format_labels(labels), format_number(h.sum)))
+                lines.append('{}_count{} {}'.format(name, format_labels(labels), h.count))
+        return '\n'.join(lines) + '\n'
+
+
+    def write(self, path):
+        """Write all metrics to file, replacing it atomically.
+
+        Files ending with .json get the JSON snapshot, all others Prometheus text, e.g. for the node exporter textfile collector.
+
+        :param path: Output file path
+        :type path: str
+        """
+        if path[-5:] == '.json':
+            s = json.dumps(self.snapshot(), indent=2) + '\n'
+        else:
+            s = self.prometheus()
+        d = os.path.dirname(os.path.abspath(path))
+        (fd, tmp) = tempfile.mkstemp(dir=d)
+        f = os.fdopen(fd, 'w')
+        f.write(s)
+        f.close()
+        os.replace(tmp, path)
+
+
+class InstrumentedConnection:
+    """Wraps an RPC connection, recording metrics for every request made through it.
+
+    Requests are counted by RPC method, contract address and contract method. The contract method is resolved from the call data selector with the given call plans; unknown selectors are recorded as hex. Signed transactions are only decoded for contract and method labels if a chain spec is given. Latency and payload sizes are recorded per request, or per batch for batch arrays. Transaction receipts with failed status are counted as reverts.
+
+    Without instrumentation the connection is used as is, so disabled metrics cost nothing.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param metrics: Metrics registry
+    :type metrics: eth_erc20.metrics.Metrics
+    :param call_plans: Call plans to resolve contract method names with. Defaults to those of eth_erc20.ERC20
+    :type call_plans: list of eth_erc20.plan.CallPlan
+    :param chain_spec: Chain spec to decode signed transactions with
+    :type chain_spec: chainlib.chain.ChainSpec
+    """
+
+    def __init__(self, conn, metrics, call_plans=None, chain_spec=None):
+        self.conn = conn
+        self.metrics = metrics
+        if call_plans == None:
+            call_plans = ERC20.call_plans()
+        self.methods = {}
+        for plan in call_plans:
+            self.methods[plan.selector] = plan.method
+        self.chain_spec = chain_spec
+
+
+    @property
+    def supports_batch(self):
+        """Whether the wrapped connection sends batch arrays natively, see eth_erc20.batch.do_batch.
+        """
+        from .batch import supports_batch
+        return supports_batch(self.conn)
+
+
+    def __call_labels(self, o):
+        method = o.get('method', '')
+        contract = ''
+        data = None
+        params = o.get('params') or []
+        try:
+            if method in CALL_METHODS:
+                contract = params[0].get('to') or ''
+                data = params[0].get('data') or params[0].get('input')
+            elif method == 'eth_sendRawTransaction' and self.chain_spec != None:
+                from chainlib.eth.tx import unpack
+                tx = unpack(bytes.fromhex(strip_0x(params[0])), self.chain_spec)
+                contract = tx.get('to') or ''
+                data = tx.get('data')
+        except (IndexError, AttributeError, TypeError, ValueError) as e:
+            logg.debug('could not resolve labels for {} request: {}'.format(method, e))
+        call = ''
+        if data != None:
+            selector = hex_label(data)[:8]
+            call = self.methods.get(selector, selector)
+        return (('method', method), ('contract', hex_label(contract)), ('call', call),)
+
+
+    def __result(self, o, r):
+        if o.get('method') != 'eth_getTransactionReceipt' or not isinstance(r, dict):
+            return
+        status = r.get('status')
+        if isinstance(status, str):
+            status = int(status, 16)
+        if status == 0:
+            self.metrics.inc('erc20_reverts_total', (('contract', hex_label(r.get('to'))),))
+
+
+    def do(self, o, *args, **kwargs):
+        """Execute a JSON-RPC request or batch array through the wrapped connection, see chainlib.connection.RPCConnection.do.
+        """
+        m = self.metrics
+        requests = o
+        kind = 'batch'
+        if isinstance(o, list):
+            m.inc('erc20_rpc_batches_total')
+        else:
+            requests = [o]
+            kind = o.get('method', '')
+        labels = [self.__call_labels(v) for v in requests]
+        for l in labels:
+            m.inc('erc20_rpc_requests_total', l)
+        m.observe('erc20_rpc_request_bytes', len(json.dumps(o)), (('method', kind),), buckets=m.size_buckets)
+
+        t = time.perf_counter()
+        try:
+            r = self.conn.do(o, *args, **kwargs)
+        except Exception as e:
+            m.observe('erc20_rpc_latency_seconds', time.perf_counter() - t, (('method', kind),))
+            for l in labels:
+                m.inc('erc20_rpc_errors_total', l)
+            raise e
+        m.observe('erc20_rpc_latency_seconds', time.perf_counter() - t, (('method', kind),))
+        m.observe('erc20_rpc_response_bytes', len(json.dumps(r)), (('method', kind),), buckets=m.size_buckets)
+
+        if kind == 'batch':
+            for (v, result) in zip(requests, r):
+                self.__result(v, result)
+        else:
+            self.__result(o, r)
+        return r
+
+
+    def __getattr__(self, k):
+        return getattr(self.conn, k)
+
+
+def instrument_settings(settings, metrics, call_plans=None):
+    """Route all RPC traffic of the connection and oracles in chainlib settings through an eth_erc20.metrics.InstrumentedConnection.
+
+    :param settings: Chain settings, as produced by chainlib.eth.settings.process_settings
+    :type settings: chainlib.settings.ChainSettings
+    :param metrics: Metrics registry
+    :type metrics: eth_erc20.metrics.Metrics
+    :param call_plans: Call plans to resolve contract method names with
+    :type call_plans: list of eth_erc20.plan.CallPlan
+    :rtype: eth_erc20.metrics.InstrumentedConnection
+    :returns: Instrumented connection, also set as CONN in the settings
+    """
+    conn = settings.get('CONN')
+    wrapped = InstrumentedConnection(conn, metrics, call_plans=call_plans, chain_spec=settings.get('CHAIN_SPEC'))
+    settings.set('CONN', wrapped)
+    for k in ('NONCE_ORACLE', 'GAS_ORACLE', 'FEE_ORACLE'):
+        oracle = settings.get(k)
+        if getattr(oracle, 'conn', None) is conn:
+            oracle.conn = wrapped
+    return wrapped
+
+
+def write_metrics(metrics, path):
+    try:
+        metrics.write(path)
+    except OSError as e:
+        logg.warning('could not write metrics to {}: {}'.format(path, e))
+
+
+def process_metrics(settings, path, call_plans=None, interval=0):
+    """Set up metrics for a command line tool, written to file when the process exits.
+
+    The metrics registry is also set as METRICS in the settings.
+
+    :param settings: Chain settings, see eth_erc20.metrics.instrument_settings
+    :type settings: chainlib.settings.ChainSettings
+    :param path: Output file path, or None to leave metrics disabled
+    :type path: str
+    :param call_plans: Call plans to resolve contract method names with
+    :type call_plans: list of eth_erc20.plan.CallPlan
+    :param interval: If set, also write the file every interval seconds, for long running processes
+    :type interval: float
+    :rtype: eth_erc20.metrics.Metrics
+    :returns: Metrics registry, or None if disabled
+    """
+    settings.set('METRICS', None)
+    if path == None:
+        return None
+    import atexit
+    metrics = Metrics()
+    instrument_settings(settings, metrics, call_plans=call_plans)
+    settings.set('METRICS', metrics)
+    atexit.register(write_metrics, metrics, path)
+    if interval > 0:
+        def write():
+            while True:
+                time.sleep(interval)
+                write_metrics(metrics, path)
+        threading.Thread(target=write, daemon=True).start()
+    return metrics
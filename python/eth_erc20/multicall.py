@@ -0,0 +1,191 @@
+# standard imports
+import os
+import json
+import logging
+
+# external imports
+from chainlib.eth.constant import ZERO_ADDRESS
+from chainlib.eth.contract import ABIContractEncoder
+from chainlib.eth.tx import (
+    TxFactory,
+    TxFormat,
+)
+from chainlib.jsonrpc import JSONRPCRequest
+from chainlib.block import BlockSpec
+from hexathon import (
+    add_0x,
+    strip_0x,
+)
+
+# local imports
+from eth_erc20.data import data_dir
+from .erc20 import to_block_param
+from .plan import (
+    encode_address,
+    encode_uint256,
+)
+
+logg = logging.getLogger(__name__)
+
+# bounds of the bundled aggregator contract; standard Multicall deployments have none
+MAX_CALLS = 128
+MAX_DATA_LENGTH = 256
+
+
+class Multicall(TxFactory):
+    """Aggregates contract (read-only) calls into a single call to a contract implementing the Multicall aggregate((address,bytes)[]) method.
+
+    All aggregated calls are executed against the state of the same block.
+
+    :param chain_spec: Chain spec
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param max_calls: Maximum number of calls the aggregator contract accepts, or None for no limit. Use eth_erc20.multicall.MAX_CALLS with the bundled contract
+    :type max_calls: int
+    :param max_data_length: Maximum input data length of a call the aggregator contract accepts, in bytes, or None for no limit. Use eth_erc20.multicall.MAX_DATA_LENGTH with the bundled contract
+    :type max_data_length: int
+    """
+
+    __abi = None
+    __bytecode = None
+    __selector = None
+
+    def __init__(self, chain_spec, max_calls=None, max_data_length=None, signer=None, gas_oracle=None, nonce_oracle=None):
+        super(Multicall, self).__init__(chain_spec, signer=signer, gas_oracle=gas_oracle, nonce_oracle=nonce_oracle)
+        self.max_calls = max_calls
+        self.max_data_length = max_data_length
+
+
+    def constructor(self, sender_address, tx_format=TxFormat.JSONRPC):
+        code = Multicall.bytecode()
+        tx = self.template(sender_address, None, use_nonce=True)
+        tx = self.set_code(tx, code)
+        return self.finalize(tx, tx_format)
+
+
+    @staticmethod
+    def gas(code=None):
+        return 500000
+
+
+    @staticmethod
+    def abi():
+        if Multicall.__abi == None:
+            f = open(os.path.join(data_dir, 'Multicall.json'), 'r')
+            Multicall.__abi = json.load(f)
+            f.close()
+        return Multicall.__abi
+
+
+    @staticmethod
+    def bytecode():
+        if Multicall.__bytecode == None:
+            f = open(os.path.join(data_dir, 'Multicall.bin'))
+            Multicall.__bytecode = f.read()
+            f.close()
+        return Multicall.__bytecode
+
+
+    @staticmethod
+    def selector():
+        if Multicall.__selector == None:
+            enc = ABIContractEncoder()
+            enc.method('aggregate')
+            enc.typ_literal('(address,bytes)[]')
+            Multicall.__selector = enc.get_method_signature()
+        return Multicall.__selector
+
+
+    @staticmethod
+    def encode_aggregate(calls, max_calls=None, max_data_length=None):
+        """Encode input data for the aggregate method.
+
+        :param calls: Calls to aggregate, as (contract address, input data) tuples or eth_call query objects
+        :type calls: list
+        :param max_calls: Maximum number of calls, or None for no limit
+        :type max_calls: int
+        :param max_data_length: Maximum input data length of a call, in bytes, or None for no limit
+        :type max_data_length: int
+        :raises ValueError: Too many calls, or call input data too long
+        :rtype: str
+        :returns: ABI encoded contract input data, in hex
+        """
+        l = len(calls)
+        if max_calls != None and l > max_calls:
+            raise ValueError('cannot aggregate more than {} calls, got {}'.format(max_calls, l))
+        head = ''
+        tail = ''
+        offset = l * 32
+        for call in calls:
+            if isinstance(call, dict):
+                call = (call['params'][0]['to'], call['params'][0]['data'],)
+            data = bytes.fromhex(strip_0x(call[1], allow_empty=True))
+            data_length = len(data)
+            if max_data_length != None and data_length > max_data_length:
+                raise ValueError('call input data cannot exceed {} bytes, got {}'.format(max_data_length, data_length))
+            data += b'\x00' * ((32 - (data_length % 32)) % 32)
+            item = encode_address(call[0]) + encode_uint256(64) + encode_uint256(data_length) + data.hex()
+            head += encode_uint256(offset)
+            tail += item
+            offset += len(item) // 2
+        return Multicall.selector() + encode_uint256(32) + encode_uint256(l) + head + tail
+
+
+    def aggregate(self, contract_address, calls, sender_address=ZERO_ADDRESS, height=BlockSpec.LATEST, id_generator=None):
+        """Build the eth_call query for the aggregate method.
+
+        :param contract_address: Aggregator contract address
+        :type contract_address: str
+        :param calls: Calls to aggregate, as (contract address, input data) tuples or eth_call query objects
+        :type calls: list
+        :param sender_address: Sender address for the eth_call query
+        :type sender_address: str
+        :param height: Block height to execute all calls at
+        :type height: int, chainlib.block.BlockSpec, str or dict
+        :raises ValueError: Query object for a different block than height, too many calls, or call input data too long
+        :rtype: dict
+        :returns: JSON-RPC request object
+        """
+        block_param = to_block_param(height)
+        for call in calls:
+            if isinstance(call, dict) and len(call['params']) > 1 and call['params'][1] != block_param:
+                raise ValueError('call for block {} cannot be aggregated at block {}'.format(call['params'][1], block_param))
+        j = JSONRPCRequest(id_generator)
+        o = j.template()
+        o['method'] = 'eth_call'
+        data = add_0x(Multicall.encode_aggregate(calls, max_calls=self.max_calls, max_data_length=self.max_data_length))
+        tx = self.template(sender_address, contract_address)
+        tx = self.set_code(tx, data)
+        o['params'].append(self.normalize(tx))
+        o['params'].append(block_param)
+        o = j.finalize(o)
+        return o
+
+
+    @classmethod
+    def parse_aggregate(self, v, parsers=None):
+        """Decode the result of the aggregate method.
+
+        :param v: Aggregate call result, in hex
+        :type v: str
+        :param parsers: Result parser for each aggregated call, e.g. eth_erc20.ERC20.parse_balance. If not set, results are returned as hex
+        :type parsers: list
+        :raises ValueError: Parser count does not match result count
+        :rtype: tuple
+        :returns: Block number the calls were executed at, and list of call results
+        """
+        b = bytes.fromhex(strip_0x(v))
+        block_number = int.from_bytes(b[:32], 'big')
+        cursor = int.from_bytes(b[32:64], 'big')
+        l = int.from_bytes(b[cursor:cursor+32], 'big')
+        if parsers != None and len(parsers) != l:
+            raise ValueError('parser count mismatch; expected {}, got {}'.format(l, len(parsers)))
+        cursor += 32
+        r = []
+        for i in range(l):
+            offset = cursor + int.from_bytes(b[cursor+(i*32):cursor+((i+1)*32)], 'big')
+            data_length = int.from_bytes(b[offset:offset+32], 'big')
+            data = add_0x(b[offset+32:offset+32+data_length].hex(), allow_empty=True)
+            if parsers != None:
+                data = parsers[i](data)
+            r.append(data)
+        return (block_number, r,)
@@ -0,0 +1,205 @@
+# standard imports
+import logging
+
+# external imports
+from chainlib.eth.contract import (
+    ABIContractEncoder,
+    ABIContractType,
+)
+from chainlib.eth.address import to_checksum_address
+from chainlib.eth.error import RequestMismatchException
+
+logg = logging.getLogger(__name__)
+
+
+def encode_address(v):
+    if isinstance(v, bytes):
+        v = v.hex()
+    elif v[:2] == '0x':
+        v = v[2:]
+    l = len(v)
+    if l != 40 or len(bytes.fromhex(v)) != 20:
+        raise ValueError('value wrong size; expected {}, got {})'.format(20, l))
+    return '000000000000000000000000' + v
+
+
+def encode_uint256(v):
+    return int(v).to_bytes(32, 'big').hex()
+
+
+def encode_boolean(v):
+    if bool(v):
+        return encode_uint256(1)
+    return encode_uint256(0)
+
+
+def encode_bytes(v):
+    if not isinstance(v, bytes):
+        if v[:2] == '0x':
+            v = v[2:]
+        v = bytes.fromhex(v)
+    l = len(v)
+    v += b'\x00' * ((32 - (l % 32)) % 32)
+    return encode_uint256(l) + v.hex()
+
+
+def decode_address(v):
+    return to_checksum_address(v[24:])
+
+
+def decode_uint256(v):
+    return int(v, 16)
+
+
+def decode_boolean(v):
+    return bool(int(v, 16))
+
+
+encoders = {
+    ABIContractType.ADDRESS: encode_address,
+    ABIContractType.UINT256: encode_uint256,
+    ABIContractType.BOOLEAN: encode_boolean,
+    ABIContractType.BYTES: encode_bytes,
+}
+
+decoders = {
+    ABIContractType.ADDRESS: decode_address,
+    ABIContractType.UINT256: decode_uint256,
+    ABIContractType.BOOLEAN: decode_boolean,
+}
+
+
+class CallPlan:
+    """Precompiled encoding plan for a contract method.
+
+    The method signature is hashed once, and the resulting selector is reused for every call. For static argument types, the encoded output is identical to that of chainlib.eth.contract.ABIContractEncoder for the same method and arguments.
+
+    :param method: Contract method name
+    :type method: str
+    :param typs: Argument types, in order
+    :type typs: chainlib.eth.contract.ABIContractType
+    :raises NotImplementedError: Argument type is not supported
+    """
+
+    __plans = {}
+
+    def __init__(self, method, *typs):
+        enc = ABIContractEncoder()
+        enc.method(method)
+        self.encoders = []
+        self.dynamic = False
+        for typ in typs:
+            enc.typ(typ)
+            try:
+                self.encoders.append(encoders[typ])
+            except KeyError:
+                raise NotImplementedError('no call plan encoder for type {}'.format(typ))
+            if typ == ABIContractType.BYTES:
+                self.dynamic = True
+        self.method = method
+        self.typs = typs
+        self.signature = enc.get_method()
+        self.selector = enc.get_method_signature()
+        self.prefix = '0x' + self.selector
+        self.data_length = 8 + (len(typs) * 64)
+
+
+    def encode(self, *args):
+        """Encode method call input data.
+
+        :param args: Argument values, in the order of the plan types
+        :type args: any
+        :raises ValueError: Wrong argument count, or invalid argument value
+        :rtype: str
+        :returns: ABI encoded contract input data, in hex
+        """
+        if len(args) != len(self.encoders):
+            raise ValueError('{} expects {} arguments, got {}'.format(self.signature, len(self.encoders), len(args)))
+        r = self.selector
+        if not self.dynamic:
+            for i in range(len(args)):
+                r += self.encoders[i](args[i])
+            return r
+        tail = ''
+        offset = len(args) * 32
+        for i in range(len(args)):
+            v = self.encoders[i](args[i])
+            if self.typs[i] == ABIContractType.BYTES:
+                r += encode_uint256(offset)
+                tail += v
+                offset += len(v) // 2
+            else:
+                r += v
+        return r + tail
+
+
+    def match(self, v):
+        """Check whether input data is a call to the plan method.
+
+        :param v: Contract input data, in hex
+        :type v: str
+        :rtype: bool
+        :returns: True if selector matches
+        """
+        if v[:2] == '0x':
+            return v[2:10].lower() == self.selector
+        return v[:8].lower() == self.selector
+
+
+    def decode(self, v):
+        """Decode method call input data to argument values.
+
+        Results are in the same format as the parse_*_request methods of eth_erc20.ERC20; addresses are returned checksummed without 0x prefix, and bytes are returned as hex.
+
+        :param v: Contract input data, in hex
+        :type v: str
+        :raises chainlib.eth.error.RequestMismatchException: Input is not a call to the plan method
+        :raises ValueError: Input data too short
+        :rtype: list
+        :returns: Decoded argument values
+        """
+        if v[:2] == '0x':
+            v = v[2:]
+        if v[:8].lower() != self.selector:
+            raise RequestMismatchException(v)
+        if len(v) < self.data_length:
+            raise ValueError('input data too short for {}; expected {}, got {}'.format(self.signature, self.data_length, len(v)))
+        r = []
+        cursor = 8
+        for typ in self.typs:
+            word = v[cursor:cursor+64]
+            if typ == ABIContractType.BYTES:
+                offset = 8 + (int(word, 16) * 2)
+                l = int(v[offset:offset+64], 16) * 2
+                offset += 64
+                if len(v) < offset + l:
+                    raise ValueError('input data too short for {}; expected {}, got {}'.format(self.signature, offset + l, len(v)))
+                r.append(v[offset:offset+l])
+            else:
+                r.append(decoders[typ](word))
+            cursor += 64
+        return r
+
+
+    @staticmethod
+    def get(method, *typs):
+        """Return the cached plan for the given method and argument types, creating it if it does not exist.
+
+        :param method: Contract method name
+        :type method: str
+        :param typs: Argument types, in order
+        :type typs: chainlib.eth.contract.ABIContractType
+        :rtype: eth_erc20.plan.CallPlan
+        :returns: Call plan
+        """
+        k = (method, typs,)
+        plan = CallPlan.__plans.get(k)
+        if plan == None:
+            plan = CallPlan(method, *typs)
+            CallPlan.__plans[k] = plan
+            logg.debug('added call plan {} -> {}'.format(plan.signature, plan.selector))
+        return plan
+
+
+    def __str__(self):
+        return '{} {}'.format(self.selector, self.signature)
@@ -11,9 +11,7 @@
 
 # standard imports
 import sys
-import os
 import json
-import argparse
 import logging
 
 # external imports
@@ -22,32 +20,27 @@ from hexathon import (
         strip_0x,
         even,
         )
-import sha3
-
-# external imports
 import chainlib.eth.cli
 from chainlib.eth.cli.arg import (
         Arg,
         ArgFlag,
         process_args,
+        stdin_arg,
         )
 from chainlib.eth.cli.config import (
         Config,
         process_config,
         )
-from chainlib.eth.address import to_checksum_address
-from chainlib.eth.connection import EthHTTPConnection
-from chainlib.eth.gas import (
-        OverrideGasOracle,
-        balance,
-        )
-from chainlib.chain import ChainSpec
 from chainlib.eth.cli.log import process_log
 from chainlib.eth.settings import process_settings
 from chainlib.settings import ChainSettings
 
 # local imports
 from eth_erc20 import ERC20
+from eth_erc20.batch import DEFAULT_CONCURRENCY
+from eth_erc20.metrics import process_metrics
+
+logg = logging.getLogger()
 
 
 def process_config_local(config, arg, args, flags):
@@ -55,36 +48,98 @@ def process_config_local(config, arg, args, flags):
     address = config.get('_POSARG')
     if address:
         recipient = add_0x(address)
-    else:
+    elif args.address_file == None:
         recipient = stdin_arg()
     config.add(recipient, '_RECIPIENT', False)
+    config.add(args.address_file, '_ADDRESS_FILE', False)
+    config.add(args.format, '_FORMAT', False)
+    config.add(args.batch_size, '_BATCH_SIZE', False)
+    config.add(args.concurrency, '_CONCURRENCY', False)
+    config.add(args.no_cache, '_NO_CACHE', False)
+    config.add(args.refresh_cache, '_REFRESH_CACHE', False)
+    config.add(args.metrics, '_METRICS', False)
     return config
 
 
-logg = logging.getLogger()
-
-arg_flags = ArgFlag()
-arg = Arg(arg_flags)
-flags = arg_flags.STD_READ | arg_flags.EXEC | arg_flags.SENDER
-
-argparser = chainlib.eth.cli.ArgumentParser()
-argparser = process_args(argparser, arg, flags)
-argparser.add_argument('address', type=str, help='Ethereum address of recipient')
-args = argparser.parse_args()
-
-logg = process_log(args, logg)
-
-config = Config()
-config = process_config(config, arg, args, flags, positional_name='address')
-config = process_config_local(config, arg, args, flags)
-logg.debug('config loaded:\n{}'.format(config))
-
-settings = ChainSettings()
-settings = process_settings(settings, config)
-logg.debug('settings loaded:\n{}'.format(settings))
-
+def process_cli():
+    arg_flags = ArgFlag()
+    arg = Arg(arg_flags)
+    flags = arg_flags.STD_READ | arg_flags.EXEC | arg_flags.SENDER
+
+    argparser = chainlib.eth.cli.ArgumentParser()
+    argparser = process_args(argparser, arg, flags)
+    argparser.add_argument('--no-cache', dest='no_cache', action='store_true', help='Do not use the token metadata cache')
+    argparser.add_argument('--refresh-cache', dest='refresh_cache', action='store_true', help='Refresh token metadata cache entry')
+    argparser.add_argument('--address-file', dest='address_file', type=str, help='Read addresses to query from file, one per line. Use "-" for stdin')
+    argparser.add_argument('--format', dest='format', type=str, choices=['csv', 'ndjson'], default='csv', help='Output format when querying multiple addresses')
+    argparser.add_argument('--batch-size', dest='batch_size', type=int, default=100, help='Number of balance queries per JSON-RPC batch when querying multiple addresses')
+    argparser.add_argument('--concurrency', dest='concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Maximum number of JSON-RPC batches in flight when querying multiple addresses')
+    argparser.add_argument('address', type=str, nargs='?', default='', help='Ethereum address of recipient')
+    argparser.add_argument('--metrics', type=str, help='Write RPC metrics to file on exit; Prometheus text format, or JSON if the file name ends with .json')
+    args = argparser.parse_args()
+
+    process_log(args, logg)
+
+    config = Config()
+    config = process_config(config, arg, args, flags, positional_name='address')
+    config = process_config_local(config, arg, args, flags)
+    logg.debug('config loaded:\n{}'.format(config))
+
+    settings = ChainSettings()
+    settings = process_settings(settings, config)
+    logg.debug('settings loaded:\n{}'.format(settings))
+    return (config, settings,)
+
+
+def read_addresses(f):
+    from eth_erc20.plan import encode_address
+    for l in f:
+        address = l.strip()
+        if len(address) == 0 or address[0] == '#':
+            continue
+        try:
+            address = add_0x(address)
+            encode_address(address)
+        except ValueError:
+            logg.error('skipping invalid address {}'.format(address))
+            continue
+        yield address
+
+
+def process_addresses(config, settings, conn, token_address, sender_address, amount_codec):
+    fp = config.get('_ADDRESS_FILE')
+    if fp == '-':
+        output_balances(config, settings, conn, token_address, sender_address, amount_codec, sys.stdin)
+        return
+    with open(fp, 'r') as f:
+        output_balances(config, settings, conn, token_address, sender_address, amount_codec, f)
+
+
+def output_balances(config, settings, conn, token_address, sender_address, amount_codec, f):
+    from eth_erc20.batch import do_batches
+    # the queries are read-only, so skip the fee price lookup for each of them
+    g = ERC20(chain_spec=settings.get('CHAIN_SPEC'))
+    batches = g.balance_of_batch(token_address, read_addresses(f), sender_address=sender_address, batch_size=config.get('_BATCH_SIZE'))
+    output_format = config.get('_FORMAT')
+    if output_format == 'csv':
+        sys.stdout.write('address,balance\n')
+    for (chunk, r) in do_batches(conn, batches, concurrency=config.get('_CONCURRENCY')):
+        balances = g.parse_balance_batch(chunk, r)
+        values = [balances[address] for address in chunk]
+        if amount_codec == None:
+            values = [str(v) for v in values]
+        else:
+            values = amount_codec.format_many(values)
+        for (address, balance_str) in zip(chunk, values):
+            if output_format == 'ndjson':
+                sys.stdout.write(json.dumps({'address': address, 'balance': balance_str}) + '\n')
+            else:
+                sys.stdout.write('{},{}\n'.format(address, balance_str))
+        sys.stdout.flush()
 
 def main():
+    (config, settings) = process_cli()
+    process_metrics(settings, config.get('_METRICS'))
     token_address = settings.get('EXEC')
     conn = settings.get('CONN')
     sender_address = settings.get('SENDER_ADDRESS')
@@ -94,11 +149,19 @@ def main():
             )
 
     # determine decimals
+    amount_codec = None
     if not config.get('_RAW'):
-        decimals_o = g.decimals(token_address, sender_address=sender_address)
-        r = conn.do(decimals_o)
-        decimals = int(strip_0x(r), 16)
-        logg.info('decimals {}'.format(decimals))
+        from eth_erc20.amount import token_codec
+        from eth_erc20.cache import TokenMetadataCache
+        cache = None
+        if not config.true('_NO_CACHE'):
+            cache = TokenMetadataCache(metrics=settings.get('METRICS'))
+        amount_codec = token_codec(conn, settings.get('CHAIN_SPEC'), token_address, cache=cache, refresh=config.true('_REFRESH_CACHE'), sender_address=sender_address)
+        logg.info('decimals {}'.format(amount_codec.decimals))
+
+    if config.get('_ADDRESS_FILE') != None:
+        process_addresses(config, settings, conn, token_address, sender_address, amount_codec)
+        return
 
     # get balance
     balance_o = g.balance(token_address, settings.get('RECIPIENT'), sender_address=sender_address)
@@ -106,21 +169,12 @@ def main():
    
     hx = strip_0x(r)
     balance_value = int(hx, 16)
-    if config.get('_RAW'):
+    if amount_codec == None:
         logg.debug('balance {} = {}'.format(even(hx), balance_value))
+        print(balance_value)
     else:
-        logg.debug('balance {} = {} decimals {}'.format(even(hx), balance_value, decimals))
-
-    balance_str = str(balance_value)
-    balance_len = len(balance_str)
-    if config.get('_RAW'):
-        print(balance_str)
-    else:
-        if balance_len < decimals + 1:
-            print('0.{}'.format(balance_str.zfill(decimals)))
-        else:
-            offset = balance_len-decimals
-            print('{}.{}'.format(balance_str[:offset],balance_str[offset:]))
+        logg.debug('balance {} = {} decimals {}'.format(even(hx), balance_value, amount_codec.decimals))
+        print(amount_codec.format(balance_value))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,128 @@
+#!python3
+
+"""Token query daemon
+
+.. moduleauthor:: Louis Holbrook <dev@holbrook.no>
+.. pgp:: 0826EDA1702D1E87C6E2875121D2E7BB88C2A746
+
+"""
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# standard imports
+import logging
+
+# external imports
+import chainlib.eth.cli
+from chainlib.eth.cli.arg import (
+        Arg,
+        ArgFlag,
+        process_args,
+        )
+from chainlib.eth.cli.config import (
+        Config,
+        process_config,
+        )
+from chainlib.eth.cli.log import process_log
+from chainlib.eth.constant import ZERO_ADDRESS
+from chainlib.eth.settings import process_settings
+from chainlib.settings import ChainSettings
+
+# local imports
+from eth_erc20 import ERC20
+from eth_erc20.batch import (
+        DEFAULT_BATCH_SIZE,
+        DEFAULT_CONCURRENCY,
+        )
+from eth_erc20.daemon import (
+        QueryDaemon,
+        DaemonServer,
+        DEFAULT_MAX_DELAY,
+        )
+from eth_erc20.metrics import process_metrics
+
+logg = logging.getLogger()
+
+# seconds between metrics file updates
+METRICS_INTERVAL = 15
+
+
+def process_config_local(config, arg, args, flags):
+    config.add(args.socket, '_SOCKET', False)
+    config.add(args.batch_size, '_BATCH_SIZE', False)
+    config.add(args.concurrency, '_CONCURRENCY', False)
+    config.add(args.max_delay, '_MAX_DELAY', False)
+    config.add(args.no_cache, '_NO_CACHE', False)
+    config.add(args.giftable, '_GIFTABLE', False)
+    config.add(args.metrics, '_METRICS', False)
+    return config
+
+
+def process_cli():
+    arg_flags = ArgFlag()
+    arg = Arg(arg_flags)
+    flags = arg_flags.STD_READ | arg_flags.SENDER
+
+    argparser = chainlib.eth.cli.ArgumentParser()
+    argparser = process_args(argparser, arg, flags)
+    argparser.add_argument('--socket', type=str, default='./erc20.sock', help='Path of unix socket to accept queries on')
+    argparser.add_argument('--batch-size', dest='batch_size', type=int, default=DEFAULT_BATCH_SIZE, help='Maximum number of requests per JSON-RPC batch')
+    argparser.add_argument('--concurrency', dest='concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Maximum number of JSON-RPC batches in flight')
+    argparser.add_argument('--max-delay', dest='max_delay', type=float, default=DEFAULT_MAX_DELAY, help='Seconds to wait for more queries before sending a batch that is not full')
+    argparser.add_argument('--no-cache', dest='no_cache', action='store_true', help='Do not use the token metadata cache')
+    argparser.add_argument('--giftable', action='store_true', help='Also answer burned and minted queries, for giftable tokens')
+    argparser.add_argument('--metrics', type=str, help='Write RPC metrics to file periodically and on exit; Prometheus text format, or JSON if the file name ends with .json')
+    args = argparser.parse_args()
+
+    process_log(args, logg)
+
+    config = Config()
+    config = process_config(config, arg, args, flags)
+    config = process_config_local(config, arg, args, flags)
+    logg.debug('config loaded:\n{}'.format(config))
+
+    settings = ChainSettings()
+    settings = process_settings(settings, config)
+    logg.debug('settings loaded:\n{}'.format(settings))
+    return (config, settings,)
+
+
+def main():
+    (config, settings) = process_cli()
+    process_metrics(settings, config.get('_METRICS'), interval=METRICS_INTERVAL)
+    chain_spec = settings.get('CHAIN_SPEC')
+
+    cache = None
+    if not config.true('_NO_CACHE'):
+        from eth_erc20.cache import TokenMetadataCache
+        cache = TokenMetadataCache(metrics=settings.get('METRICS'))
+
+    # the queries are read-only, so skip the fee price lookup
+    factory = ERC20(chain_spec)
+    if config.true('_GIFTABLE'):
+        from giftable_erc20_token import GiftableToken
+        factory = GiftableToken(chain_spec)
+    daemon = QueryDaemon(
+            settings.get('CONN'),
+            chain_spec,
+            sender_address=settings.get('SENDER_ADDRESS') or ZERO_ADDRESS,
+            factory=factory,
+            cache=cache,
+            batch_size=config.get('_BATCH_SIZE'),
+            concurrency=config.get('_CONCURRENCY'),
+            max_delay=config.get('_MAX_DELAY'),
+            id_generator=settings.get('RPC_ID_GENERATOR'),
+            )
+    server = DaemonServer(daemon, config.get('_SOCKET'))
+    daemon.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.stop()
+    daemon.stop()
+    logg.info('daemon stopped after {} queries in {} batches'.format(daemon.query_count, daemon.batch_count))
+
+
+if __name__ == '__main__':
+    main()
@@ -11,20 +11,13 @@
 
 # standard imports
 import sys
-import os
-import json
-import argparse
 import logging
 
 # external imports
 from hexathon import (
         add_0x,
         strip_0x,
-        even,
         )
-import sha3
-
-# external imports
 import chainlib.eth.cli
 from chainlib.eth.cli.arg import (
         Arg,
@@ -36,114 +29,202 @@ from chainlib.eth.cli.config import (
         Config,
         process_config,
         )
-from chainlib.eth.address import to_checksum_address
-from chainlib.eth.connection import EthHTTPConnection
-from chainlib.eth.gas import (
-        OverrideGasOracle,
-        balance,
-        )
-from chainlib.chain import ChainSpec
 from chainlib.eth.settings import process_settings
 from chainlib.settings import ChainSettings
 from chainlib.eth.cli.log import process_log
+from chainlib.eth.block import block_latest
 
 # local imports
 from eth_erc20 import ERC20
+from eth_erc20.cache import (
+        TokenMetadataCache,
+        metadata_query,
+        parse_metadata,
+        )
+from eth_erc20.amount import codec
+from eth_erc20.batch import (
+        chunks,
+        do_batches,
+        DEFAULT_CONCURRENCY,
+        )
+from eth_erc20.metrics import process_metrics
 
 logg = logging.getLogger()
 
 
-
 def process_config_local(config, arg, args, flags):
-    contract = None
+    contracts = []
     try:
         contract = config.get('_EXEC_ADDRESS')
+        if contract != None:
+            contracts.append(contract)
     except KeyError:
         pass
 
-    if contract == None:
-        address = config.get('_POSARG')
-        if address:
-            contract = add_0x(address)
-        else:
-            contract = stdin_arg()
-
-    config.add(contract, '_CONTRACT', False)
+    for address in args.contract_address:
+        contracts.append(add_0x(address))
+
+    if len(contracts) == 0:
+        v = stdin_arg()
+        if v != None:
+            for address in v.split():
+                contracts.append(add_0x(address))
+
+    config.add(contracts, '_CONTRACTS', False)
+    config.add(args.batch_size, '_BATCH_SIZE', False)
+    config.add(args.concurrency, '_CONCURRENCY', False)
+    config.add(args.no_cache, '_NO_CACHE', False)
+    config.add(args.refresh_cache, '_REFRESH_CACHE', False)
+    config.add(args.metrics, '_METRICS', False)
     return config
 
 
-arg_flags = ArgFlag()
-arg = Arg(arg_flags)
-flags = arg_flags.STD_READ | arg_flags.EXEC | arg_flags.TAB | arg_flags.SENDER 
-
-argparser = chainlib.eth.cli.ArgumentParser()
-argparser = process_args(argparser, arg, flags)
-argparser.add_argument('contract_address', type=str, help='Token contract address (may also be specified by -e)')
-args = argparser.parse_args()
-
-logg = process_log(args, logg)
-
-config = Config()
-config = process_config(config, arg, args, flags, positional_name='contract_address')
-config = process_config_local(config, arg, args, flags)
-logg.debug('config loaded:\n{}'.format(config))
-
-settings = ChainSettings()
-settings = process_settings(settings, config)
-logg.debug('settings loaded:\n{}'.format(settings))
-
-
-def main():
-    token_address = config.get('_CONTRACT')
-    conn = settings.get('CONN')
-    sender_address = settings.get('SENDER_ADDRESS')
-    g = ERC20(
-            chain_spec=settings.get('CHAIN_SPEC'),
-            gas_oracle=settings.get('GAS_ORACLE'),
-            )
-
-    outkeys = config.get('_OUTARG')
+def process_cli():
+    arg_flags = ArgFlag()
+    arg = Arg(arg_flags)
+    flags = arg_flags.STD_READ | arg_flags.EXEC | arg_flags.TAB | arg_flags.SENDER 
+
+    argparser = chainlib.eth.cli.ArgumentParser()
+    argparser = process_args(argparser, arg, flags)
+    argparser.add_argument('--no-cache', dest='no_cache', action='store_true', help='Do not use the token metadata cache')
+    argparser.add_argument('--refresh-cache', dest='refresh_cache', action='store_true', help='Refresh token metadata cache entry')
+    argparser.add_argument('--batch-size', dest='batch_size', type=int, default=25, help='Number of contracts per JSON-RPC batch')
+    argparser.add_argument('--concurrency', dest='concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Maximum number of JSON-RPC batches in flight')
+    argparser.add_argument('contract_address', type=str, nargs='*', help='Token contract addresses (may also be specified by -e)')
+    argparser.add_argument('--metrics', type=str, help='Write RPC metrics to file on exit; Prometheus text format, or JSON if the file name ends with .json')
+    args = argparser.parse_args()
+
+    process_log(args, logg)
+
+    config = Config()
+    config = process_config(config, arg, args, flags, positional_name='contract_address')
+    config = process_config_local(config, arg, args, flags)
+    logg.debug('config loaded:\n{}'.format(config))
+
+    settings = ChainSettings()
+    settings = process_settings(settings, config)
+    logg.debug('settings loaded:\n{}'.format(settings))
+    return (config, settings,)
+
+
+def contract_batches(config, chain_spec, contracts, keys, cache, height, sender_address):
+    refresh = config.true('_REFRESH_CACHE')
+    supply = 'supply' in keys
+    keys = [k for k in keys if k != 'supply']
+    for chunk in chunks(contracts, batch_size=config.get('_BATCH_SIZE')):
+        tags = []
+        o = []
+        for contract in chunk:
+            metadata = {}
+            if cache != None and not refresh:
+                metadata = dict(cache.get(chain_spec, contract) or {})
+            missing = [k for k in keys if k not in metadata]
+            o += metadata_query(chain_spec, contract, keys=missing, sender_address=sender_address, height=height)
+            if supply:
+                o.append(ERC20(chain_spec).total_supply(contract, sender_address=sender_address, height=height))
+            tags.append((contract, metadata, missing,))
+        yield (tags, o,)
+
+
+def output(config, contract, metadata, outkeys, multiple):
+    if multiple:
+        s = ''
+        if not config.true('_RAW'):
+            s = 'Address: '
+        s += contract
+        print(s)
 
     if not outkeys or 'address' in outkeys:
-        name_o = g.name(token_address, sender_address=sender_address)
-        r = conn.do(name_o)
-        token_name = g.parse_name(r)
         s = ''
         if not config.true('_RAW'):
             s = 'Name: '
-        s += token_name
+        s += metadata['name']
         print(s)
 
     if not outkeys or 'symbol' in outkeys:
-        symbol_o = g.symbol(token_address, sender_address=sender_address)
-        r = conn.do(symbol_o)
-        token_symbol = g.parse_symbol(r)
         s = ''
         if not config.true('_RAW'):
             s = 'Symbol: '
-        s += token_symbol
+        s += metadata['symbol']
         print(s)
 
     if not outkeys or 'decimals' in outkeys:
-        decimals_o = g.decimals(token_address, sender_address=sender_address)
-        r = conn.do(decimals_o)
-        decimals = int(strip_0x(r), 16)
         s = ''
         if not config.true('_RAW'):
             s = 'Decimals: '
-        s += str(decimals)
+        s += str(metadata['decimals'])
         print(s)
 
     if not outkeys or 'supply' in outkeys:
-        supply_o = g.total_supply(token_address, sender_address=sender_address)
-        r = conn.do(supply_o)
-        supply = int(strip_0x(r), 16)
         s = ''
-        if not config.true('_RAW'):
-            s = 'Supply: '
-        s += str(supply)
+        if config.true('_RAW'):
+            s += str(metadata['supply'])
+        else:
+            s = 'Supply: ' + codec(metadata['decimals']).format(metadata['supply'])
         print(s)
 
+    if multiple:
+        print()
+    sys.stdout.flush()
+
+
+def main():
+    (config, settings) = process_cli()
+    process_metrics(settings, config.get('_METRICS'))
+    contracts = config.get('_CONTRACTS')
+    conn = settings.get('CONN')
+    sender_address = settings.get('SENDER_ADDRESS')
+    chain_spec = settings.get('CHAIN_SPEC')
+
+    outkeys = config.get('_OUTARG')
+
+    keys = []
+    if not outkeys or 'address' in outkeys:
+        keys.append('name')
+    if not outkeys or 'symbol' in outkeys:
+        keys.append('symbol')
+    if not outkeys or 'decimals' in outkeys:
+        keys.append('decimals')
+    if not outkeys or 'supply' in outkeys:
+        # supply is shown in token units unless raw
+        if not config.true('_RAW') and 'decimals' not in keys:
+            keys.append('decimals')
+        keys.append('supply')
+    cache = None
+    if not config.true('_NO_CACHE'):
+        cache = TokenMetadataCache(metrics=settings.get('METRICS'))
+
+    # pin all queries to the same block
+    height = config.get('_HEIGHT')
+    if height == 'latest':
+        r = conn.do(block_latest())
+        height = int(strip_0x(r), 16)
+    else:
+        height = int(height)
+    logg.debug('querying {} contracts at block {}'.format(len(contracts), height))
+
+    # batches complete out of order, so results are held until all earlier batches have been output
+    batches = enumerate(contract_batches(config, chain_spec, contracts, keys, cache, height, sender_address))
+    batches = (((i, tags,), o,) for (i, (tags, o)) in batches)
+    results = {}
+    cursor_batch = 0
+    for ((i, tags), r) in do_batches(conn, batches, concurrency=config.get('_CONCURRENCY')):
+        cursor = 0
+        for (contract, metadata, missing) in tags:
+            l = len(missing)
+            if l > 0:
+                metadata.update(parse_metadata(missing, r[cursor:cursor+l]))
+                if cache != None:
+                    cache.put(chain_spec, contract, dict(metadata))
+                cursor += l
+            if 'supply' in keys:
+                metadata['supply'] = ERC20.parse_total_supply(r[cursor])
+                cursor += 1
+        results[i] = tags
+        while cursor_batch in results:
+            for (contract, metadata, missing) in results.pop(cursor_batch):
+                output(config, contract, metadata, outkeys, len(contracts) > 1)
+            cursor_batch += 1
 
 if __name__ == '__main__':
     main()
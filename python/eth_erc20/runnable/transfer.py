@@ -10,17 +10,10 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 # standard imports
-import os
-import io
-import json
-import argparse
+import sys
 import logging
 
 # external imports
-from hexathon import (
-        add_0x,
-        strip_0x,
-        )
 import chainlib.eth.cli
 from chainlib.eth.cli.log import process_log
 from chainlib.eth.settings import process_settings
@@ -37,49 +30,176 @@ from chainlib.eth.cli.config import (
 
 # local imports
 from eth_erc20 import ERC20
+from eth_erc20.batch import do_batch
+from eth_erc20.metrics import process_metrics
 
 logg = logging.getLogger()
 
+DEFAULT_WAIT_TIMEOUT = 600
+
 
 def process_config_local(config, arg, args, flags):
-    config.add(config.get('_POSARG'), '_VALUE', False)
+    # in bulk mode values are read from the csv file, and the value settings are not processed
+    if args.csv == None:
+        config.add(config.get('_POSARG'), '_VALUE', False)
+    config.add(args.csv, '_CSV', False)
+    journal = args.journal
+    if journal == None and args.csv != None:
+        journal = args.csv + '.journal'
+    config.add(journal, '_JOURNAL', False)
+    config.add(args.window, '_WINDOW', False)
+    config.add(args.max_pending, '_MAX_PENDING', False)
+    config.add(args.wait_timeout, '_WAIT_TIMEOUT', False)
+    config.add(args.human, '_HUMAN', False)
+    config.add(args.metrics, '_METRICS', False)
     return config
 
 
-arg_flags = ArgFlag()
-arg = Arg(arg_flags)
-flags = arg_flags.STD_WRITE | arg_flags.EXEC | arg_flags.WALLET
-
-argparser = chainlib.eth.cli.ArgumentParser()
-argparser = process_args(argparser, arg, flags)
-argparser.add_argument('value', type=str, help='Token value to send')
-args = argparser.parse_args()
-
-logg = process_log(args, logg)
-
-config = Config()
-config = process_config(config, arg, args, flags, positional_name='value')
-config = process_config_local(config, arg, args, flags)
-logg.debug('config loaded:\n{}'.format(config))
+def process_cli():
+    arg_flags = ArgFlag()
+    arg = Arg(arg_flags)
+    flags = arg_flags.STD_WRITE | arg_flags.EXEC | arg_flags.WALLET
+
+    argparser = chainlib.eth.cli.ArgumentParser()
+    argparser = process_args(argparser, arg, flags)
+    argparser.add_argument('--csv', type=str, help='Bulk mode; send to each recipient and token value in CSV file')
+    argparser.add_argument('--journal', type=str, help='Bulk mode progress journal, for resuming an interrupted run (default: csv file path with .journal appended)')
+    argparser.add_argument('--window', type=int, help='Bulk mode number of transactions submitted per JSON-RPC batch (default: eth_erc20.airdrop.DEFAULT_WINDOW)')
+    argparser.add_argument('--max-pending', dest='max_pending', type=int, help='Bulk mode maximum number of submitted transactions without receipt (default: eth_erc20.airdrop.DEFAULT_MAX_PENDING)')
+    argparser.add_argument('--wait-timeout', dest='wait_timeout', type=float, default=DEFAULT_WAIT_TIMEOUT, help='Bulk mode seconds to wait for receipts when waiting, or 0 to wait indefinitely')
+    argparser.add_argument('--human', action='store_true', help='Token values are in token units with decimals, e.g. 1.5, instead of integer base units')
+    argparser.add_argument('value', type=str, nargs='?', default='', help='Token value to send')
+    argparser.add_argument('--metrics', type=str, help='Write RPC metrics to file on exit; Prometheus text format, or JSON if the file name ends with .json')
+    args = argparser.parse_args()
+    if args.csv == None and args.value == '':
+        argparser.error('value is required unless --csv is given')
+
+    process_log(args, logg)
+
+    config = Config()
+    config = process_config(config, arg, args, flags, positional_name='value')
+    config = process_config_local(config, arg, args, flags)
+    logg.debug('config loaded:\n{}'.format(config))
+
+    settings = ChainSettings()
+    settings = process_settings(settings, config)
+    logg.debug('settings loaded:\n{}'.format(settings))
+    return (config, settings,)
+
+
+def value_codec(settings, token_address):
+    from eth_erc20.amount import token_codec
+    from eth_erc20.cache import TokenMetadataCache
+    return token_codec(settings.get('CONN'), settings.get('CHAIN_SPEC'), token_address, cache=TokenMetadataCache(metrics=settings.get('METRICS')), sender_address=settings.get('SENDER_ADDRESS'))
+
+
+def balances(conn, generator, token_address, addresses, id_generator=None):
+    r = {}
+    for (chunk, o) in generator.balance_of_batch(token_address, addresses, id_generator=id_generator):
+        v = do_batch(conn, o)
+        r.update(generator.parse_balance_batch(chunk, v))
+    return r
+
+
+def process_bulk(config, settings, conn, token_address, signer_address, amount_codec):
+    from chainlib.eth.gas import OverrideGasOracle
+    from eth_erc20.airdrop import (
+            Airdrop,
+            read_transfers,
+            DEFAULT_WINDOW,
+            DEFAULT_MAX_PENDING,
+            )
 
-settings = ChainSettings()
-settings = process_settings(settings, config)
-logg.debug('settings loaded:\n{}'.format(settings))
+    window = config.get('_WINDOW')
+    if window == None:
+        window = DEFAULT_WINDOW
+    max_pending = config.get('_MAX_PENDING')
+    if max_pending == None:
+        max_pending = DEFAULT_MAX_PENDING
 
+    # fee values are fixed for the whole run, instead of being queried for each transaction
+    gas_oracle = settings.get('GAS_ORACLE')
+    (price, limit) = gas_oracle.get_gas()
+    gas_oracle = OverrideGasOracle(price=price, limit=limit, conn=conn)
 
-def balance(conn, generator, token_address, address, id_generator=None):
-    o = generator.balance(token_address, address, id_generator=id_generator)
-    r = conn.do(o)
-    token_balance = generator.parse_balance(r)
-    return token_balance
+    airdrop = Airdrop(
+            conn,
+            settings.get('CHAIN_SPEC'),
+            token_address,
+            signer_address,
+            config.get('_JOURNAL'),
+            signer=settings.get('SIGNER'),
+            gas_oracle=gas_oracle,
+            window=window,
+            max_pending=max_pending,
+            id_generator=settings.get('RPC_ID_GENERATOR'),
+            )
+    f = open(config.get('_CSV'), 'r')
+    airdrop.add(read_transfers(f, amount_codec=amount_codec))
+    f.close()
+    airdrop.sign()
+
+    if not settings.get('RPC_SEND'):
+        for entry in airdrop.unsent():
+            print(entry['raw'])
+        airdrop.close()
+        return
+
+    failed = 0
+    rejected = 0
+    for entry in airdrop.send():
+        failed += output_bulk(entry, amount_codec)
+        if entry.get('error') != None:
+            rejected += 1
+    if rejected > 0:
+        airdrop.close()
+        logg.critical('{} transfers rejected by node; transfers with later nonces cannot be mined until these are resubmitted by running again with the same journal'.format(rejected))
+        sys.exit(1)
+    if settings.get('WAIT'):
+        try:
+            for entry in airdrop.wait(timeout=config.get('_WAIT_TIMEOUT')):
+                failed += output_bulk(entry, amount_codec)
+        except TimeoutError as e:
+            airdrop.close()
+            logg.critical('{}; run again with the same journal to resume'.format(e))
+            sys.exit(1)
+    airdrop.close()
+    if failed > 0:
+        logg.critical('{} transfers reverted'.format(failed))
+        sys.exit(1)
+
+
+def output_bulk(entry, amount_codec):
+    value = entry['value']
+    if amount_codec != None:
+        value = amount_codec.format(value)
+    status = entry.get('status')
+    if entry.get('error') != None:
+        status = 'rejected'
+    print('{},{},{},{}'.format(entry['recipient'], value, entry['hash'], status))
+    sys.stdout.flush()
+    if status != 1:
+        return 1
+    return 0
 
 
 def main():
+    (config, settings) = process_cli()
+    process_metrics(settings, config.get('_METRICS'))
     token_address = settings.get('EXEC')
     signer_address = settings.get('SENDER_ADDRESS')
     recipient = settings.get('RECIPIENT')
     value = settings.get('VALUE')
     conn = settings.get('CONN')
+    amount_codec = None
+    if config.true('_HUMAN'):
+        amount_codec = value_codec(settings, token_address)
+    if config.get('_CSV') != None:
+        process_bulk(config, settings, conn, token_address, signer_address, amount_codec)
+        return
+    if amount_codec != None:
+        value = amount_codec.parse(config.get('_VALUE'))
+
     g = ERC20(
             settings.get('CHAIN_SPEC'),
             signer=settings.get('SIGNER'),
@@ -87,8 +207,9 @@ def main():
             nonce_oracle=settings.get('NONCE_ORACLE'),
             )
     if logg.isEnabledFor(logging.DEBUG):
-        sender_balance = balance(conn, g, token_address, signer_address, id_generator=settings.get('RPC_ID_GENERATOR'))
-        recipient_balance = balance(conn, g, token_address, recipient, id_generator=settings.get('RPC_ID_GENERATOR'))
+        token_balances = balances(conn, g, token_address, [signer_address, recipient], id_generator=settings.get('RPC_ID_GENERATOR'))
+        sender_balance = token_balances[signer_address]
+        recipient_balance = token_balances[recipient]
         logg.debug('sender {} balance before: {}'.format(signer_address, sender_balance))
         logg.debug('recipient {} balance before: {}'.format(recipient, recipient_balance))
 
@@ -97,15 +218,21 @@ def main():
     if settings.get('RPC_SEND'):
         conn.do(o)
         if settings.get('WAIT'):
-            r = conn.wait(tx_hash_hex)
+            from eth_erc20.track import (
+                    RevertError,
+                    wait,
+                    )
+            try:
+                r = wait(conn, tx_hash_hex, id_generator=settings.get('RPC_ID_GENERATOR'))
+            except RevertError as e:
+                logg.critical('VM revert: {}'.format(e))
+                sys.exit(1)
             if logg.isEnabledFor(logging.DEBUG):
-                sender_balance = balance(conn, g, token_address, signer_address, id_generator=settings.get('RPC_ID_GENERATOR'))
-                recipient_balance = balance(conn, g, token_address, recipient, id_generator=settings.get('RPC_ID_GENERATOR'))
+                token_balances = balances(conn, g, token_address, [signer_address, recipient], id_generator=settings.get('RPC_ID_GENERATOR'))
+                sender_balance = token_balances[signer_address]
+                recipient_balance = token_balances[recipient]
                 logg.debug('sender {} balance after: {}'.format(signer_address, sender_balance))
                 logg.debug('recipient {} balance after: {}'.format(recipient, recipient_balance))
-            if r['status'] == 0:
-                logg.critical('VM revert. Wish I could tell you more')
-                sys.exit(1)
         print(tx_hash_hex)
 
     else:
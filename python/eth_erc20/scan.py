@@ -0,0 +1,142 @@
+# standard imports
+import logging
+
+# external imports
+from chainlib.eth.block import block_latest
+from chainlib.jsonrpc import JSONRPCRequest
+from chainlib.error import JSONRPCException
+
+# local imports
+from .event import to_int
+
+logg = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_CHUNK_SIZE = 100000
+DEFAULT_RESULT_LIMIT = 10000
+
+
+def logs(address, from_block, to_block, topics=None, id_generator=None):
+    """Build an eth_getLogs request.
+
+    :param address: Contract address, or list of contract addresses
+    :type address: str or list
+    :param from_block: First block of range, inclusive
+    :type from_block: int
+    :param to_block: Last block of range, inclusive
+    :type to_block: int
+    :param topics: Event topics to match, any of which may be the first topic of a log entry
+    :type topics: list
+    :rtype: dict
+    :returns: JSON-RPC request object
+    """
+    j = JSONRPCRequest(id_generator)
+    o = j.template()
+    o['method'] = 'eth_getLogs'
+    q = {
+        'address': address,
+        'fromBlock': hex(from_block),
+        'toBlock': hex(to_block),
+            }
+    if topics != None:
+        q['topics'] = [list(topics)]
+    o['params'].append(q)
+    return j.finalize(o)
+
+
+class LogScanner:
+    """Walks a block range with eth_getLogs and yields decoded event records.
+
+    The range is queried in chunks of blocks. The chunk size is halved whenever the node rejects a query, typically because of a result limit, and doubled after queries returning less than half of result_limit entries. Only one chunk of log entries is held in memory at a time.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param plans: Event plans to match and decode, e.g. eth_erc20.ERC20.event_plans()
+    :type plans: list of eth_erc20.event.EventPlan
+    :param chunk_size: Initial number of blocks per query
+    :type chunk_size: int
+    :param max_chunk_size: Maximum number of blocks per query
+    :type max_chunk_size: int
+    :param result_limit: Number of log entries per query to stay below
+    :type result_limit: int
+    :raises ValueError: Invalid chunk size
+    """
+
+    def __init__(self, conn, plans, chunk_size=DEFAULT_CHUNK_SIZE, max_chunk_size=MAX_CHUNK_SIZE, result_limit=DEFAULT_RESULT_LIMIT, id_generator=None):
+        if chunk_size < 1 or max_chunk_size < chunk_size:
+            raise ValueError('invalid chunk size {} (max {})'.format(chunk_size, max_chunk_size))
+        self.conn = conn
+        self.plans = {}
+        for plan in plans:
+            self.plans[plan.topic] = plan
+        self.chunk_size = chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.result_limit = result_limit
+        self.id_generator = id_generator
+
+
+    def latest(self):
+        o = block_latest(id_generator=self.id_generator)
+        r = self.conn.do(o)
+        return to_int(r)
+
+
+    def logs(self, contract_address, start, end=None):
+        """Query log entries of the plan events in a block range.
+
+        :param contract_address: Contract address, or list of contract addresses
+        :type contract_address: str or list
+        :param start: First block of range, inclusive
+        :type start: int
+        :param end: Last block of range, inclusive. If not set, the latest block at the time of the call is used
+        :type end: int
+        :raises chainlib.error.JSONRPCException: Node rejected a query for a single block
+        :rtype: generator
+        :returns: Log entries, in block order
+        """
+        if end == None:
+            end = self.latest()
+        topics = list(self.plans.keys())
+        cursor = start
+        while cursor <= end:
+            to_block = min(cursor + self.chunk_size - 1, end)
+            o = logs(contract_address, cursor, to_block, topics=topics, id_generator=self.id_generator)
+            try:
+                r = self.conn.do(o)
+            except JSONRPCException as e:
+                if self.chunk_size == 1:
+                    raise e
+                self.chunk_size = max(self.chunk_size // 2, 1)
+                logg.debug('log query {}-{} failed, chunk size now {}: {}'.format(cursor, to_block, self.chunk_size, e))
+                continue
+            logg.debug('log query {}-{} returned {} entries'.format(cursor, to_block, len(r)))
+            cursor = to_block + 1
+            if len(r) >= self.result_limit:
+                self.chunk_size = max(self.chunk_size // 2, 1)
+            elif len(r) < self.result_limit // 2:
+                self.chunk_size = min(self.chunk_size * 2, self.max_chunk_size)
+            for log in r:
+                yield log
+
+
+    def scan(self, contract_address, start, end=None):
+        """Query and decode events in a block range.
+
+        :param contract_address: Contract address, or list of contract addresses
+        :type contract_address: str or list
+        :param start: First block of range, inclusive
+        :type start: int
+        :param end: Last block of range, inclusive. If not set, the latest block at the time of the call is used
+        :type end: int
+        :raises chainlib.error.JSONRPCException: Node rejected a query for a single block
+        :rtype: generator
+        :returns: Event records, in block order
+        """
+        for log in self.logs(contract_address, start, end=end):
+            if len(log['topics']) == 0:
+                continue
+            plan = self.plans.get(log['topics'][0].lower())
+            if plan == None:
+                logg.debug('skipping log with unknown topic {}'.format(log['topics'][0]))
+                continue
+            yield plan.decode(log)
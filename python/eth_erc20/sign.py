@@ -0,0 +1,60 @@
+# standard imports
+import os
+import logging
+
+# external imports
+from chainlib.eth.tx import TxFactory
+
+# local imports
+from .batch import chunks
+
+logg = logging.getLogger(__name__)
+
+# below this number of transactions, signing in-process is faster than starting workers
+MIN_PARALLEL = 64
+# number of chunks per worker, to even out differences in worker speed
+CHUNKS_PER_WORKER = 4
+
+
+def sign_chunk(signer, txs):
+    c = TxFactory(None, signer=signer)
+    return [c.build_raw(tx) for tx in txs]
+
+
+def sign_batch(signer, txs, processes=None, executor=None):
+    """Sign transaction templates across a pool of worker processes.
+
+    The signer is pickled and sent to the workers with each chunk of transactions, so it must not hold unpicklable state, e.g. open files or locks.
+
+    :param signer: Transaction signer
+    :type signer: funga.signer.Signer
+    :param txs: Transaction templates with nonce set, as output by chainlib.eth.tx.TxFactory with tx_format TxFormat.DICT
+    :type txs: list
+    :param processes: Number of worker processes, or of workers in executor. If not set, the number of cpus is used. Without executor, transactions are signed in this process if 1, or if there are few transactions
+    :type processes: int
+    :param executor: Process pool to use instead of starting a new one for the call
+    :type executor: concurrent.futures.ProcessPoolExecutor
+    :rtype: list
+    :returns: Transaction hash and serialized transaction, as (hex, hex) tuples, in input order
+    """
+    if processes == None:
+        processes = os.cpu_count() or 1
+    if executor == None and (processes < 2 or len(txs) < MIN_PARALLEL):
+        return sign_chunk(signer, txs)
+
+    chunk_size = max(1, -(-len(txs) // (processes * CHUNKS_PER_WORKER)))
+    own_executor = executor == None
+    if own_executor:
+        # multiprocessing is only imported when actually used, it adds noticeably to startup time
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=processes)
+    try:
+        futures = [executor.submit(sign_chunk, signer, chunk) for chunk in chunks(txs, batch_size=chunk_size)]
+        r = []
+        for future in futures:
+            r += future.result()
+    finally:
+        if own_executor:
+            executor.shutdown(wait=True)
+    logg.debug('signed {} transactions in {} chunks on {} processes'.format(len(txs), len(futures), processes))
+    return r
@@ -0,0 +1,264 @@
+# standard imports
+import logging
+import sqlite3
+
+# external imports
+from chainlib.eth.block import (
+    block_latest,
+    block_by_number,
+)
+from chainlib.eth.constant import ZERO_ADDRESS
+from chainlib.block import BlockSpec
+from hexathon import (
+    add_0x,
+    strip_0x,
+)
+
+# local imports
+from .erc20 import ERC20
+from .event import to_int
+from .batch import (
+    chunks,
+    do_batches,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CONCURRENCY,
+)
+
+logg = logging.getLogger(__name__)
+
+# sqlite bound parameter limit is 999 in older versions
+QUERY_BATCH_SIZE = 300
+
+
+def to_block_hash(v):
+    if isinstance(v, bytes):
+        v = v.hex()
+    return add_0x(strip_0x(v).lower())
+
+
+class SnapshotStore:
+    """Persistent store of eth_call results at fixed blocks.
+
+    Results are keyed by block hash, contract address and call data. A result at a given block hash cannot change, so entries are never invalidated.
+
+    :param path: Path to sqlite database file, or ":memory:"
+    :type path: str
+    :param chain_spec: Chain spec of the queried contracts
+    :type chain_spec: chainlib.chain.ChainSpec
+    :raises ValueError: Database already holds results for a different chain
+    """
+
+    def __init__(self, path, chain_spec):
+        self.chain_spec = chain_spec
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS chain (spec TEXT NOT NULL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS result (block_hash TEXT NOT NULL, contract TEXT NOT NULL, data TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (block_hash, contract, data))')
+        r = self.db.execute('SELECT spec FROM chain').fetchone()
+        if r == None:
+            self.db.execute('INSERT INTO chain (spec) VALUES (?)', (str(chain_spec),))
+        elif r[0] != str(chain_spec):
+            raise ValueError('snapshot store is for chain {}, not {}'.format(r[0], chain_spec))
+        self.db.commit()
+
+
+    def get(self, block_hash, keys):
+        """Look up stored results.
+
+        :param block_hash: Block hash the results were read at
+        :type block_hash: str
+        :param keys: Results to look up, as (contract address, call data) tuples
+        :type keys: list
+        :rtype: dict
+        :returns: Raw results of the stored keys, keyed by (contract address, call data)
+        """
+        r = {}
+        for chunk in chunks(keys, QUERY_BATCH_SIZE):
+            q = ' OR '.join(['(contract = ? AND data = ?)'] * len(chunk))
+            args = [block_hash]
+            for k in chunk:
+                args += k
+            for (contract, data, value) in self.db.execute('SELECT contract, data, value FROM result WHERE block_hash = ? AND (' + q + ')', args):
+                r[(contract, data,)] = value
+        return r
+
+
+    def put(self, block_hash, results):
+        """Store results.
+
+        :param block_hash: Block hash the results were read at
+        :type block_hash: str
+        :param results: Raw results, keyed by (contract address, call data)
+        :type results: dict
+        """
+        self.db.executemany('INSERT OR IGNORE INTO result (block_hash, contract, data, value) VALUES (?, ?, ?, ?)', [(block_hash, k[0], k[1], v) for (k, v) in results.items()])
+        self.db.commit()
+
+
+    def close(self):
+        self.db.close()
+
+
+class Snapshot:
+    """Reads token state pinned to a single block.
+
+    All reads are sent with the block hash as EIP-1898 block parameter, so every result in a report belongs to the same state even if new blocks arrive while it is collected. Since results at a fixed block never change, they are kept in memory and, if a store is given, on disk, and a repeated read costs no RPC call.
+
+    Reads that are not cached are sent in JSON-RPC batches with eth_erc20.batch.do_batches.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param chain_spec: Chain spec of the queried contracts
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param block_hash: Hash of the block to read at
+    :type block_hash: str
+    :param block_number: Number of the block to read at, for reference only
+    :type block_number: int
+    :param factory: Builder of view calls. Methods named as reads must accept contract address, arguments, sender_address, height and id_generator, with a parse_ classmethod for the result
+    :type factory: eth_erc20.ERC20
+    :param store: Persistent result store
+    :type store: eth_erc20.snapshot.SnapshotStore
+    :param sender_address: Sender address for the eth_call queries
+    :type sender_address: str
+    :param pin_hash: If not set, reads are sent with the block number instead of the block hash, for nodes that do not support EIP-1898
+    :type pin_hash: bool
+    :param batch_size: Maximum number of requests per JSON-RPC batch
+    :type batch_size: int
+    :param concurrency: Maximum number of JSON-RPC batches in flight
+    :type concurrency: int
+    :param id_generator: JSON-RPC id generator
+    :type id_generator: chainlib.jsonrpc.JSONRPCIdGenerator
+    """
+
+    def __init__(self, conn, chain_spec, block_hash, block_number=None, factory=None, store=None, sender_address=ZERO_ADDRESS, pin_hash=True, batch_size=DEFAULT_BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY, id_generator=None):
+        if factory == None:
+            factory = ERC20(chain_spec)
+        if not pin_hash and block_number == None:
+            raise ValueError('block number is required when not pinning by hash')
+        self.conn = conn
+        self.chain_spec = chain_spec
+        self.block_hash = to_block_hash(block_hash)
+        self.block_number = block_number
+        self.factory = factory
+        self.store = store
+        self.sender_address = sender_address
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.id_generator = id_generator
+        self.height = self.block_hash
+        if not pin_hash:
+            self.height = block_number
+        self.results = {}
+        self.rpc_count = 0
+
+
+    @classmethod
+    def at(cls, conn, chain_spec, height=BlockSpec.LATEST, id_generator=None, **kwargs):
+        """Create a snapshot at the given block, resolving its hash.
+
+        :param conn: RPC connection
+        :type conn: chainlib.connection.RPCConnection
+        :param chain_spec: Chain spec of the queried contracts
+        :type chain_spec: chainlib.chain.ChainSpec
+        :param height: Block number, or chainlib.block.BlockSpec.LATEST
+        :type height: int or chainlib.block.BlockSpec
+        :param id_generator: JSON-RPC id generator
+        :type id_generator: chainlib.jsonrpc.JSONRPCIdGenerator
+        :param kwargs: Other eth_erc20.snapshot.Snapshot arguments
+        :raises ValueError: Unsupported block spec, or block does not exist
+        :rtype: eth_erc20.snapshot.Snapshot
+        :returns: Snapshot
+        """
+        if height == None or height == BlockSpec.LATEST:
+            height = to_int(conn.do(block_latest(id_generator=id_generator)))
+        elif not isinstance(height, int) or height < 0:
+            raise ValueError('snapshot needs a block number or latest, got {}'.format(height))
+        r = conn.do(block_by_number(height, include_tx=False, id_generator=id_generator))
+        if r == None:
+            raise ValueError('block {} not found'.format(height))
+        return cls(conn, chain_spec, r['hash'], block_number=to_int(r['number']), id_generator=id_generator, **kwargs)
+
+
+    def __key(self, contract_address, o):
+        return (strip_0x(contract_address).lower(), strip_0x(o['params'][0]['data']),)
+
+
+    def read(self, reads):
+        """Execute view calls at the snapshot block.
+
+        :param reads: Calls, as (contract address, method name, arguments) tuples, e.g. ('0x...', 'balance_of', (holder_address,))
+        :type reads: list
+        :raises chainlib.error.JSONRPCException: Error response
+        :rtype: list
+        :returns: Parsed results, in read order
+        """
+        keys = []
+        pending = {}
+        for (contract_address, method, args) in reads:
+            o = getattr(self.factory, method)(contract_address, *args, sender_address=self.sender_address, height=self.height, id_generator=self.id_generator)
+            k = self.__key(contract_address, o)
+            keys.append((k, method,))
+            if k not in self.results:
+                pending[k] = o
+
+        if len(pending) > 0 and self.store != None:
+            r = self.store.get(self.block_hash, list(pending.keys()))
+            for (k, v) in r.items():
+                self.results[k] = v
+                del pending[k]
+
+        if len(pending) > 0:
+            fetched = {}
+            batches = chunks(pending.items(), self.batch_size)
+            for (chunk, r) in do_batches(self.conn, ((chunk, [v[1] for v in chunk],) for chunk in batches), concurrency=self.concurrency):
+                self.rpc_count += len(chunk)
+                for (item, v) in zip(chunk, r):
+                    fetched[item[0]] = v
+            self.results.update(fetched)
+            if self.store != None:
+                self.store.put(self.block_hash, fetched)
+            logg.debug('snapshot {} fetched {} of {} reads'.format(self.block_hash, len(fetched), len(reads)))
+
+        r = []
+        for (k, method) in keys:
+            r.append(getattr(self.factory, 'parse_' + method)(self.results[k]))
+        return r
+
+
+    def balance_of(self, contract_address, holder_address):
+        return self.read([(contract_address, 'balance_of', (holder_address,),)])[0]
+
+
+    def balances(self, contract_address, holder_addresses):
+        """Balances of several holders at the snapshot block.
+
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :param holder_addresses: Holder addresses
+        :type holder_addresses: list
+        :rtype: dict
+        :returns: Balances, keyed by holder address
+        """
+        r = self.read([(contract_address, 'balance_of', (address,),) for address in holder_addresses])
+        return dict(zip(holder_addresses, r))
+
+
+    def allowance(self, contract_address, holder_address, spender_address):
+        return self.read([(contract_address, 'allowance', (holder_address, spender_address,),)])[0]
+
+
+    def total_supply(self, contract_address):
+        return self.read([(contract_address, 'total_supply', (),)])[0]
+
+
+    def metadata(self, contract_address, keys=('name', 'symbol', 'decimals',)):
+        """Token metadata values at the snapshot block.
+
+        :param contract_address: Token contract address
+        :type contract_address: str
+        :param keys: Values to read, as view method names
+        :type keys: tuple
+        :rtype: dict
+        :returns: Values, keyed by name
+        """
+        r = self.read([(contract_address, k, (),) for k in keys])
+        return dict(zip(keys, r))
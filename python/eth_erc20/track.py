@@ -0,0 +1,225 @@
+# standard imports
+import time
+import logging
+from collections import deque
+
+# external imports
+from chainlib.eth.tx import (
+    receipt,
+    transaction,
+)
+from chainlib.eth.error import RevertEthException
+from chainlib.error import JSONRPCException
+from hexathon import (
+    add_0x,
+    strip_0x,
+)
+
+# local imports
+from .erc20 import ERC20
+from .classify import CallClassifier
+from .batch import (
+    chunks,
+    do_batches,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CONCURRENCY,
+)
+
+logg = logging.getLogger(__name__)
+
+DEFAULT_MIN_INTERVAL = 0.5
+DEFAULT_MAX_INTERVAL = 4.0
+DEFAULT_BACKOFF = 1.5
+
+
+def receipt_status(r):
+    v = r['status']
+    if isinstance(v, str):
+        v = int(v, 16)
+    return v
+
+
+class RevertError(RevertEthException):
+    """Raised when a tracked transaction is confirmed with failed status.
+
+    :param tx_hash: Transaction hash
+    :type tx_hash: str
+    :param receipt: Transaction receipt
+    :type receipt: dict
+    :param call: Call plan and decoded arguments of the transaction input, or None if unknown
+    :type call: tuple
+    """
+
+    def __init__(self, tx_hash, receipt, call=None):
+        self.tx_hash = tx_hash
+        self.receipt = receipt
+        self.call = call
+        if call == None:
+            s = 'transaction {} reverted'.format(tx_hash)
+        else:
+            s = 'transaction {} reverted: {}({})'.format(tx_hash, call[0].method, ', '.join([str(v) for v in call[1]]))
+        super(RevertError, self).__init__(s)
+
+
+class ReceiptTracker:
+    """Waits for receipts of any number of transactions, polling them all with batched eth_getTransactionReceipt requests.
+
+    The polling interval starts at min_interval, and is multiplied by backoff after each poll that finds no new receipts, up to max_interval. It drops back to min_interval whenever a receipt is found.
+
+    When a transaction reverts, its input data is identified with the classifier, so the error can show which call failed. The input data is taken from the add call if given, or else retrieved from the node.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param classifier: Classifier for transaction input data. Defaults to one for the eth_erc20.ERC20 methods
+    :type classifier: eth_erc20.classify.CallClassifier
+    :param batch_size: Maximum number of receipt queries per batch
+    :type batch_size: int
+    :param concurrency: Maximum number of batches in flight
+    :type concurrency: int
+    :param min_interval: Seconds between polls when receipts are landing
+    :type min_interval: float
+    :param max_interval: Maximum seconds between polls
+    :type max_interval: float
+    :param backoff: Factor to increase the interval with after each poll without new receipts
+    :type backoff: float
+    """
+
+    def __init__(self, conn, classifier=None, batch_size=DEFAULT_BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL, backoff=DEFAULT_BACKOFF, id_generator=None):
+        self.conn = conn
+        if classifier == None:
+            classifier = CallClassifier(ERC20.call_plans())
+        self.classifier = classifier
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.backoff = backoff
+        self.interval = min_interval
+        self.id_generator = id_generator
+        self.pending_txs = {}
+        self.landed = deque()
+
+
+    def add(self, tx_hash, data=None):
+        """Add a transaction to track.
+
+        :param tx_hash: Transaction hash
+        :type tx_hash: str
+        :param data: Transaction input data, in hex, to decode the call from if it reverts
+        :type data: str
+        """
+        self.pending_txs[add_0x(strip_0x(tx_hash).lower())] = data
+
+
+    def pending(self):
+        """Transactions without receipt, including those with a receipt found but not yet returned by track.
+
+        :rtype: list
+        :returns: Transaction hashes
+        """
+        return list(self.pending_txs.keys()) + [tx_hash for (tx_hash, r, data) in self.landed]
+
+
+    def poll(self):
+        """Query receipts of all pending transactions once.
+
+        Receipts found are queued for return by eth_erc20.track.ReceiptTracker.track, and the polling interval is adjusted.
+
+        :rtype: int
+        :returns: Number of receipts found
+        """
+        batches = []
+        for chunk in chunks(self.pending_txs.keys(), batch_size=self.batch_size):
+            batches.append((chunk, [receipt(tx_hash, id_generator=self.id_generator) for tx_hash in chunk],))
+        count = 0
+        for (chunk, results) in do_batches(self.conn, batches, concurrency=self.concurrency, tolerate_errors=True):
+            for (tx_hash, r) in zip(chunk, results):
+                if r == None:
+                    continue
+                if isinstance(r, Exception):
+                    # some nodes answer with an error instead of null for unknown transactions
+                    logg.debug('receipt query for {} failed: {}'.format(tx_hash, r))
+                    continue
+                self.landed.append((tx_hash, r, self.pending_txs.pop(tx_hash),))
+                count += 1
+        if count > 0:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        logg.debug('receipt poll found {}, {} pending, next poll in {}s'.format(count, len(self.pending_txs), self.interval))
+        return count
+
+
+    def call(self, tx_hash, data=None):
+        """Identify the call made by a transaction.
+
+        :param tx_hash: Transaction hash
+        :type tx_hash: str
+        :param data: Transaction input data, in hex. If not set, the transaction is retrieved from the node
+        :type data: str
+        :rtype: tuple, or None
+        :returns: Call plan and decoded arguments, see eth_erc20.classify.CallClassifier.classify
+        """
+        if data == None:
+            try:
+                tx = self.conn.do(transaction(tx_hash, id_generator=self.id_generator))
+            except JSONRPCException as e:
+                logg.warning('could not retrieve transaction {}: {}'.format(tx_hash, e))
+                return None
+            if tx == None:
+                return None
+            data = tx.get('input') or tx.get('data') or ''
+        return self.classifier.classify(data)
+
+
+    def track(self, timeout=0, raise_on_revert=True):
+        """Poll until all added transactions have a receipt, yielding each receipt as it lands.
+
+        A reverted transaction raises eth_erc20.track.RevertError as soon as its receipt is found. Tracking of the other transactions can be resumed by calling this method again.
+
+        :param timeout: Seconds to wait at most, or 0 to wait indefinitely
+        :type timeout: float
+        :param raise_on_revert: If not set, receipts of reverted transactions are yielded like any other
+        :type raise_on_revert: bool
+        :raises eth_erc20.track.RevertError: Transaction reverted
+        :raises TimeoutError: Transactions are still pending after timeout
+        :rtype: generator
+        :returns: Transaction hash and receipt, as (str, dict) tuples, in order of confirmation
+        """
+        start = time.time()
+        while True:
+            while len(self.landed) > 0:
+                (tx_hash, r, data) = self.landed.popleft()
+                if raise_on_revert and receipt_status(r) == 0:
+                    raise RevertError(tx_hash, r, self.call(tx_hash, data=data))
+                yield (tx_hash, r,)
+            if len(self.pending_txs) == 0:
+                return
+            if timeout > 0 and time.time() - start > timeout:
+                raise TimeoutError('{} transactions still pending after {} seconds'.format(len(self.pending_txs), timeout))
+            if self.poll() == 0:
+                time.sleep(self.interval)
+
+
+def wait(conn, tx_hash, data=None, classifier=None, timeout=0, id_generator=None):
+    """Wait for the receipt of a single transaction.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param tx_hash: Transaction hash
+    :type tx_hash: str
+    :param data: Transaction input data, see eth_erc20.track.ReceiptTracker.add
+    :type data: str
+    :param classifier: Classifier for transaction input data
+    :type classifier: eth_erc20.classify.CallClassifier
+    :param timeout: Seconds to wait at most, or 0 to wait indefinitely
+    :type timeout: float
+    :raises eth_erc20.track.RevertError: Transaction reverted
+    :raises TimeoutError: Transaction is still pending after timeout
+    :rtype: dict
+    :returns: Transaction receipt
+    """
+    tracker = ReceiptTracker(conn, classifier=classifier, id_generator=id_generator)
+    tracker.add(tx_hash, data=data)
+    for (tx_hash, r) in tracker.track(timeout=timeout):
+        return r
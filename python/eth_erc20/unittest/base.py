@@ -3,6 +3,11 @@ import logging
 
 # external imports
 from chainlib.eth.unittest.ethtester import EthTesterCase
+from chainlib.eth.unittest.base import TestRPCConnection
+from chainlib.connection import (
+        RPCConnection,
+        ConnType,
+        )
 from chainlib.eth.nonce import RPCNonceOracle
 from chainlib.eth.gas import OverrideGasOracle
 from chainlib.eth.tx import (
@@ -18,6 +23,116 @@ logging.basicConfig(level=logging.DEBUG)
 logg = logging.getLogger(__name__)
 
 
+def add_log_methods(rpc, result_limit=0):
+    """Add eth_getLogs to an eth-tester connection, with log entries in the format returned by a node.
+
+    :param rpc: Test connection
+    :type rpc: chainlib.eth.unittest.base.TestRPCConnection
+    :param result_limit: If positive, fail queries returning more log entries than this, like a node does
+    :type result_limit: int
+    """
+    def eth_getLogs(p):
+        latest = rpc.backend.get_block_by_number('latest')['number']
+        from_block = int(p[0].get('fromBlock', '0x0'), 16)
+        to_block = min(int(p[0].get('toBlock', hex(latest)), 16), latest)
+        topics = p[0].get('topics')
+        if topics != None and len(topics) > 0 and isinstance(topics[0], list):
+            want = topics[0]
+            topics = None
+        else:
+            want = None
+        r = []
+        if from_block > to_block:
+            return r
+        for log in rpc.backend.get_logs(from_block=from_block, to_block=to_block, address=p[0].get('address'), topics=topics):
+            if want != None and log['topics'][0] not in want:
+                continue
+            r.append({
+                'address': log['address'],
+                'topics': list(log['topics']),
+                'data': log['data'],
+                'blockNumber': hex(log['block_number']),
+                'blockHash': log['block_hash'],
+                'transactionHash': log['transaction_hash'],
+                'transactionIndex': hex(log['transaction_index']),
+                'logIndex': hex(log['log_index']),
+                'removed': False,
+                })
+        if result_limit > 0 and len(r) > result_limit:
+            raise ValueError('query returned more than {} results'.format(result_limit))
+        return r
+    rpc.eth_getLogs = eth_getLogs
+
+
+class SnapshotTesterCase(EthTesterCase):
+    """Test case which sets up the test chain and its fixture contracts once per class, and reverts the chain to a snapshot of that state before each test.
+
+    Subclasses publish their fixtures in publish_fixture instead of setUp. Every instance attribute set up to and including publish_fixture is restored before each test, with lists and dicts shallow-copied. Each test gets a new RPC connection, with the eth_getLogs extension from eth_erc20.unittest.add_log_methods.
+
+    The snapshot covers the chain state only. Accounts created with new_account in a test remain known to the keystore and backend in later tests of the class, although their balance is reverted.
+
+    Subclasses overriding tearDownClass must call it on super, so the chain of the class is released.
+    """
+
+    fixture_state = None
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fixture_state = None
+        super(SnapshotTesterCase, cls).tearDownClass()
+
+
+    def publish_fixture(self):
+        """Publish contracts and set up chain state shared by all tests in the class.
+
+        Called once per class, after the test chain and connection are set up.
+        """
+        pass
+
+
+    def __connect(self):
+        rpc = TestRPCConnection(None, self.helper, self.signer)
+
+        def rpc_with_tester(chain_spec=self.chain_spec, url=None):
+            return rpc
+
+        RPCConnection.register_constructor(ConnType.CUSTOM, rpc_with_tester, tag='default')
+        RPCConnection.register_constructor(ConnType.CUSTOM, rpc_with_tester, tag='signer')
+        self.rpc = rpc
+        self.conn = RPCConnection.connect(self.chain_spec, 'default')
+        add_log_methods(self.rpc)
+
+
+    def setUp(self):
+        fixture = self.__class__.__dict__.get('fixture_state')
+        if fixture == None:
+            keys = set(self.__dict__.keys())
+            super(SnapshotTesterCase, self).setUp()
+            self.__connect()
+            self.publish_fixture()
+            state = {}
+            for k in self.__dict__.keys():
+                if k not in keys or k == 'accounts':
+                    v = self.__dict__[k]
+                    if isinstance(v, (list, dict,)):
+                        v = v.copy()
+                    state[k] = v
+            del state['rpc']
+            del state['conn']
+            snapshot = self.helper.take_snapshot()
+            self.__class__.fixture_state = (snapshot, state,)
+            logg.debug('took fixture snapshot {} for {}'.format(snapshot, self.__class__.__name__))
+            return
+
+        (snapshot, state) = fixture
+        for (k, v) in state.items():
+            if isinstance(v, (list, dict,)):
+                v = v.copy()
+            setattr(self, k, v)
+        self.helper.revert_to_snapshot(snapshot)
+        self.__connect()
+
+
 class TestInterface:
 
     def test_balance(self):
@@ -0,0 +1,109 @@
+# standard imports
+import json
+import logging
+import threading
+from http.server import (
+    ThreadingHTTPServer,
+    BaseHTTPRequestHandler,
+)
+
+# external imports
+from chainlib.jsonrpc import (
+    jsonrpc_response,
+    jsonrpc_error,
+)
+
+logg = logging.getLogger(__name__)
+
+
+def to_json(v):
+    # test connections may return raw bytes fields, e.g. in eth-tester receipts
+    if isinstance(v, bytes):
+        return '0x' + v.hex()
+    raise TypeError('{} is not JSON serializable'.format(type(v)))
+
+
+class RPCServer:
+    """Local JSON-RPC HTTP server answering requests through a test connection, e.g. the eth-tester connection of chainlib.eth.unittest.ethtester.EthTesterCase.
+
+    The server speaks HTTP/1.1 with keep-alive, accepts batch arrays, and serializes access to the backing connection. Counters for accepted connections and requests are kept, so tests can check how clients use the transport.
+
+    :param conn: Backing connection
+    :type conn: chainlib.connection.RPCConnection
+    :param host: Address to listen on
+    :type host: str
+    :param port: Port to listen on; 0 picks a free port
+    :type port: int
+    """
+
+    def __init__(self, conn, host='127.0.0.1', port=0):
+        self.conn = conn
+        self.lock = threading.Lock()
+        self.connection_count = 0
+        self.request_count = 0
+        self.batch_count = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super(Handler, self).setup()
+                with server.lock:
+                    server.connection_count += 1
+
+
+            def do_POST(self):
+                l = int(self.headers.get('Content-Length', 0))
+                o = json.loads(self.rfile.read(l))
+                if isinstance(o, list):
+                    with server.lock:
+                        server.batch_count += 1
+                    r = [server.process(v) for v in o]
+                else:
+                    r = server.process(o)
+                b = json.dumps(r, default=to_json).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(b)))
+                self.end_headers()
+                self.wfile.write(b)
+
+
+            def log_message(self, fmt, *args):
+                logg.debug('rpc server ' + fmt % args)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = 'http://{}:{}'.format(host, self.httpd.server_address[1])
+        self.thread = None
+
+
+    def process(self, o):
+        """Answer a single JSON-RPC request object.
+
+        :param o: JSON-RPC request object
+        :type o: dict
+        :rtype: dict
+        :returns: JSON-RPC response object
+        """
+        with self.lock:
+            self.request_count += 1
+            try:
+                r = self.conn.do(o)
+            except Exception as e:
+                return jsonrpc_error(o['id'], message=str(e))
+        return jsonrpc_response(o['id'], r)
+
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        logg.debug('rpc server listening on {}'.format(self.url))
+
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
@@ -0,0 +1,276 @@
+# standard imports
+import csv
+import logging
+from collections import namedtuple
+
+# external imports
+from chainlib.eth.nonce import (
+    RPCNonceOracle,
+    OverrideNonceOracle,
+)
+from chainlib.eth.tx import (
+    TxFormat,
+    raw,
+)
+from chainlib.eth.address import to_checksum_address
+from chainlib.hash import keccak256
+from hexathon import (
+    add_0x,
+    strip_0x,
+)
+
+# local imports
+from giftable_erc20_token import GiftableToken
+from static_token import StaticToken
+from eth_erc20.classify import CallClassifier
+from eth_erc20.track import (
+    ReceiptTracker,
+    RevertError,
+    receipt_status,
+)
+from eth_erc20.sign import sign_batch
+from eth_erc20.batch import (
+    chunks,
+    do_batch,
+)
+
+logg = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 100
+
+GIFTABLE = 'giftable'
+STATIC = 'static'
+TOKEN_TYPES = (GIFTABLE, STATIC,)
+
+# constructor execution gas, on top of intrinsic, input data and code deposit cost
+DEPLOY_EXECUTION_GAS = 200000
+# gas limit for the mint of initial supply
+MINT_GAS = 100000
+
+TokenSpec = namedtuple('TokenSpec', ['name', 'symbol', 'decimals', 'expire', 'supply', 'token_type'])
+
+
+def contract_address(sender_address, nonce):
+    """Address of the contract created by a deployment transaction, derived from the sender address and nonce.
+
+    :param sender_address: Sender address
+    :type sender_address: str
+    :param nonce: Nonce of deployment transaction
+    :type nonce: int
+    :rtype: str
+    :returns: Checksummed contract address, with 0x prefix
+    """
+    # rlp encoding of [sender, nonce], always shorter than 56 bytes
+    b = b'\x94' + bytes.fromhex(strip_0x(sender_address))
+    if nonce == 0:
+        b += b'\x80'
+    elif nonce < 0x80:
+        b += bytes([nonce])
+    else:
+        n = nonce.to_bytes((nonce.bit_length() + 7) // 8, 'big')
+        b += bytes([0x80 + len(n)]) + n
+    b = bytes([0xc0 + len(b)]) + b
+    return add_0x(to_checksum_address(keccak256(b)[12:].hex()))
+
+
+def deploy_gas(data):
+    """Gas limit covering a contract deployment with the given input data.
+
+    Input data is priced at pre-Istanbul rates, and the code deposit cost is counted for the whole input instead of only the deployed code, so the result is an upper bound on any fork.
+
+    :param data: Contract bytecode with constructor arguments, in hex
+    :type data: str
+    :rtype: int
+    :returns: Gas limit
+    """
+    b = bytes.fromhex(strip_0x(data))
+    zero = b.count(0)
+    return 53000 + (zero * 4) + ((len(b) - zero) * 68) + (len(b) * 200) + DEPLOY_EXECUTION_GAS
+
+
+def read_specs(f):
+    """Read token specifications from CSV with name, symbol, decimals, expire, supply and token type columns.
+
+    Only name and symbol are required. Decimals defaults to 18, expire and supply to 0, and token type to giftable. For giftable tokens, a non-zero supply is minted to the deployer after publishing. A first line with non-numeric decimals is treated as a header and skipped.
+
+    :param f: CSV input
+    :type f: file
+    :raises ValueError: Invalid or missing value
+    :rtype: generator
+    :returns: Token specifications
+    """
+    first = True
+    for row in csv.reader(f):
+        row = [v.strip() for v in row]
+        if len(row) == 0 or row[0] == '' or row[0][0] == '#':
+            continue
+        if first:
+            first = False
+            if len(row) > 2 and row[2] != '' and not row[2].isdigit():
+                logg.debug('skipping csv header {}'.format(row))
+                continue
+        if len(row) < 2 or row[1] == '':
+            raise ValueError('missing symbol for token {}'.format(row[0]))
+        row += [''] * (6 - len(row))
+        token_type = row[5] or GIFTABLE
+        if token_type not in TOKEN_TYPES:
+            raise ValueError('unknown token type {} for token {}'.format(token_type, row[0]))
+        expire = int(row[3] or 0)
+        if token_type == STATIC and expire != 0:
+            raise ValueError('static token {} cannot expire'.format(row[0]))
+        yield TokenSpec(row[0], row[1], int(row[2] or 18), expire, int(row[4] or 0), token_type)
+
+
+class BatchDeployer:
+    """Publishes many GiftableToken and StaticToken contracts from one sender.
+
+    Nonces are allocated locally in sequence, so every contract address is known before anything is sent. All deployments, and the mint of initial supply for giftable tokens, are signed up front, and then submitted in windows of JSON-RPC batches without waiting for receipts. The contract bytecode is read once per token type, and only the constructor arguments differ between deployments.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param chain_spec: Chain spec
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param sender_address: Deployer address
+    :type sender_address: str
+    :param signer: Transaction signer
+    :type signer: funga.signer.Signer
+    :param gas_oracle: Gas oracle. Should not query the network, since it is called once for every transaction. Deployments get the limit from the oracle or from giftable_erc20_token.deploy.deploy_gas, whichever is higher
+    :type gas_oracle: chainlib.eth.gas.GasOracle
+    :param mint_gas: Gas limit for the mint of initial supply of giftable tokens
+    :type mint_gas: int
+    :param window: Number of transactions submitted in each JSON-RPC batch
+    :type window: int
+    :param processes: Number of signing processes, see eth_erc20.sign.sign_batch
+    :type processes: int
+    """
+
+    def __init__(self, conn, chain_spec, sender_address, signer=None, gas_oracle=None, mint_gas=MINT_GAS, window=DEFAULT_WINDOW, processes=None, id_generator=None):
+        self.conn = conn
+        self.chain_spec = chain_spec
+        self.sender_address = sender_address
+        self.signer = signer
+        self.gas_oracle = gas_oracle
+        self.mint_gas = mint_gas
+        self.window = window
+        self.processes = processes
+        self.id_generator = id_generator
+        self.deployments = []
+        self.txs = []
+
+
+    def sign(self, specs, nonce=None):
+        """Build and sign the transactions for the given tokens.
+
+        :param specs: Token specifications
+        :type specs: iterable of giftable_erc20_token.deploy.TokenSpec
+        :param nonce: Nonce of the first transaction. If not set, the nonce from the network is used
+        :type nonce: int
+        :rtype: list
+        :returns: Deployment records, in spec order, see giftable_erc20_token.deploy.BatchDeployer.manifest
+        """
+        if nonce == None:
+            nonce = RPCNonceOracle(self.sender_address, conn=self.conn, id_generator=self.id_generator).get_nonce()
+        nonce_oracle = OverrideNonceOracle(self.sender_address, nonce)
+        giftable = GiftableToken(self.chain_spec, gas_oracle=self.gas_oracle, nonce_oracle=nonce_oracle)
+        static = StaticToken(self.chain_spec, gas_oracle=self.gas_oracle, nonce_oracle=nonce_oracle)
+        templates = []
+        deployments = []
+        for spec in specs:
+            tx_nonce = nonce_oracle.nonce
+            o = spec._asdict()
+            o['address'] = contract_address(self.sender_address, tx_nonce)
+            o['nonce'] = tx_nonce
+            if spec.token_type == STATIC:
+                tx = static.constructor(self.sender_address, spec.name, spec.symbol, spec.decimals, spec.supply, tx_format=TxFormat.DICT)
+            else:
+                tx = giftable.constructor(self.sender_address, spec.name, spec.symbol, spec.decimals, expire=spec.expire, tx_format=TxFormat.DICT)
+            tx['gas'] = max(tx['gas'], deploy_gas(tx['data']))
+            templates.append(tx)
+            if spec.token_type == GIFTABLE and spec.supply > 0:
+                tx = giftable.mint_to(o['address'], self.sender_address, self.sender_address, spec.supply, tx_format=TxFormat.DICT)
+                tx['gas'] = self.mint_gas
+                templates.append(tx)
+                o['mint_nonce'] = tx_nonce + 1
+            deployments.append(o)
+
+        signed = sign_batch(self.signer, templates, processes=self.processes)
+        cursor = 0
+        for o in deployments:
+            o['hash'] = signed[cursor][0]
+            self.txs.append((signed[cursor][0], signed[cursor][1], None,))
+            cursor += 1
+            if o.get('mint_nonce') != None:
+                o['mint_hash'] = signed[cursor][0]
+                self.txs.append((signed[cursor][0], signed[cursor][1], strip_0x(templates[cursor]['data']),))
+                cursor += 1
+        self.deployments += deployments
+        logg.info('signed {} deployments in {} transactions from nonce {}'.format(len(deployments), len(templates), nonce))
+        return deployments
+
+
+    def send(self):
+        """Submit all signed transactions, in windows.
+
+        Errors for individual transactions are logged, and left for giftable_erc20_token.deploy.BatchDeployer.wait to settle.
+
+        :rtype: int
+        :returns: Number of transactions submitted
+        """
+        count = 0
+        for window in chunks(self.txs, batch_size=self.window):
+            o = [raw(add_0x(tx_raw), id_generator=self.id_generator) for (tx_hash, tx_raw, data) in window]
+            r = do_batch(self.conn, o, tolerate_errors=True)
+            for ((tx_hash, tx_raw, data), v) in zip(window, r):
+                if isinstance(v, Exception):
+                    logg.warning('submit tx {} failed: {}'.format(tx_hash, v))
+            count += len(window)
+            logg.debug('submitted window of {} transactions'.format(len(window)))
+        return count
+
+
+    def wait(self, timeout=0):
+        """Wait for receipts of all submitted transactions, and record their status in the deployment records.
+
+        Waiting continues past reverted transactions, so the status of every deployment is known before a revert is raised.
+
+        :param timeout: Seconds to wait at most, or 0 to wait indefinitely
+        :type timeout: float
+        :raises eth_erc20.track.RevertError: Transaction reverted; the first one submitted is reported
+        :raises ValueError: Contract was published at a different address than precomputed
+        :raises TimeoutError: Transactions are still pending after timeout
+        """
+        tracker = ReceiptTracker(self.conn, classifier=CallClassifier(GiftableToken.call_plans()), batch_size=self.window, id_generator=self.id_generator)
+        data = {}
+        for (tx_hash, tx_raw, tx_data) in self.txs:
+            tracker.add(tx_hash, data=tx_data)
+            data[add_0x(strip_0x(tx_hash).lower())] = tx_data
+        receipts = {}
+        for (tx_hash, r) in tracker.track(timeout=timeout, raise_on_revert=False):
+            receipts[add_0x(strip_0x(tx_hash).lower())] = r
+
+        reverted = None
+        for o in self.deployments:
+            for (k, status_key) in [('hash', 'status',), ('mint_hash', 'mint_status',)]:
+                tx_hash = o.get(k)
+                if tx_hash == None:
+                    continue
+                tx_hash = add_0x(strip_0x(tx_hash).lower())
+                r = receipts[tx_hash]
+                o[status_key] = receipt_status(r)
+                if o[status_key] == 0 and reverted == None:
+                    reverted = (tx_hash, r,)
+            address = receipts[add_0x(strip_0x(o['hash']).lower())]
+            address = address.get('contractAddress', address.get('contract_address'))
+            if address != None and strip_0x(address).lower() != strip_0x(o['address']).lower():
+                raise ValueError('token {} published at {}, expected {}'.format(o['symbol'], address, o['address']))
+        if reverted != None:
+            raise RevertError(reverted[0], reverted[1], tracker.call(reverted[0], data=data[reverted[0]]))
+
+
+    def manifest(self):
+        """Deployment records of all signed tokens.
+
+        :rtype: list
+        :returns: Token specification fields, with contract address, nonce and transaction hash of each deployment, and nonce and transaction hash of the supply mint for giftable tokens with supply. After giftable_erc20_token.deploy.BatchDeployer.wait, the receipt status of the deployment and mint are included as status and mint_status
+        """
+        return list(self.deployments)
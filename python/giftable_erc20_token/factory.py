@@ -1,24 +1,23 @@
 # standard imports
 import os
+import json
 import logging
 
 # external imports
-from chainlib.eth.tx import (
-        TxFactory,
-        TxFormat,
-        )
-from chainlib.hash import keccak256_string_to_hex
+from chainlib.eth.tx import TxFormat
 from chainlib.eth.contract import (
         ABIContractEncoder,
         ABIContractType,
+        abi_decode_single,
         )
 from chainlib.eth.constant import ZERO_ADDRESS
-from chainlib.jsonrpc import JSONRPCRequest
-from hexathon import add_0x
+from chainlib.block import BlockSpec
 
 # local imports
 from giftable_erc20_token.data import data_dir
 from eth_erc20 import ERC20
+from eth_erc20.plan import CallPlan
+from eth_erc20.event import EventPlan
 
 logg = logging.getLogger(__name__)
 
@@ -75,83 +74,85 @@ class GiftableToken(ERC20):
 
 
     def add_minter(self, contract_address, sender_address, address, tx_format=TxFormat.JSONRPC):
-        enc = ABIContractEncoder()
-        enc.method('addMinter')
-        enc.typ(ABIContractType.ADDRESS)
-        enc.address(address)
-        data = enc.get()
-        tx = self.template(sender_address, contract_address, use_nonce=True)
-        tx = self.set_code(tx, data)
-        tx = self.finalize(tx, tx_format)
-        return tx
+        plan = CallPlan.get('addMinter', ABIContractType.ADDRESS)
+        data = plan.encode(address)
+        return self.transact_data(contract_address, sender_address, data, tx_format=tx_format)
 
 
     def remove_minter(self, contract_address, sender_address, address, tx_format=TxFormat.JSONRPC):
-        enc = ABIContractEncoder()
-        enc.method('removeMinter')
-        enc.typ(ABIContractType.ADDRESS)
-        enc.address(address)
-        data = enc.get()
-        tx = self.template(sender_address, contract_address, use_nonce=True)
-        tx = self.set_code(tx, data)
-        tx = self.finalize(tx, tx_format)
-        return tx
+        plan = CallPlan.get('removeMinter', ABIContractType.ADDRESS)
+        data = plan.encode(address)
+        return self.transact_data(contract_address, sender_address, data, tx_format=tx_format)
 
 
     def mint_to(self, contract_address, sender_address, address, value, tx_format=TxFormat.JSONRPC):
-        enc = ABIContractEncoder()
-        enc.method('mintTo')
-        enc.typ(ABIContractType.ADDRESS)
-        enc.typ(ABIContractType.UINT256)
-        enc.address(address)
-        enc.uint256(value)
-        data = enc.get()
-        tx = self.template(sender_address, contract_address, use_nonce=True)
-        tx = self.set_code(tx, data)
-        tx = self.finalize(tx, tx_format)
-        return tx
+        plan = CallPlan.get('mintTo', ABIContractType.ADDRESS, ABIContractType.UINT256)
+        data = plan.encode(address, value)
+        return self.transact_data(contract_address, sender_address, data, tx_format=tx_format)
 
 
     def burn(self, contract_address, sender_address, value, tx_format=TxFormat.JSONRPC):
-        enc = ABIContractEncoder()
-        enc.method('burn')
-        enc.typ(ABIContractType.UINT256)
-        enc.uint256(value)
-        data = enc.get()
-        tx = self.template(sender_address, contract_address, use_nonce=True)
-        tx = self.set_code(tx, data)
-        tx = self.finalize(tx, tx_format)
-        return tx
-
-
-    def burned(self, contract_address, sender_address=ZERO_ADDRESS, id_generator=None):
-        j = JSONRPCRequest(id_generator)
-        o = j.template()
-        o['method'] = 'eth_call'
-        enc = ABIContractEncoder()
-        enc.method('totalBurned')
-        data = add_0x(enc.get())
-        tx = self.template(sender_address, contract_address)
-        tx = self.set_code(tx, data)
-        o['params'].append(self.normalize(tx))
-        o['params'].append('latest')
-        o = j.finalize(o)
-        return o
-
-
-    def total_minted(self, contract_address, sender_address=ZERO_ADDRESS, id_generator=None):
-        j = JSONRPCRequest(id_generator)
-        o = j.template()
-        o['method'] = 'eth_call'
-        enc = ABIContractEncoder()
-        enc.method('totalMinted')
-        data = add_0x(enc.get())
-        tx = self.template(sender_address, contract_address)
-        tx = self.set_code(tx, data)
-        o['params'].append(self.normalize(tx))
-        o['params'].append('latest')
-        o = j.finalize(o)
-        return o
+        plan = CallPlan.get('burn', ABIContractType.UINT256)
+        data = plan.encode(value)
+        return self.transact_data(contract_address, sender_address, data, tx_format=tx_format)
+
+
+    @classmethod
+    def call_plans(self):
+        r = super(GiftableToken, self).call_plans()
+        r += [
+            CallPlan.get('mintTo', ABIContractType.ADDRESS, ABIContractType.UINT256),
+            CallPlan.get('mint', ABIContractType.ADDRESS, ABIContractType.UINT256, ABIContractType.BYTES),
+            CallPlan.get('burn', ABIContractType.UINT256),
+            CallPlan.get('burn'),
+            CallPlan.get('burn', ABIContractType.ADDRESS, ABIContractType.UINT256, ABIContractType.BYTES),
+            CallPlan.get('addWriter', ABIContractType.ADDRESS),
+            CallPlan.get('deleteWriter', ABIContractType.ADDRESS),
+            CallPlan.get('isWriter', ABIContractType.ADDRESS),
+            CallPlan.get('addMinter', ABIContractType.ADDRESS),
+            CallPlan.get('removeMinter', ABIContractType.ADDRESS),
+            CallPlan.get('transferOwnership', ABIContractType.ADDRESS),
+            CallPlan.get('applyExpiry'),
+            CallPlan.get('totalMinted'),
+            CallPlan.get('totalBurned'),
+            CallPlan.get('expires'),
+            CallPlan.get('owner'),
+                ]
+        return r
+
+
+    @classmethod
+    def event_plans(self):
+        r = super(GiftableToken, self).event_plans()
+        r += [
+            EventPlan.get('TransferFrom', ('sender', ABIContractType.ADDRESS, True), ('recipient', ABIContractType.ADDRESS, True), ('spender', ABIContractType.ADDRESS, True), ('value', ABIContractType.UINT256, False)),
+            EventPlan.get('Mint', ('minter', ABIContractType.ADDRESS, True), ('beneficiary', ABIContractType.ADDRESS, True), ('value', ABIContractType.UINT256, False)),
+            EventPlan.get('Burn', ('value', ABIContractType.UINT256, False)),
+            EventPlan.get('Expired', ('timestamp', ABIContractType.UINT256, False)),
+            EventPlan.get('WriterAdded', ('writer', ABIContractType.ADDRESS, False)),
+            EventPlan.get('WriterRemoved', ('writer', ABIContractType.ADDRESS, False)),
+                ]
+        return r
+
+
+    def burned(self, contract_address, sender_address=ZERO_ADDRESS, id_generator=None, height=BlockSpec.LATEST):
+        plan = CallPlan.get('totalBurned')
+        return self.call_plan(plan, contract_address, sender_address=sender_address, height=height, id_generator=id_generator)
+
+
+    def total_minted(self, contract_address, sender_address=ZERO_ADDRESS, id_generator=None, height=BlockSpec.LATEST):
+        plan = CallPlan.get('totalMinted')
+        return self.call_plan(plan, contract_address, sender_address=sender_address, height=height, id_generator=id_generator)
+
+
+    @classmethod
+    def parse_burned(self, v):
+        return abi_decode_single(ABIContractType.UINT256, v)
+
+
+    @classmethod
+    def parse_total_minted(self, v):
+        return abi_decode_single(ABIContractType.UINT256, v)
 
 
 def bytecode(**kwargs):
@@ -0,0 +1,454 @@
+# standard imports
+import os
+import json
+import time
+import heapq
+import logging
+import threading
+import socketserver
+from collections import deque
+
+# external imports
+from chainlib.eth.nonce import (
+    RPCNonceOracle,
+    OverrideNonceOracle,
+)
+from chainlib.eth.tx import (
+    TxFormat,
+    raw,
+    receipt,
+)
+from chainlib.eth.address import to_checksum_address
+from hexathon import (
+    add_0x,
+    strip_0x,
+)
+
+# local imports
+from giftable_erc20_token import GiftableToken
+from eth_erc20.batch import (
+    chunks,
+    do_batch,
+)
+
+logg = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 100
+DEFAULT_MAX_PENDING = 1000
+DEFAULT_QUEUE_SIZE = 100000
+DEFAULT_RATE_LIMIT = 3600
+DEFAULT_POLL_INTERVAL = 1.0
+# number of most recent gifts latency percentiles are computed over
+LATENCY_SAMPLES = 1000
+
+QUEUED = 'queued'
+DUPLICATE = 'duplicate'
+RATE_LIMITED = 'rate_limited'
+QUEUE_FULL = 'queue_full'
+
+
+def percentile(v, p):
+    if len(v) == 0:
+        return None
+    v = sorted(v)
+    return v[min(len(v) - 1, int(len(v) * p))]
+
+
+class Faucet:
+    """Mints tokens to recipients requested by clients, as a pipelined stream of mint_to transactions.
+
+    Requests are queued, and a recipient is rejected while it has a gift queued or waiting for receipt, and for rate_limit seconds after its last accepted request.
+
+    Each step of the pipeline polls receipts of submitted transactions in batches, then signs and submits up to window queued gifts in a single JSON-RPC batch, as long as fewer than max_pending transactions are without receipt. Nonces are allocated locally. When the node rejects a transaction, the nonce is checked against the network; if it is still unused it is reused for the next gift, so that later transactions are not stuck behind the gap.
+
+    The queue is only kept in memory.
+
+    :param conn: RPC connection
+    :type conn: chainlib.connection.RPCConnection
+    :param chain_spec: Chain spec
+    :type chain_spec: chainlib.chain.ChainSpec
+    :param token_address: Token contract address
+    :type token_address: str
+    :param minter_address: Minter address
+    :type minter_address: str
+    :param value: Token value minted for each gift
+    :type value: int
+    :param signer: Transaction signer
+    :type signer: funga.signer.Signer
+    :param gas_oracle: Gas oracle. Should not query the network, since it is called once for every gift
+    :type gas_oracle: chainlib.eth.gas.GasOracle
+    :param nonce: Nonce of the first transaction. If not set, the nonce is retrieved from the network on the first step
+    :type nonce: int
+    :param window: Maximum number of transactions submitted in each step
+    :type window: int
+    :param max_pending: Maximum number of submitted transactions without receipt
+    :type max_pending: int
+    :param rate_limit: Seconds before the same recipient may request again
+    :type rate_limit: float
+    :param queue_size: Maximum number of queued requests
+    :type queue_size: int
+    """
+
+    def __init__(self, conn, chain_spec, token_address, minter_address, value, signer=None, gas_oracle=None, nonce=None, window=DEFAULT_WINDOW, max_pending=DEFAULT_MAX_PENDING, rate_limit=DEFAULT_RATE_LIMIT, queue_size=DEFAULT_QUEUE_SIZE, id_generator=None):
+        self.conn = conn
+        self.token_address = token_address
+        self.minter_address = minter_address
+        self.value = value
+        self.nonce = nonce
+        self.window = window
+        self.max_pending = max(max_pending, window)
+        self.rate_limit = rate_limit
+        self.queue_size = queue_size
+        self.id_generator = id_generator
+        self.nonce_oracle = OverrideNonceOracle(minter_address, 0)
+        self.factory = GiftableToken(chain_spec, signer=signer, gas_oracle=gas_oracle, nonce_oracle=self.nonce_oracle)
+
+        self.lock = threading.Lock()
+        self.queue = deque()
+        self.active = set()
+        self.last_request = {}
+        self.pending_gifts = {}
+        self.free_nonces = []
+
+        self.start_time = time.time()
+        self.counts = {
+            QUEUED: 0,
+            DUPLICATE: 0,
+            RATE_LIMITED: 0,
+            QUEUE_FULL: 0,
+            'submitted': 0,
+            'minted': 0,
+            'failed': 0,
+                }
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+        self.thread = None
+
+
+    def request(self, recipient):
+        """Queue a gift to a recipient.
+
+        :param recipient: Recipient address
+        :type recipient: str
+        :raises ValueError: Invalid recipient address
+        :rtype: tuple
+        :returns: Request status, one of QUEUED, DUPLICATE, RATE_LIMITED or QUEUE_FULL, and seconds until the recipient may request again
+        """
+        recipient = to_checksum_address(strip_0x(recipient))
+        now = time.time()
+        with self.lock:
+            if recipient in self.active:
+                status = DUPLICATE
+            elif now - self.last_request.get(recipient, -self.rate_limit) < self.rate_limit:
+                status = RATE_LIMITED
+            elif len(self.queue) >= self.queue_size:
+                status = QUEUE_FULL
+            else:
+                status = QUEUED
+                self.queue.append((recipient, now,))
+                self.active.add(recipient)
+                self.last_request[recipient] = now
+            self.counts[status] += 1
+            retry_after = max(0, self.last_request.get(recipient, now) + self.rate_limit - now)
+        if status == QUEUED:
+            self.wake_event.set()
+        logg.debug('faucet request for {}: {}'.format(recipient, status))
+        return (status, retry_after,)
+
+
+    def __next_nonce(self):
+        if len(self.free_nonces) > 0:
+            return heapq.heappop(self.free_nonces)
+        n = self.nonce
+        self.nonce += 1
+        return n
+
+
+    def __sync_nonce(self):
+        # nonces below the network nonce were used by other transactions, and cannot be reused
+        nonce = RPCNonceOracle(self.minter_address, conn=self.conn, id_generator=self.id_generator).get_nonce()
+        self.free_nonces = [n for n in self.free_nonces if n >= nonce]
+        heapq.heapify(self.free_nonces)
+        if nonce > self.nonce:
+            logg.info('faucet nonce moved from {} to {} by network'.format(self.nonce, nonce))
+            self.nonce = nonce
+
+
+    def __finish(self, gift, status):
+        with self.lock:
+            self.active.discard(gift['recipient'])
+            if status == 1:
+                self.counts['minted'] += 1
+                self.latencies.append(time.time() - gift['requested'])
+            else:
+                self.counts['failed'] += 1
+                # let the recipient try again straight away
+                self.last_request.pop(gift['recipient'], None)
+
+
+    def confirm(self):
+        """Poll receipts of submitted transactions once, in batches.
+
+        :rtype: list
+        :returns: Confirmed gifts, as dicts with recipient, nonce, hash and receipt status
+        """
+        r = []
+        for chunk in chunks(list(self.pending_gifts.values()), batch_size=self.window):
+            o = [receipt(gift['hash'], id_generator=self.id_generator) for gift in chunk]
+            for (gift, v) in zip(chunk, do_batch(self.conn, o, tolerate_errors=True)):
+                if v == None or isinstance(v, Exception):
+                    continue
+                status = v['status']
+                if isinstance(status, str):
+                    status = int(status, 16)
+                gift['status'] = status
+                del self.pending_gifts[gift['hash']]
+                if status == 0:
+                    logg.warning('mint to {} tx {} reverted'.format(gift['recipient'], gift['hash']))
+                self.__finish(gift, status)
+                r.append(gift)
+        return r
+
+
+    def submit(self):
+        """Sign and submit queued gifts, as many as the window and the pending limit allow.
+
+        If the submission fails as a whole, the gifts are queued again and their nonces are reused.
+
+        :raises Exception: Submission failed as a whole, e.g. because the node could not be reached
+        :rtype: list
+        :returns: Submitted gifts, as dicts with recipient, nonce and hash
+        """
+        if self.nonce == None:
+            self.nonce = RPCNonceOracle(self.minter_address, conn=self.conn, id_generator=self.id_generator).get_nonce()
+            logg.info('faucet starting at nonce {}'.format(self.nonce))
+        gifts = []
+        o = []
+        with self.lock:
+            count = min(self.window, self.max_pending - len(self.pending_gifts), len(self.queue))
+            requests = [self.queue.popleft() for i in range(max(count, 0))]
+        for (recipient, requested) in requests:
+            nonce = self.__next_nonce()
+            self.nonce_oracle.nonce = nonce
+            (tx_hash, tx_raw) = self.factory.mint_to(self.token_address, self.minter_address, recipient, self.value, tx_format=TxFormat.RLP_SIGNED)
+            gifts.append({
+                'recipient': recipient,
+                'requested': requested,
+                'nonce': nonce,
+                'hash': tx_hash,
+                    })
+            o.append(raw(add_0x(tx_raw), id_generator=self.id_generator))
+
+        try:
+            results = do_batch(self.conn, o, tolerate_errors=True)
+        except Exception:
+            # node could not be reached; return the requests to the queue, and release their nonces
+            with self.lock:
+                for gift in reversed(gifts):
+                    heapq.heappush(self.free_nonces, gift['nonce'])
+                    self.queue.appendleft((gift['recipient'], gift['requested'],))
+            try:
+                self.__sync_nonce()
+            except Exception as e:
+                logg.debug('faucet nonce sync failed: {}'.format(e))
+            raise
+
+        r = []
+        failed = False
+        for (gift, v) in zip(gifts, results):
+            if isinstance(v, Exception):
+                logg.warning('submit mint to {} nonce {} failed: {}'.format(gift['recipient'], gift['nonce'], v))
+                heapq.heappush(self.free_nonces, gift['nonce'])
+                self.__finish(gift, 0)
+                failed = True
+                continue
+            self.pending_gifts[gift['hash']] = gift
+            r.append(gift)
+        if failed:
+            self.__sync_nonce()
+        with self.lock:
+            self.counts['submitted'] += len(r)
+        return r
+
+
+    def step(self):
+        """Run one pipeline step; poll receipts, then submit queued gifts.
+
+        :rtype: tuple
+        :returns: Number of gifts confirmed and submitted
+        """
+        confirmed = self.confirm()
+        submitted = self.submit()
+        return (len(confirmed), len(submitted),)
+
+
+    def run(self, interval=DEFAULT_POLL_INTERVAL):
+        """Run pipeline steps until stopped. When a step does nothing, the next one runs after interval seconds, or as soon as a new request is queued.
+
+        :param interval: Seconds to wait between idle steps
+        :type interval: float
+        """
+        while not self.stop_event.is_set():
+            self.wake_event.clear()
+            try:
+                (confirmed, submitted) = self.step()
+            except Exception as e:
+                logg.error('faucet step failed: {}'.format(e))
+                confirmed = 0
+                submitted = 0
+            if confirmed == 0 and submitted == 0:
+                self.wake_event.wait(interval)
+
+
+    def start(self, interval=DEFAULT_POLL_INTERVAL):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, args=(interval,), daemon=True)
+        self.thread.start()
+
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+        self.thread.join()
+
+
+    def stats(self):
+        """Faucet metrics.
+
+        Latencies are seconds from request to receipt, over the most recent minted gifts. Throughput is minted gifts per second since the faucet was created.
+
+        :rtype: dict
+        :returns: Metric values, keyed by name
+        """
+        with self.lock:
+            r = dict(self.counts)
+            r['queue_depth'] = len(self.queue)
+            r['pending'] = len(self.pending_gifts)
+            r['nonce'] = self.nonce
+            latencies = list(self.latencies)
+        uptime = time.time() - self.start_time
+        r['uptime'] = uptime
+        r['throughput'] = r['minted'] / uptime
+        r['latency_p50'] = percentile(latencies, 0.5)
+        r['latency_p95'] = percentile(latencies, 0.95)
+        r['latency_max'] = None
+        if len(latencies) > 0:
+            r['latency_max'] = max(latencies)
+        return r
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+
+    daemon_threads = True
+
+    def get_request(self):
+        (request, client_address) = super(ThreadingUnixHTTPServer, self).get_request()
+        # http.server handlers expect an (address, port) client address
+        return (request, ('local', 0,),)
+
+
+class FaucetServer:
+    """HTTP front end for a faucet, on a TCP address or a unix socket.
+
+    POST /mint with a JSON object body {"recipient": <address>} queues a gift, and answers with the request status; 202 if queued, 409 if the recipient already has a gift in progress, 429 with a Retry-After header if rate limited, 503 if the queue is full, and 400 for an invalid request. GET /stats answers with the faucet metrics as a JSON object.
+
+    :param faucet: Faucet
+    :type faucet: giftable_erc20_token.faucet.Faucet
+    :param address: Address to listen on, as (host, port) tuple, or path to unix socket. Port 0 picks a free port. A socket left at the path by a stopped process is replaced
+    :type address: tuple or str
+    :raises ValueError: Path exists and is not a socket
+    :raises OSError: Another process is listening on the socket
+    """
+
+    http_status = {
+        QUEUED: 202,
+        DUPLICATE: 409,
+        RATE_LIMITED: 429,
+        QUEUE_FULL: 503,
+            }
+
+    def __init__(self, faucet, address):
+        # http.server is only needed in faucet mode, and is slow to import
+        from http.server import (
+            ThreadingHTTPServer,
+            BaseHTTPRequestHandler,
+        )
+        self.faucet = faucet
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+
+            def respond(self, code, o, headers={}):
+                b = json.dumps(o).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(b)))
+                for k in headers.keys():
+                    self.send_header(k, headers[k])
+                self.end_headers()
+                self.wfile.write(b)
+
+
+            def do_GET(self):
+                if self.path != '/stats':
+                    self.respond(404, {'error': 'not found'})
+                    return
+                self.respond(200, server.faucet.stats())
+
+
+            def do_POST(self):
+                l = int(self.headers.get('Content-Length', 0))
+                b = self.rfile.read(l)
+                if self.path != '/mint':
+                    self.respond(404, {'error': 'not found'})
+                    return
+                try:
+                    recipient = json.loads(b)['recipient']
+                    (status, retry_after) = server.faucet.request(recipient)
+                except (ValueError, KeyError, TypeError) as e:
+                    self.respond(400, {'error': 'invalid request: {}'.format(e)})
+                    return
+                headers = {}
+                if status == RATE_LIMITED:
+                    headers['Retry-After'] = str(int(retry_after) + 1)
+                self.respond(server.http_status[status], {'status': status, 'recipient': add_0x(to_checksum_address(strip_0x(recipient)))}, headers=headers)
+
+
+            def log_message(self, fmt, *args):
+                logg.debug('faucet server ' + fmt % args)
+
+        if isinstance(address, str):
+            if os.path.exists(address):
+                from eth_erc20.daemon import remove_stale_socket
+                remove_stale_socket(address)
+            self.httpd = ThreadingUnixHTTPServer(address, Handler)
+            self.address = address
+        else:
+            self.httpd = ThreadingHTTPServer(address, Handler)
+            self.httpd.daemon_threads = True
+            self.address = self.httpd.server_address
+        self.thread = None
+
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        logg.info('faucet server listening on {}'.format(self.address))
+
+
+    def serve_forever(self):
+        logg.info('faucet server listening on {}'.format(self.address))
+        self.httpd.serve_forever()
+
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread != None:
+            self.thread.join()
+        if isinstance(self.address, str):
+            os.unlink(self.address)
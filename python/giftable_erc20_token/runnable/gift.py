@@ -9,22 +9,10 @@
 
 # standard imports
 import sys
-import os
-import json
-import argparse
 import logging
-import time
 
 # external imports
 import chainlib.eth.cli
-from chainlib.eth.tx import receipt
-from chainlib.chain import ChainSpec
-from chainlib.eth.connection import EthHTTPConnection
-from chainlib.eth.address import to_checksum_address
-from hexathon import (
-        strip_0x,
-        add_0x,
-        )
 from chainlib.settings import ChainSettings
 from chainlib.eth.cli.log import process_log
 from chainlib.eth.settings import process_settings
@@ -40,43 +28,141 @@ from chainlib.eth.cli.config import (
 
 # local imports
 from giftable_erc20_token import GiftableToken
+from eth_erc20.metrics import process_metrics
 
 logg = logging.getLogger()
 
+# seconds between metrics file updates
+METRICS_INTERVAL = 15
+
 
 def process_config_local(config, arg, args, flags):
     config.add(config.get('_POSARG'), '_VALUE', False)
+    config.add(args.listen, '_LISTEN', False)
+    config.add(args.window, '_WINDOW', False)
+    config.add(args.max_pending, '_MAX_PENDING', False)
+    config.add(args.rate_limit, '_RATE_LIMIT', False)
+    config.add(args.queue_size, '_QUEUE_SIZE', False)
+    config.add(args.human, '_HUMAN', False)
+    config.add(args.metrics, '_METRICS', False)
     return config
 
 
-arg_flags = ArgFlag()
-arg = Arg(arg_flags)
-flags = arg_flags.STD_WRITE | arg_flags.WALLET | arg_flags.EXEC
-
-argparser = chainlib.eth.cli.ArgumentParser()
-argparser = process_args(argparser, arg, flags)
-argparser.add_argument('value', type=str, help='Token value to send')
-args = argparser.parse_args()
-
-logg = process_log(args, logg)
-
-config = Config()
-config = process_config(config, arg, args, flags, positional_name='value')
-config = process_config_local(config, arg, args, flags)
-logg.debug('config loaded:\n{}'.format(config))
+def process_cli():
+    arg_flags = ArgFlag()
+    arg = Arg(arg_flags)
+    flags = arg_flags.STD_WRITE | arg_flags.WALLET | arg_flags.EXEC
+
+    argparser = chainlib.eth.cli.ArgumentParser()
+    argparser = process_args(argparser, arg, flags)
+    argparser.add_argument('--listen', type=str, help='Faucet mode; accept mint requests over HTTP on host:port, or on unix socket path')
+    argparser.add_argument('--window', type=int, help='Faucet mode maximum number of transactions submitted per JSON-RPC batch (default: giftable_erc20_token.faucet.DEFAULT_WINDOW)')
+    argparser.add_argument('--max-pending', dest='max_pending', type=int, help='Faucet mode maximum number of submitted transactions without receipt (default: giftable_erc20_token.faucet.DEFAULT_MAX_PENDING)')
+    argparser.add_argument('--rate-limit', dest='rate_limit', type=float, help='Faucet mode seconds before the same recipient may request again (default: giftable_erc20_token.faucet.DEFAULT_RATE_LIMIT)')
+    argparser.add_argument('--queue-size', dest='queue_size', type=int, help='Faucet mode maximum number of queued requests (default: giftable_erc20_token.faucet.DEFAULT_QUEUE_SIZE)')
+    argparser.add_argument('--human', action='store_true', help='Token value is in token units with decimals, e.g. 1.5, instead of integer base units')
+    argparser.add_argument('value', type=str, help='Token value to send, or to send per request in faucet mode')
+    argparser.add_argument('--metrics', type=str, help='Write RPC metrics to file periodically and on exit; Prometheus text format, or JSON if the file name ends with .json')
+    args = argparser.parse_args()
+
+    process_log(args, logg)
+
+    config = Config()
+    config = process_config(config, arg, args, flags, positional_name='value')
+    config = process_config_local(config, arg, args, flags)
+    logg.debug('config loaded:\n{}'.format(config))
+
+    settings = ChainSettings()
+    settings = process_settings(settings, config)
+    logg.debug('settings loaded:\n{}'.format(settings))
+    return (config, settings,)
+
+
+def listen_address(v):
+    try:
+        (host, port) = v.rsplit(':', 1)
+        return (host, int(port),)
+    except ValueError:
+        return v
+
+
+def token_value(config, settings, token_address):
+    if not config.true('_HUMAN'):
+        return int(settings.get('VALUE'))
+    from eth_erc20.amount import token_codec
+    from eth_erc20.cache import TokenMetadataCache
+    amount_codec = token_codec(settings.get('CONN'), settings.get('CHAIN_SPEC'), token_address, cache=TokenMetadataCache(metrics=settings.get('METRICS')), sender_address=settings.get('SENDER_ADDRESS'))
+    return amount_codec.parse(config.get('_VALUE'))
+
+
+def process_faucet(config, settings, conn, token_address, signer_address, value):
+    from chainlib.eth.gas import OverrideGasOracle
+    from giftable_erc20_token.faucet import (
+            Faucet,
+            FaucetServer,
+            DEFAULT_WINDOW,
+            DEFAULT_MAX_PENDING,
+            DEFAULT_RATE_LIMIT,
+            DEFAULT_QUEUE_SIZE,
+            )
 
-settings = ChainSettings()
-settings = process_settings(settings, config)
-logg.debug('settings loaded:\n{}'.format(settings))
+    window = config.get('_WINDOW')
+    if window == None:
+        window = DEFAULT_WINDOW
+    max_pending = config.get('_MAX_PENDING')
+    if max_pending == None:
+        max_pending = DEFAULT_MAX_PENDING
+    rate_limit = config.get('_RATE_LIMIT')
+    if rate_limit == None:
+        rate_limit = DEFAULT_RATE_LIMIT
+    queue_size = config.get('_QUEUE_SIZE')
+    if queue_size == None:
+        queue_size = DEFAULT_QUEUE_SIZE
+
+    # fee values are fixed for the whole run, instead of being queried for each transaction
+    gas_oracle = settings.get('GAS_ORACLE')
+    (price, limit) = gas_oracle.get_gas()
+    gas_oracle = OverrideGasOracle(price=price, limit=limit, conn=conn)
+
+    faucet = Faucet(
+            conn,
+            settings.get('CHAIN_SPEC'),
+            token_address,
+            signer_address,
+            value,
+            signer=settings.get('SIGNER'),
+            gas_oracle=gas_oracle,
+            nonce=settings.get('NONCE_ORACLE').get_nonce(),
+            window=window,
+            max_pending=max_pending,
+            rate_limit=rate_limit,
+            queue_size=queue_size,
+            id_generator=settings.get('RPC_ID_GENERATOR'),
+            )
+    server = FaucetServer(faucet, listen_address(config.get('_LISTEN')))
+    faucet.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.stop()
+    faucet.stop()
+    logg.info('faucet stopped: {}'.format(faucet.stats()))
 
 
 def main():
+    (config, settings) = process_cli()
+    process_metrics(settings, config.get('_METRICS'), call_plans=GiftableToken.call_plans(), interval=METRICS_INTERVAL)
     token_address = settings.get('EXEC')
     signer_address = settings.get('SENDER_ADDRESS')
     recipient = settings.get('RECIPIENT')
-    value = settings.get('VALUE')
+    value = token_value(config, settings, token_address)
     conn = settings.get('CONN')
 
+    if config.get('_LISTEN') != None:
+        process_faucet(config, settings, conn, token_address, signer_address, value)
+        return
+
     c = GiftableToken(
             settings.get('CHAIN_SPEC'),
             signer=settings.get('SIGNER'),
@@ -93,9 +179,15 @@ def main():
     if settings.get('RPC_SEND'):
         conn.do(o)
         if settings.get('WAIT'):
-            r = conn.wait(tx_hash_hex)
-            if r['status'] == 0:
-                sys.stderr.write('EVM revert. Wish I had more to tell you')
+            from eth_erc20.classify import CallClassifier
+            from eth_erc20.track import (
+                    RevertError,
+                    wait,
+                    )
+            try:
+                r = wait(conn, tx_hash_hex, classifier=CallClassifier(GiftableToken.call_plans()), id_generator=settings.get('RPC_ID_GENERATOR'))
+            except RevertError as e:
+                sys.stderr.write('EVM revert: {}\n'.format(e))
                 sys.exit(1)
 
         logg.info('mint to {} tx {}'.format(recipient, tx_hash_hex))
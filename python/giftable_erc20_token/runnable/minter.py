@@ -9,15 +9,10 @@
 
 # standard imports
 import sys
-import os
-import json
-import argparse
 import logging
-import time
 
 # external imports
 import chainlib.eth.cli
-from chainlib.eth.tx import receipt
 from chainlib.settings import ChainSettings
 from chainlib.eth.cli.log import process_log
 from chainlib.eth.settings import process_settings
@@ -32,13 +27,11 @@ from chainlib.eth.cli.config import (
         process_config,
         )
 
-from hexathon import (
-        strip_0x,
-        add_0x,
-        )
+from hexathon import add_0x
 
 # local imports
 from giftable_erc20_token import GiftableToken
+from eth_erc20.metrics import process_metrics
 
 logg = logging.getLogger()
 
@@ -46,32 +39,38 @@ logg = logging.getLogger()
 def process_config_local(config, arg, args, flags):
     config.add(args.rm, '_RM', False)
     config.add(add_0x(args.minter_address[0]), '_MINTER_ADDRESS', False)
+    config.add(args.metrics, '_METRICS', False)
     return config
 
 
-arg_flags = ArgFlag()
-arg = Arg(arg_flags)
-flags = arg_flags.STD_WRITE | arg_flags.EXEC | arg_flags.WALLET
+def process_cli():
+    arg_flags = ArgFlag()
+    arg = Arg(arg_flags)
+    flags = arg_flags.STD_WRITE | arg_flags.EXEC | arg_flags.WALLET
 
-argparser = chainlib.eth.cli.ArgumentParser()
-argparser = process_args(argparser, arg, flags)
-argparser.add_argument('--rm', action='store_true', help='Remove entry')
-argparser.add_argument('minter_address', type=str, help='Address to add or remove as minter')
-args = argparser.parse_args()
+    argparser = chainlib.eth.cli.ArgumentParser()
+    argparser = process_args(argparser, arg, flags)
+    argparser.add_argument('--rm', action='store_true', help='Remove entry')
+    argparser.add_argument('minter_address', type=str, help='Address to add or remove as minter')
+    argparser.add_argument('--metrics', type=str, help='Write RPC metrics to file on exit; Prometheus text format, or JSON if the file name ends with .json')
+    args = argparser.parse_args()
 
-logg = process_log(args, logg)
+    process_log(args, logg)
 
-config = Config()
-config = process_config(config, arg, args, flags)
-config = process_config_local(config, arg, args, flags)
-logg.debug('config loaded:\n{}'.format(config))
+    config = Config()
+    config = process_config(config, arg, args, flags)
+    config = process_config_local(config, arg, args, flags)
+    logg.debug('config loaded:\n{}'.format(config))
 
-settings = ChainSettings()
-settings = process_settings(settings, config)
-logg.debug('settings loaded:\n{}'.format(settings))
+    settings = ChainSettings()
+    settings = process_settings(settings, config)
+    logg.debug('settings loaded:\n{}'.format(settings))
+    return (config, settings,)
 
 
 def main():
+    (config, settings) = process_cli()
+    process_metrics(settings, config.get('_METRICS'), call_plans=GiftableToken.call_plans())
     token_address = settings.get('EXEC')
     signer_address = settings.get('SENDER_ADDRESS')
     conn = settings.get('CONN')
@@ -108,9 +107,15 @@ def main():
     if settings.get('RPC_SEND'):
         conn.do(o)
         if settings.get('WAIT'):
-            r = conn.wait(tx_hash_hex)
-            if r['status'] == 0:
-                sys.stderr.write('EVM revert. Wish I had more to tell you')
+            from eth_erc20.classify import CallClassifier
+            from eth_erc20.track import (
+                    RevertError,
+                    wait,
+                    )
+            try:
+                r = wait(conn, tx_hash_hex, classifier=CallClassifier(GiftableToken.call_plans()), id_generator=settings.get('RPC_ID_GENERATOR'))
+            except RevertError as e:
+                sys.stderr.write('EVM revert: {}\n'.format(e))
                 sys.exit(1)
 
         logg.info('add minter {} to {} tx {}'.format(minter_address, token_address, tx_hash_hex))
@@ -1,6 +1,6 @@
 #!python3
 
-"""Deploys giftable token
+"""Deploys giftable token, or many giftable and static tokens from a spec file
 
 .. moduleauthor:: Louis Holbrook <dev@holbrook.no>
 .. pgp:: 0826EDA1702D1E87C6E2875121D2E7BB88C2A746 
@@ -11,19 +11,15 @@
 
 # standard imports
 import sys
-import os
 import json
-import argparse
 import logging
-import time
-from enum import Enum
 
 # external imports
 import chainlib.eth.cli
-from chainlib.eth.tx import receipt
 from chainlib.settings import ChainSettings
 from chainlib.eth.cli.log import process_log
 from chainlib.eth.settings import process_settings
+from chainlib.eth.gas import OverrideGasOracle
 from chainlib.eth.cli.arg import (
         Arg,
         ArgFlag,
@@ -34,9 +30,14 @@ from chainlib.eth.cli.config import (
         process_config,
         )
 
-
 # local imports
 from giftable_erc20_token import GiftableToken
+from eth_erc20.track import (
+        RevertError,
+        wait,
+        )
+from giftable_erc20_token.deploy import DEFAULT_WINDOW
+from eth_erc20.metrics import process_metrics
 
 logg = logging.getLogger()
 
@@ -46,37 +47,121 @@ def process_config_local(config, arg, args, flags):
     config.add(args.token_symbol, '_TOKEN_SYMBOL', False)
     config.add(args.token_decimals, '_TOKEN_DECIMALS', False)
     config.add(args.token_expire, '_TOKEN_EXPIRE', False)
+    config.add(args.spec, '_SPEC', False)
+    config.add(args.manifest, '_MANIFEST', False)
+    config.add(args.window, '_WINDOW', False)
+    config.add(args.metrics, '_METRICS', False)
     return config
 
 
-arg_flags = ArgFlag()
-arg = Arg(arg_flags)
-flags = arg_flags.STD_WRITE | arg_flags.WALLET
-
-argparser = chainlib.eth.cli.ArgumentParser()
-argparser = process_args(argparser, arg, flags)
-argparser.add_argument('--name', dest='token_name', required=True, type=str, help='Token name')
-argparser.add_argument('--symbol', dest='token_symbol', required=True, type=str, help='Token symbol')
-argparser.add_argument('--decimals', dest='token_decimals', default=18, type=int, help='Token decimals')
-argparser.add_argument('--expire', dest='token_expire', default=0, type=int, help='Token expiry timestamp (after which token cannot be traded)')
-args = argparser.parse_args()
-
-logg = process_log(args, logg)
-
-config = Config()
-config = process_config(config, arg, args, flags)
-config = process_config_local(config, arg, args, flags)
-logg.debug('config loaded:\n{}'.format(config))
-
-settings = ChainSettings()
-settings = process_settings(settings, config)
-logg.debug('settings loaded:\n{}'.format(settings))
-
+def process_cli():
+    arg_flags = ArgFlag()
+    arg = Arg(arg_flags)
+    flags = arg_flags.STD_WRITE | arg_flags.WALLET
+
+    argparser = chainlib.eth.cli.ArgumentParser()
+    argparser = process_args(argparser, arg, flags)
+    argparser.add_argument('--name', dest='token_name', type=str, help='Token name')
+    argparser.add_argument('--symbol', dest='token_symbol', type=str, help='Token symbol')
+    argparser.add_argument('--decimals', dest='token_decimals', default=18, type=int, help='Token decimals')
+    argparser.add_argument('--expire', dest='token_expire', default=0, type=int, help='Token expiry timestamp (after which token cannot be traded)')
+    argparser.add_argument('--spec', type=str, help='Deploy all tokens in CSV file with name, symbol, decimals, expire, supply and type (giftable or static) columns, instead of a single token')
+    argparser.add_argument('--manifest', type=str, help='Write JSON manifest of deployed tokens with their contract addresses to file instead of stdout, with --spec')
+    argparser.add_argument('--window', type=int, default=DEFAULT_WINDOW, help='Number of deployment transactions submitted in each JSON-RPC batch, with --spec')
+    argparser.add_argument('--metrics', type=str, help='Write RPC metrics to file on exit; Prometheus text format, or JSON if the file name ends with .json')
+    args = argparser.parse_args()
+    if args.spec == None and (args.token_name == None or args.token_symbol == None):
+        argparser.error('--name and --symbol are required without --spec')
+
+    process_log(args, logg)
+
+    config = Config()
+    config = process_config(config, arg, args, flags)
+    config = process_config_local(config, arg, args, flags)
+    logg.debug('config loaded:\n{}'.format(config))
+
+    settings = ChainSettings()
+    settings = process_settings(settings, config)
+    logg.debug('settings loaded:\n{}'.format(settings))
+    return (config, settings,)
+
+
+def process_spec(config, settings, conn, signer_address):
+    from giftable_erc20_token.deploy import (
+            BatchDeployer,
+            read_specs,
+            )
+    f = open(config.get('_SPEC'), 'r')
+    try:
+        specs = list(read_specs(f))
+    except ValueError as e:
+        sys.stderr.write('invalid spec file: {}\n'.format(e))
+        sys.exit(1)
+    finally:
+        f.close()
+
+    # the gas price is fetched once for all deployments
+    # deployments get at least the estimated limit for their bytecode, the supply mints have their own limit
+    (price, limit) = settings.get('GAS_ORACLE').get_gas()
+    gas_oracle = OverrideGasOracle(price=price, limit=limit, conn=conn)
+    nonce = None
+    nonce_oracle = settings.get('NONCE_ORACLE')
+    if nonce_oracle != None:
+        nonce = nonce_oracle.get_nonce()
+    deployer = BatchDeployer(
+            conn,
+            settings.get('CHAIN_SPEC'),
+            signer_address,
+            signer=settings.get('SIGNER'),
+            gas_oracle=gas_oracle,
+            window=config.get('_WINDOW'),
+            id_generator=settings.get('RPC_ID_GENERATOR'),
+            )
+    deployer.sign(specs, nonce=nonce)
+    if not settings.get('RPC_SEND'):
+        for (tx_hash, tx_raw, data) in deployer.txs:
+            print(tx_raw)
+        if config.get('_MANIFEST') != None:
+            write_manifest(config, deployer)
+        return
+
+    deployer.send()
+    # written before waiting, so the addresses are kept if waiting is interrupted
+    if config.get('_MANIFEST') != None:
+        write_manifest(config, deployer)
+    if not settings.get('WAIT'):
+        write_manifest(config, deployer)
+        return
+    try:
+        deployer.wait()
+    except RevertError as e:
+        sys.stderr.write('EVM revert while deploying contracts: {}\n'.format(e))
+        sys.exit(1)
+    finally:
+        write_manifest(config, deployer)
+
+
+def write_manifest(config, deployer):
+    manifest = deployer.manifest()
+    if config.get('_MANIFEST') != None:
+        f = open(config.get('_MANIFEST'), 'w')
+        json.dump(manifest, f, indent=2)
+        f.write('\n')
+        f.close()
+    else:
+        json.dump(manifest, sys.stdout, indent=2)
+        sys.stdout.write('\n')
 
 def main():
+    (config, settings) = process_cli()
+    process_metrics(settings, config.get('_METRICS'), call_plans=GiftableToken.call_plans())
     signer_address = settings.get('SENDER_ADDRESS')
     conn = settings.get('CONN')
 
+    if config.get('_SPEC') != None:
+        process_spec(config, settings, conn, signer_address)
+        return
+
     c = GiftableToken(
             settings.get('CHAIN_SPEC'),
             signer=settings.get('SIGNER'),
@@ -94,9 +179,10 @@ def main():
     if settings.get('RPC_SEND'):
         conn.do(o)
         if settings.get('WAIT'):
-            r = conn.wait(tx_hash_hex)
-            if r['status'] == 0:
-                sys.stderr.write('EVM revert while deploying contract. Wish I had more to tell you')
+            try:
+                r = wait(conn, tx_hash_hex, id_generator=settings.get('RPC_ID_GENERATOR'))
+            except RevertError as e:
+                sys.stderr.write('EVM revert while deploying contract: {}\n'.format(e))
                 sys.exit(1)
             # TODO: pass through translator for keys (evm tester uses underscore instead of camelcase)
             address = r['contractAddress']
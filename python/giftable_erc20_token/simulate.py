@@ -0,0 +1,385 @@
+# standard imports
+import time
+import logging
+from collections import namedtuple
+
+# external imports
+from chainlib.eth.constant import ZERO_ADDRESS
+from chainlib.eth.contract import (
+        ABIContractType,
+        abi_decode_single,
+        )
+from chainlib.eth.tx import unpack
+from hexathon import strip_0x
+
+# local imports
+from giftable_erc20_token import GiftableToken
+from eth_erc20.plan import CallPlan
+from eth_erc20.batch import do_batch
+
+logg = logging.getLogger(__name__)
+
+MAX_UINT256 = (1 << 256) - 1
+
+# outcome of a reverted transaction
+SimulatedRevert = namedtuple('SimulatedRevert', ['index', 'tx_hash', 'reason'])
+
+
+def to_key(v):
+    return strip_0x(v).lower()
+
+
+class GiftableTokenSimulator:
+    """In-process model of the GiftableToken contract state, for dry runs of transaction plans without a node.
+
+    Transactions are applied with the semantics of GiftableToken.sol: balances and allowances, approve reverting when changing a non-zero allowance to another non-zero value, writers and owner for minting, burning by the owner only, totalMinted and totalBurned, and transfers, transferFrom and approve reverting once the expiry timestamp is reached. A reverted transaction leaves the state unchanged. Gas is not accounted, so out-of-gas reverts are not detected.
+
+    Transactions are taken in any format produced by the eth_erc20.ERC20 and giftable_erc20_token.GiftableToken builders. Signed transactions need the sender to be recovered from the signature, which costs far more than simulating the call itself; for large plans, simulate the unsigned TxFormat.DICT templates, and sign those that pass.
+
+    Addresses in the state are lowercase hex without 0x prefix.
+
+    :param address: Token contract address; transactions to other addresses are rejected
+    :type address: str
+    :param owner: Contract owner address
+    :type owner: str
+    :param expires: Expiry timestamp, or 0 if the token does not expire
+    :type expires: int
+    :param timestamp: Block timestamp to simulate at, for expiry. Defaults to the current time
+    :type timestamp: int
+    :param chain_spec: Chain spec, needed only to decode signed transactions
+    :type chain_spec: chainlib.chain.ChainSpec
+    """
+
+    def __init__(self, address, owner, expires=0, timestamp=None, chain_spec=None):
+        self.address = to_key(address)
+        self.owner = to_key(owner)
+        self.expires = expires
+        if timestamp == None:
+            timestamp = int(time.time())
+        self.timestamp = timestamp
+        self.chain_spec = chain_spec
+        self.balances = {}
+        self.allowances = {}
+        self.writers = set()
+        self.total_minted = 0
+        self.total_burned = 0
+        self.methods = {}
+        self.keys = {}
+        for (plan, fn) in [
+                (CallPlan.get('transfer', ABIContractType.ADDRESS, ABIContractType.UINT256), self.__transfer),
+                (CallPlan.get('transferFrom', ABIContractType.ADDRESS, ABIContractType.ADDRESS, ABIContractType.UINT256), self.__transfer_from),
+                (CallPlan.get('approve', ABIContractType.ADDRESS, ABIContractType.UINT256), self.__approve),
+                (CallPlan.get('mintTo', ABIContractType.ADDRESS, ABIContractType.UINT256), self.__mint_to),
+                (CallPlan.get('mint', ABIContractType.ADDRESS, ABIContractType.UINT256, ABIContractType.BYTES), self.__mint),
+                (CallPlan.get('burn', ABIContractType.UINT256), self.__burn),
+                (CallPlan.get('burn'), self.__burn_all),
+                (CallPlan.get('burn', ABIContractType.ADDRESS, ABIContractType.UINT256, ABIContractType.BYTES), self.__burn_from),
+                (CallPlan.get('addWriter', ABIContractType.ADDRESS), self.__add_writer),
+                (CallPlan.get('deleteWriter', ABIContractType.ADDRESS), self.__delete_writer),
+                (CallPlan.get('transferOwnership', ABIContractType.ADDRESS), self.__transfer_ownership),
+                (CallPlan.get('applyExpiry'), self.__noop),
+                ]:
+            self.methods[plan.selector] = (fn, plan.data_length,)
+        # calling a view function in a transaction succeeds without changing state
+        for plan in [
+                CallPlan.get('balanceOf', ABIContractType.ADDRESS),
+                CallPlan.get('allowance', ABIContractType.ADDRESS, ABIContractType.ADDRESS),
+                CallPlan.get('isWriter', ABIContractType.ADDRESS),
+                CallPlan.get('totalSupply'),
+                CallPlan.get('totalMinted'),
+                CallPlan.get('totalBurned'),
+                CallPlan.get('expires'),
+                CallPlan.get('owner'),
+                CallPlan.get('name'),
+                CallPlan.get('symbol'),
+                CallPlan.get('decimals'),
+                ]:
+            self.methods[plan.selector] = (self.__noop, plan.data_length,)
+
+
+    @classmethod
+    def from_node(cls, conn, chain_spec, address, holders=(), pairs=(), writers=(), sender_address=ZERO_ADDRESS, timestamp=None):
+        """Create a simulator with the current contract state read from the node.
+
+        The contract mappings cannot be enumerated, so only the listed holders, allowance pairs and writers are read; all others start out empty.
+
+        :param conn: RPC connection
+        :type conn: chainlib.connection.RPCConnection
+        :param chain_spec: Chain spec
+        :type chain_spec: chainlib.chain.ChainSpec
+        :param address: Token contract address
+        :type address: str
+        :param holders: Addresses to read balances of
+        :type holders: iterable
+        :param pairs: Allowances to read, as (owner address, spender address) tuples
+        :type pairs: iterable
+        :param writers: Addresses to read writer status of
+        :type writers: iterable
+        :param sender_address: Sender address for the eth_call queries
+        :type sender_address: str
+        :param timestamp: Block timestamp to simulate at, for expiry
+        :type timestamp: int
+        :rtype: giftable_erc20_token.simulate.GiftableTokenSimulator
+        :returns: Simulator
+        """
+        holders = list(holders)
+        pairs = list(pairs)
+        writers = list(writers)
+        c = GiftableToken(chain_spec)
+        o = [
+            c.call_plan(CallPlan.get('owner'), address, sender_address=sender_address),
+            c.call_plan(CallPlan.get('expires'), address, sender_address=sender_address),
+            c.total_minted(address, sender_address=sender_address),
+            c.burned(address, sender_address=sender_address),
+                ]
+        for holder in holders:
+            o.append(c.balance_of(address, holder, sender_address=sender_address))
+        for (owner, spender) in pairs:
+            o.append(c.allowance(address, owner, spender, sender_address=sender_address))
+        for writer in writers:
+            o.append(c.call_plan(CallPlan.get('isWriter', ABIContractType.ADDRESS), address, (writer,), sender_address=sender_address))
+        r = do_batch(conn, o)
+
+        sim = cls(address, abi_decode_single(ABIContractType.ADDRESS, r[0]), expires=abi_decode_single(ABIContractType.UINT256, r[1]), timestamp=timestamp, chain_spec=chain_spec)
+        sim.total_minted = c.parse_total_minted(r[2])
+        sim.total_burned = c.parse_burned(r[3])
+        cursor = 4
+        for holder in holders:
+            sim.balances[to_key(holder)] = c.parse_balance(r[cursor])
+            cursor += 1
+        for (owner, spender) in pairs:
+            sim.allowances[(to_key(owner), to_key(spender),)] = c.parse_allowance(r[cursor])
+            cursor += 1
+        for writer in writers:
+            if abi_decode_single(ABIContractType.BOOLEAN, r[cursor]) and to_key(writer) != sim.owner:
+                sim.writers.add(to_key(writer))
+            cursor += 1
+        return sim
+
+
+    def key(self, address):
+        """Normalize an address to the state key format, caching the result.
+
+        :param address: Address, in any hex format
+        :type address: str
+        :rtype: str
+        :returns: Lowercase hex address without 0x prefix
+        """
+        try:
+            return self.keys[address]
+        except KeyError:
+            k = to_key(address)
+            self.keys[address] = k
+            return k
+
+
+    def balance_of(self, address):
+        return self.balances.get(to_key(address), 0)
+
+
+    def allowance(self, owner_address, spender_address):
+        return self.allowances.get((to_key(owner_address), to_key(spender_address),), 0)
+
+
+    def is_writer(self, address):
+        address = to_key(address)
+        return address in self.writers or address == self.owner
+
+
+    def total_supply(self):
+        return self.total_minted - self.total_burned
+
+
+    def expired(self):
+        return self.expires != 0 and self.timestamp >= self.expires
+
+
+    def __noop(self, sender, data):
+        return None
+
+
+    def __transfer(self, sender, data):
+        if self.expired():
+            return 'expired'
+        to = data[32:72]
+        value = int(data[72:136], 16)
+        balances = self.balances
+        v = balances.get(sender, 0)
+        if v < value:
+            return 'insufficient balance'
+        balances[sender] = v - value
+        balances[to] = balances.get(to, 0) + value
+        return None
+
+
+    def __transfer_from(self, sender, data):
+        if self.expired():
+            return 'expired'
+        holder = data[32:72]
+        to = data[96:136]
+        value = int(data[136:200], 16)
+        k = (holder, sender,)
+        allowance = self.allowances.get(k, 0)
+        if allowance < value:
+            return 'insufficient allowance'
+        balances = self.balances
+        v = balances.get(holder, 0)
+        if v < value:
+            return 'insufficient balance'
+        self.allowances[k] = allowance - value
+        balances[holder] = v - value
+        balances[to] = balances.get(to, 0) + value
+        return None
+
+
+    def __approve(self, sender, data):
+        if self.expired():
+            return 'expired'
+        k = (sender, data[32:72],)
+        value = int(data[72:136], 16)
+        if value > 0 and self.allowances.get(k, 0) != 0:
+            return 'allowance not zero'
+        self.allowances[k] = value
+        return None
+
+
+    def __mint_to(self, sender, data):
+        if sender not in self.writers and sender != self.owner:
+            return 'not writer'
+        value = int(data[72:136], 16)
+        if self.total_minted + value > MAX_UINT256:
+            return 'overflow'
+        to = data[32:72]
+        self.balances[to] = self.balances.get(to, 0) + value
+        self.total_minted += value
+        return None
+
+
+    def __mint(self, sender, data):
+        return self.__mint_to(sender, data)
+
+
+    def __burn_value(self, sender, value):
+        if sender != self.owner:
+            return 'ERR_ACCESS'
+        v = self.balances.get(sender, 0)
+        if v < value:
+            return 'ERR_FUNDS'
+        self.balances[sender] = v - value
+        self.total_burned += value
+        return None
+
+
+    def __burn(self, sender, data):
+        return self.__burn_value(sender, int(data[8:72], 16))
+
+
+    def __burn_all(self, sender, data):
+        return self.__burn_value(sender, self.balances.get(sender, 0))
+
+
+    def __burn_from(self, sender, data):
+        if data[32:72] != sender:
+            return 'ERR_NOT_SELF'
+        return self.__burn_value(sender, int(data[72:136], 16))
+
+
+    def __add_writer(self, sender, data):
+        if sender != self.owner:
+            return 'not owner'
+        self.writers.add(data[32:72])
+        return None
+
+
+    def __delete_writer(self, sender, data):
+        writer = data[32:72]
+        if sender != self.owner and sender != writer:
+            return 'not owner'
+        self.writers.discard(writer)
+        return None
+
+
+    def __transfer_ownership(self, sender, data):
+        if sender != self.owner:
+            return 'not owner'
+        self.owner = data[32:72]
+        return None
+
+
+    def call(self, sender_address, data, value=0):
+        """Apply a contract call.
+
+        :param sender_address: Transaction sender
+        :type sender_address: str
+        :param data: Transaction input data, in hex
+        :type data: str
+        :param value: Transaction value
+        :type value: int
+        :rtype: str
+        :returns: Revert reason, or None if the call succeeds
+        """
+        if data[:2] == '0x':
+            data = data[2:]
+        data = data.lower()
+        try:
+            (fn, data_length) = self.methods[data[:8]]
+        except KeyError:
+            return 'unknown method'
+        if value != 0:
+            return 'not payable'
+        if len(data) < data_length:
+            return 'input too short'
+        return fn(self.key(sender_address), data)
+
+
+    def __unpack(self, tx):
+        tx_hash = None
+        if isinstance(tx, tuple):
+            (tx_hash, tx) = tx
+        if isinstance(tx, dict) and tx.get('method') == 'eth_sendRawTransaction':
+            tx = tx['params'][0]
+        if isinstance(tx, str):
+            if self.chain_spec == None:
+                raise ValueError('chain spec is needed to decode signed transactions')
+            tx = unpack(bytes.fromhex(strip_0x(tx)), self.chain_spec)
+        value = tx.get('value', 0)
+        if isinstance(value, str):
+            value = int(value, 16)
+        return (tx_hash, tx['from'], tx.get('to'), tx['data'], value,)
+
+
+    def apply(self, tx):
+        """Apply a transaction.
+
+        :param tx: Transaction, as output by a builder in any transaction format
+        :type tx: dict, str or tuple
+        :raises ValueError: Transaction is not to the token contract
+        :rtype: str
+        :returns: Revert reason, or None if the transaction succeeds
+        """
+        (tx_hash, sender, to, data, value) = self.__unpack(tx)
+        if to == None or self.key(to) != self.address:
+            raise ValueError('transaction {} is not to token contract {}'.format(tx_hash, self.address))
+        return self.call(sender, data, value=value)
+
+
+    def run(self, txs):
+        """Apply transactions in order.
+
+        :param txs: Transactions, as output by the builders in any transaction format
+        :type txs: iterable
+        :raises ValueError: Transaction is not to the token contract
+        :rtype: list
+        :returns: Reverted transactions, in order
+        """
+        r = []
+        i = -1
+        for (i, tx) in enumerate(txs):
+            (tx_hash, sender, to, data, value) = self.__unpack(tx)
+            if to == None or self.key(to) != self.address:
+                raise ValueError('transaction {} is not to token contract {}'.format(i, self.address))
+            reason = self.call(sender, data, value=value)
+            if reason != None:
+                r.append(SimulatedRevert(i, tx_hash, reason))
+        logg.debug('simulated {} transactions, {} reverted'.format(i + 1, len(r)))
+        return r
@@ -3,26 +3,26 @@ import logging
 import time
 
 # external imports
-from chainlib.eth.unittest.ethtester import EthTesterCase
-from chainlib.connection import RPCConnection
 from chainlib.eth.nonce import RPCNonceOracle
 from chainlib.eth.tx import receipt
 from chainlib.eth.address import to_checksum_address
 
 # local imports
 from giftable_erc20_token import GiftableToken
+from eth_erc20.unittest.base import SnapshotTesterCase
 
 logg = logging.getLogger(__name__)
 
 
-class TestGiftableToken(EthTesterCase):
+class TestGiftableToken(SnapshotTesterCase):
+    """Publishes a GiftableToken, with initial supply minted to the first account.
+
+    The token is published once per class, and the chain is reverted to the state after publishing before each test, see eth_erc20.unittest.SnapshotTesterCase.
+    """
 
     expire = 0
 
-    def setUp(self):
-        super(TestGiftableToken, self).setUp()
-        self.conn = RPCConnection.connect(self.chain_spec, 'default')
-       
+    def publish_fixture(self):
         address = self.publish_giftable_token('Foo Token', 'FOO', 16, expire=self.expire)
         self.address = to_checksum_address(address)
         nonce_oracle = RPCNonceOracle(self.accounts[0], conn=self.conn)
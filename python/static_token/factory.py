@@ -1,5 +1,6 @@
 # standard imports
 import os
+import json
 import logging
 
 # external imports
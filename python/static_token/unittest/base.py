@@ -3,24 +3,27 @@ import logging
 import time
 
 # external imports
-from chainlib.eth.unittest.ethtester import EthTesterCase
-from chainlib.connection import RPCConnection
 from chainlib.eth.nonce import RPCNonceOracle
 from chainlib.eth.tx import receipt
 from chainlib.eth.address import to_checksum_address
 
 # local imports
 from static_token import StaticToken
-from eth_erc20.unittest import TestInterface
+from eth_erc20.unittest import (
+        SnapshotTesterCase,
+        TestInterface,
+        )
 
 logg = logging.getLogger(__name__)
 
 
-class TestStaticToken(EthTesterCase, TestInterface):
+class TestStaticToken(SnapshotTesterCase, TestInterface):
+    """Publishes a StaticToken, with initial supply held by the first account.
 
-    def setUp(self):
-        super(TestStaticToken, self).setUp()
-        self.conn = RPCConnection.connect(self.chain_spec, 'default')
+    The token is published once per class, and the chain is reverted to the state after publishing before each test, see eth_erc20.unittest.SnapshotTesterCase.
+    """
+
+    def publish_fixture(self):
         nonce_oracle = RPCNonceOracle(self.accounts[0], conn=self.conn)
         c = StaticToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
         self.symbol = 'FOO'
@@ -0,0 +1,178 @@
+# standard imports
+import unittest
+import json
+import logging
+import asyncio
+
+# external imports
+from chainlib.eth.nonce import RPCNonceOracle
+from chainlib.eth.tx import receipt
+from chainlib.jsonrpc import JSONRPCRequest
+from chainlib.error import (
+        JSONRPCException,
+        RPCException,
+        )
+
+# local imports
+from eth_erc20.aio import (
+        AsyncJSONRPCConnection,
+        AsyncERC20,
+        )
+from eth_erc20.unittest.server import RPCServer
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.unittest import TestGiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class TestAsync(TestGiftableToken):
+
+    def setUp(self):
+        super(TestAsync, self).setUp()
+        self.server = RPCServer(self.rpc)
+        self.server.start()
+
+
+    def tearDown(self):
+        self.server.stop()
+        super(TestAsync, self).tearDown()
+
+
+    def test_async_balances(self):
+        nonce_oracle = RPCNonceOracle(self.accounts[0], conn=self.conn)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        for i in range(1, 5):
+            (tx_hash, o) = c.mint_to(self.address, self.accounts[0], self.accounts[i], i * 1000)
+            self.rpc.do(o)
+        (tx_hash, o) = c.approve(self.address, self.accounts[0], self.accounts[1], 42)
+        self.rpc.do(o)
+        o = receipt(tx_hash)
+        r = self.rpc.do(o)
+        self.assertEqual(r['status'], 1)
+
+        async def run():
+            conn = AsyncJSONRPCConnection(self.server.url, concurrency=3)
+            c = AsyncERC20(conn, self.chain_spec, sender_address=self.accounts[0], factory=GiftableToken(self.chain_spec))
+            single = await asyncio.gather(*[c.balance_of(self.address, self.accounts[i]) for i in range(5)])
+            batched = await c.balances(self.address, self.accounts[:6], batch_size=2)
+            allowance = await c.allowance(self.address, self.accounts[0], self.accounts[1])
+            supply = await c.total_supply(self.address)
+            metadata = await c.metadata(self.address)
+            await conn.close()
+            return (single, batched, allowance, supply, metadata,)
+
+        (single, batched, allowance, supply, metadata) = asyncio.run(run())
+        self.assertEqual(single, [self.initial_supply, 1000, 2000, 3000, 4000])
+        self.assertEqual(batched[self.accounts[4]], 4000)
+        self.assertEqual(batched[self.accounts[5]], 0)
+        self.assertEqual(allowance, 42)
+        self.assertEqual(supply, self.initial_supply + 10000)
+        self.assertEqual(metadata, {'name': self.name, 'symbol': self.symbol, 'decimals': self.decimals})
+        self.assertLessEqual(self.server.connection_count, 3)
+        self.assertEqual(self.server.batch_count, 4)
+
+
+    def test_async_pool(self):
+        async def run():
+            conn = AsyncJSONRPCConnection(self.server.url, concurrency=2)
+            c = AsyncERC20(conn, self.chain_spec, sender_address=self.accounts[0])
+            for i in range(5):
+                await asyncio.gather(*[c.total_supply(self.address) for i in range(10)])
+            await conn.close()
+
+        asyncio.run(run())
+        self.assertEqual(self.server.request_count, 50)
+        self.assertLessEqual(self.server.connection_count, 2)
+
+
+    def test_async_error(self):
+        async def run_error():
+            conn = AsyncJSONRPCConnection(self.server.url)
+            j = JSONRPCRequest()
+            o = j.template()
+            o['method'] = 'eth_fooBar'
+            o = j.finalize(o)
+            try:
+                await conn.do(o)
+            finally:
+                await conn.close()
+
+        with self.assertRaises(JSONRPCException):
+            asyncio.run(run_error())
+
+        async def run_unreachable():
+            conn = AsyncJSONRPCConnection('http://127.0.0.1:1')
+            c = AsyncERC20(conn, self.chain_spec)
+            await c.total_supply(self.address)
+
+        with self.assertRaises(RPCException):
+            asyncio.run(run_unreachable())
+
+        with self.assertRaises(ValueError):
+            AsyncJSONRPCConnection('ws://localhost:8546')
+
+
+    def test_async_loops(self):
+        conn = AsyncJSONRPCConnection(self.server.url, concurrency=2)
+        c = AsyncERC20(conn, self.chain_spec, sender_address=self.accounts[0])
+
+        # idle connections of the first loop are left open
+        r = asyncio.run(c.total_supply(self.address))
+        self.assertEqual(r, self.initial_supply)
+
+        async def run():
+            try:
+                return await c.total_supply(self.address)
+            finally:
+                await conn.close()
+
+        self.assertEqual(asyncio.run(run()), self.initial_supply)
+
+
+    def test_async_raw_endpoint(self):
+        async def handle_silent(reader, writer):
+            try:
+                await reader.read()
+            except asyncio.CancelledError:
+                pass
+
+        async def handle_unsized(reader, writer):
+            l = 0
+            while True:
+                v = await reader.readline()
+                if v == b'\r\n':
+                    break
+                if v.lower().startswith(b'content-length:'):
+                    l = int(v.split(b':')[1])
+            o = json.loads(await reader.readexactly(l))
+            b = json.dumps({'jsonrpc': '2.0', 'id': o['id'], 'result': '0x2a'}).encode('utf-8')
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n' + b)
+            await writer.drain()
+            writer.close()
+
+        def request():
+            j = JSONRPCRequest()
+            o = j.template()
+            o['method'] = 'eth_blockNumber'
+            return j.finalize(o)
+
+        async def run(handler, timeout):
+            server = await asyncio.start_server(handler, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            conn = AsyncJSONRPCConnection('http://127.0.0.1:{}'.format(port), timeout=timeout)
+            try:
+                return await conn.do(request())
+            finally:
+                await conn.close()
+                server.close()
+
+        # response without content length is read until the endpoint closes the connection
+        self.assertEqual(asyncio.run(run(handle_unsized, 5)), '0x2a')
+
+        with self.assertRaises(RPCException):
+            asyncio.run(run(handle_silent, 0.2))
+
+
+if __name__ == '__main__':
+    unittest.main()
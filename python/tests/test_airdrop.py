@@ -0,0 +1,204 @@
+# standard imports
+import os
+import io
+import json
+import unittest
+import logging
+import tempfile
+import shutil
+
+# external imports
+from chainlib.eth.nonce import RPCNonceOracle
+from chainlib.eth.gas import OverrideGasOracle
+from chainlib.error import JSONRPCException
+
+# local imports
+from eth_erc20 import ERC20
+from eth_erc20.airdrop import (
+        Airdrop,
+        read_transfers,
+        )
+from giftable_erc20_token.unittest import TestGiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class RejectingConnection:
+
+    def __init__(self, conn, message):
+        self.conn = conn
+        self.message = message
+
+
+    def do(self, o):
+        if o['method'] == 'eth_sendRawTransaction':
+            raise JSONRPCException(self.message)
+        return self.conn.do(o)
+
+
+class TestAirdrop(TestGiftableToken):
+
+    def setUp(self):
+        super(TestAirdrop, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.journal_path = os.path.join(self.tmp_dir, 'airdrop.journal')
+        self.transfers = [(self.accounts[1 + (i % 4)], 1000 + i) for i in range(7)]
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestAirdrop, self).tearDown()
+
+
+    def airdrop(self, token_address=None, gas_oracle=None, conn=None):
+        if token_address == None:
+            token_address = self.address
+        if conn == None:
+            conn = self.rpc
+        return Airdrop(conn, self.chain_spec, token_address, self.accounts[0], self.journal_path, signer=self.signer, gas_oracle=gas_oracle, window=3, max_pending=3)
+
+
+    def balances(self):
+        c = ERC20(self.chain_spec)
+        r = []
+        for i in range(1, 5):
+            o = c.balance_of(self.address, self.accounts[i], sender_address=self.accounts[0])
+            r.append(c.parse_balance(self.rpc.do(o)))
+        return r
+
+
+    def expected_balances(self):
+        r = [0] * 4
+        for (recipient, value) in self.transfers:
+            r[self.accounts.index(recipient) - 1] += value
+        return r
+
+
+    def test_airdrop(self):
+        airdrop = self.airdrop()
+        airdrop.add(self.transfers)
+        self.assertEqual(airdrop.sign(), 7)
+        confirmed = list(airdrop.send()) + list(airdrop.wait())
+        airdrop.close()
+        self.assertEqual(len(confirmed), 7)
+        for entry in confirmed:
+            self.assertEqual(entry['status'], 1)
+        self.assertEqual([entry['nonce'] for entry in confirmed], list(range(2, 9)))
+        self.assertEqual(self.balances(), self.expected_balances())
+
+        airdrop = self.airdrop()
+        airdrop.add(self.transfers)
+        self.assertEqual(airdrop.sign(), 0)
+        self.assertEqual(list(airdrop.send()), [])
+        self.assertEqual(len(airdrop.pending()), 0)
+        airdrop.close()
+        self.assertEqual(self.balances(), self.expected_balances())
+
+
+    def test_airdrop_resume(self):
+        airdrop = self.airdrop()
+        airdrop.add(self.transfers[:4])
+        airdrop.sign()
+        airdrop.close()
+
+        f = open(self.journal_path, 'a')
+        f.write('{"i": 3, "se')
+        f.close()
+
+        airdrop = self.airdrop()
+        self.assertEqual(len(airdrop.unsent()), 4)
+        airdrop.add(self.transfers)
+        self.assertEqual(airdrop.sign(), 3)
+        airdrop.close()
+
+        airdrop = self.airdrop()
+        airdrop.add(self.transfers)
+        self.assertEqual(airdrop.sign(), 0)
+        self.assertEqual([entry['nonce'] for entry in airdrop.unsent()], list(range(2, 9)))
+        list(airdrop.send())
+        list(airdrop.wait())
+        airdrop.close()
+        self.assertEqual(self.balances(), self.expected_balances())
+
+        airdrop = self.airdrop()
+        with self.assertRaises(ValueError):
+            airdrop.add(reversed(self.transfers))
+        airdrop.close()
+
+        with self.assertRaises(ValueError):
+            self.airdrop(token_address=self.accounts[9])
+
+
+    def test_airdrop_resend(self):
+        airdrop = self.airdrop()
+        airdrop.add(self.transfers)
+        airdrop.sign()
+        confirmed = list(airdrop.send())
+        airdrop.close()
+
+        # resubmitted transactions are already mined, and are settled by their receipts
+        airdrop = self.airdrop()
+        airdrop.add(self.transfers)
+        self.assertGreater(len(airdrop.pending()), 0)
+        confirmed += list(airdrop.send()) + list(airdrop.wait(timeout=10))
+        airdrop.close()
+        self.assertEqual(len(confirmed), 7)
+        for entry in confirmed:
+            self.assertEqual(entry['status'], 1)
+        self.assertEqual(self.balances(), self.expected_balances())
+
+
+    def test_airdrop_rejected(self):
+        gas_oracle = OverrideGasOracle(price=1000000000, limit=21000, conn=self.rpc)
+        airdrop = self.airdrop(gas_oracle=gas_oracle)
+        airdrop.add(self.transfers)
+        airdrop.sign()
+        rejected = list(airdrop.send())
+        self.assertEqual(len(rejected), 7)
+        for entry in rejected:
+            self.assertIsNotNone(entry['error'])
+        self.assertEqual(airdrop.pending(), [])
+        self.assertEqual(list(airdrop.wait()), [])
+        airdrop.close()
+
+        airdrop = self.airdrop()
+        airdrop.add(self.transfers)
+        self.assertEqual(len(airdrop.unsent()), 7)
+        self.assertIsNotNone(airdrop.unsent()[0]['error'])
+        airdrop.close()
+
+
+    def test_airdrop_known_error(self):
+        # errors for transactions the node already has leave them for receipt tracking
+        airdrop = self.airdrop(conn=RejectingConnection(self.rpc, 'already known'))
+        airdrop.add(self.transfers[:3])
+        airdrop.sign()
+        self.assertEqual(list(airdrop.send()), [])
+        self.assertEqual(len(airdrop.pending()), 3)
+        airdrop.close()
+        os.unlink(self.journal_path)
+
+        # other errors mentioning "known" are rejections
+        airdrop = self.airdrop(conn=RejectingConnection(self.rpc, 'unknown account'))
+        airdrop.add(self.transfers)
+        airdrop.sign()
+        rejected = list(airdrop.send())
+        self.assertEqual(len(rejected), 7)
+        self.assertEqual(rejected[0]['error'], 'unknown account')
+        self.assertEqual(airdrop.pending(), [])
+        airdrop.close()
+
+
+    def test_read_transfers(self):
+        f = io.StringIO('recipient,value\n{},42\n\n# foo\n{},13\n'.format(self.accounts[1].lower(), self.accounts[2]))
+        r = list(read_transfers(f))
+        self.assertEqual(r, [(self.accounts[1], 42), (self.accounts[2], 13)])
+
+        f = io.StringIO('{}\n'.format(self.accounts[1]))
+        with self.assertRaises(ValueError):
+            list(read_transfers(f))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# standard imports
+import os
+import unittest
+import logging
+import tempfile
+import shutil
+
+# external imports
+from chainlib.chain import ChainSpec
+from chainlib.eth.nonce import RPCNonceOracle
+from chainlib.eth.tx import receipt
+from hexathon import strip_0x
+
+# local imports
+from eth_erc20 import ERC20
+from eth_erc20.allowance import AllowanceIndex
+from eth_erc20.scan import LogScanner
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.unittest import TestGiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class TransferScanner(LogScanner):
+    """Reports TransferFrom events as plain Transfer events, like ERC20 contracts that do not emit TransferFrom."""
+
+    def scan(self, contract_address, start, end=None):
+        transfer = ERC20.event_plans()[0].record
+        for event in super(TransferScanner, self).scan(contract_address, start, end=end):
+            if event.__class__.__name__ == 'TransferFrom':
+                d = event._asdict()
+                del d['spender']
+                event = transfer(**d)
+            yield event
+
+
+class TestAllowance(TestGiftableToken):
+
+    def setUp(self):
+        super(TestAllowance, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'allowance.sqlite')
+        self.plans = GiftableToken.event_plans()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestAllowance, self).tearDown()
+
+
+    def __do(self, sender_address, method, *args):
+        nonce_oracle = RPCNonceOracle(sender_address, conn=self.rpc)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        (tx_hash, o) = getattr(c, method)(self.address, sender_address, *args)
+        self.rpc.do(o)
+        r = self.rpc.do(receipt(tx_hash))
+        self.assertEqual(r['status'], 1)
+
+
+    def test_index_sync(self):
+        self.__do(self.accounts[0], 'transfer', self.accounts[1], 1000)
+        self.__do(self.accounts[0], 'approve', self.accounts[2], 500)
+        self.__do(self.accounts[0], 'approve', self.accounts[3], 200)
+        self.__do(self.accounts[1], 'approve', self.accounts[2], 100)
+
+        index = AllowanceIndex(self.path, self.chain_spec)
+        checkpoint = index.sync(self.rpc, self.address)
+        self.assertEqual(index.checkpoint(self.address), checkpoint)
+        self.assertEqual(index.allowance(self.address, self.accounts[0], self.accounts[2]), 500)
+        self.assertEqual(index.by_owner(self.address, self.accounts[0]), {strip_0x(self.accounts[2]): 500, strip_0x(self.accounts[3]): 200})
+        self.assertEqual(index.by_spender(self.address, self.accounts[2]), {strip_0x(self.accounts[0]): 500, strip_0x(self.accounts[1]): 100})
+        index.close()
+
+        self.__do(self.accounts[2], 'transfer_from', self.accounts[0], self.accounts[4], 300)
+        self.__do(self.accounts[3], 'transfer_from', self.accounts[0], self.accounts[4], 200)
+        self.__do(self.accounts[1], 'approve', self.accounts[2], 0)
+
+        index = AllowanceIndex(self.path, self.chain_spec)
+        self.assertEqual(index.sync(self.rpc, self.address), checkpoint + 3)
+        self.assertEqual(list(index.allowances(self.address)), [(strip_0x(self.accounts[0]), strip_0x(self.accounts[2]), 200,)])
+        self.assertEqual(index.by_spender(self.address, self.accounts[3]), {})
+        pairs = [(self.accounts[i], self.accounts[j],) for i in range(3) for j in range(4)]
+        self.assertEqual(index.verify(self.rpc, self.address, pairs=pairs, sender_address=self.accounts[0]), [])
+        self.assertEqual(index.verify(self.rpc, self.address, sender_address=self.accounts[0]), [])
+        index.close()
+
+
+    def test_index_resolve_transfers(self):
+        self.__do(self.accounts[0], 'approve', self.accounts[2], 500)
+        self.__do(self.accounts[0], 'transfer', self.accounts[1], 1000)
+        self.__do(self.accounts[2], 'transfer_from', self.accounts[0], self.accounts[3], 300)
+        self.__do(self.accounts[1], 'transfer', self.accounts[3], 10)
+
+        index = AllowanceIndex(self.path, self.chain_spec)
+        scanner = TransferScanner(self.rpc, self.plans)
+        index.sync(self.rpc, self.address, scanner=scanner)
+        self.assertEqual(index.allowance(self.address, self.accounts[0], self.accounts[2]), 500)
+
+        index = AllowanceIndex(':memory:', self.chain_spec)
+        index.sync(self.rpc, self.address, scanner=scanner, resolve_transfers=True)
+        self.assertEqual(index.allowance(self.address, self.accounts[0], self.accounts[2]), 200)
+        self.assertEqual(index.verify(self.rpc, self.address, sender_address=self.accounts[0]), [])
+
+
+    def test_index_chain(self):
+        index = AllowanceIndex(self.path, self.chain_spec)
+        index.close()
+        with self.assertRaises(ValueError):
+            AllowanceIndex(self.path, ChainSpec('evm', 'barchain', 13))
+        index = AllowanceIndex(self.path, self.chain_spec)
+        with self.assertRaises(ValueError):
+            index.verify(self.rpc, self.address)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# standard imports
+import os
+import io
+import unittest
+import logging
+import tempfile
+import shutil
+
+# local imports
+from eth_erc20.amount import (
+        AmountCodec,
+        MAX_VALUE,
+        codec,
+        format_amount,
+        parse_amount,
+        token_codec,
+        )
+from eth_erc20.airdrop import read_transfers
+from eth_erc20.cache import TokenMetadataCache
+from giftable_erc20_token.unittest import TestGiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class TestAmount(unittest.TestCase):
+
+    def test_format(self):
+        c = AmountCodec(6)
+        self.assertEqual(c.format_many([0, 1, 999999, 1000000, 1500000, 123456789012]), ['0.000000', '0.000001', '0.999999', '1.000000', '1.500000', '123456.789012'])
+        self.assertEqual(AmountCodec(0).format_many([0, 42]), ['0', '42'])
+        self.assertEqual(format_amount(MAX_VALUE, 18), str(MAX_VALUE)[:-18] + '.' + str(MAX_VALUE)[-18:])
+        with self.assertRaises(ValueError):
+            c.format(-1)
+        with self.assertRaises(ValueError):
+            AmountCodec(-1)
+
+
+    def test_parse(self):
+        c = AmountCodec(6)
+        self.assertEqual(c.parse_many(['0', '1', '1.5', '.5', '5.', ' 0.000001 ', '1.5000000000']), [0, 1000000, 1500000, 500000, 5000000, 1, 1500000])
+        self.assertEqual(AmountCodec(0).parse('42'), 42)
+        self.assertEqual(parse_amount(format_amount(MAX_VALUE, 18), 18), MAX_VALUE)
+        for v in ['', '.', '1.0000001', '-1', '1,5', '1e6', '1.2.3', '1_000', '١']:
+            with self.assertRaises(ValueError):
+                c.parse(v)
+        with self.assertRaises(ValueError):
+            parse_amount(str(MAX_VALUE + 1), 0)
+
+
+    def test_roundtrip(self):
+        for decimals in [0, 1, 6, 18, 30]:
+            c = codec(decimals)
+            values = [0, 1, 10 ** decimals, 10 ** decimals - 1, 3 ** 100, MAX_VALUE]
+            self.assertEqual(c.parse_many(c.format_many(values)), values)
+        self.assertIs(codec(18), codec(18))
+
+
+class TestTokenAmount(TestGiftableToken):
+
+    def setUp(self):
+        super(TestTokenAmount, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestTokenAmount, self).tearDown()
+
+
+    def test_token_codec(self):
+        cache = TokenMetadataCache(path=self.tmp_dir)
+        c = token_codec(self.rpc, self.chain_spec, self.address, cache=cache, sender_address=self.accounts[0])
+        self.assertEqual(c.decimals, self.decimals)
+        self.assertEqual(cache.get(self.chain_spec, self.address)['decimals'], self.decimals)
+
+        f = io.StringIO('{},1.5\n{},2\n'.format(self.accounts[1], self.accounts[2]))
+        r = list(read_transfers(f, amount_codec=c))
+        self.assertEqual(r, [(self.accounts[1], 15 * 10 ** (self.decimals - 1)), (self.accounts[2], 2 * 10 ** self.decimals)])
+
+
+if __name__ == '__main__':
+    unittest.main()
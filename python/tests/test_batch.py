@@ -0,0 +1,116 @@
+# standard imports
+import unittest
+import logging
+import threading
+
+# external imports
+from chainlib.eth.nonce import RPCNonceOracle
+from chainlib.eth.tx import receipt
+from chainlib.jsonrpc import IntSequenceGenerator
+
+# local imports
+from eth_erc20 import ERC20
+from eth_erc20.batch import (
+        chunks,
+        do_batch,
+        do_batches,
+        )
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.unittest import TestGiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class EchoConnection:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+
+    def do(self, o):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        threading.Event().wait(0.01)
+        with self.lock:
+            self.active -= 1
+        return o['id']
+
+
+class TestBatch(TestGiftableToken):
+
+    def test_chunks(self):
+        r = list(chunks(range(5), batch_size=2))
+        self.assertEqual(r, [[0, 1], [2, 3], [4]])
+        r = list(chunks([], batch_size=2))
+        self.assertEqual(r, [])
+        with self.assertRaises(ValueError):
+            list(chunks(range(5), batch_size=0))
+
+
+    def test_balance_of_batch(self):
+        nonce_oracle = RPCNonceOracle(self.accounts[0], conn=self.conn)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        for i in range(1, 5):
+            (tx_hash, o) = c.mint_to(self.address, self.accounts[0], self.accounts[i], i * 1000)
+            self.rpc.do(o)
+            o = receipt(tx_hash)
+            r = self.rpc.do(o)
+            self.assertEqual(r['status'], 1)
+
+        c = ERC20(self.chain_spec)
+        addresses = self.accounts[:6]
+        batches = list(c.balance_of_batch(self.address, iter(addresses), sender_address=self.accounts[0], id_generator=IntSequenceGenerator(), batch_size=4))
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(len(batches[0][1]), 4)
+        self.assertEqual(len(batches[1][1]), 2)
+        self.assertEqual(batches[1][1][0]['id'], 4)
+
+        balances = {}
+        for (chunk, o) in batches:
+            r = do_batch(self.rpc, o)
+            balances.update(c.parse_balance_batch(chunk, r))
+
+        self.assertEqual(balances[self.accounts[0]], self.initial_supply)
+        for i in range(1, 5):
+            self.assertEqual(balances[self.accounts[i]], i * 1000)
+        self.assertEqual(balances[self.accounts[5]], 0)
+
+        with self.assertRaises(ValueError):
+            c.parse_balance_batch(addresses, [])
+
+
+    def test_balance_of_batch_height(self):
+        c = ERC20(self.chain_spec)
+        for (chunk, o) in c.balance_of_batch(self.address, self.accounts[:3], height=42):
+            for v in o:
+                self.assertEqual(v['params'][1], '0x000000000000002a')
+
+
+    def test_do_batches(self):
+        c = ERC20(self.chain_spec)
+        addresses = self.accounts[:6]
+        batches = c.balance_of_batch(self.address, addresses, sender_address=self.accounts[0], batch_size=4)
+        balances = {}
+        for (chunk, r) in do_batches(self.rpc, batches, concurrency=1):
+            balances.update(c.parse_balance_batch(chunk, r))
+        self.assertEqual(len(balances), 6)
+        self.assertEqual(balances[self.accounts[0]], self.initial_supply)
+
+        conn = EchoConnection()
+        batches = (([i, i+1], [{'id': i}, {'id': i+1}]) for i in range(0, 20, 2))
+        r = list(do_batches(conn, batches, concurrency=3))
+        self.assertEqual(len(r), 10)
+        for (tag, v) in r:
+            self.assertEqual(tag, v)
+        self.assertLessEqual(conn.max_active, 3)
+
+        with self.assertRaises(ValueError):
+            list(do_batches(conn, [], concurrency=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+# standard imports
+import os
+import unittest
+import logging
+import tempfile
+import shutil
+import threading
+
+# external imports
+from chainlib.chain import ChainSpec
+
+# local imports
+from eth_erc20.cache import (
+        TokenMetadataCache,
+        token_metadata,
+        metadata_query,
+        parse_metadata,
+        )
+from eth_erc20.batch import do_batch
+from giftable_erc20_token.unittest import TestGiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class CountingConnection:
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.count = 0
+
+
+    def do(self, o):
+        self.count += 1
+        return self.conn.do(o)
+
+
+class TestCache(TestGiftableToken):
+
+    def setUp(self):
+        super(TestCache, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        super(TestCache, self).tearDown()
+
+
+    def test_metadata_cache(self):
+        conn = CountingConnection(self.rpc)
+        cache = TokenMetadataCache(self.cache_dir)
+        r = token_metadata(conn, self.chain_spec, self.address, cache=cache, sender_address=self.accounts[0])
+        self.assertEqual(r, {'name': self.name, 'symbol': self.symbol, 'decimals': self.decimals})
+        self.assertEqual(conn.count, 3)
+
+        r = token_metadata(conn, self.chain_spec, self.address, cache=cache, sender_address=self.accounts[0])
+        self.assertEqual(r['decimals'], self.decimals)
+        self.assertEqual(conn.count, 3)
+
+        cache = TokenMetadataCache(self.cache_dir)
+        r = token_metadata(conn, self.chain_spec, self.address.lower(), keys=('decimals',), cache=cache, sender_address=self.accounts[0])
+        self.assertEqual(r['decimals'], self.decimals)
+        self.assertEqual(conn.count, 3)
+
+        r = token_metadata(conn, self.chain_spec, self.address, keys=('decimals',), cache=cache, refresh=True, sender_address=self.accounts[0])
+        self.assertEqual(conn.count, 4)
+        self.assertEqual(cache.get(self.chain_spec, self.address)['name'], self.name)
+
+        r = token_metadata(conn, self.chain_spec, self.address, keys=('decimals',), sender_address=self.accounts[0])
+        self.assertEqual(conn.count, 5)
+
+        other_chain_spec = ChainSpec('evm', 'barchain', 13)
+        self.assertIsNone(cache.get(other_chain_spec, self.address))
+
+
+    def test_metadata_cache_lru(self):
+        cache = TokenMetadataCache(self.cache_dir, size=2)
+        for i in range(3):
+            cache.put(self.chain_spec, self.accounts[i], {'decimals': i})
+        self.assertEqual(len(cache.entries), 2)
+        self.assertEqual(cache.get(self.chain_spec, self.accounts[0]), {'decimals': 0})
+        self.assertEqual(len(cache.entries), 2)
+
+        d = os.path.join(self.cache_dir, str(self.chain_spec))
+        fp = os.path.join(d, os.listdir(d)[0])
+        f = open(fp, 'w')
+        f.write('foo')
+        f.close()
+        cache = TokenMetadataCache(self.cache_dir)
+        self.assertEqual(len([i for i in range(3) if cache.get(self.chain_spec, self.accounts[i]) == None]), 1)
+
+
+    def test_metadata_cache_threads(self):
+        cache = TokenMetadataCache(self.cache_dir, size=2)
+        errors = []
+
+        def run(i):
+            try:
+                for j in range(200):
+                    address = self.accounts[(i + j) % 6]
+                    cache.put(self.chain_spec, address, {'decimals': j})
+                    cache.get(self.chain_spec, self.accounts[j % 6])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(cache.entries), 2)
+
+
+    def test_metadata_query(self):
+        keys = ('decimals', 'total_supply', 'name',)
+        o = metadata_query(self.chain_spec, self.address, keys=keys, sender_address=self.accounts[0], height=42)
+        self.assertEqual(len(o), 3)
+        for v in o:
+            self.assertEqual(v['params'][1], '0x000000000000002a')
+
+        o = metadata_query(self.chain_spec, self.address, keys=keys, sender_address=self.accounts[0])
+        r = parse_metadata(keys, do_batch(self.rpc, o))
+        self.assertEqual(r, {'decimals': self.decimals, 'total_supply': self.initial_supply, 'name': self.name})
+
+
+if __name__ == '__main__':
+    unittest.main()
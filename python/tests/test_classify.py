@@ -0,0 +1,101 @@
+# standard imports
+import unittest
+import logging
+
+# external imports
+from chainlib.eth.nonce import RPCNonceOracle
+from chainlib.eth.tx import (
+        receipt,
+        transaction,
+        )
+from chainlib.eth.contract import ABIContractType
+from chainlib.eth.error import RequestMismatchException
+from chainlib.eth.address import to_checksum_address
+from hexathon import strip_0x
+
+# local imports
+from eth_erc20 import ERC20
+from eth_erc20.plan import CallPlan
+from eth_erc20.classify import CallClassifier
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.unittest import TestGiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class TestClassify(TestGiftableToken):
+
+    def setUp(self):
+        super(TestClassify, self).setUp()
+        self.classifier = CallClassifier(GiftableToken.call_plans())
+
+
+    def test_classify_plans(self):
+        a = strip_0x(self.accounts[1])
+        b = strip_0x(self.accounts[2])
+        cases = [
+            (CallPlan.get('transfer', ABIContractType.ADDRESS, ABIContractType.UINT256), [a, 42],),
+            (CallPlan.get('approve', ABIContractType.ADDRESS, ABIContractType.UINT256), [a, 13],),
+            (CallPlan.get('transferFrom', ABIContractType.ADDRESS, ABIContractType.ADDRESS, ABIContractType.UINT256), [a, b, 1024],),
+            (CallPlan.get('mintTo', ABIContractType.ADDRESS, ABIContractType.UINT256), [b, 666],),
+            (CallPlan.get('burn', ABIContractType.UINT256), [2048],),
+            (CallPlan.get('burn'), [],),
+            (CallPlan.get('mint', ABIContractType.ADDRESS, ABIContractType.UINT256, ABIContractType.BYTES), [a, 5, 'deadbeef' * 9],),
+            (CallPlan.get('addWriter', ABIContractType.ADDRESS), [b],),
+                ]
+        for (plan, args) in cases:
+            v = '0x' + plan.encode(*args)
+            r = self.classifier.classify(v)
+            self.assertEqual(r[0].signature, plan.signature)
+            self.assertEqual(r[1], args)
+
+        r = list(self.classifier.classify_all([case[0].encode(*case[1]) for case in cases]))
+        self.assertEqual([v[0] for v in r], [case[0] for case in cases])
+
+
+    def test_classify_invalid(self):
+        self.assertIsNone(self.classifier.classify('0xdeadbeef' + '00' * 32))
+        self.assertIsNone(self.classifier.classify(''))
+        self.assertIsNone(self.classifier.classify({}))
+        plan = CallPlan.get('transfer', ABIContractType.ADDRESS, ABIContractType.UINT256)
+        v = plan.encode(self.accounts[1], 42)
+        self.assertIsNone(self.classifier.classify(v[:-2]))
+
+        c = CallClassifier([plan])
+        other = CallPlan('foo')
+        other.selector = plan.selector
+        with self.assertRaises(ValueError):
+            c.add(other)
+        c.add(CallPlan('transfer', ABIContractType.ADDRESS, ABIContractType.UINT256))
+
+
+    def test_classify_tx(self):
+        nonce_oracle = RPCNonceOracle(self.accounts[0], conn=self.conn)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        (tx_hash, o) = c.mint_to(self.address, self.accounts[0], self.accounts[1], 1000)
+        self.rpc.do(o)
+        o = receipt(tx_hash)
+        r = self.rpc.do(o)
+        self.assertEqual(r['status'], 1)
+
+        o = transaction(tx_hash)
+        tx = self.rpc.do(o)
+        (plan, args) = self.classifier.classify(tx)
+        self.assertEqual(plan.method, 'mintTo')
+        self.assertEqual(args, [to_checksum_address(self.accounts[1]), 1000])
+
+
+    def test_parse_request_mismatch(self):
+        c = ERC20(self.chain_spec)
+        plan = CallPlan.get('approve', ABIContractType.ADDRESS, ABIContractType.UINT256)
+        v = plan.encode(self.accounts[1], 42)
+        self.assertEqual(c.parse_approve_request(v), [strip_0x(self.accounts[1]), 42])
+        with self.assertRaises(RequestMismatchException):
+            c.parse_transfer_request(v)
+        with self.assertRaises(RequestMismatchException):
+            c.parse_transfer_from_request(v)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+# standard imports
+import os
+import json
+import socket
+import unittest
+import logging
+import tempfile
+import shutil
+
+# external imports
+from chainlib.eth.connection import EthHTTPConnection
+from chainlib.eth.nonce import RPCNonceOracle
+from chainlib.eth.tx import receipt
+
+# local imports
+from eth_erc20.daemon import (
+        QueryDaemon,
+        DaemonServer,
+        )
+from eth_erc20.cache import TokenMetadataCache
+from eth_erc20.unittest.server import RPCServer
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.unittest import TestGiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class TestDaemon(TestGiftableToken):
+
+    def setUp(self):
+        super(TestDaemon, self).setUp()
+        nonce_oracle = RPCNonceOracle(self.accounts[0], conn=self.rpc)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        for i in range(1, 5):
+            (tx_hash, o) = c.mint_to(self.address, self.accounts[0], self.accounts[i], i * 1000)
+            self.rpc.do(o)
+        (tx_hash, o) = c.approve(self.address, self.accounts[0], self.accounts[1], 42)
+        self.rpc.do(o)
+        o = receipt(tx_hash)
+        r = self.rpc.do(o)
+        self.assertEqual(r['status'], 1)
+
+        self.server = RPCServer(self.rpc)
+        self.server.start()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = TokenMetadataCache(path=os.path.join(self.tmp_dir, 'cache'))
+        conn = EthHTTPConnection(self.server.url)
+        self.daemon = QueryDaemon(conn, self.chain_spec, sender_address=self.accounts[0], cache=self.cache, batch_size=50, concurrency=2, max_delay=0.05)
+        self.daemon.start()
+
+
+    def tearDown(self):
+        self.daemon.stop()
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir)
+        super(TestDaemon, self).tearDown()
+
+
+    def test_query(self):
+        futures = [self.daemon.submit('balance', {'contract': self.address, 'address': self.accounts[i]}) for i in range(6)]
+        r = [f.result(timeout=10) for f in futures]
+        self.assertEqual(r, [self.initial_supply, 1000, 2000, 3000, 4000, 0])
+        self.assertEqual(self.daemon.query('allowance', {'contract': self.address, 'owner': self.accounts[0], 'spender': self.accounts[1]}), 42)
+        self.assertEqual(self.daemon.query('supply', {'contract': self.address}), self.initial_supply + 10000)
+        self.assertLess(self.daemon.batch_count, self.daemon.query_count)
+
+        with self.assertRaises(ValueError):
+            self.daemon.submit('transfer', {'contract': self.address})
+        with self.assertRaises(ValueError):
+            self.daemon.submit('balance', {'contract': self.address})
+
+
+    def test_query_giftable(self):
+        (tx_hash, o) = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=RPCNonceOracle(self.accounts[0], conn=self.rpc)).burn(self.address, self.accounts[0], 500)
+        self.rpc.do(o)
+        self.assertEqual(self.rpc.do(receipt(tx_hash))['status'], 1)
+
+        conn = EthHTTPConnection(self.server.url)
+        daemon = QueryDaemon(conn, self.chain_spec, sender_address=self.accounts[0], factory=GiftableToken(self.chain_spec))
+        daemon.start()
+        try:
+            self.assertEqual(daemon.query('minted', {'contract': self.address}, timeout=10), self.initial_supply + 10000)
+            self.assertEqual(daemon.query('burned', {'contract': self.address}, timeout=10), 500)
+            self.assertEqual(daemon.query('supply', {'contract': self.address}, timeout=10), self.initial_supply + 9500)
+        finally:
+            daemon.stop()
+
+        # plain ERC20 factory cannot build the giftable queries
+        with self.assertRaises(ValueError):
+            self.daemon.submit('burned', {'contract': self.address})
+
+
+    def test_info_cache(self):
+        r = self.daemon.query('info', {'contract': self.address})
+        self.assertEqual(r, {'name': self.name, 'symbol': self.symbol, 'decimals': self.decimals, 'supply': self.initial_supply + 10000})
+        self.assertEqual(self.cache.get(self.chain_spec, self.address)['symbol'], self.symbol)
+
+        request_count = self.server.request_count
+        r = self.daemon.query('info', {'contract': self.address})
+        self.assertEqual(r['symbol'], self.symbol)
+        self.assertEqual(self.server.request_count, request_count + 1)
+
+
+    def test_server(self):
+        path = os.path.join(self.tmp_dir, 'erc20.sock')
+        server = DaemonServer(self.daemon, path)
+        server.start()
+
+        queries = []
+        for i in range(20):
+            queries.append({'id': i, 'method': 'balance', 'params': {'contract': self.address, 'address': self.accounts[i % 6]}})
+        queries.append({'id': 'allowance', 'method': 'allowance', 'params': {'contract': self.address, 'owner': self.accounts[0], 'spender': self.accounts[1]}})
+        queries.append({'id': 'info', 'method': 'info', 'params': {'contract': self.address}})
+        queries.append({'id': 'unknown', 'method': 'transfer', 'params': {}})
+        queries.append({'id': 'missing', 'method': 'balance', 'params': {'contract': self.address}})
+
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.connect(path)
+        f = s.makefile('rwb')
+        for q in queries:
+            f.write((json.dumps(q) + '\n').encode('utf-8'))
+        f.write(b'not json\n')
+        f.flush()
+        s.shutdown(socket.SHUT_WR)
+        r = {}
+        errors = 0
+        for l in f:
+            o = json.loads(l)
+            if o['id'] == None:
+                errors += 1
+                continue
+            r[o['id']] = o
+        f.close()
+        s.close()
+        server.stop()
+        self.assertFalse(os.path.exists(path))
+
+        balances = [self.initial_supply, 1000, 2000, 3000, 4000, 0]
+        for i in range(20):
+            self.assertEqual(r[i]['result'], balances[i % 6])
+        self.assertEqual(r['allowance']['result'], 42)
+        self.assertEqual(r['info']['result']['decimals'], self.decimals)
+        self.assertIn('error', r['unknown'])
+        self.assertIn('error', r['missing'])
+        self.assertEqual(errors, 1)
+        self.assertLess(self.server.batch_count, 22)
+
+
+    def test_server_socket(self):
+        path = os.path.join(self.tmp_dir, 'erc20.sock')
+
+        # socket left behind by a stopped process is replaced
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.bind(path)
+        s.close()
+        server = DaemonServer(self.daemon, path)
+        server.start()
+
+        # socket of a running daemon is kept
+        with self.assertRaises(OSError):
+            DaemonServer(self.daemon, path)
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.connect(path)
+        s.close()
+        server.stop()
+
+        f = open(path, 'w')
+        f.close()
+        with self.assertRaises(ValueError):
+            DaemonServer(self.daemon, path)
+        self.assertTrue(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# standard imports
+import io
+import unittest
+import logging
+
+# external imports
+from chainlib.eth.unittest.ethtester import EthTesterCase
+from chainlib.eth.nonce import RPCNonceOracle
+from chainlib.eth.tx import (
+        receipt,
+        transaction,
+        )
+from chainlib.eth.gas import OverrideGasOracle
+from chainlib.eth.address import to_checksum_address
+from hexathon import strip_0x
+
+# local imports
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.deploy import (
+        BatchDeployer,
+        TokenSpec,
+        contract_address,
+        deploy_gas,
+        read_specs,
+        )
+from eth_erc20.track import RevertError
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class TestDeploy(EthTesterCase):
+
+    def test_contract_address(self):
+        nonce = RPCNonceOracle(self.accounts[0], conn=self.rpc).get_nonce()
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=RPCNonceOracle(self.accounts[0], conn=self.rpc))
+        (tx_hash, o) = c.constructor(self.accounts[0], 'Foo Token', 'FOO', 6)
+        self.rpc.do(o)
+        r = self.rpc.do(receipt(tx_hash))
+        self.assertEqual(strip_0x(contract_address(self.accounts[0], nonce)), to_checksum_address(r['contract_address']))
+        self.assertEqual(contract_address('0x6ac7ea33f8831ea9dcc53393aaa88b25a785dbf0', 0).lower(), '0xcd234a471b72ba2f1ccf0a70fcaba648a5eecd8d')
+        self.assertEqual(contract_address('0x6ac7ea33f8831ea9dcc53393aaa88b25a785dbf0', 1).lower(), '0x343c43a37d37dff08ae8c4a11544c718abb4fcf8')
+
+
+    def test_read_specs(self):
+        f = io.StringIO('name,symbol,decimals,expire,supply,type\nFoo Token,FOO\n# comment\nBar Token,BAR,6,0,1000,static\n')
+        r = list(read_specs(f))
+        self.assertEqual(r, [TokenSpec('Foo Token', 'FOO', 18, 0, 0, 'giftable'), TokenSpec('Bar Token', 'BAR', 6, 0, 1000, 'static')])
+        for s in ['Foo Token\n', 'Foo Token,FOO,6,0,0,baz\n', 'Foo Token,FOO,6,100,0,static\n', 'Foo Token,FOO,x\nBar Token,BAR,y\n']:
+            with self.assertRaises(ValueError):
+                list(read_specs(io.StringIO(s)))
+
+
+    def test_deploy(self):
+        specs = [
+            TokenSpec('Foo Token', 'FOO', 6, 0, 1000, 'giftable'),
+            TokenSpec('Bar Token', 'BAR', 18, 0, 0, 'giftable'),
+            TokenSpec('Baz Token', 'BAZ', 2, 0, 4200, 'static'),
+                ]
+        gas_oracle = OverrideGasOracle(price=1000000000, limit=8000000, conn=self.rpc)
+        deployer = BatchDeployer(self.rpc, self.chain_spec, self.accounts[0], signer=self.signer, gas_oracle=gas_oracle, window=2)
+        r = deployer.sign(specs)
+        self.assertEqual([o['nonce'] for o in r], [0, 2, 3])
+        self.assertEqual(r[0]['mint_nonce'], 1)
+        self.assertEqual(deployer.send(), 4)
+        deployer.wait()
+
+        manifest = deployer.manifest()
+        c = GiftableToken(self.chain_spec)
+        for (o, v) in zip(manifest, [1000, 0, 4200]):
+            self.assertEqual(c.parse_symbol(self.rpc.do(c.symbol(o['address'], sender_address=self.accounts[0]))), o['symbol'])
+            self.assertEqual(c.parse_decimals(self.rpc.do(c.decimals(o['address'], sender_address=self.accounts[0]))), o['decimals'])
+            self.assertEqual(c.parse_balance(self.rpc.do(c.balance_of(o['address'], self.accounts[0], sender_address=self.accounts[0]))), v)
+            r = self.rpc.do(receipt(o['hash']))
+            self.assertEqual(strip_0x(r['contract_address']).lower(), strip_0x(o['address']).lower())
+            self.assertEqual(o['status'], 1)
+        self.assertEqual(manifest[0]['mint_status'], 1)
+
+
+    def test_deploy_gas(self):
+        specs = [
+            TokenSpec('Foo Token', 'FOO', 6, 0, 1000, 'giftable'),
+            TokenSpec('Baz Token', 'BAZ', 2, 0, 4200, 'static'),
+                ]
+        # the limit of the oracle only covers value transfers
+        gas_oracle = OverrideGasOracle(price=1000000000, limit=21000, conn=self.rpc)
+        deployer = BatchDeployer(self.rpc, self.chain_spec, self.accounts[0], signer=self.signer, gas_oracle=gas_oracle)
+        deployer.sign(specs)
+        deployer.send()
+        deployer.wait()
+        for (tx_hash, tx_raw, data) in deployer.txs:
+            r = self.rpc.do(receipt(tx_hash))
+            self.assertEqual(r['status'], 1)
+            if data == None:
+                tx = self.rpc.do(transaction(tx_hash))
+                self.assertEqual(tx['gas'], deploy_gas(tx['data']))
+
+
+    def test_deploy_revert(self):
+        specs = [
+            TokenSpec('Foo Token', 'FOO', 6, 0, 1000, 'giftable'),
+            TokenSpec('Bar Token', 'BAR', 18, 0, 0, 'giftable'),
+                ]
+        gas_oracle = OverrideGasOracle(price=1000000000, limit=21000, conn=self.rpc)
+        deployer = BatchDeployer(self.rpc, self.chain_spec, self.accounts[0], signer=self.signer, gas_oracle=gas_oracle, mint_gas=30000)
+        deployer.sign(specs)
+        deployer.send()
+        with self.assertRaises(RevertError):
+            deployer.wait()
+
+        # all receipts are recorded, also after the revert
+        manifest = deployer.manifest()
+        self.assertEqual(manifest[0]['status'], 1)
+        self.assertEqual(manifest[0]['mint_status'], 0)
+        self.assertEqual(manifest[1]['status'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,265 @@
+# standard imports
+import os
+import json
+import time
+import socket
+import unittest
+import logging
+import tempfile
+import shutil
+import http.client
+
+# external imports
+from chainlib.eth.nonce import RPCNonceOracle
+from hexathon import strip_0x
+
+# local imports
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.faucet import (
+        Faucet,
+        FaucetServer,
+        QUEUED,
+        DUPLICATE,
+        RATE_LIMITED,
+        QUEUE_FULL,
+        )
+from giftable_erc20_token.unittest import TestGiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, path):
+        super(UnixHTTPConnection, self).__init__('localhost')
+        self.path = path
+
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+class FailingConnection:
+
+    supports_batch = True
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.fail = False
+
+
+    def do(self, o):
+        if self.fail and isinstance(o, list) and o[0]['method'] == 'eth_sendRawTransaction':
+            self.fail = False
+            raise ConnectionError('node unreachable')
+        if isinstance(o, list):
+            return [self.conn.do(v) for v in o]
+        return self.conn.do(o)
+
+
+class TestFaucet(TestGiftableToken):
+
+    def faucet(self, **kwargs):
+        return Faucet(self.rpc, self.chain_spec, self.address, self.accounts[0], 42, signer=self.signer, **kwargs)
+
+
+    def balance(self, address):
+        c = GiftableToken(self.chain_spec)
+        o = c.balance_of(self.address, address, sender_address=self.accounts[0])
+        return c.parse_balance(self.rpc.do(o))
+
+
+    def test_faucet(self):
+        faucet = self.faucet(window=2, max_pending=2)
+        for i in range(1, 6):
+            self.assertEqual(faucet.request(self.accounts[i])[0], QUEUED)
+        self.assertEqual(faucet.request(self.accounts[1])[0], DUPLICATE)
+
+        self.assertEqual(faucet.step(), (0, 2,))
+        self.assertEqual(faucet.stats()['pending'], 2)
+        self.assertEqual(faucet.step(), (2, 2,))
+        self.assertEqual(faucet.step(), (2, 1,))
+        self.assertEqual(faucet.step(), (1, 0,))
+        self.assertEqual(faucet.step(), (0, 0,))
+
+        for i in range(1, 6):
+            self.assertEqual(self.balance(self.accounts[i]), 42)
+
+        stats = faucet.stats()
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertEqual(stats['pending'], 0)
+        self.assertEqual(stats['submitted'], 5)
+        self.assertEqual(stats['minted'], 5)
+        self.assertEqual(stats[DUPLICATE], 1)
+        self.assertGreater(stats['throughput'], 0)
+        self.assertGreaterEqual(stats['latency_max'], stats['latency_p50'])
+
+        # gift received, so still rate limited
+        (status, retry_after) = faucet.request(self.accounts[1])
+        self.assertEqual(status, RATE_LIMITED)
+        self.assertGreater(retry_after, 0)
+
+
+    def test_faucet_limits(self):
+        faucet = self.faucet(rate_limit=0, queue_size=1)
+        self.assertEqual(faucet.request(self.accounts[1])[0], QUEUED)
+        self.assertEqual(faucet.request(self.accounts[2])[0], QUEUE_FULL)
+        faucet.step()
+        faucet.step()
+        self.assertEqual(faucet.request(self.accounts[1])[0], QUEUED)
+        faucet.step()
+        faucet.step()
+        self.assertEqual(self.balance(self.accounts[1]), 84)
+
+        with self.assertRaises(ValueError):
+            faucet.request('0xfoo')
+
+
+    def test_faucet_nonce_gap(self):
+        nonce = RPCNonceOracle(self.accounts[0], conn=self.rpc).get_nonce()
+        faucet = self.faucet(nonce=nonce)
+        faucet.request(self.accounts[1])
+        faucet.step()
+
+        # transaction sent outside the faucet uses the next nonce
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=RPCNonceOracle(self.accounts[0], conn=self.rpc))
+        (tx_hash, o) = c.mint_to(self.address, self.accounts[0], self.accounts[9], 13)
+        self.rpc.do(o)
+
+        faucet.request(self.accounts[2])
+        faucet.request(self.accounts[3])
+        faucet.step()
+        stats = faucet.stats()
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['submitted'], 2)
+
+        # the failed request may be repeated immediately
+        self.assertEqual(faucet.request(self.accounts[2])[0], QUEUED)
+        faucet.step()
+        faucet.step()
+        stats = faucet.stats()
+        self.assertEqual(stats['minted'], 3)
+        self.assertEqual(stats['nonce'], nonce + 4)
+        for i in range(1, 4):
+            self.assertEqual(self.balance(self.accounts[i]), 42)
+
+
+    def test_faucet_outage(self):
+        conn = FailingConnection(self.rpc)
+        faucet = Faucet(conn, self.chain_spec, self.address, self.accounts[0], 42, signer=self.signer)
+        faucet.request(self.accounts[1])
+        faucet.request(self.accounts[2])
+        conn.fail = True
+        with self.assertRaises(ConnectionError):
+            faucet.step()
+
+        # the requests are kept, and minted with the same nonces when the node is back
+        stats = faucet.stats()
+        self.assertEqual(stats['queue_depth'], 2)
+        self.assertEqual(stats['failed'], 0)
+        self.assertEqual(faucet.request(self.accounts[1])[0], DUPLICATE)
+        self.assertEqual(faucet.step(), (0, 2,))
+        self.assertEqual(faucet.step(), (2, 0,))
+        for i in range(1, 3):
+            self.assertEqual(self.balance(self.accounts[i]), 42)
+
+
+    def test_faucet_server(self):
+        tmp_dir = tempfile.mkdtemp()
+        faucet = self.faucet()
+        server = FaucetServer(faucet, os.path.join(tmp_dir, 'faucet.sock'))
+        server.start()
+        try:
+            conn = UnixHTTPConnection(server.address)
+            conn.request('POST', '/mint', body=json.dumps({'recipient': strip_0x(self.accounts[1])}))
+            r = conn.getresponse()
+            self.assertEqual(r.status, 202)
+            self.assertEqual(json.loads(r.read())['status'], QUEUED)
+
+            conn.request('POST', '/mint', body=json.dumps({'recipient': self.accounts[1]}))
+            r = conn.getresponse()
+            self.assertEqual(r.status, 409)
+            r.read()
+
+            conn.request('POST', '/mint', body='{"foo": 42}')
+            r = conn.getresponse()
+            self.assertEqual(r.status, 400)
+            r.read()
+
+            faucet.step()
+            faucet.step()
+
+            conn.request('POST', '/mint', body=json.dumps({'recipient': self.accounts[1]}))
+            r = conn.getresponse()
+            self.assertEqual(r.status, 429)
+            self.assertGreater(int(r.getheader('Retry-After')), 0)
+            r.read()
+
+            conn.request('GET', '/stats')
+            r = conn.getresponse()
+            self.assertEqual(r.status, 200)
+            stats = json.loads(r.read())
+            self.assertEqual(stats['minted'], 1)
+            conn.close()
+        finally:
+            server.stop()
+            shutil.rmtree(tmp_dir)
+        self.assertEqual(self.balance(self.accounts[1]), 42)
+
+
+    def test_faucet_server_socket(self):
+        tmp_dir = tempfile.mkdtemp()
+        path = os.path.join(tmp_dir, 'faucet.sock')
+        try:
+            # socket left behind by a stopped process is replaced
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.bind(path)
+            s.close()
+            server = FaucetServer(self.faucet(), path)
+            server.start()
+
+            # socket of a running faucet is kept
+            with self.assertRaises(OSError):
+                FaucetServer(self.faucet(), path)
+            conn = UnixHTTPConnection(path)
+            conn.request('GET', '/stats')
+            self.assertEqual(conn.getresponse().status, 200)
+            conn.close()
+            server.stop()
+
+            f = open(path, 'w')
+            f.close()
+            with self.assertRaises(ValueError):
+                FaucetServer(self.faucet(), path)
+            self.assertTrue(os.path.exists(path))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+    def test_faucet_thread(self):
+        faucet = self.faucet()
+        server = FaucetServer(faucet, ('127.0.0.1', 0))
+        server.start()
+        faucet.start(interval=0.01)
+        try:
+            for i in range(1, 4):
+                conn = http.client.HTTPConnection(*server.address)
+                conn.request('POST', '/mint', body=json.dumps({'recipient': self.accounts[i]}))
+                self.assertEqual(conn.getresponse().status, 202)
+                conn.close()
+            for i in range(100):
+                if faucet.stats()['minted'] == 3:
+                    break
+                time.sleep(0.05)
+        finally:
+            faucet.stop()
+            server.stop()
+        self.assertEqual(faucet.stats()['minted'], 3)
+        for i in range(1, 4):
+            self.assertEqual(self.balance(self.accounts[i]), 42)
+
+
+if __name__ == '__main__':
+    unittest.main()
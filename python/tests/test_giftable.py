@@ -16,7 +16,10 @@ from chainlib.eth.block import (
 
 # local imports
 from giftable_erc20_token import GiftableToken
-from giftable_erc20_token.unittest import TestGiftableExpireToken
+from giftable_erc20_token.unittest import (
+        TestGiftableToken,
+        TestGiftableExpireToken,
+        )
 
 logging.basicConfig(level=logging.DEBUG)
 logg = logging.getLogger()
@@ -119,5 +122,34 @@ class TestExpire(TestGiftableExpireToken):
         self.assertEqual(balance, mint_amount)
 
 
+class TestFixture(TestGiftableToken):
+
+    def transfer_and_check(self):
+        self.assertNotIn(None, self.accounts)
+        self.accounts.append(None)
+        nonce_oracle = RPCNonceOracle(self.accounts[0], self.rpc)
+        self.assertEqual(nonce_oracle.get_nonce(), 2)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        (tx_hash, o) = c.transfer(self.address, self.accounts[0], self.accounts[1], 1000)
+        self.rpc.do(o)
+        o = receipt(tx_hash)
+        r = self.rpc.do(o)
+        self.assertEqual(r['status'], 1)
+        self.assertEqual(r['block_number'], 3)
+
+        o = c.balance_of(self.address, self.accounts[1], sender_address=self.accounts[0])
+        r = self.rpc.do(o)
+        self.assertEqual(c.parse_balance(r), 1000)
+
+
+    # each test would see the state changes of the other if the fixture were not reverted
+    def test_isolation_first(self):
+        self.transfer_and_check()
+
+
+    def test_isolation_second(self):
+        self.transfer_and_check()
+
+
 if __name__ == '__main__':
     unittest.main()
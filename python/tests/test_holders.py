@@ -0,0 +1,145 @@
+# standard imports
+import os
+import io
+import unittest
+import logging
+import tempfile
+import shutil
+
+# external imports
+from chainlib.eth.nonce import RPCNonceOracle
+from hexathon import strip_0x
+
+# local imports
+from eth_erc20.holders import (
+        HolderTable,
+        HolderTableBuilder,
+        MAX_BALANCE,
+        slot_of,
+        )
+from eth_erc20.batch import do_batch
+from eth_erc20.scan import LogScanner
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.unittest import TestGiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+def address(i):
+    return os.urandom(12).hex() + i.to_bytes(8, 'big').hex()
+
+
+class TestHolderTable(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'holders')
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+
+    def test_table(self):
+        addresses = [address(i) for i in range(3000)]
+        builder = HolderTableBuilder()
+        for (i, a) in enumerate(addresses):
+            builder.set(a, i * 1000)
+        builder.add('0x' + addresses[1].upper(), -1)
+        builder.add(addresses[2], MAX_BALANCE - 2000)
+        with self.assertRaises(ValueError):
+            builder.add(addresses[3], -3001)
+        self.assertEqual(len(builder), 3000)
+        self.assertEqual(builder.id_of(addresses[2999]), 2999)
+        builder.write(self.path)
+
+        table = HolderTable(self.path)
+        self.assertEqual(len(table), 3000)
+        self.assertEqual(table.balance_of(addresses[0]), 0)
+        self.assertEqual(table.balance_of(addresses[1]), 999)
+        self.assertEqual(table.balance_of(bytes.fromhex(addresses[2])), MAX_BALANCE)
+        self.assertEqual(table.balance_of(addresses[2999]), 2999000)
+        self.assertEqual(table.id_of(addresses[1234]), 1234)
+        self.assertEqual(table.address_of(1234).lower(), addresses[1234])
+        self.assertIsNone(table.id_of(address(4000)))
+        self.assertEqual(table.balance_of(address(4000)), 0)
+
+        f = io.StringIO()
+        self.assertEqual(table.export(f, skip_zero=True), 2999)
+        lines = f.getvalue().split('\n')
+        self.assertEqual(lines[0], '{},999'.format(table.address_of(1)))
+
+        builder = HolderTableBuilder.load(self.path)
+        table.close()
+        builder.set(address(4000), 42)
+        builder.write(self.path)
+        table = HolderTable(self.path)
+        self.assertEqual(len(table), 3001)
+        self.assertEqual(table.balance_of(addresses[1]), 999)
+        self.assertEqual(table.balance_by_id(3000), 42)
+        table.close()
+
+        f = open(self.path, 'ab')
+        f.write(b'\x00')
+        f.close()
+        with self.assertRaises(ValueError):
+            HolderTable(self.path)
+
+
+    def test_clustered_prefix(self):
+        # addresses sharing their leading bytes, as with vanity and create2 addresses
+        addresses = [bytes(8) + os.urandom(12) for i in range(20000)]
+        self.assertGreater(len(set([slot_of(a, 1 << 16) for a in addresses])), 15000)
+
+        builder = HolderTableBuilder()
+        for (i, a) in enumerate(addresses):
+            builder.set(a, i)
+        builder.write(self.path)
+        table = HolderTable(self.path)
+        self.assertEqual(len(table), 20000)
+        for i in [0, 1, 12345, 19999]:
+            self.assertEqual(table.balance_of(addresses[i]), i)
+        table.close()
+
+
+class TestHolderTableToken(TestGiftableToken):
+
+    def setUp(self):
+        super(TestHolderTableToken, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'holders')
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestHolderTableToken, self).tearDown()
+
+
+    def test_populate(self):
+        nonce_oracle = RPCNonceOracle(self.accounts[0], conn=self.rpc)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        for i in range(1, 4):
+            (tx_hash, o) = c.transfer(self.address, self.accounts[0], self.accounts[i], i * 100)
+            self.rpc.do(o)
+        (tx_hash, o) = c.mint_to(self.address, self.accounts[0], self.accounts[4], 500)
+        self.rpc.do(o)
+
+        events = HolderTableBuilder()
+        scanner = LogScanner(self.rpc, GiftableToken.event_plans())
+        self.assertEqual(events.apply(scanner.scan(self.address, 0)), 5)
+        events.write(self.path)
+
+        results = HolderTableBuilder()
+        for (chunk, o) in c.balance_of_batch(self.address, self.accounts[:5], sender_address=self.accounts[0], batch_size=5):
+            results.set_results(chunk, do_batch(self.rpc, o))
+
+        table = HolderTable(self.path)
+        for a in self.accounts[:5]:
+            self.assertEqual(table.balance_of(a), results.balance_of(a))
+        self.assertEqual(table.balance_of(self.accounts[0]), self.initial_supply - 600)
+        table.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# standard imports
+import os
+import unittest
+import logging
+import tempfile
+import shutil
+
+# external imports
+from chainlib.chain import ChainSpec
+from chainlib.eth.nonce import RPCNonceOracle
+from chainlib.eth.tx import receipt
+from hexathon import strip_0x
+
+# local imports
+from eth_erc20.ledger import (
+        BalanceLedger,
+        event_plans,
+        )
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.unittest import TestGiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class TestLedger(TestGiftableToken):
+
+    def setUp(self):
+        super(TestLedger, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'ledger.sqlite')
+        self.plans = GiftableToken.event_plans()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestLedger, self).tearDown()
+
+
+    def test_ledger_sync(self):
+        # the default event plans decode all balance changing events of the giftable token
+        topics = [o.topic for o in GiftableToken.event_plans()]
+        for o in event_plans():
+            self.assertIn(o.topic, topics)
+
+        nonce_oracle = RPCNonceOracle(self.accounts[0], conn=self.conn)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        (tx_hash, o) = c.transfer(self.address, self.accounts[0], self.accounts[1], 1000)
+        self.rpc.do(o)
+        (tx_hash, o) = c.mint_to(self.address, self.accounts[0], self.accounts[2], 500)
+        self.rpc.do(o)
+
+        ledger = BalanceLedger(self.path, self.chain_spec)
+        checkpoint = ledger.sync(self.rpc, self.address)
+        self.assertEqual(ledger.checkpoint(self.address), checkpoint)
+        self.assertEqual(ledger.balance_of(self.address, self.accounts[0]), self.initial_supply - 1000)
+        self.assertEqual(ledger.balance_of(self.address, self.accounts[1]), 1000)
+        self.assertEqual(ledger.balance_of(self.address, self.accounts[2]), 500)
+        self.assertEqual(ledger.balance_of(self.address, self.accounts[3]), 0)
+        self.assertEqual(ledger.verify(self.rpc, self.address, sender_address=self.accounts[0]), [])
+        ledger.close()
+
+        (tx_hash, o) = c.burn(self.address, self.accounts[0], 2000)
+        self.rpc.do(o)
+        nonce_oracle = RPCNonceOracle(self.accounts[1], conn=self.conn)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        (tx_hash, o) = c.approve(self.address, self.accounts[1], self.accounts[2], 300)
+        self.rpc.do(o)
+        nonce_oracle = RPCNonceOracle(self.accounts[2], conn=self.conn)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        (tx_hash, o) = c.transfer_from(self.address, self.accounts[2], self.accounts[1], self.accounts[3], 300)
+        self.rpc.do(o)
+        o = receipt(tx_hash)
+        r = self.rpc.do(o)
+        self.assertEqual(r['status'], 1)
+
+        ledger = BalanceLedger(self.path, self.chain_spec)
+        self.assertEqual(ledger.checkpoint(self.address), checkpoint)
+        checkpoint_new = ledger.sync(self.rpc, self.address)
+        self.assertEqual(checkpoint_new, checkpoint + 3)
+        r = ledger.balances(self.address, self.accounts[:4])
+        self.assertEqual(r, {
+            strip_0x(self.accounts[0]): self.initial_supply - 3000,
+            strip_0x(self.accounts[1]): 700,
+            strip_0x(self.accounts[2]): 500,
+            strip_0x(self.accounts[3]): 300,
+            })
+        self.assertEqual(ledger.balances(self.address), r)
+        self.assertEqual(ledger.verify(self.rpc, self.address, holder_addresses=self.accounts[:5], sender_address=self.accounts[0]), [])
+        self.assertEqual(ledger.sync(self.rpc, self.address), checkpoint_new)
+
+
+    def test_ledger_flush(self):
+        nonce_oracle = RPCNonceOracle(self.accounts[0], conn=self.conn)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        for i in range(1, 5):
+            (tx_hash, o) = c.transfer(self.address, self.accounts[0], self.accounts[i], i)
+            self.rpc.do(o)
+        ledger = BalanceLedger(self.path, self.chain_spec)
+        ledger.sync(self.rpc, self.address, plans=self.plans, flush_size=1, end=3)
+        self.assertEqual(ledger.checkpoint(self.address), 3)
+        self.assertEqual(ledger.balance_of(self.address, self.accounts[1]), 1)
+        self.assertEqual(ledger.balance_of(self.address, self.accounts[2]), 0)
+        ledger.sync(self.rpc, self.address, plans=self.plans, flush_size=1)
+        self.assertEqual(ledger.verify(self.rpc, self.address, sender_address=self.accounts[0]), [])
+
+
+    def test_ledger_chain(self):
+        ledger = BalanceLedger(self.path, self.chain_spec)
+        ledger.close()
+        with self.assertRaises(ValueError):
+            BalanceLedger(self.path, ChainSpec('evm', 'barchain', 13))
+        ledger = BalanceLedger(self.path, self.chain_spec)
+        with self.assertRaises(ValueError):
+            ledger.verify(self.rpc, self.address)
+
+
+if __name__ == '__main__':
+    unittest.main()
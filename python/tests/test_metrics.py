@@ -0,0 +1,121 @@
+# standard imports
+import os
+import json
+import atexit
+import unittest
+import logging
+import tempfile
+import shutil
+
+# external imports
+from chainlib.eth.connection import EthHTTPConnection
+from chainlib.eth.nonce import RPCNonceOracle
+from chainlib.eth.tx import receipt
+from chainlib.settings import ChainSettings
+from chainlib.error import JSONRPCException
+from hexathon import strip_0x
+
+# local imports
+from eth_erc20.metrics import (
+        Metrics,
+        InstrumentedConnection,
+        process_metrics,
+        write_metrics,
+        )
+from eth_erc20.batch import do_batch
+from eth_erc20.cache import TokenMetadataCache
+from eth_erc20.unittest.server import RPCServer
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.unittest import TestGiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class TestMetrics(TestGiftableToken):
+
+    def setUp(self):
+        super(TestMetrics, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = RPCServer(self.rpc)
+        self.server.start()
+
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir)
+        super(TestMetrics, self).tearDown()
+
+
+    def test_connection(self):
+        metrics = Metrics()
+        conn = InstrumentedConnection(EthHTTPConnection(self.server.url), metrics, call_plans=GiftableToken.call_plans(), chain_spec=self.chain_spec)
+        contract = strip_0x(self.address).lower()
+        c = GiftableToken(self.chain_spec)
+
+        for (chunk, o) in c.balance_of_batch(self.address, self.accounts[:5], sender_address=self.accounts[0], batch_size=5):
+            r = do_batch(conn, o)
+            self.assertEqual(c.parse_balance_batch(chunk, r)[self.accounts[0]], self.initial_supply)
+        self.assertEqual(self.server.batch_count, 1)
+        self.assertEqual(metrics.counter('erc20_rpc_batches_total'), 1)
+        self.assertEqual(metrics.counter('erc20_rpc_requests_total', (('method', 'eth_call'), ('contract', contract), ('call', 'balanceOf'),)), 5)
+
+        nonce_oracle = RPCNonceOracle(self.accounts[1], conn=conn)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        (tx_hash, o) = c.transfer(self.address, self.accounts[1], self.accounts[2], 1024)
+        conn.do(o)
+        r = conn.do(receipt(tx_hash))
+        self.assertEqual(r['status'], 0)
+        self.assertEqual(metrics.counter('erc20_rpc_requests_total', (('method', 'eth_sendRawTransaction'), ('contract', contract), ('call', 'transfer'),)), 1)
+        self.assertEqual(metrics.counter('erc20_reverts_total', (('contract', contract),)), 1)
+
+        with self.assertRaises(JSONRPCException):
+            conn.do({'jsonrpc': '2.0', 'id': 42, 'method': 'eth_foo', 'params': []})
+        self.assertEqual(metrics.counter('erc20_rpc_errors_total', (('method', 'eth_foo'), ('contract', ''), ('call', ''),)), 1)
+
+        s = metrics.prometheus()
+        self.assertIn('# TYPE erc20_rpc_latency_seconds histogram\n', s)
+        self.assertIn('erc20_rpc_requests_total{{method="eth_call",contract="{}",call="balanceOf"}} 5\n'.format(contract), s)
+        self.assertIn('erc20_rpc_latency_seconds_bucket{method="batch",le="+Inf"} 1\n', s)
+        self.assertIn('erc20_rpc_latency_seconds_count{method="batch"} 1\n', s)
+
+
+    def test_cache(self):
+        metrics = Metrics()
+        path = os.path.join(self.tmp_dir, 'cache')
+        cache = TokenMetadataCache(path=path, metrics=metrics)
+        self.assertIsNone(cache.get(self.chain_spec, self.address))
+        cache.put(self.chain_spec, self.address, {'decimals': 6})
+        cache.get(self.chain_spec, self.address)
+        cache = TokenMetadataCache(path=path, metrics=metrics)
+        cache.get(self.chain_spec, self.address)
+        self.assertEqual(metrics.counter('erc20_cache_misses_total', (('cache', 'metadata'),)), 1)
+        self.assertEqual(metrics.counter('erc20_cache_hits_total', (('cache', 'metadata'), ('tier', 'memory'),)), 1)
+        self.assertEqual(metrics.counter('erc20_cache_hits_total', (('cache', 'metadata'), ('tier', 'disk'),)), 1)
+
+
+    def test_process_metrics(self):
+        settings = ChainSettings()
+        conn = EthHTTPConnection(self.server.url)
+        nonce_oracle = RPCNonceOracle(self.accounts[0], conn=conn)
+        settings.set('CONN', conn)
+        settings.set('NONCE_ORACLE', nonce_oracle)
+        settings.set('CHAIN_SPEC', self.chain_spec)
+        self.assertIsNone(process_metrics(settings, None))
+        self.assertIs(settings.get('CONN'), conn)
+
+        path = os.path.join(self.tmp_dir, 'metrics.json')
+        metrics = process_metrics(settings, path)
+        atexit.unregister(write_metrics)
+        self.assertIs(settings.get('METRICS'), metrics)
+        self.assertIs(nonce_oracle.conn, settings.get('CONN'))
+        nonce_oracle.get_nonce()
+        metrics.write(path)
+        f = open(path, 'r')
+        o = json.load(f)
+        f.close()
+        self.assertEqual(o['counters'][0]['labels']['method'], 'eth_getTransactionCount')
+
+
+if __name__ == '__main__':
+    unittest.main()
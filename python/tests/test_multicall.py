@@ -0,0 +1,145 @@
+# standard imports
+import unittest
+import logging
+
+# external imports
+from chainlib.eth.nonce import RPCNonceOracle
+from chainlib.eth.tx import receipt
+from chainlib.eth.block import block_latest
+
+# local imports
+from eth_erc20 import ERC20
+from eth_erc20.multicall import (
+        Multicall,
+        MAX_CALLS,
+        MAX_DATA_LENGTH,
+        )
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.unittest import TestGiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class TestMulticall(TestGiftableToken):
+
+    def publish_fixture(self):
+        super(TestMulticall, self).publish_fixture()
+        nonce_oracle = RPCNonceOracle(self.accounts[0], conn=self.conn)
+        c = Multicall(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        (tx_hash, o) = c.constructor(self.accounts[0])
+        self.rpc.do(o)
+        o = receipt(tx_hash)
+        r = self.rpc.do(o)
+        self.assertEqual(r['status'], 1)
+        self.multicall_address = r['contract_address']
+
+
+    def test_multicall_interface(self):
+        c = ERC20(self.chain_spec)
+        calls = [
+            c.balance_of(self.address, self.accounts[0], sender_address=self.accounts[0]),
+            c.balance_of(self.address, self.accounts[1], sender_address=self.accounts[0]),
+            c.total_supply(self.address, sender_address=self.accounts[0]),
+            c.name(self.address, sender_address=self.accounts[0]),
+            c.symbol(self.address, sender_address=self.accounts[0]),
+            c.decimals(self.address, sender_address=self.accounts[0]),
+            c.allowance(self.address, self.accounts[0], self.accounts[1], sender_address=self.accounts[0]),
+                ]
+        parsers = [
+            c.parse_balance,
+            c.parse_balance,
+            c.parse_total_supply,
+            c.parse_name,
+            c.parse_symbol,
+            c.parse_decimals,
+            c.parse_allowance,
+                ]
+        m = Multicall(self.chain_spec)
+        o = m.aggregate(self.multicall_address, calls, sender_address=self.accounts[0])
+        r = self.rpc.do(o)
+        (block_number, results) = m.parse_aggregate(r, parsers=parsers)
+        self.assertGreater(block_number, 0)
+        self.assertEqual(results, [
+            self.initial_supply,
+            0,
+            self.initial_supply,
+            self.name,
+            self.symbol,
+            self.decimals,
+            0,
+            ])
+
+        for i in range(len(calls)):
+            r = self.rpc.do(calls[i])
+            self.assertEqual(parsers[i](r), results[i])
+
+
+    def test_multicall_giftable(self):
+        nonce_oracle = RPCNonceOracle(self.accounts[0], conn=self.conn)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        (tx_hash, o) = c.burn(self.address, self.accounts[0], 1024)
+        self.rpc.do(o)
+        o = receipt(tx_hash)
+        r = self.rpc.do(o)
+        self.assertEqual(r['status'], 1)
+
+        calls = [
+            c.total_minted(self.address, sender_address=self.accounts[0]),
+            c.burned(self.address, sender_address=self.accounts[0]),
+            c.total_supply(self.address, sender_address=self.accounts[0]),
+                ]
+        m = Multicall(self.chain_spec)
+        o = m.aggregate(self.multicall_address, calls, sender_address=self.accounts[0])
+        r = self.rpc.do(o)
+        (block_number, results) = m.parse_aggregate(r, parsers=[c.parse_balance, c.parse_balance, c.parse_total_supply])
+        self.assertEqual(results, [self.initial_supply, 1024, self.initial_supply - 1024])
+
+        o = block_latest()
+        r = self.rpc.do(o)
+        self.assertEqual(block_number, r)
+
+
+    def test_multicall_raw(self):
+        c = GiftableToken(self.chain_spec)
+        m = Multicall(self.chain_spec)
+        calls = [
+            (self.address, c.total_minted(self.address)['params'][0]['data'],),
+                ]
+        o = m.aggregate(self.multicall_address, calls, sender_address=self.accounts[0])
+        r = self.rpc.do(o)
+        (block_number, results) = m.parse_aggregate(r)
+        self.assertEqual(results, ['0x' + self.initial_supply.to_bytes(32, 'big').hex()])
+
+        with self.assertRaises(ValueError):
+            m.parse_aggregate(r, parsers=[])
+
+
+    def test_multicall_limits(self):
+        c = GiftableToken(self.chain_spec)
+        o = c.total_supply(self.address)
+
+        # no limits unless given, as for standard multicall deployments
+        m = Multicall(self.chain_spec)
+        m.aggregate(self.multicall_address, [o] * (MAX_CALLS + 1))
+        m.aggregate(self.multicall_address, [(self.address, '00' * (MAX_DATA_LENGTH + 1))])
+
+        m = Multicall(self.chain_spec, max_calls=MAX_CALLS, max_data_length=MAX_DATA_LENGTH)
+        m.aggregate(self.multicall_address, [o] * MAX_CALLS)
+        with self.assertRaises(ValueError):
+            m.aggregate(self.multicall_address, [o] * (MAX_CALLS + 1))
+        with self.assertRaises(ValueError):
+            m.aggregate(self.multicall_address, [(self.address, '00' * (MAX_DATA_LENGTH + 1))])
+
+
+    def test_multicall_height(self):
+        c = GiftableToken(self.chain_spec)
+        m = Multicall(self.chain_spec)
+        m.aggregate(self.multicall_address, [c.total_supply(self.address, height=42)], height=42)
+        with self.assertRaises(ValueError):
+            m.aggregate(self.multicall_address, [c.total_supply(self.address, height=42)])
+        with self.assertRaises(ValueError):
+            m.aggregate(self.multicall_address, [c.total_supply(self.address)], height=42)
+
+if __name__ == '__main__':
+    unittest.main()
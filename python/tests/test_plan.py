@@ -0,0 +1,137 @@
+# standard imports
+import unittest
+import logging
+
+# external imports
+from chainlib.eth.unittest.ethtester import EthTesterCase
+from chainlib.eth.nonce import OverrideNonceOracle
+from chainlib.eth.gas import OverrideGasOracle
+from chainlib.eth.contract import (
+        ABIContractEncoder,
+        ABIContractType,
+        )
+from chainlib.eth.tx import TxFormat
+from chainlib.jsonrpc import (
+        JSONRPCRequest,
+        IntSequenceGenerator,
+        )
+from hexathon import add_0x
+
+# local imports
+from eth_erc20 import ERC20
+from eth_erc20.plan import CallPlan
+from giftable_erc20_token import GiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+def reference_call(c, method, typs, args, contract_address, sender_address, height='latest', id_generator=None):
+    j = JSONRPCRequest(id_generator)
+    o = j.template()
+    o['method'] = 'eth_call'
+    enc = ABIContractEncoder()
+    enc.method(method)
+    for typ in typs:
+        enc.typ(typ)
+    for i in range(len(typs)):
+        getattr(enc, typs[i].value)(args[i])
+    data = add_0x(enc.get())
+    tx = c.template(sender_address, contract_address)
+    tx = c.set_code(tx, data)
+    o['params'].append(c.normalize(tx))
+    o['params'].append(height)
+    return j.finalize(o)
+
+
+def reference_transact(c, method, typs, args, contract_address, sender_address, tx_format, prefix=True):
+    enc = ABIContractEncoder()
+    enc.method(method)
+    for typ in typs:
+        enc.typ(typ)
+    for i in range(len(typs)):
+        getattr(enc, typs[i].value)(args[i])
+    data = enc.get()
+    if prefix:
+        data = add_0x(data)
+    tx = c.template(sender_address, contract_address, use_nonce=True)
+    tx = c.set_code(tx, data)
+    return c.finalize(tx, tx_format)
+
+
+class TestPlan(EthTesterCase):
+
+    def setUp(self):
+        super(TestPlan, self).setUp()
+        self.contract_address = self.accounts[9]
+
+
+    def test_plan_selector(self):
+        plan = CallPlan.get('transfer', ABIContractType.ADDRESS, ABIContractType.UINT256)
+        self.assertEqual(plan.selector, 'a9059cbb')
+        self.assertEqual(plan.signature, 'transfer(address,uint256)')
+        self.assertIs(plan, CallPlan.get('transfer', ABIContractType.ADDRESS, ABIContractType.UINT256))
+
+        with self.assertRaises(ValueError):
+            plan.encode(self.accounts[1])
+
+        with self.assertRaises(ValueError):
+            plan.encode(self.accounts[1][:-2], 42)
+
+        with self.assertRaises(NotImplementedError):
+            CallPlan('foo', ABIContractType.STRING)
+
+
+    def test_plan_call_identical(self):
+        for gas_oracle in [None, OverrideGasOracle(price=1000000000, limit=100000)]:
+            c = ERC20(self.chain_spec, gas_oracle=gas_oracle)
+            a = self.accounts[1]
+            b = self.accounts[2]
+            cases = [
+                (c.balance_of, (a,), 'balanceOf', [ABIContractType.ADDRESS], [a]),
+                (c.allowance, (a, b,), 'allowance', [ABIContractType.ADDRESS, ABIContractType.ADDRESS], [a, b]),
+                (c.symbol, (), 'symbol', [], []),
+                (c.name, (), 'name', [], []),
+                (c.decimals, (), 'decimals', [], []),
+                (c.total_supply, (), 'totalSupply', [], []),
+                    ]
+            for (m, args, method, typs, values) in cases:
+                o = m(self.contract_address, *args, sender_address=self.accounts[0], id_generator=IntSequenceGenerator(42))
+                r = reference_call(c, method, typs, values, self.contract_address, self.accounts[0], id_generator=IntSequenceGenerator(42))
+                self.assertEqual(o, r)
+
+            o = c.balance_of(self.contract_address, a, height=1024)
+            r = reference_call(c, 'balanceOf', [ABIContractType.ADDRESS], [a], self.contract_address, '0x' + '00' * 20, height='0x0000000000000400')
+            o['id'] = r['id']
+            self.assertEqual(o, r)
+
+        c = GiftableToken(self.chain_spec)
+        for (m, method) in [(c.burned, 'totalBurned'), (c.total_minted, 'totalMinted')]:
+            o = m(self.contract_address, sender_address=self.accounts[0], id_generator=IntSequenceGenerator(42))
+            r = reference_call(c, method, [], [], self.contract_address, self.accounts[0], id_generator=IntSequenceGenerator(42))
+            self.assertEqual(o, r)
+
+
+    def test_plan_transact_identical(self):
+        a = self.accounts[1]
+        b = self.accounts[2]
+        for tx_format in [TxFormat.DICT, TxFormat.RLP_SIGNED, TxFormat.RAW_ARGS]:
+            c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=OverrideNonceOracle(self.accounts[0], 13))
+            c_ref = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=OverrideNonceOracle(self.accounts[0], 13))
+            cases = [
+                (c.transfer, (a, 1024,), 'transfer', [ABIContractType.ADDRESS, ABIContractType.UINT256], True),
+                (c.transfer_from, (a, b, 1024,), 'transferFrom', [ABIContractType.ADDRESS, ABIContractType.ADDRESS, ABIContractType.UINT256], True),
+                (c.approve, (a, 1024,), 'approve', [ABIContractType.ADDRESS, ABIContractType.UINT256], True),
+                (c.mint_to, (a, 1024,), 'mintTo', [ABIContractType.ADDRESS, ABIContractType.UINT256], False),
+                (c.burn, (1024,), 'burn', [ABIContractType.UINT256], False),
+                (c.add_minter, (a,), 'addMinter', [ABIContractType.ADDRESS], False),
+                (c.remove_minter, (a,), 'removeMinter', [ABIContractType.ADDRESS], False),
+                    ]
+            for (m, args, method, typs, prefix) in cases:
+                o = m(self.contract_address, self.accounts[0], *args, tx_format=tx_format)
+                r = reference_transact(c_ref, method, typs, args, self.contract_address, self.accounts[0], tx_format, prefix=prefix)
+                self.assertEqual(o, r)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+# standard imports
+import os
+import sys
+import json
+import unittest
+import logging
+import time
+import tempfile
+import shutil
+import subprocess
+
+# external imports
+from funga.eth.keystore.keyfile import to_dict
+from chainlib.eth.block import block_latest
+from chainlib.eth.nonce import RPCNonceOracle
+from hexathon import strip_0x
+
+# local imports
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.unittest import TestGiftableToken
+from eth_erc20.unittest.server import RPCServer
+from eth_erc20.amount import codec
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+root_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+class TestRunnableImports(unittest.TestCase):
+
+    def test_imports(self):
+        # modules only needed by bulk, faucet and wait modes are not loaded on startup
+        env = dict(os.environ)
+        env['PYTHONPATH'] = root_dir + os.pathsep + env.get('PYTHONPATH', '')
+        for module in ['eth_erc20.runnable.transfer', 'giftable_erc20_token.runnable.gift', 'giftable_erc20_token.runnable.minter']:
+            code = 'import sys, {}; print(" ".join(sys.modules.keys()))'.format(module)
+            r = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+            loaded = r.stdout.split()
+            for v in ['eth_erc20.airdrop', 'eth_erc20.track', 'eth_erc20.classify', 'giftable_erc20_token.faucet', 'http.server']:
+                self.assertNotIn(v, loaded, module)
+
+
+class TestRunnable(TestGiftableToken):
+
+    def setUp(self):
+        super(TestRunnable, self).setUp()
+        self.server = RPCServer(self.rpc)
+        self.server.start()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.key_file = os.path.join(self.tmp_dir, 'key.json')
+        pk = self.keystore.get(self.accounts[0])
+        f = open(self.key_file, 'w')
+        json.dump(to_dict(pk), f)
+        f.close()
+        self.passphrase_file = os.path.join(self.tmp_dir, 'passphrase')
+        f = open(self.passphrase_file, 'w')
+        f.close()
+
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir)
+        super(TestRunnable, self).tearDown()
+
+
+    def run_cli(self, module, *args, stdin=None):
+        env = dict(os.environ)
+        env['PYTHONPATH'] = root_dir + os.pathsep + env.get('PYTHONPATH', '')
+        cmd = [sys.executable, '-m', module, '-p', self.server.url, '-i', str(self.chain_spec), '-y', self.key_file, '--passphrase-file', self.passphrase_file] + list(args)
+        if stdin == None:
+            return subprocess.run(cmd, env=env, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=120)
+        return subprocess.run(cmd, env=env, capture_output=True, text=True, input=stdin, timeout=120)
+
+
+    def balance(self, address):
+        c = GiftableToken(self.chain_spec)
+        o = c.balance_of(self.address, address, sender_address=self.accounts[0])
+        return c.parse_balance(self.rpc.do(o))
+
+
+    def test_transfer_bulk(self):
+        csv_file = os.path.join(self.tmp_dir, 'drop.csv')
+        f = open(csv_file, 'w')
+        f.write('{},100\n{},200\n'.format(self.accounts[1], self.accounts[2]))
+        f.close()
+
+        r = self.run_cli('eth_erc20.runnable.transfer', '-e', self.address, '--csv', csv_file, '--fee-limit', '100000', '-s', '-w')
+        self.assertEqual(r.returncode, 0, r.stderr[-2000:])
+        lines = r.stdout.strip().split('\n')
+        self.assertEqual(len(lines), 2)
+        for l in lines:
+            self.assertEqual(l.split(',')[3], '1')
+        self.assertEqual(self.balance(self.accounts[1]), 100)
+        self.assertEqual(self.balance(self.accounts[2]), 200)
+
+        # transactions rejected by the node fail the run instead of waiting for receipts forever
+        csv_file = os.path.join(self.tmp_dir, 'rejected.csv')
+        f = open(csv_file, 'w')
+        f.write('{},100\n'.format(self.accounts[3]))
+        f.close()
+        r = self.run_cli('eth_erc20.runnable.transfer', '-e', self.address, '--csv', csv_file, '--fee-limit', '21000', '-s', '-w')
+        self.assertEqual(r.returncode, 1)
+        self.assertEqual(r.stdout.strip().split(',')[3], 'rejected')
+        self.assertEqual(self.balance(self.accounts[3]), 0)
+
+
+    def test_transfer(self):
+        r = self.run_cli('eth_erc20.runnable.transfer', '-e', self.address, '-a', strip_0x(self.accounts[1]), '--fee-limit', '100000', '-s', '-w', '1000')
+        self.assertEqual(r.returncode, 0, r.stderr[-2000:])
+        self.assertEqual(self.balance(self.accounts[1]), 1000)
+
+
+    def test_publish_spec(self):
+        spec_file = os.path.join(self.tmp_dir, 'spec.csv')
+        f = open(spec_file, 'w')
+        f.write('Foo Token,FOO,6,0,1000,giftable\nBar Token,BAR,2,0,4200,static\n')
+        f.close()
+        manifest_file = os.path.join(self.tmp_dir, 'manifest.json')
+
+        # the default fee limit is used, which only covers value transfers
+        r = self.run_cli('giftable_erc20_token.runnable.publish', '--spec', spec_file, '--manifest', manifest_file, '-s', '-w')
+        self.assertEqual(r.returncode, 0, r.stderr[-2000:])
+        f = open(manifest_file, 'r')
+        manifest = json.load(f)
+        f.close()
+        self.assertEqual([o['status'] for o in manifest], [1, 1])
+        self.assertEqual(manifest[0]['mint_status'], 1)
+        for (o, v) in zip(manifest, [1000, 4200]):
+            c = GiftableToken(self.chain_spec)
+            r = self.rpc.do(c.balance_of(o['address'], self.accounts[0], sender_address=self.accounts[0]))
+            self.assertEqual(c.parse_balance(r), v)
+
+
+    def test_info_order(self):
+        contracts = [self.address]
+        for i in range(3):
+            contracts.append(self.publish_giftable_token('Bar Token', 'BAR{}'.format(i)))
+
+        # queries for the first contract are answered last
+        process = self.server.process
+        def process_slow(o):
+            if o['method'] == 'eth_call' and strip_0x(o['params'][0]['to']).lower() == strip_0x(contracts[0]).lower():
+                time.sleep(0.5)
+            return process(o)
+        self.server.process = process_slow
+
+        env = dict(os.environ)
+        env['PYTHONPATH'] = root_dir + os.pathsep + env.get('PYTHONPATH', '')
+        height = self.rpc.do(block_latest())
+        cmd = [sys.executable, '-m', 'eth_erc20.runnable.info', '-p', self.server.url, '-i', str(self.chain_spec), '--height', str(height), '-f', strip_0x(self.accounts[0]), '--no-cache', '--batch-size', '1', '--concurrency', '4'] + contracts
+        r = subprocess.run(cmd, env=env, capture_output=True, text=True, stdin=subprocess.DEVNULL, timeout=120)
+        self.assertEqual(r.returncode, 0, r.stderr[-2000:])
+        addresses = [l[len('Address: '):] for l in r.stdout.split('\n') if l.startswith('Address: ')]
+        self.assertEqual([strip_0x(a).lower() for a in addresses], [strip_0x(a).lower() for a in contracts])
+
+
+    def test_balance_address_file(self):
+        nonce_oracle = RPCNonceOracle(self.accounts[0], conn=self.rpc)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        (tx_hash, o) = c.transfer(self.address, self.accounts[0], self.accounts[1], 1000)
+        self.rpc.do(o)
+        addresses = self.accounts[:3]
+        balances = [self.initial_supply - 1000, 1000, 0]
+
+        # decimals are queried once for all addresses
+        decimals_calls = [0]
+        process = self.server.process
+        def process_count(o):
+            if o['method'] == 'eth_call' and o['params'][0]['data'][:10] == '0x313ce567':
+                decimals_calls[0] += 1
+            return process(o)
+        self.server.process = process_count
+
+        address_file = os.path.join(self.tmp_dir, 'addresses')
+        f = open(address_file, 'w')
+        f.write('# holders\n{}\n\n{}\n{}\n'.format(*[strip_0x(a) for a in addresses]))
+        f.close()
+        r = self.run_cli('eth_erc20.runnable.balance', '-e', self.address, '--address-file', address_file, '--no-cache', '--batch-size', '1')
+        self.assertEqual(r.returncode, 0, r.stderr[-2000:])
+        lines = r.stdout.strip().split('\n')
+        self.assertEqual(lines[0], 'address,balance')
+        results = {}
+        for l in lines[1:]:
+            (address, balance) = l.split(',')
+            results[strip_0x(address).lower()] = balance
+        c = codec(self.decimals)
+        self.assertEqual(results, dict([(strip_0x(a).lower(), c.format(v)) for (a, v) in zip(addresses, balances)]))
+        self.assertEqual(decimals_calls[0], 1)
+
+        r = self.run_cli('eth_erc20.runnable.balance', '-e', self.address, '--address-file', '-', '--format', 'ndjson', '--raw', stdin='\n'.join(addresses) + '\n')
+        self.assertEqual(r.returncode, 0, r.stderr[-2000:])
+        results = {}
+        for l in r.stdout.strip().split('\n'):
+            o = json.loads(l)
+            results[strip_0x(o['address']).lower()] = o['balance']
+        self.assertEqual(results, dict([(strip_0x(a).lower(), str(v)) for (a, v) in zip(addresses, balances)]))
+
+        r = self.run_cli('eth_erc20.runnable.balance', '-e', self.address, '--address-file', os.path.join(self.tmp_dir, 'missing'), '--raw')
+        self.assertNotEqual(r.returncode, 0)
+
+
+    def test_transfer_value_required(self):
+        r = self.run_cli('eth_erc20.runnable.transfer', '-e', self.address, '-a', strip_0x(self.accounts[1]), '-s')
+        self.assertEqual(r.returncode, 2)
+        self.assertIn('value', r.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
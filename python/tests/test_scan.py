@@ -0,0 +1,92 @@
+# standard imports
+import unittest
+import logging
+
+# external imports
+from chainlib.eth.nonce import RPCNonceOracle
+from chainlib.eth.tx import receipt
+from chainlib.error import JSONRPCException
+from hexathon import strip_0x
+
+# local imports
+from eth_erc20 import ERC20
+from eth_erc20.scan import LogScanner
+from eth_erc20.unittest.base import add_log_methods
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.unittest import TestGiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class TestScan(TestGiftableToken):
+
+    def setUp(self):
+        super(TestScan, self).setUp()
+        nonce_oracle = RPCNonceOracle(self.accounts[0], conn=self.conn)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        for i in range(1, 9):
+            (tx_hash, o) = c.mint_to(self.address, self.accounts[0], self.accounts[1], i)
+            self.rpc.do(o)
+        (tx_hash, o) = c.transfer(self.address, self.accounts[0], self.accounts[2], 100)
+        self.rpc.do(o)
+        (tx_hash, o) = c.approve(self.address, self.accounts[0], self.accounts[3], 200)
+        self.rpc.do(o)
+        (tx_hash, o) = c.burn(self.address, self.accounts[0], 300)
+        self.rpc.do(o)
+        o = receipt(tx_hash)
+        r = self.rpc.do(o)
+        self.assertEqual(r['status'], 1)
+
+
+    def test_scan_giftable(self):
+        scanner = LogScanner(self.rpc, GiftableToken.event_plans())
+        r = list(scanner.scan(self.address, 0))
+        self.assertEqual([v.__class__.__name__ for v in r], ['Mint'] * 9 + ['Transfer', 'Approval', 'Burn'])
+        self.assertEqual(r[0].value, self.initial_supply)
+        self.assertEqual([v.value for v in r[1:9]], list(range(1, 9)))
+        self.assertEqual(r[1].beneficiary, strip_0x(self.accounts[1]))
+        self.assertEqual(r[9].sender, strip_0x(self.accounts[0]))
+        self.assertEqual(r[9].recipient, strip_0x(self.accounts[2]))
+        self.assertEqual(r[9].value, 100)
+        self.assertEqual(r[10].spender, strip_0x(self.accounts[3]))
+        self.assertEqual(r[11].value, 300)
+        for i in range(1, len(r)):
+            self.assertGreater(r[i].block_number, r[i-1].block_number)
+
+
+    def test_scan_erc20(self):
+        scanner = LogScanner(self.rpc, ERC20.event_plans())
+        r = list(scanner.scan(self.address, 0))
+        self.assertEqual([v.__class__.__name__ for v in r], ['Transfer', 'Approval'])
+
+
+    def test_scan_adaptive(self):
+        add_log_methods(self.rpc, result_limit=2)
+        scanner = LogScanner(self.rpc, GiftableToken.event_plans(), chunk_size=8, result_limit=2)
+        r = list(scanner.scan(self.address, 0))
+        self.assertEqual(len(r), 12)
+        self.assertLessEqual(scanner.chunk_size, 2)
+
+        add_log_methods(self.rpc, result_limit=0)
+        scanner = LogScanner(self.rpc, GiftableToken.event_plans(), chunk_size=1, result_limit=10)
+        r = list(scanner.scan(self.address, 0, end=4))
+        self.assertEqual(len(r), 3)
+        self.assertEqual(scanner.chunk_size, 8)
+
+        with self.assertRaises(ValueError):
+            LogScanner(self.rpc, [], chunk_size=0)
+
+
+    def test_scan_fail(self):
+        def eth_getLogs(p):
+            raise ValueError('query timeout')
+        self.rpc.eth_getLogs = eth_getLogs
+        scanner = LogScanner(self.rpc, GiftableToken.event_plans(), chunk_size=4)
+        with self.assertRaises(JSONRPCException):
+            list(scanner.scan(self.address, 0))
+        self.assertEqual(scanner.chunk_size, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# standard imports
+import unittest
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+# external imports
+from chainlib.eth.nonce import (
+        RPCNonceOracle,
+        OverrideNonceOracle,
+        )
+from chainlib.eth.tx import (
+        TxFormat,
+        receipt,
+        )
+from chainlib.jsonrpc import IntSequenceGenerator
+
+# local imports
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.unittest import TestGiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class TestSign(TestGiftableToken):
+
+    def templates(self, nonce):
+        nonce_oracle = OverrideNonceOracle(self.accounts[0], nonce)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        r = []
+        for i in range(1, 10):
+            r.append(c.transfer(self.address, self.accounts[0], self.accounts[i], i, tx_format=TxFormat.DICT))
+            r.append(c.mint_to(self.address, self.accounts[0], self.accounts[i], i, tx_format=TxFormat.DICT))
+            r.append(c.approve(self.address, self.accounts[0], self.accounts[i], i, tx_format=TxFormat.DICT))
+        return r
+
+
+    def test_finalize_batch(self):
+        nonce = RPCNonceOracle(self.accounts[0], conn=self.rpc).get_nonce()
+        c = GiftableToken(self.chain_spec, signer=self.signer)
+
+        id_generator = IntSequenceGenerator()
+        serial = [c.finalize(tx, id_generator=id_generator) for tx in self.templates(nonce)]
+        serial_raw = [c.finalize(tx, tx_format=TxFormat.RLP_SIGNED) for tx in self.templates(nonce)]
+
+        executor = ProcessPoolExecutor(max_workers=2)
+        try:
+            r = c.finalize_batch(self.templates(nonce), id_generator=IntSequenceGenerator(), executor=executor)
+            r_raw = c.finalize_batch(self.templates(nonce), tx_format=TxFormat.RLP_SIGNED, executor=executor)
+        finally:
+            executor.shutdown()
+        r_inline = c.finalize_batch(self.templates(nonce), id_generator=IntSequenceGenerator(), processes=1)
+        self.assertEqual(r, serial)
+        self.assertEqual(r_raw, serial_raw)
+        self.assertEqual(r_inline, serial)
+
+        for (tx_hash, o) in r:
+            self.rpc.do(o)
+            o = receipt(tx_hash)
+            self.assertEqual(self.rpc.do(o)['status'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+# standard imports
+import unittest
+import logging
+
+# external imports
+from chainlib.eth.nonce import RPCNonceOracle
+from chainlib.eth.gas import OverrideGasOracle
+from chainlib.eth.tx import (
+        TxFormat,
+        receipt,
+        )
+from chainlib.eth.contract import ABIContractType
+from hexathon import strip_0x
+
+# local imports
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.simulate import GiftableTokenSimulator
+from giftable_erc20_token.unittest import TestGiftableToken
+from eth_erc20.batch import do_batch
+from eth_erc20.sign import sign_batch
+from eth_erc20.plan import CallPlan
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+def transfer_data(to, value):
+    return CallPlan.get('transfer', ABIContractType.ADDRESS, ABIContractType.UINT256).encode(to, value)
+
+
+class TestSimulate(TestGiftableToken):
+
+    def token(self, sender_address):
+        if sender_address not in self.nonce_oracles:
+            self.nonce_oracles[sender_address] = RPCNonceOracle(sender_address, conn=self.rpc)
+        gas_oracle = OverrideGasOracle(price=1000000000, limit=100000, conn=self.rpc)
+        return GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=self.nonce_oracles[sender_address], gas_oracle=gas_oracle)
+
+
+    def transact(self, sender_address, method, typs, *args):
+        data = CallPlan.get(method, *typs).encode(*args)
+        return self.token(sender_address).transact_data(self.address, sender_address, data, tx_format=TxFormat.DICT)
+
+
+    def setUp(self):
+        super(TestSimulate, self).setUp()
+        self.nonce_oracles = {}
+
+
+    def test_against_chain(self):
+        a = self.accounts
+        txs = [
+            self.token(a[0]).transfer(self.address, a[0], a[1], 1000, tx_format=TxFormat.DICT),
+            self.token(a[1]).transfer(self.address, a[1], a[2], 1001, tx_format=TxFormat.DICT),
+            self.token(a[1]).transfer(self.address, a[1], a[1], 400, tx_format=TxFormat.DICT),
+            self.token(a[1]).approve(self.address, a[1], a[2], 500, tx_format=TxFormat.DICT),
+            self.token(a[1]).approve(self.address, a[1], a[2], 600, tx_format=TxFormat.DICT),
+            self.token(a[2]).transfer_from(self.address, a[2], a[1], a[3], 501, tx_format=TxFormat.DICT),
+            self.token(a[2]).transfer_from(self.address, a[2], a[1], a[3], 300, tx_format=TxFormat.DICT),
+            self.token(a[1]).approve(self.address, a[1], a[2], 0, tx_format=TxFormat.DICT),
+            self.token(a[1]).approve(self.address, a[1], a[2], 2000, tx_format=TxFormat.DICT),
+            self.token(a[2]).transfer_from(self.address, a[2], a[1], a[3], 800, tx_format=TxFormat.DICT),
+            self.token(a[0]).add_minter(self.address, a[0], a[1], tx_format=TxFormat.DICT),
+            self.token(a[1]).mint_to(self.address, a[1], a[4], 100, tx_format=TxFormat.DICT),
+            self.transact(a[0], 'addWriter', (ABIContractType.ADDRESS,), a[1]),
+            self.token(a[1]).mint_to(self.address, a[1], a[4], 100, tx_format=TxFormat.DICT),
+            self.token(a[1]).burn(self.address, a[1], 1, tx_format=TxFormat.DICT),
+            self.token(a[0]).burn(self.address, a[0], 1 << 41, tx_format=TxFormat.DICT),
+            self.token(a[0]).burn(self.address, a[0], 42, tx_format=TxFormat.DICT),
+            self.transact(a[2], 'deleteWriter', (ABIContractType.ADDRESS,), a[1]),
+            self.transact(a[1], 'deleteWriter', (ABIContractType.ADDRESS,), a[1]),
+            self.token(a[1]).mint_to(self.address, a[1], a[4], 100, tx_format=TxFormat.DICT),
+            self.transact(a[0], 'transferOwnership', (ABIContractType.ADDRESS,), a[3]),
+            self.token(a[0]).mint_to(self.address, a[0], a[4], 100, tx_format=TxFormat.DICT),
+            self.token(a[3]).mint_to(self.address, a[3], a[4], 100, tx_format=TxFormat.DICT),
+                ]
+
+        sim = GiftableTokenSimulator.from_node(self.rpc, self.chain_spec, self.address, holders=a[:5], sender_address=a[0])
+        self.assertEqual(sim.balance_of(a[0]), self.initial_supply)
+        self.assertTrue(sim.is_writer(a[0]))
+        reverts = sim.run(txs)
+        self.assertEqual([r.index for r in reverts], [1, 4, 5, 9, 10, 11, 14, 15, 17, 19, 21])
+        self.assertEqual(reverts[1].reason, 'allowance not zero')
+        self.assertEqual(reverts[4].reason, 'unknown method')
+        self.assertEqual(reverts[6].reason, 'ERR_ACCESS')
+        self.assertEqual(reverts[7].reason, 'ERR_FUNDS')
+
+        signed = sign_batch(self.signer, txs, processes=1)
+        for (tx_hash, tx_raw) in signed:
+            self.rpc.do({'jsonrpc': '2.0', 'id': 0, 'method': 'eth_sendRawTransaction', 'params': [tx_raw]})
+        chain_reverts = []
+        for (i, (tx_hash, tx_raw)) in enumerate(signed):
+            r = self.rpc.do(receipt(tx_hash))
+            if r['status'] == 0:
+                chain_reverts.append(i)
+        self.assertEqual(chain_reverts, [r.index for r in reverts])
+
+        c = GiftableToken(self.chain_spec)
+        o = [c.balance_of(self.address, x, sender_address=a[0]) for x in a[:5]]
+        o.append(c.allowance(self.address, a[1], a[2], sender_address=a[0]))
+        o.append(c.total_minted(self.address, sender_address=a[0]))
+        o.append(c.burned(self.address, sender_address=a[0]))
+        r = do_batch(self.rpc, o)
+        for (i, x) in enumerate(a[:5]):
+            self.assertEqual(sim.balance_of(x), c.parse_balance(r[i]))
+        self.assertEqual(sim.allowance(a[1], a[2]), c.parse_allowance(r[5]))
+        self.assertEqual(sim.total_minted, c.parse_total_minted(r[6]))
+        self.assertEqual(sim.total_burned, c.parse_burned(r[7]))
+        self.assertEqual(strip_0x(sim.owner), strip_0x(a[3]).lower())
+
+        # signed transactions give the same outcome, with the transaction hash in the revert
+        sim = GiftableTokenSimulator(self.address, a[0], chain_spec=self.chain_spec)
+        sim.balances[sim.key(a[0])] = self.initial_supply
+        sim.total_minted = self.initial_supply
+        reverts = sim.run(signed)
+        self.assertEqual([r.index for r in reverts], chain_reverts)
+        self.assertEqual(reverts[0].tx_hash, signed[1][0])
+        self.assertEqual(sim.balance_of(a[4]), c.parse_balance(r[4]))
+
+
+    def test_expiry(self):
+        a = self.accounts
+        sim = GiftableTokenSimulator(self.address, a[0], expires=1000, timestamp=999)
+        self.assertIsNone(sim.call(a[0], transfer_data(a[1], 0)))
+        self.assertIsNone(sim.apply(self.token(a[0]).mint_to(self.address, a[0], a[1], 10, tx_format=TxFormat.DICT)))
+        self.assertIsNone(sim.apply(self.token(a[1]).transfer(self.address, a[1], a[2], 5, tx_format=TxFormat.DICT)))
+        sim.timestamp = 1000
+        self.assertEqual(sim.apply(self.token(a[1]).transfer(self.address, a[1], a[2], 5, tx_format=TxFormat.DICT)), 'expired')
+        self.assertEqual(sim.apply(self.token(a[1]).approve(self.address, a[1], a[2], 5, tx_format=TxFormat.DICT)), 'expired')
+        self.assertIsNone(sim.apply(self.token(a[0]).mint_to(self.address, a[0], a[1], 10, tx_format=TxFormat.DICT)))
+        self.assertEqual(sim.balance_of(a[1]), 15)
+        self.assertEqual(sim.total_supply(), 20)
+
+        self.assertEqual(sim.call(a[0], '0xdeadbeef'), 'unknown method')
+        self.assertEqual(sim.call(a[0], transfer_data(a[1], 0), value=1), 'not payable')
+        self.assertEqual(sim.call(a[0], transfer_data(a[1], 0)[:-2]), 'input too short')
+        tx = self.token(a[0]).transfer(a[1], a[0], a[1], 1, tx_format=TxFormat.DICT)
+        with self.assertRaises(ValueError):
+            sim.apply(tx)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# standard imports
+import os
+import unittest
+import logging
+import tempfile
+import shutil
+
+# external imports
+from chainlib.eth.nonce import RPCNonceOracle
+from chainlib.eth.tx import receipt
+
+# local imports
+from eth_erc20.snapshot import (
+        Snapshot,
+        SnapshotStore,
+        )
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.unittest import TestGiftableToken
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class TestSnapshot(TestGiftableToken):
+
+    def setUp(self):
+        super(TestSnapshot, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'snapshot.sqlite')
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestSnapshot, self).tearDown()
+
+
+    def test_height_param(self):
+        block_hash = '0x' + 'Ab' * 32
+        c = GiftableToken(self.chain_spec)
+        for o in [
+                c.symbol(self.address, height=block_hash),
+                c.allowance(self.address, self.accounts[0], self.accounts[1], height=block_hash),
+                c.burned(self.address, height=block_hash),
+                c.total_minted(self.address, height=block_hash),
+                ]:
+            self.assertEqual(o['params'][1], {'blockHash': block_hash.lower(), 'requireCanonical': True})
+        self.assertEqual(c.total_minted(self.address, height=1024)['params'][1], '0x0000000000000400')
+        self.assertEqual(c.burned(self.address)['params'][1], 'latest')
+
+
+    def test_snapshot_reads(self):
+        nonce_oracle = RPCNonceOracle(self.accounts[0], conn=self.rpc)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        (tx_hash, o) = c.transfer(self.address, self.accounts[0], self.accounts[1], 1000)
+        self.rpc.do(o)
+        r = self.rpc.do(receipt(tx_hash))
+        self.assertEqual(r['status'], 1)
+
+        store = SnapshotStore(self.path, self.chain_spec)
+        snapshot = Snapshot.at(self.rpc, self.chain_spec, factory=GiftableToken(self.chain_spec), store=store, sender_address=self.accounts[0])
+        self.assertEqual(snapshot.block_number, r['block_number'])
+        balances = snapshot.balances(self.address, self.accounts[:3])
+        self.assertEqual(balances, {self.accounts[0]: self.initial_supply - 1000, self.accounts[1]: 1000, self.accounts[2]: 0})
+        self.assertEqual(snapshot.metadata(self.address), {'name': self.name, 'symbol': self.symbol, 'decimals': self.decimals})
+        reads = [(self.address, 'total_supply', (),), (self.address, 'total_minted', (),), (self.address, 'burned', (),)]
+        self.assertEqual(snapshot.read(reads), [self.initial_supply, self.initial_supply, 0])
+        self.assertEqual(snapshot.rpc_count, 9)
+
+        snapshot.balances(self.address, self.accounts[:3])
+        snapshot.read(reads)
+        self.assertEqual(snapshot.rpc_count, 9)
+        store.close()
+
+        store = SnapshotStore(self.path, self.chain_spec)
+        snapshot = Snapshot(self.rpc, self.chain_spec, snapshot.block_hash, factory=GiftableToken(self.chain_spec), store=store, sender_address=self.accounts[0])
+        self.assertEqual(snapshot.balance_of(self.address, self.accounts[1]), 1000)
+        self.assertEqual(snapshot.read(reads), [self.initial_supply, self.initial_supply, 0])
+        self.assertEqual(snapshot.rpc_count, 0)
+        self.assertEqual(snapshot.allowance(self.address, self.accounts[0], self.accounts[1]), 0)
+        self.assertEqual(snapshot.rpc_count, 1)
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
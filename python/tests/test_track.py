@@ -0,0 +1,100 @@
+# standard imports
+import unittest
+import logging
+
+# external imports
+from chainlib.eth.nonce import RPCNonceOracle
+from chainlib.eth.tx import TxFormat
+from hexathon import strip_0x
+
+# local imports
+from giftable_erc20_token import GiftableToken
+from giftable_erc20_token.unittest import TestGiftableToken
+from eth_erc20.classify import CallClassifier
+from eth_erc20.track import (
+        ReceiptTracker,
+        RevertError,
+        wait,
+        )
+
+logging.basicConfig(level=logging.DEBUG)
+logg = logging.getLogger()
+
+
+class TestTrack(TestGiftableToken):
+
+    def test_track(self):
+        nonce_oracle = RPCNonceOracle(self.accounts[0], conn=self.rpc)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        tracker = ReceiptTracker(self.rpc, batch_size=2, min_interval=0.01)
+        hashes = []
+        for i in range(1, 6):
+            (tx_hash, o) = c.transfer(self.address, self.accounts[0], self.accounts[i], i)
+            self.rpc.do(o)
+            tracker.add(tx_hash)
+            hashes.append(tx_hash)
+        self.assertEqual(len(tracker.pending()), 5)
+
+        r = list(tracker.track())
+        self.assertEqual(sorted([tx_hash for (tx_hash, v) in r]), sorted(hashes))
+        for (tx_hash, v) in r:
+            self.assertEqual(v['status'], 1)
+        self.assertEqual(len(tracker.pending()), 0)
+
+
+    def test_track_revert(self):
+        nonce_oracle = RPCNonceOracle(self.accounts[0], conn=self.rpc)
+        c = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        tracker = ReceiptTracker(self.rpc, classifier=CallClassifier(GiftableToken.call_plans()), min_interval=0.01)
+
+        (tx_hash_ok, o) = c.mint_to(self.address, self.accounts[0], self.accounts[1], 42)
+        self.rpc.do(o)
+        tracker.add(tx_hash_ok)
+
+        # accounts 2 has no tokens to burn, and its input is left to be retrieved from the node
+        nonce_oracle = RPCNonceOracle(self.accounts[2], conn=self.rpc)
+        c_burn = GiftableToken(self.chain_spec, signer=self.signer, nonce_oracle=nonce_oracle)
+        (tx_hash_burn, o) = c_burn.burn(self.address, self.accounts[2], 13)
+        self.rpc.do(o)
+        tracker.add(tx_hash_burn)
+
+        # input passed on add
+        tx = c.transfer(self.address, self.accounts[0], self.accounts[1], self.initial_supply * 2, tx_format=TxFormat.DICT)
+        (tx_hash_transfer, o) = c.finalize(tx)
+        self.rpc.do(o)
+        tracker.add(tx_hash_transfer, data=tx['data'])
+
+        confirmed = []
+        reverted = {}
+        while len(tracker.pending()) > 0:
+            try:
+                for (tx_hash, r) in tracker.track():
+                    confirmed.append(tx_hash)
+            except RevertError as e:
+                self.assertEqual(e.receipt['status'], 0)
+                reverted[e.tx_hash] = e.call
+
+        self.assertEqual(confirmed, [tx_hash_ok])
+        self.assertEqual(reverted[tx_hash_burn][0].method, 'burn')
+        self.assertEqual(reverted[tx_hash_burn][1], [13])
+        self.assertEqual(reverted[tx_hash_transfer][0].method, 'transfer')
+        self.assertEqual(reverted[tx_hash_transfer][1], [strip_0x(self.accounts[1]), self.initial_supply * 2])
+
+        with self.assertRaises(RevertError):
+            wait(self.rpc, tx_hash_burn)
+        r = wait(self.rpc, tx_hash_ok)
+        self.assertEqual(r['status'], 1)
+
+
+    def test_track_backoff(self):
+        tracker = ReceiptTracker(self.rpc, min_interval=0.001, max_interval=0.004, backoff=2)
+        tracker.add('0x' + 'ff' * 32)
+        with self.assertRaises(TimeoutError):
+            for r in tracker.track(timeout=0.05):
+                pass
+        self.assertEqual(tracker.interval, 0.004)
+        self.assertEqual(len(tracker.pending()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+# @version 0.3.7
+
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+# Implements the aggregate method of the Multicall contract interface.
+
+struct ContractCall:
+    target: address
+    callData: Bytes[256]
+
+@external
+@view
+def aggregate(calls: DynArray[ContractCall, 128]) -> (uint256, DynArray[Bytes[256], 128]):
+    returnData: DynArray[Bytes[256], 128] = []
+    for c in calls:
+        r: Bytes[256] = raw_call(c.target, c.callData, max_outsize=256, is_static_call=True)
+        returnData.append(r)
+    return (block.number, returnData)
+
+@external
+@view
+def getBlockNumber() -> uint256:
+    return block.number